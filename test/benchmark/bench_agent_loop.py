@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+流水线智能体循环基准测试
+模拟的大模型在每一步的流式回复中先后给出--calls个工具调用，相邻分片间隔--token-ms，整个回复持续约--stream-ms；
+每个工具（声明concurrent的自定义工具）执行--tool-ms。对比：
+- 等待回复结束：收完整个回复后才开始执行工具调用
+- 流水线：工具调用参数完整后立即开始执行，与模型继续生成的时间重叠
+输出每次命令（--steps步）的耗时，以及agent_summary报告的重叠节省时间。
+
+使用方式：
+python test/benchmark/bench_agent_loop.py [--steps 3] [--calls 3] [--stream-ms 300] [--tool-ms 150] [--rounds 5]
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+sys.path.append(TOOLS_DIR)
+
+from core.command_processor import CommandProcessor
+
+
+class SimulatedModel:
+    """按固定节奏流式返回文本和工具调用；收到最后一步的工具结果后回复最终答案"""
+
+    def __init__(self, steps: int, calls: int, stream_ms: float, buffered: bool):
+        self.steps = steps
+        self.calls = calls
+        self.stream_ms = stream_ms
+        self.buffered = buffered
+
+    def stream_request(self, data, sequence_id=None):
+        events = self._events(data)
+        # 等待回复结束：收完全部事件后才交给调用方
+        return iter(list(events)) if self.buffered else events
+
+    def _events(self, data):
+        step = sum(1 for m in data["messages"] if m.get("role") == "assistant" and m.get("tool_calls")) + 1
+        if step >= self.steps:
+            yield {"type": "text", "content": "完成"}
+            return
+        gap = self.stream_ms / 1000 / (self.calls + 1)
+        for index in range(self.calls):
+            time.sleep(gap)
+            yield {"type": "tool_call", "toolCall": {"id": f"call_{step}_{index}", "name": "fetch",
+                                                     "parameters": {"index": index}}}
+        time.sleep(gap)
+        yield {"type": "text", "content": "继续"}
+
+
+def run(buffered: bool, args) -> tuple:
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        processor = CommandProcessor(use_mock=True, stream=True, max_steps=args.steps)
+        processor.llm_client = SimulatedModel(args.steps, args.calls, args.stream_ms, buffered)
+        processor.tool_handler.register_custom_tool({
+            "name": "fetch", "description": "模拟I/O", "parameters": {}, "concurrent": True,
+            "handler": lambda parameters, sequence_id: time.sleep(args.tool_ms / 1000) or parameters
+        })
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            processor.process_command("开始", "bench")
+        elapsed = (time.perf_counter() - start) / args.rounds
+    summaries = [json.loads(line)["content"] for line in output.getvalue().splitlines()
+                 if line.startswith('{"type": "agent_summary"')]
+    saved = sum(s["overlapSavedMs"] for s in summaries) / max(1, len(summaries))
+    return elapsed, saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description='流水线智能体循环基准测试')
+    parser.add_argument('--steps', type=int, default=3, help='每次命令的步数（最后一步不调用工具）')
+    parser.add_argument('--calls', type=int, default=3, help='每步的工具调用数')
+    parser.add_argument('--stream-ms', type=float, default=300, help='每步流式回复的持续时间（毫秒）')
+    parser.add_argument('--tool-ms', type=float, default=150, help='每个工具调用的耗时（毫秒）')
+    parser.add_argument('--rounds', type=int, default=5, help='重复次数')
+    args = parser.parse_args()
+
+    print(f"{args.steps}步，每步{args.calls}个工具调用，流式回复{args.stream_ms:g}ms，工具耗时{args.tool_ms:g}ms")
+    baseline, _ = run(True, args)
+    print(f"  {'等待回复结束':<10}每次{baseline * 1e3:8.1f}ms")
+    pipelined, saved = run(False, args)
+    print(f"  {'流水线':<10}每次{pipelined * 1e3:8.1f}ms  实测节省{(baseline - pipelined) * 1e3:7.1f}ms  "
+          f"agent_summary报告节省{saved:7.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+金额计算引擎基准测试
+对比core.amount_engine（整数最小货币单位 + array缓冲区）与逐条Decimal累加的汇总耗时，
+并给出浮点累加的误差作为参照
+
+使用方式：
+python test/benchmark/bench_amount_engine.py [--records 1000000] [--seed 1]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from decimal import Decimal
+
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+sys.path.append(TOOLS_DIR)
+
+from core.amount_engine import AmountBatch, currency_exponent, format_minor_units, percentile
+
+CURRENCIES = ['CNY', 'USD', 'EUR', 'JPY', 'KWD']
+
+
+def generate(count: int, seed: int) -> list:
+    """生成(金额字符串, 币种)记录，金额精度与币种一致"""
+    rng = random.Random(seed)
+    records = []
+    for _ in range(count):
+        currency = rng.choice(CURRENCIES)
+        exponent = currency_exponent(currency)
+        records.append((format_minor_units(rng.randint(-10 ** 9, 10 ** 9), currency) if exponent else
+                        str(rng.randint(-10 ** 7, 10 ** 7)), currency))
+    return records
+
+
+def run_engine(records: list) -> dict:
+    batch = AmountBatch()
+    batch.extend(records)
+    return {currency: format_minor_units(entry["total"], currency) for currency, entry in batch.stats().items()}
+
+
+def run_decimal(records: list) -> dict:
+    groups = {}
+    for amount, currency in records:
+        groups.setdefault(currency, []).append(Decimal(amount))
+    result = {}
+    for currency, values in groups.items():
+        ordered = sorted(values)
+        for pct in (50, 90, 99):
+            percentile(ordered, pct)
+        exponent = currency_exponent(currency)
+        result[currency] = format(sum(values, Decimal(0)).quantize(Decimal(1).scaleb(-exponent)), 'f')
+    return result
+
+
+def run_float(records: list) -> dict:
+    totals = {}
+    for amount, currency in records:
+        totals[currency] = totals.get(currency, 0.0) + float(amount)
+    return totals
+
+
+def timed(func, records: list):
+    start = time.perf_counter()
+    result = func(records)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='金额计算引擎基准测试')
+    parser.add_argument('--records', type=int, default=1000000, help='记录条数')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    args = parser.parse_args()
+
+    records = generate(args.records, args.seed)
+    engine_result, engine_time = timed(run_engine, records)
+    decimal_result, decimal_time = timed(run_decimal, records)
+    float_result, float_time = timed(run_float, records)
+
+    print(f"records={args.records}")
+    print(f"  engine : {engine_time:7.3f}s  {args.records / engine_time:12,.0f} records/s")
+    print(f"  decimal: {decimal_time:7.3f}s  {args.records / decimal_time:12,.0f} records/s")
+    print(f"  float  : {float_time:7.3f}s  {args.records / float_time:12,.0f} records/s")
+    print(f"  engine与Decimal结果一致: {'是' if engine_result == decimal_result else '否'}")
+    for currency in sorted(engine_result):
+        drift = Decimal(repr(float_result[currency])) - Decimal(engine_result[currency])
+        print(f"  {currency}: total={engine_result[currency]}  float误差={drift}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+金额处理基准测试套件
+用固定种子生成的合成数据（多币种，约2%的畸形记录）测试cmd-third的三种处理方式：
+- argv：单条模式，每条记录单独调用一次process_input（与命令行参数相同的JSON字符串）
+- batch：批量模式，一次调用处理全部记录
+- stream：流式模式，逐块读取CSV文件
+
+每个(方式, 记录数)在独立的子进程中运行，分别报告吞吐（条/秒）、每块耗时的p99和峰值RSS。
+消息经json.dumps序列化后丢弃，计入与命令行输出相同的序列化开销；单条模式不包含模拟的等待。
+
+使用方式：
+python test/benchmark/bench_amount_suite.py [--sizes 1e3 1e4 1e5 1e6] [--modes argv batch stream]
+python test/benchmark/bench_amount_suite.py --save-baseline            # 记录当前机器的基线
+python test/benchmark/bench_amount_suite.py --threshold 15             # 与基线对比，退化超过15%时返回1
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+import importlib.util
+
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'amount_suite.json')
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'amount-bench-data')
+
+MODES = ('argv', 'batch', 'stream')
+CURRENCIES = ['CNY', 'USD', 'EUR', 'JPY', 'KWD', 'GBP']
+# 各项指标的方向：吞吐越高越好，p99和内存越低越好
+METRICS = (('records_per_s', 1), ('p99_chunk_ms', -1), ('peak_rss_mb', -1))
+# 用于检测退化的最小样本：很小的用例耗时只有几毫秒，噪声远大于阈值
+MIN_COMPARABLE_SECONDS = 0.05
+
+
+def parse_size(value: str) -> int:
+    """支持1e6、1000000两种写法"""
+    return int(float(value))
+
+
+def _amount(rng: random.Random, currency: str) -> str:
+    exponent = {'JPY': 0, 'KWD': 3}.get(currency, 2)
+    units = rng.randint(-10 ** 8, 10 ** 9)
+    if not exponent:
+        return str(units)
+    sign = '-' if units < 0 else ''
+    whole, frac = divmod(abs(units), 10 ** exponent)
+    return f"{sign}{whole}.{frac:0{exponent}d}"
+
+
+def generate_dataset(size: int, seed: int, data_dir: str) -> tuple:
+    """生成(或复用)CSV和JSONL数据文件，返回两者的路径
+
+    畸形记录包括：无法解析的金额、超出币种精度的金额、空金额，
+    以及CSV中字段数不一致的行和JSONL中无法解析的行。
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    stem = os.path.join(data_dir, f'amounts-{size}-{seed}')
+    csv_path, jsonl_path = f'{stem}.csv', f'{stem}.jsonl'
+    if os.path.exists(csv_path) and os.path.exists(jsonl_path):
+        return csv_path, jsonl_path
+
+    rng = random.Random(seed)
+    with open(f'{csv_path}.tmp', 'w', encoding='utf-8') as csv_file, \
+            open(f'{jsonl_path}.tmp', 'w', encoding='utf-8') as jsonl_file:
+        csv_file.write('amount,currency,date\n')
+        for i in range(size):
+            currency = rng.choice(CURRENCIES)
+            amount = _amount(rng, currency)
+            date = f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}"
+            roll = rng.random()
+            if roll < 0.005:
+                amount = 'abc'
+            elif roll < 0.01:
+                currency, amount = 'JPY', '1.5'
+            elif roll < 0.015:
+                amount = ''
+            if 0.015 <= roll < 0.02:
+                csv_file.write(f'{amount},{currency},{date},extra\n')
+                jsonl_file.write('{"amount": \n')
+                continue
+            csv_file.write(f'{amount},{currency},{date}\n')
+            jsonl_file.write(json.dumps({"amount": amount, "currency": currency, "date": date}) + '\n')
+    os.replace(f'{csv_path}.tmp', csv_path)
+    os.replace(f'{jsonl_path}.tmp', jsonl_path)
+    return csv_path, jsonl_path
+
+
+def percentile(samples: list, pct: float) -> float:
+    """最近秩法百分位"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def peak_rss_mb() -> float:
+    """当前进程的峰值RSS（MB）"""
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux上单位为KB，macOS上为字节
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+class ChunkTimer:
+    """CmdThird的输出回调：序列化消息并记录每个table块之间的耗时"""
+
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+        self.chunk_ms = []
+        self.rows = 0
+        self.bytes = 0
+
+    def __call__(self, message: dict) -> None:
+        self.bytes += len(json.dumps(message))
+        content = message.get('content')
+        if message.get('type') == 'table' and content['header'][0] == 'index':
+            now = time.perf_counter()
+            self.chunk_ms.append((now - self.last) * 1000)
+            self.last = now
+            self.rows += len(content['rows'])
+
+
+def run_worker(mode: str, size: int, csv_path: str, jsonl_path: str) -> dict:
+    """在当前进程内运行一个用例，返回各项指标"""
+    sys.path.insert(0, TOOLS_DIR)
+    spec = importlib.util.spec_from_file_location('cmd_third', os.path.join(TOOLS_DIR, 'cmd-third.py'))
+    cmd_third = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(cmd_third)
+    from core.amount_stream import iter_jsonl_records
+
+    timer = ChunkTimer()
+    tool = cmd_third.CmdThird(output=timer, simulate_delay=False)
+
+    if mode == 'argv':
+        # 单条模式没有table消息，每条记录即一块
+        with open(jsonl_path, encoding='utf-8') as f:
+            arguments = [line.strip() for line in f]
+        start = time.perf_counter()
+        for argument in arguments:
+            began = time.perf_counter()
+            tool.process_input(argument)
+            timer.chunk_ms.append((time.perf_counter() - began) * 1000)
+        elapsed = time.perf_counter() - start
+    elif mode == 'batch':
+        # 加载时间不计入吞吐，但加载的记录计入峰值内存
+        with open(jsonl_path, encoding='utf-8') as f:
+            records = list(iter_jsonl_records(f))
+        timer.start = timer.last = start = time.perf_counter()
+        tool.process_input({"records": records})
+        elapsed = time.perf_counter() - start
+    else:
+        timer.start = timer.last = start = time.perf_counter()
+        tool.process_input({"file": csv_path})
+        elapsed = time.perf_counter() - start
+
+    return {
+        "records": size,
+        "seconds": round(elapsed, 4),
+        "records_per_s": round(size / elapsed, 1) if elapsed else 0.0,
+        "p99_chunk_ms": round(percentile(timer.chunk_ms, 99), 4),
+        "chunks": len(timer.chunk_ms),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def run_case(mode: str, size: int, csv_path: str, jsonl_path: str, repeat: int = 1) -> dict:
+    """在子进程中运行用例，使峰值RSS只反映该用例；重复repeat次，各项指标取最好的一次以降低噪声"""
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', mode, str(size), csv_path, jsonl_path],
+            capture_output=True,
+            text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"{mode}/{size}运行失败: {result.stderr.strip()}")
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    best = max(runs, key=lambda run: run['records_per_s'])
+    best['p99_chunk_ms'] = min(run['p99_chunk_ms'] for run in runs)
+    best['peak_rss_mb'] = min(run['peak_rss_mb'] for run in runs)
+    return best
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """与基线对比，返回退化超过threshold%的(用例, 指标, 基线值, 当前值, 变化%)"""
+    regressions = []
+    for case, current in results.items():
+        base = baseline.get(case)
+        if not base or min(base.get('seconds', 0), current['seconds']) < MIN_COMPARABLE_SECONDS:
+            continue
+        for metric, direction in METRICS:
+            old, new = base.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            if -direction * change > threshold:
+                regressions.append((case, metric, old, new, change))
+    return regressions
+
+
+def load_baseline(path: str) -> dict:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f).get('results', {})
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path: str, results: dict, existing: dict) -> None:
+    """写入基线；未运行的用例保留原有基线"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "results": dict(existing, **results),
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        mode, size, csv_path, jsonl_path = sys.argv[2:6]
+        print(json.dumps(run_worker(mode, int(size), csv_path, jsonl_path)))
+        return 0
+
+    parser = argparse.ArgumentParser(description='金额处理基准测试套件')
+    parser.add_argument('--sizes', type=parse_size, nargs='+', default=[1000, 10000, 100000, 1000000],
+                        help='记录数，可写作1e3~1e7')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES), help='处理方式')
+    parser.add_argument('--max-argv', type=parse_size, default=100000,
+                        help='单条模式的最大记录数（逐条调用，更大的数据集耗时过长）')
+    parser.add_argument('--max-batch', type=parse_size, default=1000000,
+                        help='批量模式的最大记录数（全部记录常驻内存）')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    parser.add_argument('--repeat', type=int, default=3, help='每个用例的运行次数，取最好的一次')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='合成数据目录，已生成的文件会复用')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线JSON文件路径')
+    parser.add_argument('--save-baseline', action='store_true', help='将本次结果写入基线')
+    parser.add_argument('--threshold', type=float, default=20.0, help='允许的退化百分比')
+    args = parser.parse_args()
+
+    limits = {'argv': args.max_argv, 'batch': args.max_batch}
+    results = {}
+    print(f"{'case':<16}{'records/s':>14}{'p99 chunk':>14}{'peak RSS':>12}{'seconds':>10}")
+    for size in args.sizes:
+        csv_path, jsonl_path = generate_dataset(size, args.seed, args.data_dir)
+        for mode in args.modes:
+            case = f"{mode}/{size}"
+            if size > limits.get(mode, size):
+                print(f"{case:<16}{'skipped (--max-' + mode + ')':>50}")
+                continue
+            result = results[case] = run_case(mode, size, csv_path, jsonl_path, args.repeat)
+            print(f"{case:<16}{result['records_per_s']:>14,.0f}{result['p99_chunk_ms']:>12.3f}ms"
+                  f"{result['peak_rss_mb']:>10.1f}MB{result['seconds']:>10.2f}")
+
+    baseline = load_baseline(args.baseline)
+    if args.save_baseline:
+        save_baseline(args.baseline, results, baseline)
+        print(f"\n基线已写入{args.baseline}")
+        return 0
+    if not baseline:
+        print(f"\n没有基线文件{args.baseline}，可使用--save-baseline生成")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    if not regressions:
+        print(f"\n与基线相比没有超过{args.threshold:g}%的退化")
+        return 0
+    print(f"\n与基线相比退化超过{args.threshold:g}%：")
+    for case, metric, old, new, change in regressions:
+        print(f"  {case:<16}{metric:<16}{old:>12,.2f} -> {new:>12,.2f} ({change:+.1f}%)")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
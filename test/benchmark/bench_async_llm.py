@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+大模型请求并发扇出基准测试
+用本地替身服务（每个请求固定等待--latency-ms毫秒，模拟模型推理耗时）对比：
+- 同步QianwenClient在线程池中并发发送
+- AsyncQianwenClient在单个事件循环中用gather_requests并发发送
+
+使用方式：
+python test/benchmark/bench_async_llm.py [--requests 500] [--latency-ms 100] [--concurrency 50 200 500]
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+sys.path.append(TOOLS_DIR)
+
+from core.llm_client import QianwenClient, close_shared_sessions
+from core.async_llm_client import AsyncConnectionPool, AsyncQianwenClient, gather_requests
+
+RESPONSE = json.dumps({"choices": [{"message": {"role": "assistant", "content": "ok"}}]}).encode('utf-8')
+
+
+async def handle(reader, writer, latency):
+    """模型服务替身：读取请求后等待latency秒再返回固定回复，保持连接"""
+    writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    try:
+        while True:
+            if not await reader.readline():
+                break
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            await reader.readexactly(length)
+            await asyncio.sleep(latency)
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s'
+                         % (len(RESPONSE), RESPONSE))
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+def start_server(latency: float):
+    """在后台线程的事件循环中启动替身服务，返回(base_url, 停止函数)"""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    holder = {}
+
+    async def serve():
+        holder['server'] = await asyncio.start_server(lambda r, w: handle(r, w, latency), '127.0.0.1', 0,
+                                                      backlog=2048)
+        ready.set()
+
+    thread = threading.Thread(target=lambda: (loop.run_until_complete(serve()), loop.run_forever()), daemon=True)
+    thread.start()
+    ready.wait()
+    port = holder['server'].sockets[0].getsockname()[1]
+
+    def stop():
+        loop.call_soon_threadsafe(holder['server'].close)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+
+    return f"http://127.0.0.1:{port}", stop
+
+
+def run_threads(base_url: str, payloads: list, concurrency: int) -> float:
+    client = QianwenClient(base_url, "", pool_size=concurrency)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client.send_request, payloads))
+    elapsed = time.perf_counter() - start
+    close_shared_sessions()
+    return elapsed
+
+
+async def run_async(base_url: str, payloads: list, concurrency: int) -> float:
+    async with AsyncQianwenClient(base_url, "", pool=AsyncConnectionPool(pool_size=concurrency)) as client:
+        start = time.perf_counter()
+        results = await gather_requests(client, payloads)
+        elapsed = time.perf_counter() - start
+    errors = [r for r in results if isinstance(r, Exception)]
+    if errors:
+        raise errors[0]
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='大模型请求并发扇出基准测试')
+    parser.add_argument('--requests', type=int, default=500, help='每种方式的请求总数')
+    parser.add_argument('--latency-ms', type=float, default=100.0, help='替身服务每个请求的处理耗时（毫秒）')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 200, 500],
+                        help='同时进行的请求数（线程数 / 连接池大小）')
+    args = parser.parse_args()
+
+    base_url, stop = start_server(args.latency_ms / 1000)
+    payloads = [{"messages": [{"role": "user", "content": f"问题{i}"}]} for i in range(args.requests)]
+    try:
+        print(f"{args.requests}次请求，替身服务耗时{args.latency_ms:g}ms/请求")
+        print(f"  {'并发':>6}  {'线程池+同步客户端':>18}  {'asyncio客户端':>14}")
+        for concurrency in args.concurrency:
+            threaded = run_threads(base_url, payloads, concurrency)
+            native = asyncio.run(run_async(base_url, payloads, concurrency))
+            print(f"  {concurrency:>6}  {threaded:>8.2f}s {args.requests / threaded:>7.0f}/s"
+                  f"  {native:>6.2f}s {args.requests / native:>7.0f}/s")
+    finally:
+        stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多轮会话上下文窗口基准测试
+模拟一个--turns轮的长会话，每轮追加一条用户消息和一条回复并构建发送的请求体，对比：
+- 逐轮重新扫描：每轮对全部历史重新估算token数、截取预算内的消息并序列化
+- 会话存储：追加时估算、序列化一次，窗口增量移动，请求体拼接缓存的JSON文本（进程内存储和文件存储）
+并测量被淘汰的长会话从文件重新加载窗口的耗时。
+
+使用方式：
+python test/benchmark/bench_conversation_store.py [--turns 2000] [--budget 4096] [--message-chars 200]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+sys.path.append(TOOLS_DIR)
+
+from core.conversation_store import ConversationStore, message_tokens
+from core.llm_client import encode_request
+
+
+def message(turn: int, role: str, chars: int) -> str:
+    return (f"第{turn}轮{role}：" + "会话内容abc " * chars)[:chars]
+
+
+def run_rescan(turns: int, budget: int, chars: int) -> float:
+    history = []
+    start = time.perf_counter()
+    for turn in range(turns):
+        history.append({"role": "user", "content": message(turn, "user", chars)})
+        tokens = 0
+        window = []
+        for item in reversed(history):
+            tokens += message_tokens(item)
+            if window and tokens > budget:
+                break
+            window.append(item)
+        json.dumps({"model": "qwen", "messages": window[::-1]}, ensure_ascii=False).encode('utf-8')
+        history.append({"role": "assistant", "content": message(turn, "assistant", chars)})
+    return time.perf_counter() - start
+
+
+def run_store(store: ConversationStore, turns: int, chars: int) -> float:
+    start = time.perf_counter()
+    for turn in range(turns):
+        store.append("bench", "user", message(turn, "user", chars))
+        encode_request({"model": "qwen", "messages": store.window("bench")})
+        store.append("bench", "assistant", message(turn, "assistant", chars))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多轮会话上下文窗口基准测试')
+    parser.add_argument('--turns', type=int, default=2000, help='会话轮数')
+    parser.add_argument('--budget', type=int, default=4096, help='上下文窗口的token预算')
+    parser.add_argument('--message-chars', type=int, default=200, help='每条消息的字符数')
+    args = parser.parse_args()
+
+    print(f"{args.turns}轮会话，每条消息{args.message_chars}个字符，token预算{args.budget}")
+    elapsed = run_rescan(args.turns, args.budget, args.message_chars)
+    print(f"  {'逐轮重新扫描':<12}{elapsed:8.3f}s  每轮{elapsed / args.turns * 1e3:8.3f}ms")
+
+    store = ConversationStore(token_budget=args.budget)
+    elapsed = run_store(store, args.turns, args.message_chars)
+    print(f"  {'进程内存储':<12}{elapsed:8.3f}s  每轮{elapsed / args.turns * 1e3:8.3f}ms  "
+          f"窗口{len(store.window('bench'))}条消息")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'conversations.sqlite3')
+        store = ConversationStore(path, token_budget=args.budget)
+        elapsed = run_store(store, args.turns, args.message_chars)
+        print(f"  {'文件存储':<12}{elapsed:8.3f}s  每轮{elapsed / args.turns * 1e3:8.3f}ms")
+        store.close()
+
+        # 新进程冷启动：只从文件读取窗口范围内的最近消息
+        store = ConversationStore(path, token_budget=args.budget)
+        start = time.perf_counter()
+        window = store.window("bench")
+        print(f"  冷启动加载窗口{(time.perf_counter() - start) * 1e3:8.3f}ms  "
+              f"（历史{args.turns * 2}条，窗口{len(window)}条）")
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+direct_comm_server金额处理吞吐基准测试
+对比旧实现（每个请求通过shell启动cmd-third.py子进程）与进程内处理+NDJSON流式返回的吞吐
+
+使用方式：
+python test/benchmark/bench_direct_comm_amount.py [--requests 50] [--records 1 100]
+
+单条金额模式不参与对比：旧的命令行会模拟0.7秒的处理延迟，测得的只是sleep时间。
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import statistics
+import urllib.request
+import importlib.util
+
+# 动态导入direct_comm_server.py
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+sys.path.append(TOOLS_DIR)
+_spec = importlib.util.spec_from_file_location("direct_comm_server", os.path.join(TOOLS_DIR, "direct_comm_server.py"))
+direct_comm_server = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(direct_comm_server)
+
+
+class QuietHandler(direct_comm_server.DirectCommHandler):
+    """关闭访问日志和请求日志，避免打印影响计时"""
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LegacyHandler(QuietHandler):
+    """旧实现：通过shell启动cmd-third.py，等待结束后一次性返回JSON"""
+
+    def _handle_process_amount(self, request_data):
+        try:
+            amount_data = request_data.get('amountData')
+            cmd_path = os.path.join(TOOLS_DIR, 'cmd-third.py')
+            escaped_json = json.dumps(amount_data, ensure_ascii=False).replace('"', '\\"')
+            result = self._execute_command(f'"{sys.executable}" "{cmd_path}" "{escaped_json}"')
+            self._send_json(200, {'success': True, 'result': {'type': 'text', 'content': result}})
+        except Exception as e:
+            self._send_json(500, {'success': False, 'error': str(e)})
+
+
+def start_server(handler):
+    """在临时端口上启动服务器，返回(server, url)"""
+    server = direct_comm_server.ThreadedHTTPServer(('localhost', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://localhost:{server.server_address[1]}/process-amount'
+
+
+def measure(url: str, payload: bytes, requests: int) -> list:
+    """顺序发送请求并读完整个响应，返回每次耗时（毫秒）"""
+    samples = []
+    for _ in range(requests):
+        request = urllib.request.Request(url, data=payload, headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        with urllib.request.urlopen(request, timeout=120) as response:
+            response.read()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples: list) -> str:
+    """格式化统计结果"""
+    total = sum(samples) / 1000
+    return (f"{len(samples) / total:8.1f} req/s  mean={statistics.mean(samples):7.2f}ms  "
+            f"median={statistics.median(samples):7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='direct_comm_server金额处理吞吐基准测试')
+    parser.add_argument('--requests', type=int, default=50, help='每种方式的请求次数')
+    parser.add_argument('--records', type=int, nargs='+', default=[1, 100], help='每个请求的记录数')
+    args = parser.parse_args()
+
+    direct_comm_server.load_cmd_third()
+    servers = {name: start_server(handler) for name, handler in
+               (('legacy (shell)', LegacyHandler), ('in-process', QuietHandler))}
+    # 请求日志打印到stdout，基准测试期间丢弃
+    stdout = sys.stdout
+    try:
+        for count in args.records:
+            records = [{"amount": f"{i}.{i % 100:02d}", "currency": "USD"} for i in range(count)]
+            payload = json.dumps({'amountData': records, 'sequenceId': 'bench'}).encode('utf-8')
+            results = {}
+            for name, (_, url) in servers.items():
+                sys.stdout = open(os.devnull, 'w')
+                try:
+                    measure(url, payload, 2)  # 预热
+                    results[name] = measure(url, payload, args.requests)
+                finally:
+                    sys.stdout.close()
+                    sys.stdout = stdout
+            print(f"\n{count}条记录/请求，{args.requests}次请求")
+            for name, samples in results.items():
+                print(f"  {name:<16}{summarize(samples)}")
+    finally:
+        sys.stdout = stdout
+        for server, _ in servers.values():
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+execinfo启动延迟基准测试
+对比shell=True与直接exec两种方式启动短命令（如git status）的耗时
+
+使用方式：
+python test/benchmark/bench_execinfo_spawn.py [--runs 50] [--command "git status"]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+import importlib.util
+
+# 动态导入execinfo.py
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+sys.path.append(TOOLS_DIR)
+_spec = importlib.util.spec_from_file_location("execinfo", os.path.join(TOOLS_DIR, "execinfo.py"))
+execinfo = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(execinfo)
+
+DEFAULT_COMMANDS = ["git status", "true", "ls"]
+
+
+def measure(popen_args, use_shell: bool, runs: int, executable=None) -> list:
+    """启动并等待命令结束，返回每次耗时（毫秒）"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            popen_args,
+            executable=executable,
+            shell=use_shell,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        process.communicate()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples: list) -> str:
+    """格式化统计结果"""
+    ordered = sorted(samples)
+    p95 = ordered[int(len(ordered) * 0.95) - 1] if len(ordered) >= 20 else ordered[-1]
+    return f"mean={statistics.mean(samples):7.2f}ms  median={statistics.median(samples):7.2f}ms  p95={p95:7.2f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='execinfo启动延迟基准测试')
+    parser.add_argument('--runs', type=int, default=50, help='每种方式的运行次数')
+    parser.add_argument('--command', action='append', help='要测试的命令，可多次指定')
+    args = parser.parse_args()
+
+    tool = execinfo.ExecInfo()
+    for command in args.command or DEFAULT_COMMANDS:
+        popen_args, use_shell, executable = tool._build_popen_args(command)
+        if use_shell:
+            print(f"[{command}] 不满足直接执行条件，跳过")
+            continue
+
+        # 预热一次，排除首次加载的影响
+        measure(popen_args, False, 1, executable)
+
+        shell_samples = measure(command, True, args.runs)
+        direct_samples = measure(popen_args, False, args.runs, executable)
+        saved = statistics.median(shell_samples) - statistics.median(direct_samples)
+
+        print(f"[{command}] runs={args.runs}")
+        print(f"  shell : {summarize(shell_samples)}")
+        print(f"  direct: {summarize(direct_samples)}")
+        print(f"  节省   : {saved:.2f}ms (median)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+幂等存储查询基准测试
+在不同行数的表上测试热缓存命中和未命中（直接查询SQLite主键）的单次查询耗时，
+用于确认查询开销不随表的增长而明显变化
+
+使用方式：
+python test/benchmark/bench_idempotency_store.py [--rows 1000 100000 1000000] [--lookups 20000]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+sys.path.append(TOOLS_DIR)
+
+from core.idempotency_store import IdempotencyStore, content_hash
+
+MESSAGES = json.dumps([{"type": "end", "content": "", "isError": False, "isEnd": True, "sequenceId": ""}])
+
+
+def fill(store: IdempotencyStore, rows: int) -> list:
+    """批量写入rows条记录，返回全部键"""
+    now = time.time()
+    keys = [(f"seq-{i}", content_hash({"amount": str(i)})) for i in range(rows)]
+    with store._lock:
+        store._conn.execute('BEGIN')
+        store._conn.executemany(
+            'INSERT INTO submissions (sequence_id, content_hash, created, messages) VALUES (?, ?, ?, ?)',
+            ((seq, digest, now, MESSAGES) for seq, digest in keys)
+        )
+        store._conn.execute('COMMIT')
+    return keys
+
+
+def measure(store: IdempotencyStore, keys: list, lookups: int) -> float:
+    """随机查询lookups次，返回平均每次耗时（微秒）"""
+    sample = [random.choice(keys) for _ in range(lookups)]
+    start = time.perf_counter()
+    for key in sample:
+        store.get(*key)
+    return (time.perf_counter() - start) / lookups * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='幂等存储查询基准测试')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000, 1000000], help='表的行数')
+    parser.add_argument('--lookups', type=int, default=20000, help='每种情况的查询次数')
+    args = parser.parse_args()
+
+    random.seed(1)
+    print(f"{'rows':>10}{'hot hit':>14}{'sqlite lookup':>18}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = IdempotencyStore(os.path.join(tmpdir, 'idem.sqlite3'), hot_size=0)
+            keys = fill(store, rows)
+            cold = measure(store, keys, args.lookups)
+            store.hot_size = 1024
+            hot_keys = keys[:1024]
+            measure(store, hot_keys, 1024)  # 预热热缓存
+            hot = measure(store, hot_keys, args.lookups)
+            store.close()
+        print(f"{rows:>10}{hot:>12.2f}us{cold:>16.2f}us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+工具输入解析基准测试
+对比core.input_parser.parse_tool_input与execinfo.py原有的多次尝试解析逻辑
+
+使用方式：
+python test/benchmark/bench_input_parser.py [--runs 20000]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+sys.path.append(TOOLS_DIR)
+
+from core.input_parser import parse_tool_input
+
+LARGE_VALUE = 'C:\\Users\\dev\\project, with commas ' * 200
+
+CASES = {
+    'strict': json.dumps({"content": "git status", "projectDir": "/home/dev/project", "sequenceId": "seq-1"}),
+    'over-escaped': json.dumps({"content": "git status", "projectDir": "/home/dev/project", "sequenceId": "seq-1"})
+    .replace('\\', '\\\\').replace('"', '\\"'),
+    'powershell': '{content:git status,projectDir:/home/dev/project,sequenceId:seq-1}',
+    'raw': 'git status',
+    'large-escaped': json.dumps({"content": LARGE_VALUE, "projectDir": "C:\\work"})
+    .replace('\\', '\\\\').replace('"', '\\"'),
+}
+
+
+def legacy_parse(input_arg):
+    """execinfo.py原有的解析逻辑：json.loads失败后去掉全部反斜杠再解析，最后手工查找content:"""
+    try:
+        input_data = json.loads(input_arg)
+        return input_data.get('content', ''), input_data.get('projectDir', os.getcwd())
+    except json.JSONDecodeError:
+        try:
+            if '\\' in input_arg:
+                input_data = json.loads(input_arg.replace('\\', ''))
+                return input_data.get('content', ''), input_data.get('projectDir', os.getcwd())
+            if input_arg.startswith('{') and input_arg.endswith('}') and ':' in input_arg and '"' not in input_arg:
+                content = input_arg
+                project_dir = os.getcwd()
+                if 'content:' in content:
+                    start = content.find('content:') + len('content:')
+                    end = content.find(',', start) if ',' in content[start:] else content.find('}', start)
+                    content = content[start:end].strip()
+                if 'projectDir:' in input_arg:
+                    start = input_arg.find('projectDir:') + len('projectDir:')
+                    end = input_arg.find(',', start) if ',' in input_arg[start:] else input_arg.find('}', start)
+                    project_dir = input_arg[start:end].strip() or os.getcwd()
+                return content, project_dir
+            return input_arg, os.getcwd()
+        except json.JSONDecodeError:
+            return input_arg, os.getcwd()
+
+
+def new_parse(input_arg):
+    """使用共享解析器得到同样的(content, projectDir)"""
+    input_data = parse_tool_input(input_arg)
+    if isinstance(input_data, dict):
+        return input_data.get('content', ''), input_data.get('projectDir') or os.getcwd()
+    return input_arg, os.getcwd()
+
+
+def bench(func, text, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        func(text)
+    return (time.perf_counter() - start) / runs * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='工具输入解析基准测试')
+    parser.add_argument('--runs', type=int, default=20000, help='每个用例的运行次数')
+    args = parser.parse_args()
+
+    print(f"{'case':<15}{'legacy(us)':>12}{'new(us)':>12}  legacy结果是否正确")
+    for name, text in CASES.items():
+        runs = max(1, args.runs // 100) if name.startswith('large') else args.runs
+        legacy_us = bench(legacy_parse, text, runs)
+        new_us = bench(new_parse, text, runs)
+        correct = legacy_parse(text) == new_parse(text)
+        print(f"{name:<15}{legacy_us:>12.2f}{new_us:>12.2f}  {'是' if correct else '否'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+大模型响应缓存基准测试
+用带固定延迟（--latency-ms，模拟一次模型调用）的模拟客户端发送--requests个请求，
+其中提示词从--distinct个模板中按Zipf分布选取，对比不使用缓存、进程内缓存、文件缓存（新进程冷启动）的总耗时，
+并测量缓存命中时单次查找的耗时。
+
+使用方式：
+python test/benchmark/bench_llm_cache.py [--requests 500] [--distinct 100] [--latency-ms 20]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+sys.path.append(TOOLS_DIR)
+
+from core.llm_cache import CachedLLMClient, ResponseCache
+from core.mock_llm import MockQianwenClient
+
+
+class SlowMockClient(MockQianwenClient):
+    """每个请求固定耗时的模拟客户端"""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    def send_request(self, data, sequence_id=None):
+        time.sleep(self.latency)
+        return super().send_request(data, sequence_id)
+
+
+def workload(requests_count: int, distinct: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    prompts = rng.choices(range(distinct), weights=weights, k=requests_count)
+    return [{"messages": [{"role": "user", "content": f"help me 模板{prompt}"}]} for prompt in prompts]
+
+
+def run(client, requests: list) -> float:
+    start = time.perf_counter()
+    for data in requests:
+        client.send_request(data)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='大模型响应缓存基准测试')
+    parser.add_argument('--requests', type=int, default=500, help='请求数')
+    parser.add_argument('--distinct', type=int, default=100, help='不同提示词的数量')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='模拟的单次模型调用耗时（毫秒）')
+    args = parser.parse_args()
+
+    requests = workload(args.requests, args.distinct)
+    latency = args.latency_ms / 1000
+    print(f"{args.requests}次请求，{len(set(r['messages'][0]['content'] for r in requests))}个不同的提示词，"
+          f"模型调用{args.latency_ms:g}ms")
+
+    uncached = run(SlowMockClient(latency), requests)
+    print(f"  {'不使用缓存':<14}{uncached:8.2f}s")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'llm_cache.sqlite3')
+        cache = ResponseCache(path)
+        client = CachedLLMClient(SlowMockClient(latency), cache)
+        elapsed = run(client, requests)
+        stats = cache.stats()
+        print(f"  {'缓存（首次）':<14}{elapsed:8.2f}s  命中率={stats['hit_ratio']:.1%}  "
+              f"模型调用={client.call_count}")
+        cache.close()
+
+        # 新进程冷启动：进程内缓存为空，全部从文件读取
+        cache = ResponseCache(path)
+        client = CachedLLMClient(SlowMockClient(latency), cache)
+        elapsed = run(client, requests)
+        stats = cache.stats()
+        print(f"  {'缓存（冷启动）':<14}{elapsed:8.2f}s  命中率={stats['hit_ratio']:.1%}  "
+              f"文件命中={stats['disk_hits']}  模型调用={client.call_count}")
+
+        hot = requests[0]
+        start = time.perf_counter()
+        for _ in range(10000):
+            client.send_request(hot)
+        print(f"  单次命中查找{(time.perf_counter() - start) / 10000 * 1e6:8.1f}us")
+        cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+QianwenClient重试与对冲请求基准测试
+本地替身服务模拟一个有慢副本的上游：--slow-rate比例的请求耗时--slow-ms毫秒，其余耗时--fast-ms毫秒；
+--error-rate比例的请求返回503。对比不重试、重试、重试+对冲三种配置的成功率和延迟分位数。
+
+使用方式：
+python test/benchmark/bench_llm_resilience.py [--requests 400] [--threads 8] [--slow-rate 0.05] [--error-rate 0.05]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+sys.path.append(TOOLS_DIR)
+
+from core.llm_client import (
+    CircuitBreaker, HedgePolicy, QianwenClient, RequestMetrics, RetryPolicy, close_shared_sessions
+)
+
+RESPONSE = json.dumps({"choices": [{"message": {"role": "assistant", "content": "ok"}}]}).encode('utf-8')
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """有慢副本和偶发错误的模型服务替身"""
+    protocol_version = 'HTTP/1.1'
+    fast_seconds = 0.02
+    slow_seconds = 1.0
+    slow_rate = 0.05
+    error_rate = 0.05
+    rng = random.Random(7)
+    rng_lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        with self.rng_lock:
+            slow = self.rng.random() < self.slow_rate
+            error = self.rng.random() < self.error_rate
+        time.sleep(self.slow_seconds if slow else self.fast_seconds)
+        body = b'{"error": "busy"}' if error else RESPONSE
+        self.send_response(503 if error else 200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(client: QianwenClient, requests_count: int, threads: int):
+    """并发发送请求，返回(成功数, 每个请求的耗时列表（毫秒）)"""
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            client.send_request({"messages": [{"role": "user", "content": str(i)}]})
+            ok = True
+        except Exception:
+            ok = False
+        return ok, (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(timed, range(requests_count)))
+    return sum(ok for ok, _ in results), [elapsed for _, elapsed in results]
+
+
+def percentile(samples: list, value: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * value / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='QianwenClient重试与对冲请求基准测试')
+    parser.add_argument('--requests', type=int, default=400, help='每种配置的请求数')
+    parser.add_argument('--threads', type=int, default=8, help='并发线程数')
+    parser.add_argument('--fast-ms', type=float, default=20.0, help='正常请求耗时（毫秒）')
+    parser.add_argument('--slow-ms', type=float, default=1000.0, help='慢副本请求耗时（毫秒）')
+    parser.add_argument('--slow-rate', type=float, default=0.05, help='落到慢副本的请求比例')
+    parser.add_argument('--error-rate', type=float, default=0.05, help='返回503的请求比例')
+    args = parser.parse_args()
+
+    StandInHandler.fast_seconds = args.fast_ms / 1000
+    StandInHandler.slow_seconds = args.slow_ms / 1000
+    StandInHandler.slow_rate = args.slow_rate
+    StandInHandler.error_rate = args.error_rate
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    configs = [
+        ("不重试", dict(retry=RetryPolicy(max_attempts=1))),
+        ("重试", dict(retry=RetryPolicy(max_attempts=3, backoff_base=0.01))),
+        ("重试+对冲p90", dict(retry=RetryPolicy(max_attempts=3, backoff_base=0.01),
+                            hedge=HedgePolicy(percentile=90, initial_delay=0.2))),
+    ]
+    print(f"{args.requests}次请求，{args.threads}个线程，慢副本{args.slow_rate:.0%}（{args.slow_ms:g}ms），"
+          f"503错误{args.error_rate:.0%}")
+    try:
+        for name, options in configs:
+            metrics = RequestMetrics()
+            # 熔断阈值调高，只比较重试和对冲的效果
+            client = QianwenClient(base_url, "", pool_size=args.threads * 2, metrics=metrics,
+                                   breaker=CircuitBreaker(failure_threshold=10 ** 6), **options)
+            ok, samples = run(client, args.requests, args.threads)
+            counters = metrics.snapshot()["counters"]
+            print(f"  {name:<10} 成功率={ok / args.requests:6.1%}  p50={percentile(samples, 50):7.1f}ms  "
+                  f"p99={percentile(samples, 99):7.1f}ms  尝试={metrics.snapshot()['attempts']}  "
+                  f"对冲={counters.get('hedged', 0)}")
+            close_shared_sessions()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+QianwenClient连接复用基准测试
+用本地替身服务对比每次请求新建连接（旧实现的requests.post）与共享会话连接池的请求延迟。
+替身服务在每条新连接建立时等待--handshake-ms毫秒，模拟到模型服务的TCP/TLS握手耗时。
+
+使用方式：
+python test/benchmark/bench_llm_session.py [--requests 50] [--handshake-ms 50] [--threads 1 4]
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+sys.path.append(TOOLS_DIR)
+
+from core.llm_client import QianwenClient, close_shared_sessions
+
+RESPONSE = json.dumps({"choices": [{"message": {"role": "assistant", "content": "ok"}}]}).encode('utf-8')
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """模型服务替身：新连接建立时模拟握手耗时，之后立即返回固定回复"""
+    protocol_version = 'HTTP/1.1'
+    handshake_seconds = 0.05
+
+    def setup(self):
+        time.sleep(self.handshake_seconds)
+        # 响应头和响应体分两次写出，关闭Nagle算法，避免与客户端的延迟确认叠加出约40ms的等待
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().setup()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def legacy_post(base_url: str, data: dict) -> dict:
+    """旧实现：模块级requests.post，每次请求新建连接"""
+    response = requests.post(f"{base_url}/chat/completions", headers={'Content-Type': 'application/json'},
+                             json=data, timeout=30)
+    return response.json()
+
+
+def measure(send, requests_count: int, threads: int) -> list:
+    """用threads个线程发送requests_count个请求，返回每个请求的耗时（毫秒）"""
+    def timed(_):
+        start = time.perf_counter()
+        send({"messages": [{"role": "user", "content": "你好"}]})
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(timed, range(requests_count)))
+
+
+def summarize(samples: list) -> str:
+    ordered = sorted(samples)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    return f"mean={statistics.mean(samples):7.2f}ms  median={statistics.median(samples):7.2f}ms  p95={p95:7.2f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='QianwenClient连接复用基准测试')
+    parser.add_argument('--requests', type=int, default=50, help='每种方式的请求次数')
+    parser.add_argument('--handshake-ms', type=float, default=50.0, help='每条新连接模拟的握手耗时（毫秒）')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4], help='并发线程数')
+    args = parser.parse_args()
+
+    StandInHandler.handshake_seconds = args.handshake_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        for threads in args.threads:
+            client = QianwenClient(base_url, "", pool_size=max(threads, 1))
+            print(f"\n{threads}个线程，{args.requests}次请求，模拟握手{args.handshake_ms:g}ms")
+            print(f"  {'requests.post':<16}{summarize(measure(lambda data: legacy_post(base_url, data), args.requests, threads))}")
+            print(f"  {'pooled session':<16}{summarize(measure(client.send_request, args.requests, threads))}")
+            close_shared_sessions()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
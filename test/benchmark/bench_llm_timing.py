@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+大模型调用耗时分解基准测试
+启动本地模拟大模型服务（--ttft、--inter-token为首字节延迟和分片间隔的分布），用QianwenClient从--threads个线程发送
+--requests个流式请求，把timing_listener报告的耗时计入直方图和滚动统计，输出与info latency相同的耗时分解，
+并测量记录一次耗时（record_timing）的开销。
+
+使用方式：
+python test/benchmark/bench_llm_timing.py [--requests 100] [--threads 8] [--ttft lognormal:150,0.5] [--inter-token normal:10,3]
+"""
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+sys.path.append(TOOLS_DIR)
+
+from core.llm_client import CircuitBreaker, QianwenClient, RequestMetrics, close_shared_sessions
+from core.llm_timing import LatencySummary, record_timing
+from core.mock_llm_server import MockLLMServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='大模型调用耗时分解基准测试')
+    parser.add_argument('--requests', type=int, default=100, help='请求数')
+    parser.add_argument('--threads', type=int, default=8, help='并发线程数')
+    parser.add_argument('--ttft', type=str, default='lognormal:150,0.5', help='首字节延迟的分布（毫秒）')
+    parser.add_argument('--inter-token', type=str, default='normal:10,3', help='分片间隔的分布（毫秒）')
+    args = parser.parse_args()
+
+    server = MockLLMServer(ttft=args.ttft, inter_token=args.inter_token, seed=7).start()
+    metrics = RequestMetrics()
+    summary = LatencySummary(window=args.requests)
+    client = QianwenClient(server.base_url, "", pool_size=args.threads, metrics=metrics,
+                           breaker=CircuitBreaker(failure_threshold=10 ** 6),
+                           timing_listener=lambda timing: record_timing(timing, metrics, summary))
+    print(f"{args.requests}个流式请求，{args.threads}个线程；首字节延迟={args.ttft}ms  分片间隔={args.inter_token}ms")
+    try:
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            list(executor.map(lambda i: list(client.stream_request({"messages": [
+                {"role": "user", "content": ["1", "2", "9"][i % 3]}]})), range(args.requests)))
+    finally:
+        close_shared_sessions()
+        server.stop()
+
+    print(f"  {'指标':<16}{'样本数':>6}{'p50':>10}{'p95':>10}{'最大值':>10}")
+    for label, count, p50, p95, largest in summary.rows():
+        print(f"  {label:<16}{count:>6}{p50:>10g}{p95:>10g}{largest:>10g}")
+
+    timing = {"queueMs": 0.0, "connectMs": 1.0, "ttftMs": 150.0, "totalMs": 300.0, "tokensPerSec": 80.0,
+              "requestBytes": 2048, "responseBytes": 8192}
+    rounds = 100000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        record_timing(timing, metrics, summary)
+    print(f"  记录一次耗时的开销{(time.perf_counter() - start) / rounds * 1e6:6.2f}us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+真实网络客户端压力测试（使用本地模拟大模型服务）
+启动core.mock_llm_server，按配置的首字节延迟、分片间隔、错误率、断开率和响应大小，
+用QianwenClient从--threads个线程发送--requests个流式（或--no-stream时普通）请求，
+统计首个事件耗时（TTFT）、总耗时的分位数、吞吐量和客户端的重试情况。
+
+使用方式：
+python test/benchmark/bench_mock_llm_server.py [--requests 200] [--threads 16] [--ttft lognormal:200,0.5]
+    [--inter-token normal:10,3] [--error-rate 0.02] [--drop-rate 0.01] [--payload-chars uniform:0,200] [--no-stream]
+"""
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+sys.path.append(TOOLS_DIR)
+
+from core.llm_client import CircuitBreaker, QianwenClient, RequestMetrics, RetryPolicy, close_shared_sessions
+from core.mock_llm_server import MockLLMServer
+
+# 依次使用的模拟场景：文本、表格、多工具调用、默认响应
+SCENARIOS = ["1", "2", "9", "你好"]
+
+
+def percentile(samples: list, value: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * value / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='真实网络客户端压力测试（本地模拟大模型服务）')
+    parser.add_argument('--requests', type=int, default=200, help='请求数')
+    parser.add_argument('--threads', type=int, default=16, help='并发线程数')
+    parser.add_argument('--ttft', type=str, default='lognormal:200,0.5', help='首字节延迟的分布（毫秒）')
+    parser.add_argument('--inter-token', type=str, default='normal:10,3', help='分片间隔的分布（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0.02, help='返回503的请求比例')
+    parser.add_argument('--drop-rate', type=float, default=0.01, help='响应中途断开连接的请求比例')
+    parser.add_argument('--payload-chars', type=str, default='uniform:0,200', help='追加的填充文本长度的分布（字符数）')
+    parser.add_argument('--no-stream', action='store_true', help='发送普通请求而不是流式请求')
+    args = parser.parse_args()
+
+    server = MockLLMServer(ttft=args.ttft, inter_token=args.inter_token, error_rate=args.error_rate,
+                           drop_rate=args.drop_rate, payload_chars=args.payload_chars, seed=7).start()
+    metrics = RequestMetrics()
+    client = QianwenClient(server.base_url, "", pool_size=args.threads, metrics=metrics,
+                           retry=RetryPolicy(max_attempts=3, backoff_base=0.05),
+                           breaker=CircuitBreaker(failure_threshold=10 ** 6))
+
+    def timed(i):
+        data = {"messages": [{"role": "user", "content": SCENARIOS[i % len(SCENARIOS)]}]}
+        start = time.perf_counter()
+        first = None
+        try:
+            if args.no_stream:
+                client.send_request(data)
+            else:
+                for _ in client.stream_request(data):
+                    if first is None:
+                        first = time.perf_counter() - start
+        except Exception:
+            return False, None, time.perf_counter() - start
+        return True, first, time.perf_counter() - start
+
+    mode = '普通' if args.no_stream else '流式'
+    print(f"{args.requests}个{mode}请求，{args.threads}个线程；首字节延迟={args.ttft}ms  分片间隔={args.inter_token}ms  "
+          f"错误率={args.error_rate:g}  断开率={args.drop_rate:g}  填充={args.payload_chars}字符")
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            results = list(executor.map(timed, range(args.requests)))
+        elapsed = time.perf_counter() - start
+    finally:
+        close_shared_sessions()
+        server.stop()
+
+    ok = [r for r in results if r[0]]
+    totals = [r[2] * 1000 for r in ok]
+    firsts = [r[1] * 1000 for r in ok if r[1] is not None]
+    snapshot = metrics.snapshot()
+    print(f"  成功率={len(ok) / args.requests:6.1%}  吞吐={args.requests / elapsed:7.1f}请求/秒  "
+          f"尝试={snapshot['attempts']}  服务端错误={server.stats['errors']}  断开={server.stats['dropped']}")
+    if firsts:
+        print(f"  首个事件  p50={percentile(firsts, 50):7.1f}ms  p99={percentile(firsts, 99):7.1f}ms")
+    print(f"  总耗时    p50={percentile(totals, 50):7.1f}ms  p99={percentile(totals, 99):7.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+跨进程限流基准测试
+启动本地模拟大模型服务，--processes个进程各自用--threads个线程通过QianwenClient发送请求（模拟REST服务启动的多个
+interactive_tool进程），对比不限流和共享状态文件限流（--rpm）时服务端看到的请求速率：
+平均速率、任意1秒窗口内的最大请求数，以及超出配额（按同样的RPM和突发容量的令牌桶计算，上游会返回429）的请求数。
+
+使用方式：
+python test/benchmark/bench_rate_limiter.py [--processes 4] [--threads 4] [--requests 40] [--rpm 1200]
+"""
+
+import os
+import sys
+import time
+import bisect
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+sys.path.append(TOOLS_DIR)
+
+from core.llm_client import CircuitBreaker, QianwenClient, RetryPolicy
+from core.mock_llm_server import MockLLMServer
+from core.rate_limiter import DEFAULT_BURST_SECONDS, RateLimiter
+
+
+class RecordingServer(MockLLMServer):
+    """记录每个请求到达时间的模拟服务"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.arrivals = []
+
+    def plan(self, data):
+        with self._lock:
+            self.arrivals.append(time.time())
+        return super().plan(data)
+
+
+def worker(base_url: str, state_path: str, rpm: float, threads: int, requests_count: int) -> None:
+    limiter = RateLimiter(rpm=rpm, path=state_path) if rpm else None
+    client = QianwenClient(base_url, "", pool_size=threads, retry=RetryPolicy(max_attempts=1),
+                           breaker=CircuitBreaker(failure_threshold=10 ** 6), rate_limiter=limiter)
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda _: client.send_request({"messages": [{"role": "user", "content": "1"}]}),
+                          range(requests_count)))
+
+
+def over_quota(arrivals: list, rpm: float) -> int:
+    """按上游的令牌桶（容量为DEFAULT_BURST_SECONDS秒的配额）计算会被拒绝的请求数"""
+    rate = rpm / 60
+    capacity = max(1.0, rpm * DEFAULT_BURST_SECONDS / 60)
+    level, last, rejected = capacity, None, 0
+    for arrival in arrivals:
+        if last is not None:
+            level = min(capacity, level + (arrival - last) * rate)
+        last = arrival
+        # 留出时钟误差的余量
+        if level >= 1 - 1e-6:
+            level -= 1
+        else:
+            rejected += 1
+    return rejected
+
+
+def run(rpm: float, args) -> None:
+    server = RecordingServer(ttft='fixed:5').start()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        state_path = os.path.join(tmpdir, 'rate_limit.sqlite3')
+        per_process = args.requests // args.processes
+        start = time.time()
+        processes = [multiprocessing.Process(target=worker, args=(server.base_url, state_path, rpm,
+                                                                  args.threads, per_process))
+                     for _ in range(args.processes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.time() - start
+    server.stop()
+    arrivals = sorted(server.arrivals)
+    peak = max(bisect.bisect_left(arrivals, t + 1) - i for i, t in enumerate(arrivals))
+    name = f"限流{rpm:g}RPM" if rpm else "不限流"
+    print(f"  {name:<12}耗时={elapsed:6.2f}s  平均={len(arrivals) / elapsed * 60:8.0f}RPM  "
+          f"1秒峰值={peak:4d}  超出配额={over_quota(arrivals, args.rpm):4d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='跨进程限流基准测试')
+    parser.add_argument('--processes', type=int, default=4, help='进程数')
+    parser.add_argument('--threads', type=int, default=4, help='每个进程的线程数')
+    parser.add_argument('--requests', type=int, default=400, help='总请求数')
+    parser.add_argument('--rpm', type=float, default=1200, help='每分钟请求数配额')
+    args = parser.parse_args()
+
+    print(f"{args.processes}个进程x{args.threads}个线程，共{args.requests}个请求，配额{args.rpm:g}RPM"
+          f"（突发容量{max(1.0, args.rpm * DEFAULT_BURST_SECONDS / 60):g}个请求）")
+    run(0, args)
+    run(args.rpm, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+大模型请求合并基准测试
+--threads个线程在同一时刻发送--prompts个不同提示词中的一个（模拟多个面板、超时重试同时发出相同请求），
+模拟客户端每次调用耗时--latency-ms毫秒。对比直接请求与经过SingleFlight合并后的上游调用次数和总耗时。
+
+使用方式：
+python test/benchmark/bench_single_flight.py [--threads 64] [--prompts 4] [--latency-ms 200]
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+sys.path.append(TOOLS_DIR)
+
+from core.mock_llm import MockQianwenClient
+from core.single_flight import SingleFlightLLMClient
+
+
+class SlowMockClient(MockQianwenClient):
+    """每次调用固定耗时、线程安全计数的模拟客户端"""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+        self._lock = threading.Lock()
+
+    def send_request(self, data, sequence_id=None):
+        time.sleep(self.latency)
+        with self._lock:
+            return super().send_request(data, sequence_id)
+
+
+def burst(client, threads: int, prompts: int) -> float:
+    barrier = threading.Barrier(threads)
+
+    def worker(i):
+        barrier.wait()
+        client.send_request({"messages": [{"role": "user", "content": f"help me {i % prompts}"}]})
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='大模型请求合并基准测试')
+    parser.add_argument('--threads', type=int, default=64, help='同时发出请求的线程数')
+    parser.add_argument('--prompts', type=int, default=4, help='不同提示词的数量')
+    parser.add_argument('--latency-ms', type=float, default=200.0, help='模拟的单次模型调用耗时（毫秒）')
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    print(f"{args.threads}个线程同时发送{args.prompts}个不同的提示词，模型调用{args.latency_ms:g}ms")
+    direct = SlowMockClient(latency)
+    elapsed = burst(direct, args.threads, args.prompts)
+    print(f"  {'直接请求':<10}上游调用={direct.call_count:>4}  耗时={elapsed:6.3f}s")
+    upstream = SlowMockClient(latency)
+    elapsed = burst(SingleFlightLLMClient(upstream), args.threads, args.prompts)
+    print(f"  {'合并请求':<10}上游调用={upstream.call_count:>4}  耗时={elapsed:6.3f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+工具调用并发执行基准测试
+模拟大模型一次回复中的--calls个工具调用，每个自定义工具执行耗时服从--latency-ms附近的随机分布的I/O，
+对比逐个执行和声明concurrent后并发执行（输出按原始顺序）的每轮耗时。
+
+使用方式：
+python test/benchmark/bench_tool_executor.py [--calls 6] [--latency-ms 100] [--rounds 10]
+"""
+
+import io
+import os
+import sys
+import time
+import random
+import argparse
+import contextlib
+
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+sys.path.append(TOOLS_DIR)
+
+from core.tool_executor import ToolCallBatch
+from core.tool_handler import ToolHandler
+from core.output_formatter import OutputFormatter
+from core.tracing import Tracer
+
+
+def make_handler(concurrent: bool, calls: int, latency_ms: float) -> ToolHandler:
+    handler = ToolHandler(OutputFormatter())
+    rng = random.Random(7)
+
+    def io_tool(parameters, sequence_id):
+        time.sleep(rng.uniform(0.5, 1.5) * latency_ms / 1000)
+        return parameters
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(calls):
+            handler.register_custom_tool({"name": f"io_{i}", "description": "模拟I/O", "parameters": {},
+                                          "handler": io_tool, "concurrent": concurrent})
+    return handler
+
+
+def run(concurrent: bool, args) -> float:
+    handler = make_handler(concurrent, args.calls, args.latency_ms)
+    tracer = Tracer(enabled=False)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(args.rounds):
+            batch = ToolCallBatch(handler, tracer, "bench")
+            for i in range(args.calls):
+                batch.submit({"name": f"io_{i}", "parameters": {"i": i}})
+            batch.finish()
+    return (time.perf_counter() - start) / args.rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='工具调用并发执行基准测试')
+    parser.add_argument('--calls', type=int, default=6, help='每轮的工具调用数')
+    parser.add_argument('--latency-ms', type=float, default=100, help='每个工具调用的平均耗时（毫秒）')
+    parser.add_argument('--rounds', type=int, default=10, help='轮数')
+    args = parser.parse_args()
+
+    print(f"每轮{args.calls}个工具调用，平均耗时{args.latency_ms:g}ms，共{args.rounds}轮")
+    sequential = run(False, args)
+    print(f"  {'逐个执行':<8}每轮{sequential * 1e3:8.1f}ms")
+    concurrent = run(True, args)
+    print(f"  {'并发执行':<8}每轮{concurrent * 1e3:8.1f}ms  加速{sequential / concurrent:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
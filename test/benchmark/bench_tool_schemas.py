@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+工具schema构建与请求体序列化基准测试
+对比每次请求重新构建工具列表并整体序列化（旧实现）与使用预先构建、预先序列化的ToolSchemas，
+并给出按请求内容选择工具后请求体的大小。
+
+使用方式：
+python test/benchmark/bench_tool_schemas.py [--requests 20000] [--custom-tools 20]
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+
+TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
+sys.path.append(TOOLS_DIR)
+
+from core.tool_handler import BUILTIN_TOOLS, ToolHandler
+from core.output_formatter import OutputFormatter
+from core.llm_client import encode_request
+
+
+def legacy_payload(handler: ToolHandler, content: str) -> bytes:
+    """旧实现：每次请求重新构建工具列表，再与消息一起序列化"""
+    tools = copy.deepcopy(BUILTIN_TOOLS) + list(handler.custom_tools.values())
+    return json.dumps({"messages": [{"role": "user", "content": content}], "tools": tools},
+                      ensure_ascii=False).encode('utf-8')
+
+
+def precomputed_payload(handler: ToolHandler, content: str, relevant: bool = False) -> bytes:
+    tools = handler.register_extension_tools('', content if relevant else None)
+    return encode_request({"messages": [{"role": "user", "content": content}], "tools": tools})
+
+
+def timed(build, requests_count: int) -> float:
+    start = time.perf_counter()
+    for i in range(requests_count):
+        build(f"帮我看看第{i}个问题")
+    return (time.perf_counter() - start) / requests_count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='工具schema构建与请求体序列化基准测试')
+    parser.add_argument('--requests', type=int, default=20000, help='模拟的请求数')
+    parser.add_argument('--custom-tools', type=int, default=20, help='注册的自定义工具数量')
+    args = parser.parse_args()
+
+    handler = ToolHandler(OutputFormatter())
+    for i in range(args.custom_tools):
+        handler.custom_tools[f"custom_tool_{i}"] = {
+            "name": f"custom_tool_{i}",
+            "description": f"自定义工具{i}的说明" * 4,
+            "parameters": {"type": "object", "properties": {f"arg{j}": {"type": "string"} for j in range(5)}},
+        }
+
+    print(f"{args.requests}次请求，{len(BUILTIN_TOOLS)}个内置工具 + {args.custom_tools}个自定义工具")
+    print(f"  {'每次构建并序列化':<16}{timed(lambda c: legacy_payload(handler, c), args.requests):8.1f}us/请求")
+    print(f"  {'预先构建的schema':<16}{timed(lambda c: precomputed_payload(handler, c), args.requests):8.1f}us/请求")
+    full = len(precomputed_payload(handler, "你好"))
+    relevant = len(precomputed_payload(handler, "你好", relevant=True))
+    print(f"  请求体大小：全部工具{full}字节，按内容选择后{relevant}字节")
+
+
+if __name__ == '__main__':
+    main()
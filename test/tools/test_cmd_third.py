@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+import json
+import sqlite3
+import subprocess
+import sys
+import os
+import tempfile
+
+# 获取当前脚本所在目录
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+# 构建cmd-third.py的路径
+TOOL_PATH = os.path.normpath(os.path.join(TEST_DIR, '..', '..', 'tools', 'cmd-third.py'))
+
+
+def run_tool(*args: str, stdin: str = None, env: dict = None) -> list:
+    """运行cmd-third.py并解析输出的JSON行，env为额外的环境变量"""
+    result = subprocess.run(
+        [sys.executable, TOOL_PATH, *args],
+        input=stdin,
+        capture_output=True,
+        text=True,
+        timeout=60,
+        env=dict(os.environ, **env) if env else None
+    )
+    assert result.returncode == 0, result.stderr
+    return [json.loads(line) for line in result.stdout.splitlines() if line.strip()]
+
+
+class TestCmdThird:
+
+    def test_single_amount(self):
+        """测试单条金额在进程内格式化"""
+        messages = run_tool(json.dumps({"amount": "100.00", "currency": "CNY", "sequenceId": "seq-1"}))
+
+        assert any(m['type'] == 'text' and m['content'] == '处理人民币金额: 100.00 元' for m in messages)
+        assert messages[-1]['isEnd'] is True
+        assert all(m['sequenceId'] == 'seq-1' for m in messages)
+
+    def test_single_invalid_amount_is_not_executed(self):
+        """测试非法金额输出错误，而不是被拼进shell命令执行"""
+        messages = run_tool(json.dumps({"amount": "1; echo injected", "currency": "CNY"}))
+
+        assert any(m['type'] == 'error' and m['isError'] for m in messages)
+        assert not any(m['type'] == 'text' and m['content'].startswith('处理人民币金额') for m in messages)
+        assert messages[-1]['isEnd'] is True
+
+    def test_batch_streams_table_chunks(self):
+        """测试批量模式按块输出table消息，错误记录不中断批次"""
+        records = [{"amount": str(i), "currency": "USD"} for i in range(1200)]
+        records[5] = {"amount": "bad", "currency": "USD"}
+        messages = run_tool(json.dumps({"records": records, "sequenceId": "batch-1"}))
+
+        tables = [m for m in messages if m['type'] == 'table' and m['content']['header'][0] == 'index']
+        assert [t['content']['metadata']['offset'] for t in tables] == [0, 500, 1000]
+        rows = [row for t in tables for row in t['content']['rows']]
+        assert len(rows) == 1200
+        assert rows[5][4] == 'error'
+        assert rows[6] == [6, '6', 'USD', '处理USD金额: 6', 'ok', '']
+        assert any('成功1199条，失败1条' in m['content'] for m in messages if m['type'] == 'text')
+        assert messages[-1]['isEnd'] is True
+        assert all(m['sequenceId'] == 'batch-1' for m in messages)
+
+    def test_batch_top_level_array(self):
+        """测试顶层数组和PowerShell格式的批量输入"""
+        messages = run_tool('[{amount:1,000.50,currency:eur},{amount:2}]')
+
+        rows = [row for m in messages if m['type'] == 'table' and m['content']['header'][0] == 'index'
+                for row in m['content']['rows']]
+        assert rows[0][1:3] == ['1000.50', 'EUR']
+        assert rows[1][1:3] == ['2', 'CNY']
+
+    def test_batch_currency_summary(self):
+        """测试批量模式输出按币种汇总的精确统计，超出币种精度的记录标记为错误"""
+        records = [{"amount": "0.1", "currency": "USD"}] * 10 + [{"amount": "0.2", "currency": "USD"},
+                                                                 {"amount": "1.5", "currency": "JPY"},
+                                                                 {"amount": "100", "currency": "JPY"}]
+        messages = run_tool(json.dumps(records))
+
+        rows = [row for m in messages if m['type'] == 'table' and m['content']['header'][0] == 'index'
+                for row in m['content']['rows']]
+        assert rows[11][4] == 'error'
+        summary = [m['content'] for m in messages if m['type'] == 'table' and m['content']['header'][0] == 'currency']
+        assert len(summary) == 1
+        by_currency = {row[0]: dict(zip(summary[0]['header'], row)) for row in summary[0]['rows']}
+        assert by_currency['USD']['total'] == '1.20'
+        assert by_currency['USD']['count'] == 11
+        assert by_currency['JPY'] == {'currency': 'JPY', 'count': 1, 'total': '100', 'min': '100', 'max': '100',
+                                      'p50': '100', 'p90': '100', 'p99': '100'}
+
+    def test_stream_csv_file(self):
+        """测试流式处理CSV文件：逐块输出结果和进度，错误行不中断"""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+            f.write('amount,currency\n')
+            for i in range(250):
+                f.write(f'{i}.25,USD\n' if i != 100 else 'oops,USD\n')
+            path = f.name
+        try:
+            messages = run_tool('--file', path, '--chunk-size', '100', '--sequence-id', 'stream-1')
+        finally:
+            os.unlink(path)
+
+        tables = [m['content'] for m in messages if m['type'] == 'table' and m['content']['header'][0] == 'index']
+        assert [t['metadata']['offset'] for t in tables] == [0, 100, 200]
+        progress = [m['content'] for m in messages if m['type'] == 'progress']
+        assert len(progress) == 3
+        assert progress[-1]['current'] == progress[-1]['total'] > 0
+        assert tables[1]['rows'][0][4] == 'error'
+        summary = [m['content'] for m in messages if m['type'] == 'table' and m['content']['header'][0] == 'currency']
+        assert summary[0]['rows'] == [['USD', 249, '31087.25', '0.25', '249.25']]
+        assert messages[-1]['isEnd'] is True
+        assert all(m['sequenceId'] == 'stream-1' for m in messages)
+
+    def test_stream_jsonl_stdin(self):
+        """测试从stdin流式读取JSONL，格式由第一行推断"""
+        stdin = '{"amount": "1.10", "currency": "EUR"}\nnot json\n{"amount": 2, "currency": "EUR"}\n'
+        messages = run_tool('--file', '-', stdin=stdin)
+
+        rows = [row for m in messages if m['type'] == 'table' and m['content']['header'][0] == 'index'
+                for row in m['content']['rows']]
+        assert [row[4] for row in rows] == ['ok', 'error', 'ok']
+        assert any('成功2条，失败1条' in m['content'] for m in messages if m['type'] == 'text')
+
+    def test_stream_file_from_json_input(self):
+        """测试JSON输入中的file字段触发流式模式，文件不存在时输出错误和结束标志"""
+        messages = run_tool(json.dumps({"file": "/nonexistent/ledger.csv", "sequenceId": "s"}))
+
+        assert messages[0]['type'] == 'error'
+        assert messages[-1]['isEnd'] is True
+
+    def test_fx_normalization(self):
+        """测试用本地汇率表把批量记录换算为基准币种"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            csv_path = os.path.join(tmpdir, 'rates.csv')
+            rates_path = os.path.join(tmpdir, 'rates.fxr')
+            with open(csv_path, 'w', encoding='utf-8') as f:
+                f.write('date,currency,rate\n2024-01-01,USD,7.1\n2024-02-01,USD,7.2\n')
+            subprocess.run([sys.executable, '-m', 'core.fx_rates', 'build', csv_path, rates_path, '--base', 'CNY'],
+                           cwd=os.path.dirname(TOOL_PATH), check=True, capture_output=True)
+            records = [{"amount": "10", "currency": "USD", "date": "2024-01-20"},
+                       {"amount": "10", "currency": "USD"},
+                       {"amount": "1", "currency": "EUR"}]
+            messages = run_tool(json.dumps({"records": records, "fxRates": rates_path}))
+
+        rows_table = [m['content'] for m in messages if m['type'] == 'table' and m['content']['header'][0] == 'index'][0]
+        assert rows_table['header'][-1] == 'baseAmount'
+        assert [row[-1] for row in rows_table['rows']] == ['71.00', '72.00', '']
+        base_summary = [m['content'] for m in messages if m['type'] == 'table'
+                        and m['content']['metadata'].get('baseCurrency') and m['content']['header'][0] == 'currency']
+        assert base_summary[0]['rows'][0][:3] == ['CNY', 2, '143.00']
+
+    def test_idempotent_resubmission(self):
+        """测试启用幂等存储时，相同sequenceId和内容的重复提交直接重放保存的结果"""
+        records = [{"amount": "1.50", "currency": "USD"}, {"amount": "bad"}]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            env = {'AMOUNT_IDEMPOTENCY_DB': os.path.join(tmpdir, 'idem.sqlite3')}
+            first = run_tool(json.dumps({"records": records, "sequenceId": "idem-1"}), env=env)
+            # 修改保存的结果，确认第二次提交没有重新处理
+            conn = sqlite3.connect(env['AMOUNT_IDEMPOTENCY_DB'])
+            with conn:
+                stored = json.loads(conn.execute('SELECT messages FROM submissions').fetchone()[0])
+                assert stored == first
+                conn.execute('UPDATE submissions SET messages = ?', (json.dumps(first[-1:]),))
+            conn.close()
+            replayed = run_tool(json.dumps({"sequenceId": "idem-1", "records": records}), env=env)
+            changed = run_tool(json.dumps({"records": records[:1], "sequenceId": "idem-1"}), env=env)
+
+        assert replayed == first[-1:]
+        assert any(m['type'] == 'table' for m in changed)
+        assert changed[-1]['isEnd'] is True
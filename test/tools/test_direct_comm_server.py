@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+# 获取当前脚本所在目录
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+# 构建direct_comm_server.py的路径
+SERVER_PATH = os.path.normpath(os.path.join(TEST_DIR, '..', '..', 'tools', 'direct_comm_server.py'))
+sys.path.append(os.path.dirname(SERVER_PATH))
+
+from core.fx_rates import write_rate_file
+from core.idempotency_store import IdempotencyStore
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def run_server(*args):
+    """启动直接通信服务器子进程，等待/test可以访问，返回服务地址"""
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, SERVER_PATH, '--port', str(port), *args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    url = f'http://localhost:{port}'
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(f'{url}/test', timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            pytest.fail('直接通信服务器未能启动')
+        yield url
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+@pytest.fixture(scope='module')
+def server_url():
+    tmpdir = tempfile.TemporaryDirectory()
+    write_rate_file(os.path.join(tmpdir.name, 'rates.fxr'), 'CNY', [("USD", "2024-01-01", "7.1")])
+    try:
+        with run_server('--idempotency-db', os.path.join(tmpdir.name, 'idem.sqlite3'),
+                        '--fx-rates-dir', tmpdir.name) as url:
+            yield url
+    finally:
+        tmpdir.cleanup()
+
+
+def post(url: str, payload: dict):
+    """发送POST请求，返回(状态码, Content-Type, 响应体)"""
+    request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, response.headers['Content-Type'], response.read().decode('utf-8')
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers['Content-Type'], e.read().decode('utf-8')
+
+
+def ndjson(body: str) -> list:
+    return [json.loads(line) for line in body.splitlines() if line.strip()]
+
+
+class TestDirectCommServer:
+
+    def test_batch_amounts_stream_ndjson(self, server_url):
+        """测试批量金额在进程内处理，结果以NDJSON逐条返回"""
+        records = [{"amount": str(i), "currency": "USD"} for i in range(600)]
+        status, content_type, body = post(f'{server_url}/process-amount',
+                                          {'amountData': records, 'sequenceId': 'http-1'})
+
+        assert status == 200
+        assert content_type == 'application/x-ndjson'
+        messages = ndjson(body)
+        tables = [m for m in messages if m['type'] == 'table' and m['content']['header'][0] == 'index']
+        assert [t['content']['metadata']['offset'] for t in tables] == [0, 500]
+        assert sum(len(t['content']['rows']) for t in tables) == 600
+        assert messages[-1]['isEnd'] is True
+        assert all(m['sequenceId'] == 'http-1' for m in messages)
+
+    def test_single_amount(self, server_url):
+        """测试单条金额"""
+        status, _, body = post(f'{server_url}/process-amount',
+                               {'amountData': {'amount': '100.00', 'currency': 'CNY'}})
+
+        assert status == 200
+        messages = ndjson(body)
+        assert any(m['content'] == '处理人民币金额: 100.00 元' for m in messages if m['type'] == 'text')
+        assert messages[-1]['isEnd'] is True
+
+    def test_file_input_is_rejected(self, server_url):
+        """测试HTTP请求不能通过file字段读取服务器上的文件"""
+        status, _, body = post(f'{server_url}/process-amount', {'amountData': {'file': SERVER_PATH}})
+
+        assert status == 200
+        messages = ndjson(body)
+        assert any(m['isError'] for m in messages)
+        assert not any(m['type'] == 'table' for m in messages)
+
+    @pytest.mark.parametrize('fx_rates', [SERVER_PATH, '../rates.fxr', 'missing/../rates.fxr'])
+    def test_fx_rates_path_is_rejected(self, server_url, fx_rates):
+        """测试HTTP请求的fxRates不能指定汇率目录以外的路径"""
+        status, _, body = post(f'{server_url}/process-amount', {'amountData': {
+            'records': [{"amount": "1.00", "currency": "USD"}], 'fxRates': fx_rates}})
+
+        assert status == 200
+        messages = ndjson(body)
+        assert any(m['isError'] and '不允许读取本地文件' in m['content'] for m in messages)
+        assert not any(m['type'] == 'table' for m in messages)
+
+    def test_fx_rates_from_configured_dir(self, server_url):
+        """测试fxRates按文件名从--fx-rates-dir目录中选择汇率表"""
+        status, _, body = post(f'{server_url}/process-amount', {'amountData': {
+            'records': [{"amount": "1.00", "currency": "USD"}], 'fxRates': 'rates.fxr'}})
+
+        assert status == 200
+        table = next(m for m in ndjson(body) if m['type'] == 'table' and m['content']['header'][0] == 'index')
+        assert table['content']['rows'][0][-1] == '7.10'
+
+    def test_retry_returns_stored_result(self, server_url):
+        """测试超时重试（相同sequenceId和内容）返回相同的结果"""
+        payload = {'amountData': [{"amount": "3.30", "currency": "EUR"}], 'sequenceId': 'retry-1'}
+        first = post(f'{server_url}/process-amount', payload)
+        second = post(f'{server_url}/process-amount', payload)
+
+        assert first[0] == second[0] == 200
+        assert first[2] == second[2]
+        assert ndjson(second[2])[-1]['isEnd'] is True
+
+    def test_string_input_error_keeps_sequence_id(self, server_url):
+        """测试字符串形式的金额数据出错时，错误消息使用请求中的sequenceId"""
+        amount_data = json.dumps({'records': [{"amount": "1.00", "currency": "USD"}], 'fxRates': '../rates.fxr'})
+        status, _, body = post(f'{server_url}/process-amount', {'amountData': amount_data, 'sequenceId': 'http-str'})
+
+        assert status == 200
+        messages = ndjson(body)
+        assert any(m['isError'] for m in messages)
+        assert all(m['sequenceId'] == 'http-str' for m in messages)
+
+    def test_failure_after_headers_ends_stream(self, tmp_path):
+        """测试响应头发出后处理失败（保存幂等记录出错）时，返回错误消息并正常结束分块传输"""
+        db = str(tmp_path / 'idem.sqlite3')
+        IdempotencyStore(db).close()
+        conn = sqlite3.connect(db)
+        conn.execute("CREATE TRIGGER reject BEFORE INSERT ON submissions BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+        conn.commit()
+        conn.close()
+        with run_server('--idempotency-db', db) as url:
+            status, _, body = post(f'{url}/process-amount',
+                                   {'amountData': [{"amount": "1.00", "currency": "USD"}], 'sequenceId': 'fail-1'})
+            messages = ndjson(body)
+            assert status == 200
+            assert any(m['isError'] and 'disk full' in m['content'] for m in messages)
+            assert messages[-1]['isEnd'] is True
+            # 处理权已释放，重试不会一直等待
+            assert post(f'{url}/process-amount',
+                        {'amountData': [{"amount": "1.00", "currency": "USD"}], 'sequenceId': 'fail-1'})[0] == 200
+
+    def test_empty_amount_data(self, server_url):
+        """测试金额数据为空时返回400"""
+        status, content_type, body = post(f'{server_url}/process-amount', {'amountData': None})
+
+        assert status == 400
+        assert content_type == 'application/json'
+        assert json.loads(body)['success'] is False
@@ -14,6 +14,13 @@ TEST_DIR = os.path.dirname(os.path.abspath(__file__))
 TOOL_PATH = os.path.join(TEST_DIR, '..', '..', 'tools', 'execinfo.py')
 TOOL_PATH = os.path.normpath(TOOL_PATH)
 
+# 动态导入execinfo.py，用于直接测试内部方法
+import importlib.util
+sys.path.append(os.path.dirname(TOOL_PATH))
+_spec = importlib.util.spec_from_file_location("execinfo", TOOL_PATH)
+execinfo = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(execinfo)
+
 class TestExecInfo:
     
     def test_json_input_parsing(self):
@@ -318,6 +325,350 @@ class TestExecInfo:
                 continue
         
         assert has_return_code, "未在输出中找到返回码信息"
+    def test_trace_output(self):
+        """测试输入中trace为true时输出Chrome trace格式的追踪消息"""
+        test_input = {
+            'content': 'echo traced',
+            'projectDir': os.getcwd(),
+            'sequenceId': 'trace-seq',
+            'trace': True
+        }
+        result = subprocess.run(
+            [sys.executable, TOOL_PATH, json.dumps(test_input)],
+            capture_output=True,
+            text=True
+        )
+        assert result.returncode == 0
+        
+        messages = [json.loads(line) for line in result.stdout.strip().split('\n')]
+        trace_messages = [m for m in messages if m.get('type') == 'trace']
+        assert len(trace_messages) == 1
+        assert trace_messages[0]['sequenceId'] == 'trace-seq'
+        # 追踪消息在结束标志之前，读到isEnd即停止的上层也能收到
+        assert messages.index(trace_messages[0]) < next(i for i, m in enumerate(messages) if m.get('isEnd'))
+        
+        names = [e['name'] for e in trace_messages[0]['content']['traceEvents']]
+        for expected in ['execinfo_start', 'spawn', 'first_byte', 'last_byte', 'exit']:
+            assert expected in names
+    
+    def test_end_sent_recorded_after_end(self, tmp_path):
+        """测试end_sent在结束标志写出之后记录，只写入追踪文件"""
+        test_input = {'content': 'echo traced', 'projectDir': os.getcwd(), 'sequenceId': 'end-seq', 'trace': True}
+        env = dict(os.environ, TOOL_TRACE_DIR=str(tmp_path))
+        result = subprocess.run(
+            [sys.executable, TOOL_PATH, json.dumps(test_input)],
+            capture_output=True,
+            text=True,
+            env=env
+        )
+        assert result.returncode == 0
+        messages = [json.loads(line) for line in result.stdout.strip().split('\n')]
+        trace_message = next(m for m in messages if m.get('type') == 'trace')
+        assert 'end_sent' not in [e['name'] for e in trace_message['content']['traceEvents']]
+        
+        with open(tmp_path / 'trace-end-seq.json', encoding='utf-8') as f:
+            events = json.load(f)['traceEvents']
+        assert events[-1]['name'] == 'end_sent'
+    
+    def test_env_trace_without_request_is_not_output(self, tmp_path):
+        """测试只由TOOL_TRACE环境变量开启追踪、上层没有请求时不输出追踪消息，只写入追踪文件"""
+        test_input = {'content': 'echo traced', 'projectDir': os.getcwd(), 'sequenceId': 'env-seq'}
+        env = dict(os.environ, TOOL_TRACE='1', TOOL_TRACE_DIR=str(tmp_path))
+        result = subprocess.run(
+            [sys.executable, TOOL_PATH, json.dumps(test_input)],
+            capture_output=True,
+            text=True,
+            env=env
+        )
+        assert result.returncode == 0
+        assert '"type": "trace"' not in result.stdout
+        assert (tmp_path / 'trace-env-seq.json').exists()
+    
+    def test_no_trace_output_by_default(self):
+        """测试默认不输出追踪消息"""
+        test_input = {'content': 'echo untraced', 'projectDir': os.getcwd()}
+        env = dict(os.environ)
+        env.pop('TOOL_TRACE', None)
+        result = subprocess.run(
+            [sys.executable, TOOL_PATH, json.dumps(test_input)],
+            capture_output=True,
+            text=True,
+            env=env
+        )
+        assert '"type": "trace"' not in result.stdout
+
+
+@pytest.mark.skipif(platform.system() == 'Windows', reason="Windows下始终使用shell执行")
+class TestExecInfoFastPath:
+    
+    def setup_method(self):
+        self.tool = execinfo.ExecInfo()
+    
+    def test_simple_command_bypasses_shell(self):
+        """测试简单命令直接exec，不经过shell"""
+        args, use_shell, executable = self.tool._build_popen_args('ls -la /tmp')
+        assert use_shell is False
+        # argv[0]保持命令中的写法，查找到的路径通过executable传给Popen
+        assert args == ['ls', '-la', '/tmp']
+        assert os.path.isabs(executable) and os.path.basename(executable) == 'ls'
+    
+    def test_quoted_arguments_bypass_shell(self):
+        """测试带引号的参数按shell规则拆分"""
+        args, use_shell, _ = self.tool._build_popen_args('echo "Hello World"')
+        assert use_shell is False
+        assert args[1:] == ['Hello World']
+    
+    @pytest.mark.parametrize('command', [
+        'ls | grep py',
+        'echo hi > out.txt',
+        'ls *.py',
+        'echo $HOME',
+        'echo `date`',
+        'true && false',
+        'ls ~',
+        'cd /tmp',
+        'FOO=bar env',
+        'nonexistent_command',
+    ])
+    def test_shell_fallback(self, command):
+        """测试含shell语法、内建命令或找不到的命令回退到shell"""
+        args, use_shell, executable = self.tool._build_popen_args(command)
+        assert use_shell is True
+        assert args == command
+        assert executable is None
+    
+    def test_executable_lookup_is_cached(self, monkeypatch):
+        """测试PATH查找结果按环境缓存"""
+        calls = []
+        real_which = execinfo.shutil.which
+        
+        def counting_which(name, path=None):
+            calls.append(name)
+            return real_which(name, path=path)
+        
+        monkeypatch.setattr(execinfo, '_executable_cache', {})
+        monkeypatch.setattr(execinfo.shutil, 'which', counting_which)
+        self.tool._resolve_executable('ls')
+        self.tool._resolve_executable('ls')
+        assert calls == ['ls']
+        
+        # PATH变化后重新查找
+        monkeypatch.setenv('PATH', os.environ.get('PATH', '') + os.pathsep + '/nonexistent')
+        self.tool._resolve_executable('ls')
+        assert calls == ['ls', 'ls']
+    
+    def test_missing_executable_is_not_cached(self, monkeypatch, tmp_path):
+        """测试找不到的命令不缓存，之后安装到PATH中的命令可以被找到"""
+        monkeypatch.setattr(execinfo, '_executable_cache', {})
+        monkeypatch.setenv('PATH', str(tmp_path))
+        assert self.tool._resolve_executable('late_tool') is None
+        
+        tool = tmp_path / 'late_tool'
+        tool.write_text('#!/bin/sh\necho late\n')
+        tool.chmod(0o755)
+        assert self.tool._resolve_executable('late_tool') == str(tool)
+
+
+@pytest.mark.skipif(platform.system() == 'Windows', reason="跟随模式测试使用POSIX命令")
+class TestExecInfoFollowMode:
+    
+    def _run_follow(self, command, controls, **options):
+        """以跟随模式运行命令，通过stdin发送控制消息，返回解析后的输出消息"""
+        test_input = dict({'content': command, 'sequenceId': 'follow-seq', 'follow': True}, **options)
+        process = subprocess.Popen(
+            [sys.executable, TOOL_PATH, json.dumps(test_input)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        control_input = ''.join(json.dumps(c) + '\n' for c in controls)
+        stdout, _ = process.communicate(control_input, timeout=20)
+        assert process.returncode == 0
+        return [json.loads(line) for line in stdout.strip().split('\n')]
+    
+    def test_stdin_forwarding(self):
+        """测试stdin控制消息写入子进程"""
+        messages = self._run_follow('cat', [
+            {'type': 'stdin', 'data': 'hello follow\n', 'eof': True}
+        ])
+        contents = [m['content'] for m in messages if m['type'] == 'text']
+        assert 'hello follow' in contents
+        assert 'Command executed with return code: 0' in contents
+        assert messages[-1]['isEnd'] is True
+    
+    def test_signal_stops_process(self):
+        """测试signal控制消息终止长时间运行的命令"""
+        messages = self._run_follow('sleep 30', [{'type': 'signal', 'signal': 'SIGTERM'}])
+        contents = [m['content'] for m in messages if m['type'] == 'text']
+        assert 'Command executed with return code: -15' in contents
+    
+    def test_invalid_control_message(self):
+        """测试未知控制消息输出错误但不中断执行"""
+        messages = self._run_follow('cat', [
+            {'type': 'unknown'},
+            {'type': 'stdin', 'data': 'still running\n', 'eof': True}
+        ])
+        assert any(m['type'] == 'error' and 'Control message error' in m['content'] for m in messages)
+        assert any(m['type'] == 'text' and m['content'] == 'still running' for m in messages)
+    
+    def test_detach_returns_immediately(self):
+        """测试分离后立即结束，子进程继续运行并把输出写入日志文件"""
+        import re
+        import time
+        import signal
+        start = time.monotonic()
+        messages = self._run_follow('echo before; sleep 1; echo after; sleep 30', [{'type': 'detach'}])
+        assert time.monotonic() - start < 10
+        assert messages[-1]['isEnd'] is True
+        detach_message = next(m['content'] for m in messages if m['content'].startswith('Detached from process'))
+        match = re.match(r'Detached from process (\d+), .*output is written to (.+)$', detach_message)
+        pid, log_path = int(match.group(1)), match.group(2)
+        try:
+            os.kill(pid, 0)
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline:
+                with open(log_path) as log:
+                    if 'after' in log.read():
+                        break
+                time.sleep(0.1)
+            with open(log_path) as log:
+                assert 'after' in log.read()
+        finally:
+            os.killpg(pid, signal.SIGKILL)
+            os.remove(log_path)
+    
+    def test_output_rate_limit(self):
+        """测试超出每次刷新行数上限的输出被省略并提示"""
+        messages = self._run_follow('seq 1 1000', [], maxLinesPerFlush=10, flushInterval=1)
+        output_lines = [line for m in messages if m['type'] == 'text' and not m['content'].startswith(('Executing', 'Command', '[Output'))
+                        for line in m['content'].split('\n')]
+        assert len(output_lines) < 1000
+        assert any(m['content'].startswith('[Output rate limited') for m in messages)
+
+
+@pytest.mark.skipif(platform.system() == 'Windows', reason="守护模式测试使用POSIX命令")
+class TestExecInfoDaemon:
+    
+    def _start_daemon(self, *args):
+        return subprocess.Popen(
+            [sys.executable, TOOL_PATH, '--serve'] + list(args),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+    
+    def test_concurrent_requests(self):
+        """测试一个守护进程并发处理多个请求，消息带有各自的sequenceId"""
+        requests_lines = [
+            {'content': 'sleep 0.5', 'sequenceId': 'slow'},
+            {'content': 'echo fast', 'sequenceId': 'fast'},
+            {'content': 'echo anonymous'},
+        ]
+        daemon = self._start_daemon('--max-concurrency', '3')
+        stdout, _ = daemon.communicate(''.join(json.dumps(r) + '\n' for r in requests_lines), timeout=20)
+        assert daemon.returncode == 0
+        
+        messages = [json.loads(line) for line in stdout.strip().split('\n')]
+        assert messages[0]['type'] == 'ready'
+        assert messages[0]['content']['maxConcurrency'] == 3
+        assert messages[-1]['type'] == 'shutdown'
+        
+        end_order = [m['sequenceId'] for m in messages if m['type'] == 'end']
+        assert sorted(end_order) == ['fast', 'serve-3', 'slow']
+        # 慢请求不阻塞后续请求
+        assert end_order.index('fast') < end_order.index('slow')
+        assert any(m['sequenceId'] == 'fast' and m['content'] == 'fast' for m in messages)
+    
+    def test_invalid_and_duplicate_requests(self):
+        """测试无效请求和重复sequenceId输出错误但不影响守护进程"""
+        lines = [
+            'not json',
+            json.dumps({'content': 'sleep 0.3', 'sequenceId': 'dup'}),
+            json.dumps({'content': 'echo again', 'sequenceId': 'dup'}),
+        ]
+        daemon = self._start_daemon()
+        stdout, _ = daemon.communicate('\n'.join(lines) + '\n', timeout=20)
+        messages = [json.loads(line) for line in stdout.strip().split('\n')]
+        errors = [m['content'] for m in messages if m['type'] == 'error']
+        assert any(e.startswith('Invalid request') for e in errors)
+        assert any(e.startswith('Duplicate sequenceId') for e in errors)
+        assert [m['sequenceId'] for m in messages if m['type'] == 'end'] == ['dup']
+    
+    def test_control_routed_to_follow_execution(self):
+        """测试control请求投递给跟随模式的执行"""
+        daemon = self._start_daemon()
+        daemon.stdin.write(json.dumps({'content': 'cat', 'sequenceId': 'f', 'follow': True}) + '\n')
+        daemon.stdin.write(json.dumps({'type': 'control', 'sequenceId': 'f',
+                                       'control': {'type': 'stdin', 'data': 'via daemon\n', 'eof': True}}) + '\n')
+        daemon.stdin.flush()
+        
+        # 等待跟随模式执行结束后再关闭守护进程
+        messages = []
+        for line in daemon.stdout:
+            messages.append(json.loads(line))
+            if messages[-1]['type'] == 'end':
+                break
+        daemon.stdin.write(json.dumps({'type': 'shutdown'}) + '\n')
+        daemon.stdin.flush()
+        daemon.communicate(timeout=20)
+        
+        assert any(m['sequenceId'] == 'f' and m['content'] == 'via daemon' for m in messages)
+    
+    def test_follow_requests_do_not_use_concurrency_slots(self):
+        """测试跟随模式的请求不占用并发数，关闭时终止仍在运行的跟随执行"""
+        import time
+        daemon = self._start_daemon('--max-concurrency', '1')
+        start = time.monotonic()
+        lines = [
+            {'content': 'sleep 30', 'sequenceId': 'follow', 'follow': True},
+            {'content': 'echo normal', 'sequenceId': 'normal'},
+        ]
+        for line in lines:
+            daemon.stdin.write(json.dumps(line) + '\n')
+        daemon.stdin.flush()
+        messages = []
+        for line in daemon.stdout:
+            messages.append(json.loads(line))
+            if messages[-1]['type'] == 'end':
+                break
+        assert messages[-1]['sequenceId'] == 'normal'
+        
+        daemon.stdin.write(json.dumps({'type': 'shutdown'}) + '\n')
+        daemon.stdin.flush()
+        stdout, _ = daemon.communicate(timeout=20)
+        assert time.monotonic() - start < 15
+        messages = [json.loads(line) for line in stdout.strip().split('\n')]
+        assert any(m['type'] == 'end' and m['sequenceId'] == 'follow' for m in messages)
+        assert messages[-1]['type'] == 'shutdown'
+    
+    def test_shutdown_timeout_terminates_requests(self):
+        """测试关闭时等待超过--shutdown-timeout的请求被终止"""
+        import time
+        daemon = self._start_daemon('--shutdown-timeout', '0.5')
+        start = time.monotonic()
+        stdout, _ = daemon.communicate(json.dumps({'content': 'sleep 30', 'sequenceId': 'long'}) + '\n', timeout=20)
+        assert time.monotonic() - start < 10
+        messages = [json.loads(line) for line in stdout.strip().split('\n')]
+        assert any(m['content'] == 'Command executed with return code: -15' for m in messages)
+        assert messages[-1]['type'] == 'shutdown'
+    
+    def test_sigterm_waits_for_inflight_requests(self):
+        """测试收到SIGTERM后等待执行中的请求完成再退出"""
+        import signal
+        import time
+        daemon = self._start_daemon()
+        assert json.loads(daemon.stdout.readline())['type'] == 'ready'
+        daemon.stdin.write(json.dumps({'content': 'sleep 0.5', 'sequenceId': 'inflight'}) + '\n')
+        daemon.stdin.flush()
+        time.sleep(0.3)
+        daemon.send_signal(signal.SIGTERM)
+        stdout, _ = daemon.communicate(timeout=20)
+        
+        messages = [json.loads(line) for line in stdout.strip().split('\n')]
+        assert any(m['type'] == 'end' and m['sequenceId'] == 'inflight' for m in messages)
+        assert messages[-1]['type'] == 'shutdown'
 
 if __name__ == '__main__':
     pytest.main(['-v', __file__])
\ No newline at end of file
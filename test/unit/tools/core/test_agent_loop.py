@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试CommandProcessor的多步智能体循环
+"""
+
+import unittest
+import os
+import sys
+import time
+import threading
+
+# 添加tools目录到Python路径（command_processor使用包内相对导入）
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools')))
+
+from core.command_processor import CommandProcessor
+from core.output_formatter import OutputFormatter
+from core.tool_executor import ToolCallBatch
+
+class RecordingFormatter(OutputFormatter):
+    """记录输出的消息而不打印"""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def output_json(self, data):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is not None:
+            buffer.append(data)
+        else:
+            self.messages.append(data)
+
+class ScriptedClient:
+    """按脚本逐步返回流式事件的客户端；每一步是(延迟秒数, 事件)的列表，脚本用完后返回最后一步"""
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.requests = []
+
+    def stream_request(self, data, sequence_id=None):
+        step = self.steps[min(len(self.requests), len(self.steps) - 1)]
+        self.requests.append(data)
+        for delay, event in step:
+            if delay:
+                time.sleep(delay)
+            yield event
+        yield {"type": "finish", "reason": "stop"}
+
+def tool_call(name, call_id, **parameters):
+    return {"type": "tool_call", "toolCall": {"id": call_id, "name": name, "parameters": parameters}}
+
+class TestAgentLoop(unittest.TestCase):
+    """测试智能体循环"""
+
+    def setUp(self):
+        self.processor = CommandProcessor(use_mock=True, stream=True, max_steps=4)
+        self.formatter = RecordingFormatter()
+        self.processor.formatter = self.formatter
+        self.processor.tool_handler.formatter = self.formatter
+        self.started = []
+
+        def lookup(parameters, sequence_id):
+            self.started.append(time.monotonic())
+            time.sleep(parameters.get("delay", 0))
+            return {"city": parameters.get("city"), "temperature": 21}
+
+        self.processor.tool_handler.register_custom_tool({
+            "name": "lookup", "description": "查询", "parameters": {}, "handler": lookup, "concurrent": True
+        })
+        self.formatter.messages.clear()
+
+    def summary(self):
+        return [m for m in self.formatter.messages if m["type"] == "agent_summary"][-1]["content"]
+
+    def errors(self):
+        return [m["content"] for m in self.formatter.messages if m["isError"]]
+
+    def test_tool_results_returned_to_model(self):
+        """工具结果作为tool消息返回给大模型，直到回复不再调用工具"""
+        client = ScriptedClient([
+            [(0, {"type": "text", "content": "查询中"}), (0, tool_call("lookup", "call_a", city="杭州"))],
+            [(0, {"type": "text", "content": "杭州21度"})],
+        ])
+        self.processor.llm_client = client
+        result = self.processor.process_command("杭州天气", "seq")
+        self.assertEqual(result, {"content": "杭州21度"})
+        self.assertEqual(len(client.requests), 2)
+        messages = client.requests[1]["messages"]
+        self.assertEqual(messages[-2]["role"], "assistant")
+        self.assertEqual(messages[-2]["tool_calls"][0]["id"], "call_a")
+        self.assertEqual(messages[-2]["tool_calls"][0]["function"]["name"], "lookup")
+        self.assertEqual(messages[-1], {"role": "tool", "tool_call_id": "call_a",
+                                        "content": '{"city": "杭州", "temperature": 21}'})
+        summary = self.summary()
+        self.assertEqual(summary["steps"], 2)
+        self.assertEqual(summary["toolCalls"], 1)
+        # 会话中只保存文本摘要，不保存tool消息
+        history = self.processor.conversations.window(self.processor.conversation_id)
+        self.assertEqual([m["role"] for m in history], ["user", "assistant", "assistant"])
+
+    def test_tool_starts_while_streaming(self):
+        """工具调用在参数完整后立即开始，与模型继续生成的时间重叠"""
+        client = ScriptedClient([
+            [(0, tool_call("lookup", "call_a", city="杭州", delay=0.2)),
+             (0.2, {"type": "text", "content": "继续生成"})],
+            [(0, {"type": "text", "content": "完成"})],
+        ])
+        self.processor.llm_client = client
+        start = time.monotonic()
+        self.processor.process_command("杭州天气", "seq")
+        elapsed = time.monotonic() - start
+        self.assertLess(self.started[0] - start, 0.1)
+        self.assertLess(elapsed, 0.35)
+        self.assertGreater(self.summary()["overlapSavedMs"], 100)
+
+    def test_step_budget(self):
+        """一直调用工具时在最大步数处停止"""
+        client = ScriptedClient([[(0, tool_call("lookup", "", city="杭州"))]])
+        self.processor.llm_client = client
+        self.processor.process_command("杭州天气", "seq")
+        self.assertEqual(len(client.requests), 4)
+        self.assertEqual(self.summary()["steps"], 4)
+        # 没有id的工具调用按步数和位置生成id
+        self.assertEqual(client.requests[1]["messages"][-1]["tool_call_id"], "call_1_0")
+        self.assertTrue(any("最大步数" in e for e in self.errors()))
+
+    def test_wall_clock_budget(self):
+        """超出时间预算后不再调用大模型"""
+        self.processor.agent_budget = 0.05
+        client = ScriptedClient([[(0, tool_call("lookup", "call_a", city="杭州", delay=0.1))]])
+        self.processor.llm_client = client
+        self.processor.process_command("杭州天气", "seq")
+        self.assertEqual(len(client.requests), 1)
+        self.assertTrue(any("时间预算" in e for e in self.errors()))
+
+    def test_budget_bounds_model_call(self):
+        """大模型回复停滞时在时间预算内停止等待，不保存不完整的回复"""
+        self.processor.agent_budget = 0.2
+        client = ScriptedClient([[(0, {"type": "content", "content": "正在"}), (1.0, {"type": "content", "content": "查询"})]])
+        self.processor.llm_client = client
+        start = time.monotonic()
+        # 使用单独的内容，避免其他测试合并到仍在进行的请求
+        self.processor.process_command("宁波天气", "seq")
+        self.assertLess(time.monotonic() - start, 0.6)
+        self.assertTrue(any("停止等待千问大模型的回复" in e for e in self.errors()))
+        self.assertEqual(self.summary()["steps"], 1)
+        self.assertEqual(self.processor.conversations.window(self.processor.conversation_id), [])
+
+    def test_stopped_consumer_closes_model_stream(self):
+        """消费方提前停止（如处理事件时出错）后，后台线程不再读取大模型的事件流并将其关闭"""
+        pulled = []
+        closed = threading.Event()
+
+        def stream():
+            try:
+                for i in range(20):
+                    time.sleep(0.02)
+                    pulled.append(i)
+                    yield {"type": "text", "content": str(i)}
+            finally:
+                closed.set()
+
+        expired = threading.Event()
+        events = self.processor._events_until(stream, time.monotonic() + 5, expired)
+        self.assertEqual(next(events)["content"], "0")
+        events.close()
+        self.assertTrue(closed.wait(1))
+        self.assertLess(len(pulled), 5)
+        self.assertFalse(expired.is_set())
+
+    def test_single_step_by_default(self):
+        """默认不启用智能体循环"""
+        processor = CommandProcessor(use_mock=True)
+        self.assertEqual(processor.max_steps, 1)
+
+    def test_mock_answers_after_tool_results(self):
+        """模拟客户端收到工具结果后给出最终回答"""
+        self.processor.max_steps = 3
+        result = self.processor.process_command("9", "seq")
+        self.assertIn("1个工具调用的结果", result["content"])
+        self.assertEqual(self.summary()["steps"], 2)
+
+class TestOverlapSaved(unittest.TestCase):
+    """测试重叠节省时间的估算"""
+
+    def batch(self, calls, finished):
+        batch = ToolCallBatch.__new__(ToolCallBatch)
+        batch.concurrent = [concurrent for concurrent, _ in calls]
+        batch.durations = [duration for _, duration in calls]
+        batch.finished = finished
+        return batch
+
+    def test_concurrent_calls_replayed_in_parallel(self):
+        """流结束后才执行时并发调用同时开始：3个各1秒的调用需要1秒，实际流结束后等待0.25秒"""
+        batch = self.batch([(True, 1.0)] * 3, finished=10.25)
+        self.assertAlmostEqual(batch.overlap_saved(10.0), 0.75)
+
+    def test_sequential_calls_replayed_in_order(self):
+        """顺序调用等待前面的调用完成；未完成的调用不计入"""
+        batch = self.batch([(True, 1.0), (False, 0.5), (True, None)], finished=10.0)
+        self.assertAlmostEqual(batch.overlap_saved(10.0), 1.5)
+
+    def test_no_overlap(self):
+        batch = self.batch([(False, 1.0)], finished=11.0)
+        self.assertAlmostEqual(batch.overlap_saved(10.0), 0.0)
+
+if __name__ == '__main__':
+    unittest.main()
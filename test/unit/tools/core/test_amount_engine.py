@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试金额计算引擎
+"""
+
+import unittest
+import os
+import random
+import sys
+from decimal import Decimal
+
+# 添加tools目录到Python路径（amount_engine使用包内相对导入）
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools')))
+
+from core.amount_engine import (
+    AmountBatch, aggregate, currency_exponent, format_minor_units, percentile, to_minor_units,
+    to_minor_units_array
+)
+from core.amount_processor import AmountRecordError, iter_amount_rows
+
+class TestMinorUnits(unittest.TestCase):
+    """测试最小货币单位转换"""
+
+    def test_currency_exponents(self):
+        """测试币种小数位数表"""
+        self.assertEqual(currency_exponent("JPY"), 0)
+        self.assertEqual(currency_exponent("CNY"), 2)
+        self.assertEqual(currency_exponent("KWD"), 3)
+        self.assertEqual(currency_exponent("XYZ"), 2)
+
+    def test_to_minor_units(self):
+        """测试不同币种和写法的转换"""
+        self.assertEqual(to_minor_units("100.00", "CNY"), 10000)
+        self.assertEqual(to_minor_units("100", "CNY"), 10000)
+        self.assertEqual(to_minor_units("0.1", "USD"), 10)
+        self.assertEqual(to_minor_units("-.5", "USD"), -50)
+        self.assertEqual(to_minor_units("+3", "USD"), 300)
+        self.assertEqual(to_minor_units("1.500", "USD"), 150)
+        self.assertEqual(to_minor_units("1234", "JPY"), 1234)
+        self.assertEqual(to_minor_units("-0.0", "JPY"), 0)
+        self.assertEqual(to_minor_units("1.234", "KWD"), 1234)
+
+    def test_excess_precision_is_rejected(self):
+        """测试超出币种精度的非零小数被拒绝，而不是被静默舍入"""
+        with self.assertRaises(AmountRecordError):
+            to_minor_units("1.005", "USD")
+        with self.assertRaises(AmountRecordError):
+            to_minor_units("1.5", "JPY")
+
+    def test_format_round_trip(self):
+        """测试格式化与解析互为逆运算"""
+        for currency in ("CNY", "JPY", "KWD", "CLF"):
+            for units in (0, 1, -1, 5, 99, 100, -12345, 10 ** 15):
+                text = format_minor_units(units, currency)
+                self.assertEqual(to_minor_units(text, currency), units, text)
+        self.assertEqual(format_minor_units(5, "CNY"), "0.05")
+        self.assertEqual(format_minor_units(-5, "CNY"), "-0.05")
+        self.assertEqual(format_minor_units(1234, "JPY"), "1234")
+
+class TestAmountBatch(unittest.TestCase):
+    """测试列式金额缓冲区"""
+
+    def test_totals_are_exact(self):
+        """测试合计没有浮点误差"""
+        batch = aggregate([("0.1", "USD")] * 10)
+        self.assertEqual(batch.totals(), {"USD": 100})
+        self.assertNotEqual(sum([0.1] * 10), 1.0)
+
+    def test_group_by_and_stats(self):
+        """测试按币种分组统计与Decimal计算结果一致"""
+        rng = random.Random(42)
+        batch = AmountBatch()
+        expected = {}
+        for _ in range(2000):
+            currency = rng.choice(["CNY", "USD", "JPY"])
+            exponent = currency_exponent(currency)
+            value = Decimal(rng.randint(-10 ** 8, 10 ** 8)).scaleb(-exponent)
+            batch.append(format(value, 'f'), currency)
+            expected.setdefault(currency, []).append(int(value.scaleb(exponent)))
+
+        stats = batch.stats()
+        self.assertEqual(batch.currencies(), sorted(expected))
+        self.assertEqual(len(batch), 2000)
+        for currency, units in expected.items():
+            ordered = sorted(units)
+            self.assertEqual(stats[currency]["count"], len(units))
+            self.assertEqual(stats[currency]["total"], sum(units))
+            self.assertEqual(stats[currency]["min"], ordered[0])
+            self.assertEqual(stats[currency]["max"], ordered[-1])
+            self.assertEqual(stats[currency]["p50"], ordered[(len(units) + 1) // 2 - 1])
+            self.assertEqual(list(batch.group(currency)), units)
+
+    def test_extend_matches_append(self):
+        """测试批量追加（含C层快速路径和逐条回退路径）与逐条追加结果一致"""
+        records = [("1.00", "USD"), ("-.50", "USD"), ("7", "JPY"), ("2.5", "CNY"), ("3.10", "CNY"), ("0.001", "KWD")]
+        expected = aggregate(records)
+        batch = AmountBatch()
+        self.assertEqual(batch.extend(records), len(records))
+        self.assertEqual(batch.totals(), expected.totals())
+        self.assertEqual(list(batch.group("CNY")), [250, 310])
+        self.assertEqual(list(to_minor_units_array(["1.50", "-0.01", "+2.00"], "USD")), [150, -1, 200])
+
+    def test_extend_is_atomic(self):
+        """测试批量追加遇到无效记录时缓冲区保持不变"""
+        batch = aggregate([("1", "USD")])
+        with self.assertRaises(AmountRecordError):
+            batch.extend([("2", "USD"), ("1.5", "JPY")])
+        with self.assertRaises(AmountRecordError):
+            batch.extend([("9" * 25 + ".00", "USD")])
+        self.assertEqual(batch.totals(), {"USD": 100})
+
+    def test_percentile_nearest_rank(self):
+        """测试最近秩法百分位"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile(values, 0), 1)
+        self.assertEqual(percentile([7], 90), 7)
+        with self.assertRaises(ValueError):
+            percentile([], 50)
+
+    def test_out_of_range_amount(self):
+        """测试超出64位整数范围的金额被拒绝且不影响缓冲区"""
+        batch = AmountBatch()
+        with self.assertRaises(AmountRecordError):
+            batch.append("1" * 30, "USD")
+        self.assertEqual(len(batch), 0)
+
+    def test_stats_table(self):
+        """测试统计表格按币种精度格式化"""
+        batch = aggregate([("1", "USD"), ("2.5", "USD"), ("300", "JPY")])
+        table = batch.stats_table(percentiles=(50,))
+        self.assertEqual(table["header"], ["currency", "count", "total", "min", "max", "p50"])
+        self.assertEqual(table["rows"], [["JPY", 1, "300", "300", "300", "300"],
+                                         ["USD", 2, "3.50", "1.00", "2.50", "1.00"]])
+
+    def test_rows_feed_batch(self):
+        """测试批量处理行与缓冲区联动，超出精度的记录标记为错误"""
+        batch = AmountBatch()
+        rows = list(iter_amount_rows([{"amount": "1.5", "currency": "JPY"}, {"amount": "2", "currency": "JPY"}],
+                                     batch=batch))
+        self.assertEqual([row[4] for row in rows], ["error", "ok"])
+        self.assertEqual(batch.totals(), {"JPY": 2})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试金额处理模块
+"""
+
+import unittest
+import os
+import sys
+from decimal import Decimal
+
+# 添加core目录到Python路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools/core')))
+
+from amount_processor import (
+    AmountRecordError, extract_records, format_amount, iter_amount_rows,
+    normalize_amount, normalize_currency, process_amount_record
+)
+
+class TestAmountProcessor(unittest.TestCase):
+    """测试金额校验和格式化"""
+
+    def test_normalize_amount(self):
+        """测试各种合法金额写法的规范化"""
+        self.assertEqual(normalize_amount("100.00"), "100.00")
+        self.assertEqual(normalize_amount(" 1,000.50 "), "1000.50")
+        self.assertEqual(normalize_amount("1_000"), "1000")
+        self.assertEqual(normalize_amount("-.5"), "-.5")
+        self.assertEqual(normalize_amount(42), "42")
+        self.assertEqual(normalize_amount(0.1), "0.1")
+        self.assertEqual(normalize_amount(Decimal("1.10")), "1.10")
+        self.assertEqual(normalize_amount("1e3"), "1000")
+        self.assertEqual(normalize_amount("1.5e-3"), "0.0015")
+
+    def test_exponent_digit_limit(self):
+        """科学计数法展开后超出位数上限的金额被拒绝，不生成超长字符串"""
+        for value in ["1e50000000", "1e-50000000", Decimal("1E+100"), 1e300]:
+            with self.assertRaises(AmountRecordError, msg=repr(value)):
+                normalize_amount(value)
+        self.assertEqual(normalize_amount("1e60"), "1" + "0" * 60)
+
+    def test_invalid_amounts(self):
+        """测试非法金额抛出AmountRecordError"""
+        for value in ["", "abc", "1,00", "NaN", "Infinity", None, True, "1; rm -rf /"]:
+            with self.assertRaises(AmountRecordError, msg=repr(value)):
+                normalize_amount(value)
+
+    def test_normalize_currency(self):
+        """测试币种代码校验"""
+        self.assertEqual(normalize_currency("usd"), "USD")
+        self.assertEqual(normalize_currency(None), "CNY")
+        self.assertEqual(normalize_currency(""), "CNY")
+        with self.assertRaises(AmountRecordError):
+            normalize_currency("US")
+        with self.assertRaises(AmountRecordError):
+            normalize_currency("人民币")
+
+    def test_format_amount(self):
+        """测试展示文本与原先echo命令的输出一致"""
+        self.assertEqual(format_amount("100.00", "CNY"), "处理人民币金额: 100.00 元")
+        self.assertEqual(format_amount("5", "USD"), "处理USD金额: 5")
+
+    def test_process_amount_record(self):
+        """测试单条记录处理"""
+        self.assertEqual(process_amount_record({"amount": "1,234.5", "currency": "eur"}),
+                         ("1234.5", "EUR", "处理EUR金额: 1234.5"))
+        with self.assertRaises(AmountRecordError):
+            process_amount_record({"currency": "CNY"})
+        with self.assertRaises(AmountRecordError):
+            process_amount_record("100")
+
+    def test_errors_do_not_abort_batch(self):
+        """测试批量处理中单条记录的错误只记录在对应行中"""
+        records = [{"amount": "1"}, {"amount": "bad", "currency": "USD"}, 3, {"amount": 2, "currency": "JPY"}]
+        rows = list(iter_amount_rows(records))
+
+        self.assertEqual([row[0] for row in rows], [0, 1, 2, 3])
+        self.assertEqual([row[4] for row in rows], ["ok", "error", "error", "ok"])
+        self.assertEqual(rows[1][1:3], ["bad", "USD"])
+        self.assertIn("无效金额", rows[1][5])
+        self.assertEqual(rows[3][1:4], ["2", "JPY", "处理JPY金额: 2"])
+
+    def test_extract_records(self):
+        """测试批量输入的识别"""
+        self.assertEqual(extract_records([{"amount": 1}]), [{"amount": 1}])
+        self.assertEqual(extract_records({"records": [], "sequenceId": "s"}), [])
+        self.assertIsNone(extract_records({"amount": "1"}))
+        self.assertIsNone(extract_records(None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试金额记录流式读取模块
+"""
+
+import unittest
+import io
+import itertools
+import os
+import sys
+
+# 添加tools目录到Python路径（amount_stream使用包内相对导入）
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools')))
+
+from core.amount_stream import (
+    ByteCountingLines, chunked, detect_format, iter_csv_records, iter_jsonl_records, stream_records
+)
+from core.amount_processor import AmountRecordError, iter_amount_rows
+from core.amount_engine import AmountBatch, RunningAmountStats, aggregate
+
+class TestAmountStream(unittest.TestCase):
+    """测试CSV/JSONL流式读取"""
+
+    def test_byte_counting_lines(self):
+        """测试逐行解码并统计字节数，去掉BOM"""
+        data = '﻿amount\n中文\n'.encode('utf-8')
+        lines = ByteCountingLines(io.BytesIO(data))
+        self.assertEqual(list(lines), ['amount\n', '中文\n'])
+        self.assertEqual(lines.bytes_read, len(data))
+
+    def test_detect_format(self):
+        """测试按扩展名和第一行推断格式"""
+        self.assertEqual(detect_format('ledger.CSV'), 'csv')
+        self.assertEqual(detect_format('ledger.ndjson'), 'jsonl')
+        self.assertEqual(detect_format('-', '{"amount": 1}\n'), 'jsonl')
+        self.assertEqual(detect_format('-', 'amount,currency\n'), 'csv')
+
+    def test_csv_records(self):
+        """测试CSV解析，字段数不一致的行生成错误而不中断"""
+        records = list(iter_csv_records(['amount, currency\n', '1.5,USD\n', '\n', '1,2,3\n', '"1,000",CNY\n']))
+        self.assertEqual(records[0], {"amount": "1.5", "currency": "USD"})
+        self.assertIsInstance(records[1], AmountRecordError)
+        self.assertIn("第4行", str(records[1]))
+        self.assertEqual(records[2], {"amount": "1,000", "currency": "CNY"})
+
+    def test_csv_requires_amount_column(self):
+        """测试表头缺少amount列时报错"""
+        with self.assertRaises(AmountRecordError):
+            list(iter_csv_records(['value,currency\n', '1,USD\n']))
+        self.assertEqual(list(iter_csv_records([])), [])
+
+    def test_jsonl_records(self):
+        """测试JSONL解析，跳过空行，无法解析的行生成错误"""
+        records = list(iter_jsonl_records(['{"amount": "1"}\n', '\n', '{bad\n']))
+        self.assertEqual(records[0], {"amount": "1"})
+        self.assertIsInstance(records[1], AmountRecordError)
+        self.assertIn("第3行", str(records[1]))
+
+    def test_malformed_rows_become_error_rows(self):
+        """测试解析错误在结果表格中标记为错误行"""
+        rows = list(iter_amount_rows(iter_jsonl_records(['{"amount": "1"}', 'oops'])))
+        self.assertEqual([row[4] for row in rows], ["ok", "error"])
+        self.assertIn("JSON解析错误", rows[1][5])
+
+    def test_stream_is_lazy(self):
+        """测试流水线按需读取：无限输入也只消费第一块"""
+        infinite = itertools.chain(['amount,currency\n'], itertools.repeat('1.00,USD\n'))
+        first = next(chunked(stream_records(infinite, '-'), 100))
+        self.assertEqual(len(first), 100)
+
+    def test_chunked(self):
+        """测试分块"""
+        self.assertEqual(list(chunked(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(chunked([], 3)), [])
+        with self.assertRaises(ValueError):
+            list(chunked([1], 0))
+
+    def test_running_stats_match_full_batch(self):
+        """测试逐块合并的统计与整体统计一致"""
+        records = [(f"{i}.{i % 100:02d}", "USD" if i % 3 else "CNY") for i in range(-500, 500)]
+        running = RunningAmountStats()
+        for chunk in chunked(records, 64):
+            running.merge(aggregate(chunk))
+        full = aggregate(records).stats(percentiles=())
+        self.assertEqual(running.stats(), full)
+        self.assertEqual(len(running), len(records))
+        self.assertEqual(running.stats_table()["header"], ["currency", "count", "total", "min", "max"])
+        running.merge(AmountBatch())
+        self.assertEqual(running.stats(), full)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试千问大模型异步客户端模块
+"""
+
+import unittest
+import asyncio
+import json
+import os
+import sys
+import time
+
+# 添加core目录到Python路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools/core')))
+
+from async_llm_client import AsyncConnectionPool, AsyncQianwenClient, gather_requests
+from mock_llm import AsyncMockQianwenClient
+
+class StandInServer:
+    """本地替身服务：按请求内容返回不同的HTTP响应"""
+
+    def __init__(self):
+        self.connections = 0
+        self.requests = []
+        self.server = None
+        self.base_url = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}/v1/"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = json.loads(await reader.readexactly(int(headers['content-length'])))
+                self.requests.append((request_line.decode().split()[1], headers, body))
+                if not await self._respond(writer, body.get('content')):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, content):
+        """写出响应，返回连接是否保持"""
+        if content == 'slow':
+            await asyncio.sleep(5)
+        if isinstance(content, str) and content.startswith('sleep:'):
+            await asyncio.sleep(float(content[6:]))
+        if content == 'unauthorized':
+            payload, status = b'{"error": "Unauthorized"}', '401 Unauthorized'
+        elif content == 'invalid':
+            payload, status = b'Invalid JSON', '200 OK'
+        else:
+            payload = json.dumps({"content": f"echo {content}", "tool_calls": []}).encode()
+            status = '200 OK'
+        if content == 'chunked':
+            writer.write(f'HTTP/1.1 {status}\r\nTransfer-Encoding: chunked\r\n\r\n'.encode())
+            for start in range(0, len(payload), 7):
+                part = payload[start:start + 7]
+                writer.write(b'%x\r\n%s\r\n' % (len(part), part))
+            writer.write(b'0\r\n\r\n')
+        elif content == 'drop':
+            # 响应声明保持连接，随后服务端关闭空闲连接
+            writer.write(f'HTTP/1.1 {status}\r\nContent-Length: {len(payload)}\r\n\r\n'.encode() + payload)
+            await writer.drain()
+            return False
+        elif content == 'close':
+            writer.write(f'HTTP/1.1 {status}\r\nConnection: close\r\n\r\n'.encode() + payload)
+            await writer.drain()
+            return False
+        else:
+            writer.write(f'HTTP/1.1 {status}\r\nContent-Length: {len(payload)}\r\n\r\n'.encode() + payload)
+        await writer.drain()
+        return True
+
+class TestAsyncQianwenClient(unittest.IsolatedAsyncioTestCase):
+    """测试异步客户端与同步客户端相同的响应约定"""
+
+    async def asyncSetUp(self):
+        self.server = StandInServer()
+        await self.server.start()
+        self.client = AsyncQianwenClient(self.server.base_url, "test-api-key", timeout=2)
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        await self.server.stop()
+
+    async def test_send_request_success(self):
+        """测试发送请求成功的情况"""
+        response = await self.client.send_request({"content": "你好"})
+        self.assertEqual(response, {"content": "echo 你好", "tool_calls": []})
+        path, headers, body = self.server.requests[0]
+        self.assertEqual(path, "/v1/chat/completions")
+        self.assertEqual(headers['authorization'], "Bearer test-api-key")
+        self.assertEqual(headers['content-type'], "application/json")
+        self.assertEqual(body, {"content": "你好"})
+
+    async def test_chunked_and_close_responses(self):
+        """测试分块编码和Connection: close的响应"""
+        self.assertEqual((await self.client.send_request({"content": "chunked"}))["content"], "echo chunked")
+        self.assertEqual((await self.client.send_request({"content": "close"}))["content"], "echo close")
+        self.assertEqual((await self.client.send_request({"content": "again"}))["content"], "echo again")
+        self.assertEqual(self.server.connections, 2)
+
+    async def test_http_error(self):
+        """测试HTTP错误"""
+        with self.assertRaises(Exception) as context:
+            await self.client.send_request({"content": "unauthorized"})
+        self.assertEqual(str(context.exception), 'API请求失败: HTTP 401, {"error": "Unauthorized"}')
+
+    async def test_invalid_json(self):
+        """测试无效的JSON响应"""
+        with self.assertRaises(Exception) as context:
+            await self.client.send_request({"content": "invalid"})
+        self.assertIn("解析响应失败", str(context.exception))
+
+    async def test_network_error(self):
+        """测试连接失败"""
+        await self.server.stop()
+        client = AsyncQianwenClient(self.server.base_url, timeout=2)
+        with self.assertRaises(Exception) as context:
+            await client.send_request({"content": "你好"})
+        self.assertEqual(str(context.exception), "发送请求失败: Network Error")
+        await client.aclose()
+        await self.server.start()
+
+    async def test_timeout_discards_connection(self):
+        """测试超时抛出与同步客户端相同的错误，且超时的连接不会被复用"""
+        with self.assertRaises(Exception) as context:
+            await self.client.send_request({"content": "slow"}, timeout=0.1)
+        self.assertEqual(str(context.exception), "发送请求失败: Request timed out")
+        self.assertEqual((await self.client.send_request({"content": "next"}))["content"], "echo next")
+        self.assertEqual(self.server.connections, 2)
+
+    async def test_cancellation(self):
+        """测试取消请求会关闭连接并向上抛出CancelledError"""
+        task = asyncio.ensure_future(self.client.send_request({"content": "slow"}))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertEqual((await self.client.send_request({"content": "next"}))["content"], "echo next")
+        self.assertEqual(self.server.connections, 2)
+
+    async def test_connection_reuse(self):
+        """测试顺序请求复用同一条连接"""
+        for i in range(5):
+            await self.client.send_request({"content": str(i)})
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.client.pool.connections_opened, 1)
+
+    async def test_stale_connection_is_retried(self):
+        """测试复用的连接已被服务端关闭时在新连接上重试"""
+        await self.client.send_request({"content": "drop"})
+        self.assertEqual((await self.client.send_request({"content": "second"}))["content"], "echo second")
+        self.assertEqual(self.server.connections, 2)
+
+    async def test_gather_requests_in_order(self):
+        """测试并发请求按输入顺序返回，失败的请求在对应位置返回异常"""
+        requests = [{"content": f"sleep:{0.05 * (10 - i)}"} for i in range(10)]
+        requests[3] = {"content": "unauthorized"}
+        started = time.monotonic()
+        results = await gather_requests(self.client, requests)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertIsInstance(results[3], Exception)
+        self.assertEqual([r["content"] for i, r in enumerate(results) if i != 3],
+                         [f"echo sleep:{0.05 * (10 - i)}" for i in range(10) if i != 3])
+        with self.assertRaises(Exception):
+            await gather_requests(self.client, requests, return_exceptions=False)
+
+    async def test_pool_size_limits_connections(self):
+        """测试同时使用的连接数不超过pool_size，concurrency进一步限制并发"""
+        client = AsyncQianwenClient(self.server.base_url, pool=AsyncConnectionPool(pool_size=3))
+        results = await gather_requests(client, [{"content": "sleep:0.02"}] * 12)
+        self.assertEqual(len(results), 12)
+        self.assertEqual(client.pool.connections_opened, 3)
+        await client.aclose()
+
+        client = AsyncQianwenClient(self.server.base_url)
+        await gather_requests(client, [{"content": "sleep:0.02"}] * 12, concurrency=2)
+        self.assertEqual(client.pool.connections_opened, 2)
+        await client.aclose()
+
+class TestAsyncMockQianwenClient(unittest.IsolatedAsyncioTestCase):
+    """测试模拟异步客户端"""
+
+    async def test_same_responses_as_sync_mock(self):
+        """测试响应与MockQianwenClient一致"""
+        async with AsyncMockQianwenClient() as client:
+            response = await client.send_request({"content": "9"})
+            self.assertEqual(len(response["tool_calls"]), 2)
+            response = await client.send_request({"messages": [{"role": "user", "content": "1"}]})
+            self.assertIn("tool_calls", response)
+            self.assertEqual(client.call_count, 2)
+
+    async def test_fan_out_does_not_block(self):
+        """测试模拟延迟不阻塞事件循环，数百个请求可以同时进行"""
+        client = AsyncMockQianwenClient(latency=0.1)
+        started = time.monotonic()
+        results = await gather_requests(client, [{"content": "1"}] * 300)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(len(results), 300)
+        self.assertEqual(client.call_count, 300)
+
+    async def test_simulated_timeout(self):
+        """测试输入7时异步等待，超过timeout时抛出超时错误"""
+        client = AsyncMockQianwenClient()
+        started = time.monotonic()
+        with self.assertRaises(Exception) as context:
+            await client.send_request({"content": "7"}, timeout=0.05)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(str(context.exception), "发送请求失败: Request timed out")
+
+if __name__ == '__main__':
+    unittest.main()
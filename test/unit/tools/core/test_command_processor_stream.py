@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试命令处理器的流式大模型响应处理
+"""
+
+import unittest
+import os
+import sys
+from unittest.mock import patch
+
+# 添加tools目录到Python路径（command_processor使用包内相对导入）
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools')))
+
+from core.command_processor import CommandProcessor
+
+
+class FakeStreamClient:
+    """按顺序返回预置事件的流式客户端，记录每个事件被取走时已经输出的消息数"""
+
+    def __init__(self, events, outputs):
+        self.events = events
+        self.outputs = outputs
+        self.consumed_at = []
+
+    def stream_request(self, data, sequence_id=None):
+        self.request = data
+        for event in self.events:
+            self.consumed_at.append(len(self.outputs))
+            yield event
+
+
+class TestCommandProcessorStream(unittest.TestCase):
+    """测试流式模式下文本增量和工具调用的处理"""
+
+    def setUp(self):
+        self.outputs = []
+        self.processor = CommandProcessor(use_mock=True, stream=True)
+        patcher = patch.object(self.processor.formatter, 'output_json', side_effect=self.outputs.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stream_mode_from_env(self):
+        """测试LLM_STREAM环境变量开启流式模式"""
+        with patch.dict(os.environ, {'LLM_STREAM': '1'}):
+            self.assertTrue(CommandProcessor(use_mock=True).stream)
+        with patch.dict(os.environ, {'LLM_STREAM': ''}):
+            self.assertFalse(CommandProcessor(use_mock=True).stream)
+
+    def test_text_deltas_and_tool_calls(self):
+        """测试文本增量输出为isDelta消息，工具调用拼装完成后立即执行"""
+        client = FakeStreamClient([
+            {"type": "text", "content": "你好"},
+            {"type": "tool_call", "toolCall": {"id": "c0", "name": "output_text", "parameters": {"content": "工具输出"}}},
+            {"type": "text", "content": "结束"},
+            {"type": "finish", "reason": "stop"},
+        ], self.outputs)
+        self.processor.llm_client = client
+        with patch('core.command_processor.STREAM_FLUSH_INTERVAL', 0):
+            results = self.processor.process_command("qianwen 你好", "s1")
+
+        deltas = [m for m in self.outputs if m.get("isDelta")]
+        self.assertEqual([m["content"] for m in deltas], ["你好", "结束"])
+        self.assertTrue(all(m["type"] == "text" and m["sequenceId"] == "s1" for m in deltas))
+        texts = [m["content"] for m in self.outputs if m["type"] == "text" and not m.get("isDelta")]
+        self.assertIn("工具输出", texts)
+        # 取走第三个事件之前，工具调用已经执行并输出
+        tool_output_index = next(i for i, m in enumerate(self.outputs) if m.get("content") == "工具输出")
+        self.assertLess(tool_output_index, client.consumed_at[2])
+        self.assertEqual(len(results), 1)
+        self.assertEqual(self.outputs[-1]["content"]["current"], 100)
+
+    def test_deltas_are_coalesced(self):
+        """测试合并间隔内到达的增量合并为一条消息"""
+        self.processor.llm_client = FakeStreamClient(
+            [{"type": "text", "content": c} for c in "abcdef"], self.outputs)
+        with patch('core.command_processor.STREAM_FLUSH_INTERVAL', 60):
+            result = self.processor.process_command("qianwen hi", "s2")
+
+        deltas = [m["content"] for m in self.outputs if m.get("isDelta")]
+        self.assertEqual(deltas, ["abcdef"])
+        self.assertEqual(result, {"content": "abcdef"})
+
+    def test_mock_client_stream(self):
+        """测试模拟客户端的流式响应"""
+        result = self.processor.process_command("qianwen 你好", "s3")
+
+        self.assertEqual(len(result), 1)
+        self.assertTrue(any(m["content"] == "这是通过工具调用生成的响应" for m in self.outputs if m["type"] == "text"))
+
+    def test_stream_error_event(self):
+        """测试无法解析的工具调用输出错误，不中断后续处理"""
+        self.processor.llm_client = FakeStreamClient([
+            {"type": "error", "content": "工具调用x的参数不是合法的JSON"},
+            {"type": "text", "content": "继续"},
+        ], self.outputs)
+        self.processor.process_command("qianwen hi", "s4")
+
+        self.assertTrue(any(m["isError"] for m in self.outputs))
+        self.assertTrue(any(m.get("isDelta") and m["content"] == "继续" for m in self.outputs))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试多轮会话存储模块
+"""
+
+import unittest
+import os
+import sys
+import json
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+# 添加tools目录到Python路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools')))
+
+from core.conversation_store import (
+    MESSAGE_OVERHEAD, ConversationStore, estimate_tokens, message_tokens, open_conversation_store
+)
+from core.llm_cache import cache_key
+from core.llm_client import encode_request
+
+class TestTokenEstimate(unittest.TestCase):
+    """测试token数估算"""
+
+    def test_estimate(self):
+        """测试中文按字符计数，其余字符约4个字符1个token"""
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("你好世界"), 4)
+        self.assertEqual(estimate_tokens("hello world!"), 3)
+        self.assertEqual(estimate_tokens("你好 abc"), 3)
+        self.assertEqual(message_tokens({"role": "user", "content": "你好"}), MESSAGE_OVERHEAD + 2)
+
+class TestConversationStore(unittest.TestCase):
+    """测试会话窗口的构建和两级存储"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'conversations.sqlite3')
+        # 每条"消息N"（2个等宽字符加1个数字）估算为4 + 3 = 7个token
+        self.store = ConversationStore(self.path, token_budget=40, max_conversations=2)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def fill(self, conversation_id, count):
+        for i in range(count):
+            self.store.append(conversation_id, "user" if i % 2 == 0 else "assistant", f"消息{i}")
+
+    def test_window_keeps_latest_messages_within_budget(self):
+        """测试窗口只包含预算内的最近消息，顺序不变"""
+        self.fill("c1", 10)
+        window = self.store.window("c1")
+        self.assertEqual([m["content"] for m in window], [f"消息{i}" for i in range(5, 10)])
+        self.assertEqual(window.tokens, 35)
+        self.assertEqual(window[0]["role"], "assistant")
+        self.assertEqual([m["content"] for m in self.store.window("c1", token_budget=14)], ["消息8", "消息9"])
+        # 超过预算的单条消息仍然发送
+        self.store.append("c1", "user", "长" * 100)
+        self.assertEqual(len(self.store.window("c1")), 1)
+        # 全部历史保留在文件中
+        self.assertEqual(len(self.store.history("c1")), 11)
+
+    def test_pending_messages_are_not_stored(self):
+        """测试pending消息计入窗口预算但不保存，extend一起保存多条消息"""
+        self.fill("c1", 10)
+        pending = {"role": "user", "content": "消息10"}
+        window = self.store.window("c1", pending=[pending])
+        self.assertEqual([m["content"] for m in window], [f"消息{i}" for i in range(6, 11)])
+        self.assertEqual(len(self.store.history("c1")), 10)
+        self.store.extend("c1", [pending, {"role": "assistant", "content": "消息11"}])
+        self.assertEqual([m["content"] for m in self.store.history("c1")[-2:]], ["消息10", "消息11"])
+        self.assertEqual(self.store.window("c1")[-1]["content"], "消息11")
+
+    def test_window_is_pre_encoded(self):
+        """测试窗口带有拼接好的JSON文本和内容哈希，修改返回的消息不影响存储内容"""
+        self.fill("c1", 3)
+        window = self.store.window("c1")
+        self.assertEqual(json.loads(window.json_text), list(window))
+        payload = {"model": "qwen", "messages": window}
+        self.assertEqual(json.loads(encode_request(payload)), json.loads(json.dumps(payload)))
+        self.assertEqual(window.version, self.store.window("c1").version)
+        self.assertEqual(cache_key(payload), cache_key({"model": "qwen", "messages": self.store.window("c1")}))
+        window[0]["content"] = "改"
+        self.assertEqual(self.store.window("c1")[0]["content"], "消息0")
+
+    def test_evicted_conversation_reloads_only_the_window(self):
+        """测试被挤出进程内存储的会话从文件读取窗口，序号继续递增"""
+        self.fill("c1", 10)
+        self.fill("c2", 1)
+        self.fill("c3", 1)
+        self.assertEqual(self.store.stats()["evictions"], 1)
+        self.assertEqual([m["content"] for m in self.store.window("c1")], [f"消息{i}" for i in range(5, 10)])
+        self.assertEqual(self.store.stats()["disk_loads"], 1)
+        self.store.append("c1", "user", "消息X")
+        self.assertEqual(self.store.history("c1")[-1]["content"], "消息X")
+
+        # 其他进程打开同一文件得到相同的窗口
+        other = ConversationStore(self.path, token_budget=40)
+        try:
+            self.assertEqual([m["content"] for m in other.window("c1")][-1], "消息X")
+        finally:
+            other.close()
+
+    def test_shared_file_between_processes(self):
+        """测试两个存储（如REST服务和interactive_tool）交替追加同一会话，序号不冲突，窗口包含对方的消息"""
+        other = ConversationStore(self.path, token_budget=40)
+        try:
+            self.store.append("c1", "user", "消息0")
+            other.append("c1", "assistant", "消息1")
+            self.store.append("c1", "user", "消息2")
+            other.append("c1", "assistant", "消息3")
+            expected = [f"消息{i}" for i in range(4)]
+            self.assertEqual([m["content"] for m in self.store.history("c1")], expected)
+            self.assertEqual([m["content"] for m in self.store.window("c1")], expected)
+            self.assertEqual([m["content"] for m in other.window("c1")], expected)
+        finally:
+            other.close()
+
+    def test_failed_write_leaves_window_unchanged(self):
+        """测试写入文件失败时消息不加入进程内的窗口"""
+        self.fill("c1", 2)
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TRIGGER reject BEFORE INSERT ON messages WHEN NEW.message LIKE '%坏%' "
+                     "BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+        conn.commit()
+        conn.close()
+        with self.assertRaises(sqlite3.DatabaseError):
+            self.store.extend("c1", [{"role": "user", "content": "好"}, {"role": "assistant", "content": "坏"}])
+        self.assertEqual([m["content"] for m in self.store.window("c1")], ["消息0", "消息1"])
+        self.assertEqual(len(self.store.history("c1")), 2)
+        self.store.append("c1", "user", "消息2")
+        self.assertEqual([m["content"] for m in self.store.window("c1")], ["消息0", "消息1", "消息2"])
+
+    def test_memory_only_and_delete(self):
+        """测试只使用进程内存储和删除会话"""
+        store = ConversationStore(token_budget=40)
+        store.append("c1", "user", "你好")
+        self.assertEqual(store.history("c1"), [{"role": "user", "content": "你好"}])
+        store.delete("c1")
+        self.assertEqual(list(store.window("c1")), [])
+        self.fill("c1", 2)
+        self.store.delete("c1")
+        self.assertEqual(self.store.history("c1"), [])
+
+    def test_ttl(self):
+        """测试超过TTL没有新消息的会话在打开文件时清理"""
+        self.fill("c1", 2)
+        self.store.close()
+        conn = sqlite3.connect(self.path)
+        conn.execute('UPDATE conversations SET updated = 0')
+        conn.commit()
+        conn.close()
+        self.store = ConversationStore(self.path, token_budget=40)
+        self.assertEqual(self.store.history("c1"), [])
+
+class TestCommandProcessorConversation(unittest.TestCase):
+    """测试命令处理器发送多轮会话的消息"""
+
+    def test_requests_carry_history(self):
+        """测试同一会话的后续请求带上之前的用户消息和回复"""
+        from core.command_processor import CommandProcessor
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'conversations.sqlite3')
+            with patch.dict(os.environ, {'LLM_CONVERSATION_DB': path}):
+                processor = CommandProcessor(use_mock=True, stream=False, conversation_id="session")
+            sent = []
+            original = processor.llm_client.send_request
+
+            def send(data, sequence_id=None):
+                sent.append([dict(m) for m in data["messages"]])
+                return original(data, sequence_id)
+
+            processor.llm_client.send_request = send
+            with patch('builtins.print'):
+                processor.process_command("你好", "s1")
+                processor.process_command("9", "s2")
+            self.assertEqual(sent[0], [{"role": "user", "content": "你好"}])
+            self.assertEqual([m["role"] for m in sent[1]], ["user", "assistant", "user"])
+            self.assertEqual(sent[1][-1]["content"], "9")
+            history = processor.conversations.history("session")
+            self.assertIn("[调用工具] output_text", history[-1]["content"])
+            self.assertIs(open_conversation_store(path), processor.conversations)
+            processor.conversations.close()
+
+    def test_failed_request_is_not_stored(self):
+        """测试调用失败时本轮的用户消息不保存，下一轮不会发送连续的用户消息"""
+        from core.command_processor import CommandProcessor
+        processor = CommandProcessor(use_mock=True, stream=False)
+        sent = []
+        original = processor.llm_client.send_request
+
+        def send(data, sequence_id=None):
+            sent.append([dict(m) for m in data["messages"]])
+            if len(sent) == 1:
+                raise Exception("上游错误")
+            return original(data, sequence_id)
+
+        processor.llm_client.send_request = send
+        with patch('builtins.print'):
+            processor.process_command("失败的问题", "s1")
+            processor.process_command("你好", "s2")
+        self.assertEqual(sent[1], [{"role": "user", "content": "你好"}])
+        self.assertEqual([m["role"] for m in processor.conversations.history(processor.conversation_id)],
+                         ["user", "assistant"])
+
+if __name__ == '__main__':
+    unittest.main()
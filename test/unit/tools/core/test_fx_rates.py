@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试本地汇率表模块
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+# 添加tools目录到Python路径（fx_rates使用包内相对导入）
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools')))
+
+from core.fx_rates import (
+    RATE_SCALE, FxNormalizer, FxRateError, FxRateTable, format_date, load_rate_table, main,
+    parse_date, parse_rate, write_rate_file
+)
+from core.amount_processor import AmountRecordError, iter_amount_rows
+from core.amount_engine import AmountBatch
+
+RATES = [
+    ("USD", "2024-01-01", "7.1"),
+    ("USD", "2024-02-01", "7.2"),
+    ("USD", "2024-03-01", "7.15"),
+    ("JPY", "2024-01-01", "0.048"),
+    ("KWD", "2024-01-01", "23.1234567891"),
+    ("EUR", "20240115", "7.8"),
+]
+
+class TestFxRates(unittest.TestCase):
+    """测试汇率文件读写与换算"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'rates.fxr')
+        write_rate_file(self.path, 'cny', RATES)
+        self.table = FxRateTable(self.path)
+
+    def tearDown(self):
+        self.table.close()
+        self.tmpdir.cleanup()
+
+    def test_parse_helpers(self):
+        """测试日期和汇率解析"""
+        self.assertEqual(parse_date("2024-01-31"), 20240131)
+        self.assertEqual(parse_date("20240131"), 20240131)
+        self.assertEqual(format_date(20240131), "2024-01-31")
+        self.assertEqual(parse_date("2024-02-29"), 20240229)
+        for value in ("2024-13-01", "yesterday", "2024/01/01", "2024-02-31", "2023-04-31", "2023-02-29", "2024-01-00"):
+            with self.assertRaises(AmountRecordError):
+                parse_date(value)
+        self.assertEqual(parse_rate("7.1"), 71 * RATE_SCALE // 10)
+        for value in ("0", "-1", "abc", "NaN"):
+            with self.assertRaises(FxRateError):
+                parse_rate(value)
+
+    def test_as_of_lookup(self):
+        """测试按日期查找当日或之前最近一天的汇率"""
+        self.assertEqual(self.table.base, "CNY")
+        self.assertEqual(self.table.count, len(RATES))
+        self.assertEqual(self.table.rate("USD", 20240101), parse_rate("7.1"))
+        self.assertEqual(self.table.rate("USD", 20240215), parse_rate("7.2"))
+        self.assertEqual(self.table.rate("USD"), parse_rate("7.15"))
+        self.assertEqual(self.table.rate("EUR", 20240115), parse_rate("7.8"))
+        self.assertEqual(self.table.rate("CNY", 20000101), RATE_SCALE)
+        with self.assertRaises(FxRateError):
+            self.table.rate("USD", 20231231)
+        with self.assertRaises(FxRateError):
+            self.table.rate("GBP")
+        with self.assertRaises(FxRateError):
+            self.table.rate("EUR", 20240114)
+
+    def test_rates_are_memoized(self):
+        """测试同一(币种, 日期)只查找一次"""
+        with patch.object(self.table, '_lookup', wraps=self.table._lookup) as lookup:
+            for _ in range(100):
+                self.table.rate("USD", 20240215)
+            self.table.rate("USD", 20240216)
+        self.assertEqual(lookup.call_count, 2)
+
+    def test_convert_is_exact(self):
+        """测试换算使用整数运算并按银行家舍入"""
+        self.assertEqual(self.table.convert_minor_units(1000, "USD", 20240101), 7100)
+        self.assertEqual(self.table.convert_minor_units(1000, "JPY", 20240101), 4800)
+        self.assertEqual(self.table.convert_minor_units(1, "KWD", 20240101), 2)
+        self.assertEqual(self.table.convert_minor_units(-1000, "USD", 20240101), -7100)
+        # 0.5分向偶数舍入
+        write_rate_file(self.path, 'CNY', [("USD", "2024-01-01", "0.5")])
+        table = FxRateTable(self.path)
+        try:
+            self.assertEqual(table.convert_minor_units(1, "USD", 20240101), 0)
+            self.assertEqual(table.convert_minor_units(3, "USD", 20240101), 2)
+            self.assertEqual(table.convert_minor_units(-1, "USD", 20240101), 0)
+        finally:
+            table.close()
+
+    def test_invalid_file(self):
+        """测试无效的汇率文件"""
+        bad = os.path.join(self.tmpdir.name, 'bad.fxr')
+        with open(bad, 'wb') as f:
+            f.write(b'not a rate file')
+        with self.assertRaises(FxRateError):
+            FxRateTable(bad)
+        empty = os.path.join(self.tmpdir.name, 'empty.fxr')
+        open(empty, 'wb').close()
+        with self.assertRaises(FxRateError):
+            load_rate_table(empty)
+        with self.assertRaises(FxRateError):
+            load_rate_table(os.path.join(self.tmpdir.name, 'missing.fxr'))
+
+    def test_table_loaded_once(self):
+        """测试同一文件在进程内只加载一次，文件替换后重新加载"""
+        first = load_rate_table(self.path)
+        self.assertIs(load_rate_table(self.path), first)
+        write_rate_file(self.path, 'CNY', [("USD", "2024-01-01", "8")])
+        os.utime(self.path, ns=(0, os.stat(self.path).st_mtime_ns + 10 ** 9))
+        second = load_rate_table(self.path)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.rate("USD"), parse_rate("8"))
+        # 仍持有旧汇率表的请求可以继续查询
+        self.assertEqual(first.rate("EUR"), parse_rate("7.8"))
+
+    def test_normalizer_with_rows(self):
+        """测试批量记录换算为基准币种，缺少汇率的记录标记为错误"""
+        normalizer = FxNormalizer(self.table, default_date="2024-01-15")
+        records = [
+            {"amount": "10", "currency": "USD"},
+            {"amount": "10", "currency": "USD", "date": "2024-02-10"},
+            {"amount": "1000", "currency": "JPY", "date": 20240105},
+            {"amount": "1", "currency": "GBP"},
+            {"amount": "2.50"},
+        ]
+        rows = list(iter_amount_rows(records, convert=normalizer))
+        self.assertEqual([row[6] for row in rows], ["71.00", "72.00", "48.00", "", "2.50"])
+        self.assertEqual(rows[3][4], "error")
+        self.assertEqual(normalizer.batch.totals(), {"CNY": 19350})
+
+    def test_rejected_rows_are_not_converted(self):
+        """测试追加到batch失败的记录不计入基准币种汇总，换算失败的记录从batch中移除"""
+        path = os.path.join(self.tmpdir.name, 'small.fxr')
+        write_rate_file(path, 'CNY', [("IDR", "2024-01-01", "0.0004")])
+        table = FxRateTable(path)
+        try:
+            normalizer = FxNormalizer(table)
+            batch = AmountBatch()
+            records = [
+                {"amount": "100000", "currency": "IDR"},
+                # 超出batch的int64范围，但按汇率换算后不超出
+                {"amount": "1e19", "currency": "IDR"},
+                {"amount": "5", "currency": "USD"},
+            ]
+            rows = list(iter_amount_rows(records, batch=batch, convert=normalizer))
+            self.assertEqual([row[4] for row in rows], ["ok", "error", "error"])
+            self.assertEqual(normalizer.batch.totals(), {"CNY": 4000})
+            self.assertEqual(batch.totals(), {"IDR": 10000000})
+        finally:
+            table.close()
+
+    def test_build_command(self):
+        """测试由CSV生成汇率文件的命令"""
+        csv_path = os.path.join(self.tmpdir.name, 'rates.csv')
+        out_path = os.path.join(self.tmpdir.name, 'built.fxr')
+        with open(csv_path, 'w', encoding='utf-8') as f:
+            f.write('date,currency,rate\n2024-01-01,usd,7.1\n2024-01-01,USD,7.3\n')
+        with patch('builtins.print'):
+            self.assertEqual(main(['build', csv_path, out_path, '--base', 'CNY']), 0)
+        table = FxRateTable(out_path)
+        try:
+            self.assertEqual(table.count, 1)
+            self.assertEqual(table.rate("USD"), parse_rate("7.3"))
+        finally:
+            table.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试金额提交幂等存储模块
+"""
+
+import unittest
+import os
+import sys
+import sqlite3
+import tempfile
+import threading
+from unittest.mock import patch
+
+# 添加tools目录到Python路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools')))
+
+from core.idempotency_store import IdempotencyStore, content_hash, open_store
+
+MESSAGES = [
+    {"type": "text", "content": "处理人民币金额: 1.00 元", "isError": False, "isEnd": False, "sequenceId": "s1"},
+    {"type": "end", "content": "", "isError": False, "isEnd": True, "sequenceId": "s1"},
+]
+
+class TestIdempotencyStore(unittest.TestCase):
+    """测试幂等存储的读写、过期和清理"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'idem.sqlite3')
+        self.store = IdempotencyStore(self.path, ttl=60, hot_size=2)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_content_hash(self):
+        """测试内容哈希与键顺序和sequenceId无关"""
+        a = content_hash({"amount": "1", "currency": "USD", "sequenceId": "x"})
+        b = content_hash({"currency": "USD", "amount": "1", "sequenceId": "y"})
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, content_hash({"amount": "2", "currency": "USD"}))
+
+    def test_put_and_get(self):
+        """测试保存后按(sequenceId, 哈希)读取，内容不同视为新的提交"""
+        self.assertIsNone(self.store.get("s1", "h1"))
+        self.store.put("s1", "h1", MESSAGES)
+        self.assertEqual(self.store.get("s1", "h1"), MESSAGES)
+        self.assertIsNone(self.store.get("s1", "h2"))
+        # 同一键重复保存以先保存的为准
+        self.store.put("s1", "h1", MESSAGES[:1])
+        self.assertEqual(self.store.get("s1", "h1"), MESSAGES)
+        self.assertEqual(len(self.store), 1)
+
+    def test_wal_and_persistence(self):
+        """测试使用WAL模式，其他连接（进程）可以读到保存的结果"""
+        self.store.put("s1", "h1", MESSAGES)
+        mode = self.store._conn.execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(mode, 'wal')
+        other = IdempotencyStore(self.path, ttl=60)
+        try:
+            self.assertEqual(other.get("s1", "h1"), MESSAGES)
+        finally:
+            other.close()
+
+    def test_hot_cache_skips_database(self):
+        """测试热缓存命中时不查询数据库，超过上限时淘汰最久未使用的条目"""
+        for i in range(3):
+            self.store.put(f"s{i}", "h", MESSAGES)
+        self.assertEqual(list(self.store._hot), [("s1", "h"), ("s2", "h")])
+        with patch.object(self.store, '_conn', wraps=self.store._conn) as conn:
+            self.store.get("s2", "h")
+            conn.execute.assert_not_called()
+            self.assertEqual(self.store.get("s0", "h"), MESSAGES)
+            conn.execute.assert_called_once()
+
+    def test_ttl_and_compaction(self):
+        """测试过期记录视为不存在，compact删除过期记录"""
+        with patch('core.idempotency_store.time.time', return_value=1000.0):
+            self.store.put("old", "h", MESSAGES)
+        self.store.put("new", "h", MESSAGES)
+        self.assertIsNone(self.store.get("old", "h"))
+        self.assertEqual(self.store.compact(), 1)
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(self.store.get("new", "h"), MESSAGES)
+
+    def test_expired_record_is_replaced(self):
+        """测试过期但尚未清理的记录可以被新的结果覆盖"""
+        with patch('core.idempotency_store.time.time', return_value=1000.0):
+            self.store.put("s1", "h", MESSAGES[:1])
+        self.assertTrue(self.store.put("s1", "h", MESSAGES))
+        self.assertEqual(self.store.get("s1", "h"), MESSAGES)
+
+    def test_lookup_uses_primary_key(self):
+        """测试查询走主键而不是全表扫描"""
+        conn = sqlite3.connect(self.path)
+        try:
+            plan = ' '.join(row[-1] for row in conn.execute(
+                'EXPLAIN QUERY PLAN SELECT created, messages FROM submissions '
+                'WHERE sequence_id = ? AND content_hash = ?', ('s', 'h')))
+        finally:
+            conn.close()
+        self.assertIn('PRIMARY KEY', plan)
+        self.assertNotIn('SCAN', plan)
+
+    def test_concurrent_writes(self):
+        """测试多线程并发读写"""
+        def worker(n):
+            for i in range(50):
+                self.store.put(f"t{n}-{i}", "h", MESSAGES)
+                self.assertEqual(self.store.get(f"t{n}-{i}", "h"), MESSAGES)
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.store), 200)
+
+    def test_open_store_once(self):
+        """测试同一文件在进程内只打开一次，TTL不同时报错"""
+        path = os.path.join(self.tmpdir.name, 'shared.sqlite3')
+        first = open_store(path)
+        self.assertIs(open_store(path), first)
+        with self.assertRaises(ValueError):
+            open_store(path, ttl=60)
+        first.close()
+
+    def test_duplicate_waits_for_first_submission(self):
+        """测试第一次提交仍在处理时，重复提交（包括其他连接）等待其保存结果后重放"""
+        self.assertIsNone(self.store.claim("s1", "h"))
+        other = IdempotencyStore(self.path, ttl=60)
+        results = []
+        try:
+            waiter = threading.Thread(target=lambda: results.append(other.claim("s1", "h")))
+            waiter.start()
+            waiter.join(0.2)
+            self.assertTrue(waiter.is_alive())
+            self.store.put("s1", "h", MESSAGES)
+            self.store.release("s1", "h")
+            waiter.join(2)
+            self.assertEqual(results, [MESSAGES])
+        finally:
+            other.close()
+
+    def test_claim_after_unsaved_or_stale_processing(self):
+        """测试处理方没有保存结果就释放，或登记超时后，等待方取得处理权"""
+        self.assertIsNone(self.store.claim("s1", "h"))
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(self.store.claim("s1", "h")))
+        waiter.start()
+        self.store.release("s1", "h")
+        waiter.join(2)
+        self.assertEqual(results, [None])
+        # 登记超过claim_timeout视为处理方已退出
+        self.store.claim_timeout = 0.1
+        self.assertIsNone(self.store.claim("s1", "h"))
+
+if __name__ == '__main__':
+    unittest.main()
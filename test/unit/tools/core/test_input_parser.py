@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试工具输入解析模块
+包含以tools/test_json.py中的用例为种子的模糊测试语料
+"""
+
+import unittest
+import importlib.util
+import json
+import os
+import random
+import sys
+
+# 添加core目录到Python路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools/core')))
+
+from input_parser import parse_tool_input
+
+# 种子语料来自tools/test_json.py
+_TOOLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools'))
+_spec = importlib.util.spec_from_file_location("tools_test_json", os.path.join(_TOOLS_DIR, "test_json.py"))
+tools_test_json = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(tools_test_json)
+SEED_CASES = tools_test_json.TEST_CASES
+
+# 模糊测试中用于生成值和变异的字符
+VALUE_CHARS = 'abcXYZ019 _-./:,\\"\'{}[]中文\t'
+BARE_VALUE_CHARS = 'abcXYZ019 _-./\\'
+MUTATION_CHARS = '{}[]:,"\\ \'\nab1'
+
+
+def over_escape(text):
+    """模拟命令行多保留一层转义：反斜杠和双引号前各加一个反斜杠"""
+    return text.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def random_string(rng, alphabet, max_len=12):
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, max_len)))
+
+
+def random_record(rng):
+    keys = ['content', 'projectDir', 'sequenceId', 'amount', 'currency', 'trace']
+    rng.shuffle(keys)
+    return {key: random_string(rng, VALUE_CHARS) for key in keys[:rng.randint(1, len(keys))]}
+
+
+class TestParseToolInput(unittest.TestCase):
+    """测试工具输入解析"""
+
+    def test_seed_cases(self):
+        """测试test_json.py中的各种格式都解析为同一结果"""
+        for case in SEED_CASES:
+            self.assertEqual(parse_tool_input(case), {"content": "dir", "projectDir": ""}, case)
+
+    def test_raw_command_returns_none(self):
+        """测试非JSON结构的输入返回None"""
+        for case in ['ls -la', '', '   ', 'echo {a}', '{broken', '{"content": "x"', '{content}']:
+            self.assertIsNone(parse_tool_input(case), case)
+
+    def test_backslashes_are_preserved(self):
+        """测试值中的反斜杠不会像旧逻辑那样被全部去掉"""
+        self.assertEqual(parse_tool_input(r'{"projectDir":"C:\Users\me"}'), {"projectDir": "C:\\Users\\me"})
+        self.assertEqual(parse_tool_input(r'{\"projectDir\":\"C:\\\\Users\"}'), {"projectDir": "C:\\Users"})
+        self.assertEqual(parse_tool_input(r'{content:dir,projectDir:C:\Users\me}'),
+                         {"content": "dir", "projectDir": "C:\\Users\\me"})
+
+    def test_commas_in_bare_values(self):
+        """测试无引号格式中值里的逗号只在后面紧跟键时才作为分隔符"""
+        self.assertEqual(parse_tool_input('{content:echo a,b,projectDir:/tmp}'),
+                         {"content": "echo a,b", "projectDir": "/tmp"})
+        self.assertEqual(parse_tool_input('{amount:1,000.50,currency:CNY}'),
+                         {"amount": "1,000.50", "currency": "CNY"})
+        self.assertEqual(parse_tool_input('{content:echo {a},sequenceId:s-1}'),
+                         {"content": "echo {a}", "sequenceId": "s-1"})
+
+    def test_bare_literals_and_arrays(self):
+        """测试无引号的true/false/null和数组"""
+        self.assertEqual(parse_tool_input('{trace:true,follow:false,x:null}'),
+                         {"trace": True, "follow": False, "x": None})
+        self.assertEqual(parse_tool_input('[{amount:1,currency:USD},{amount:2,currency:CNY}]'),
+                         [{"amount": "1", "currency": "USD"}, {"amount": "2", "currency": "CNY"}])
+
+    def test_unicode_escapes(self):
+        """测试多一层转义的\\u转义和代理对"""
+        text = over_escape(json.dumps({"content": "中文 😀"}))
+        self.assertEqual(parse_tool_input(text), {"content": "中文 😀"})
+
+    def test_fuzz_round_trip(self):
+        """模糊测试：随机记录的标准JSON和多一层转义形式都能还原"""
+        rng = random.Random(20240601)
+        for _ in range(500):
+            record = random_record(rng)
+            for ensure_ascii in (True, False):
+                strict = json.dumps(record, ensure_ascii=ensure_ascii)
+                self.assertEqual(parse_tool_input(strict), record, strict)
+                escaped = over_escape(strict)
+                self.assertEqual(parse_tool_input(escaped), record, escaped)
+
+    def test_fuzz_bare_round_trip(self):
+        """模糊测试：无引号格式的随机记录能还原（值首尾空白会被去掉）"""
+        rng = random.Random(20240602)
+        for _ in range(500):
+            record = {key: random_string(rng, BARE_VALUE_CHARS).strip()
+                      for key in ['content', 'projectDir', 'sequenceId'][:rng.randint(1, 3)]}
+            text = '{' + ','.join(f'{key}:{value}' for key, value in record.items()) + '}'
+            self.assertEqual(parse_tool_input(text), record, text)
+
+    def test_fuzz_mutations_never_raise(self):
+        """模糊测试：对种子语料随机变异，解析结果只能是None、dict或list，不抛出异常"""
+        rng = random.Random(20240603)
+        corpus = list(SEED_CASES) + [over_escape(json.dumps(random_record(rng))) for _ in range(20)]
+        for _ in range(3000):
+            chars = list(rng.choice(corpus))
+            for _ in range(rng.randint(1, 4)):
+                op = rng.randint(0, 2)
+                index = rng.randint(0, len(chars))
+                if op == 0 and chars:
+                    del chars[min(index, len(chars) - 1)]
+                elif op == 1:
+                    chars.insert(index, rng.choice(MUTATION_CHARS))
+                elif chars:
+                    chars[min(index, len(chars) - 1)] = rng.choice(MUTATION_CHARS)
+            text = ''.join(chars)
+            result = parse_tool_input(text)
+            self.assertIn(type(result), (type(None), dict, list), text)
+
+    def test_large_input(self):
+        """测试大输入不会因递归或重复扫描而失败"""
+        value = 'x\\' * 100000
+        self.assertEqual(parse_tool_input(over_escape(json.dumps({"content": value}))), {"content": value})
+        self.assertEqual(parse_tool_input('{content:' + 'a,1' * 50000 + '}'), {"content": 'a,1' * 50000})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试大模型响应缓存模块
+"""
+
+import unittest
+import os
+import sys
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+# 添加tools目录到Python路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools')))
+
+from core.llm_cache import CachedLLMClient, ResponseCache, bypass_reason, cache_key, open_cache
+from core.llm_client import RequestMetrics
+from core.mock_llm import MockQianwenClient
+
+TOOLS = [
+    {"type": "function", "function": {"name": "output_text", "parameters": {}}},
+    {"type": "function", "function": {"name": "output_table", "parameters": {}}},
+]
+
+def request(content, **extra):
+    return dict({"messages": [{"role": "user", "content": content}]}, **extra)
+
+class TestCacheKey(unittest.TestCase):
+    """测试缓存键和绕过规则"""
+
+    def test_canonical_key(self):
+        """测试字段顺序、tools顺序和传输字段不影响缓存键"""
+        a = cache_key({"model": "qwen", "messages": [{"role": "user", "content": "1"}], "tools": TOOLS})
+        b = cache_key({"tools": TOOLS[::-1], "messages": [{"content": "1", "role": "user"}], "model": "qwen",
+                       "stream": True})
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, cache_key({"model": "qwen-max", "messages": [{"role": "user", "content": "1"}],
+                                          "tools": TOOLS}))
+        self.assertNotEqual(cache_key(request("1", temperature=0)), cache_key(request("1", temperature=0.5)))
+        self.assertNotEqual(cache_key(request("1")), cache_key(request("1"), 'stream'))
+
+    def test_bypass_rules(self):
+        """测试非确定性采样的请求不使用缓存"""
+        self.assertIsNone(bypass_reason(request("1")))
+        self.assertIsNone(bypass_reason(request("1", temperature=0)))
+        self.assertEqual(bypass_reason(request("1", temperature=0.7)), 'temperature')
+        self.assertIsNone(bypass_reason(request("1", temperature=0.7, seed=42)))
+        self.assertIsNone(bypass_reason(request("1", temperature=0.3), max_temperature=0.5))
+        self.assertEqual(bypass_reason(request("1", n=3)), 'n')
+
+class TestResponseCache(unittest.TestCase):
+    """测试两级缓存的读写、过期和大小预算"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'llm_cache.sqlite3')
+        self.cache = ResponseCache(self.path, ttl=60, hot_size=2)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def test_memory_and_disk_tiers(self):
+        """测试先查进程内缓存，淘汰后从文件读取，其他进程可以读到"""
+        self.assertIsNone(self.cache.get("k1"))
+        self.cache.put("k1", {"content": "一"})
+        self.cache.put("k2", {"content": "二"})
+        self.cache.put("k3", {"content": "三"})
+        self.assertEqual(self.cache.get("k3"), {"content": "三"})
+        # k1已被挤出热缓存，从文件读取
+        self.assertEqual(self.cache.get("k1"), {"content": "一"})
+        stats = self.cache.stats()
+        self.assertEqual((stats["memory_hits"], stats["disk_hits"], stats["misses"]), (1, 1, 1))
+        self.assertAlmostEqual(stats["hit_ratio"], 2 / 3, places=3)
+        self.assertEqual(stats["entries"], 3)
+
+        other = ResponseCache(self.path, ttl=60)
+        try:
+            self.assertEqual(other.get("k2"), {"content": "二"})
+        finally:
+            other.close()
+
+    def test_returns_copies(self):
+        """测试修改返回的响应不影响缓存内容"""
+        self.cache.put("k1", {"tool_calls": [{"name": "output_text"}]})
+        self.cache.get("k1")["tool_calls"].clear()
+        self.assertEqual(len(self.cache.get("k1")["tool_calls"]), 1)
+
+    def test_ttl(self):
+        """测试超过TTL的记录视为不存在，重新打开时清理"""
+        self.cache.put("k1", {"content": "一"})
+        with patch('core.llm_cache.time.time', return_value=self.cache._hot["k1"][0] + 61):
+            self.assertIsNone(self.cache.get("k1"))
+        self.cache.close()
+        conn = sqlite3.connect(self.path)
+        conn.execute('UPDATE responses SET created = 0')
+        conn.commit()
+        conn.close()
+        self.cache = ResponseCache(self.path, ttl=60)
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_size_budget_evicts_least_recently_used(self):
+        """测试文件中的总大小超过预算时按最近使用时间淘汰"""
+        cache = ResponseCache(os.path.join(self.tmpdir.name, 'small.sqlite3'), max_bytes=1000, hot_size=0)
+        try:
+            for i in range(4):
+                with patch('core.llm_cache.time.time', return_value=1000.0 + i):
+                    cache.put(f"k{i}", {"content": "x" * 200})
+            with patch('core.llm_cache.time.time', return_value=1010.0):
+                cache.get("k0")
+            with patch('core.llm_cache.time.time', return_value=1011.0):
+                cache.put("k4", {"content": "x" * 200})
+                self.assertIsNotNone(cache.get("k0"))
+                self.assertIsNone(cache.get("k1"))
+            stats = cache.stats()
+            self.assertLessEqual(stats["bytes"], 1000)
+            self.assertGreater(stats["evictions"], 0)
+        finally:
+            cache.close()
+
+    def test_open_cache_once(self):
+        """测试同一文件在进程内只打开一次"""
+        path = os.path.join(self.tmpdir.name, 'shared.sqlite3')
+        self.assertIs(open_cache(path), open_cache(path))
+
+class TestCachedLLMClient(unittest.TestCase):
+    """测试在客户端前面使用缓存"""
+
+    def setUp(self):
+        self.mock = MockQianwenClient()
+        self.metrics = RequestMetrics()
+        self.client = CachedLLMClient(self.mock, ResponseCache(), metrics=self.metrics)
+
+    def test_repeated_prompt_hits_cache(self):
+        """测试相同的提示词只请求一次，命中率计入统计"""
+        first = self.client.send_request(request("9"))
+        for _ in range(3):
+            self.assertEqual(self.client.send_request(request("9")), first)
+        self.assertEqual(self.mock.call_count, 1)
+        # 其余属性使用被包装的客户端
+        self.assertEqual(self.client.call_count, 1)
+        counters = self.metrics.snapshot()["counters"]
+        self.assertEqual((counters["cache_miss"], counters["cache_hit"]), (1, 3))
+        self.assertEqual(self.client.cache.stats()["hit_ratio"], 0.75)
+
+    def test_errors_and_sampling_are_not_cached(self):
+        """测试出错的响应不缓存，非确定性采样的请求直接发送"""
+        self.client.send_request(request("8"))
+        self.client.send_request(request("8"))
+        self.client.send_request(request("1", temperature=0.8))
+        self.client.send_request(request("1", temperature=0.8))
+        self.assertEqual(self.mock.call_count, 4)
+        self.assertEqual(self.metrics.snapshot()["counters"]["cache_bypass"], 2)
+
+    def test_stream_events_are_replayed(self):
+        """测试流式请求的事件序列被缓存并按原顺序重放"""
+        events = list(self.client.stream_request(request("9")))
+        self.assertEqual(list(self.client.stream_request(request("9"))), events)
+        self.assertEqual(self.mock.call_count, 1)
+        self.assertEqual(events[-1]["type"], "finish")
+        # 普通请求与流式请求分别缓存
+        self.client.send_request(request("9"))
+        self.assertEqual(self.mock.call_count, 2)
+
+    def test_command_processor_uses_cache(self):
+        """测试设置LLM_CACHE_DB后命令处理器在客户端前面使用缓存"""
+        from core.command_processor import CommandProcessor
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with patch.dict(os.environ, {'LLM_CACHE_DB': os.path.join(tmpdir, 'cache.sqlite3')}):
+                processor = CommandProcessor(use_mock=True)
+            self.assertIsInstance(processor.llm_client, CachedLLMClient)
+            self.assertIsInstance(processor.llm_client.client, MockQianwenClient)
+            processor.llm_client.cache.close()
+        with patch.dict(os.environ, {'LLM_CACHE_DB': ''}):
+            self.assertIsInstance(CommandProcessor(use_mock=True).llm_client, MockQianwenClient)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,11 +10,17 @@ from unittest.mock import patch, MagicMock
 import json
 import os
 import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # 添加core目录到Python路径
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools/core')))
 
-from llm_client import QianwenClient
+import llm_client
+from llm_client import (
+    CircuitBreaker, HedgePolicy, QianwenClient, RequestMetrics, RetryPolicy, ToolCallAssembler,
+    close_shared_sessions, get_shared_session, iter_sse_data, response_events
+)
 
 class TestQianwenClient(unittest.TestCase):
     """测试千问大模型客户端"""
@@ -25,7 +31,7 @@ class TestQianwenClient(unittest.TestCase):
         self.api_key = "test-api-key"
         self.client = QianwenClient(self.base_url, self.api_key)
     
-    @patch('llm_client.requests.post')
+    @patch('llm_client.requests.Session.post')
     def test_send_request_success(self, mock_post):
         """测试发送请求成功的情况"""
         # 设置模拟响应
@@ -57,7 +63,7 @@ class TestQianwenClient(unittest.TestCase):
         self.assertEqual(call_args[1]["headers"]["Authorization"], f"Bearer {self.api_key}")
         self.assertEqual(call_args[1]["json"], request_data)
     
-    @patch('llm_client.requests.post')
+    @patch('llm_client.requests.Session.post')
     def test_send_request_with_tools(self, mock_post):
         """测试发送带有工具调用的请求"""
         # 设置模拟响应
@@ -98,7 +104,7 @@ class TestQianwenClient(unittest.TestCase):
         self.assertEqual(len(result["tool_calls"]), 1)
         self.assertEqual(result["tool_calls"][0]["name"], "output_text")
     
-    @patch('llm_client.requests.post')
+    @patch('llm_client.requests.Session.post')
     def test_send_request_api_error(self, mock_post):
         """测试API返回错误的情况"""
         # 设置模拟响应
@@ -123,7 +129,7 @@ class TestQianwenClient(unittest.TestCase):
         self.assertIn("API请求失败", str(context.exception))
         self.assertIn("401", str(context.exception))
     
-    @patch('llm_client.requests.post')
+    @patch('llm_client.requests.Session.post')
     def test_send_request_network_error(self, mock_post):
         """测试网络错误的情况"""
         # 模拟网络错误
@@ -145,7 +151,7 @@ class TestQianwenClient(unittest.TestCase):
         self.assertIn("发送请求失败", str(context.exception))
         self.assertIn("Network Error", str(context.exception))
     
-    @patch('llm_client.requests.post')
+    @patch('llm_client.requests.Session.post')
     def test_send_request_invalid_json(self, mock_post):
         """测试返回无效JSON的情况"""
         # 设置模拟响应
@@ -175,7 +181,7 @@ class TestQianwenClient(unittest.TestCase):
         self.assertEqual(client.base_url, "")
         self.assertEqual(client.api_key, "")
     
-    @patch('llm_client.requests.post')
+    @patch('llm_client.requests.Session.post')
     def test_send_request_with_timeout(self, mock_post):
         """测试请求超时的情况"""
         # 模拟超时错误
@@ -196,5 +202,401 @@ class TestQianwenClient(unittest.TestCase):
         # 验证异常信息
         self.assertIn("发送请求失败", str(context.exception))
 
+class _ChatHandler(BaseHTTPRequestHandler):
+    """本地替身服务：返回固定回复，并记录每个请求来自哪个客户端端口（即哪条连接）"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.client_ports.append(self.client_address[1])
+        body = json.dumps({"content": "ok"}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestSharedSession(unittest.TestCase):
+    """测试共享会话和连接复用"""
+
+    def setUp(self):
+        close_shared_sessions()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _ChatHandler)
+        self.server.client_ports = []
+        threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        close_shared_sessions()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_clients_share_session(self):
+        """测试相同连接池配置的客户端共享会话，配置不同时使用不同的会话"""
+        a = QianwenClient(self.base_url, "")
+        b = QianwenClient(self.base_url, "")
+        self.assertIs(a.session, b.session)
+        self.assertIsNot(QianwenClient(self.base_url, "", pool_size=2).session, a.session)
+        adapter = QianwenClient(self.base_url, "", pool_size=2).session.get_adapter(self.base_url)
+        self.assertEqual(adapter._pool_maxsize, 2)
+
+    def test_connection_is_reused(self):
+        """测试连续请求复用同一条连接"""
+        client = QianwenClient(self.base_url, "")
+        for _ in range(5):
+            self.assertEqual(client.send_request({"messages": []}), {"content": "ok"})
+        self.assertEqual(len(set(self.server.client_ports)), 1)
+
+    def test_keep_alive_disabled(self):
+        """测试关闭keep-alive时每个请求使用新连接"""
+        client = QianwenClient(self.base_url, "", keep_alive=False)
+        for _ in range(3):
+            client.send_request({"messages": []})
+        self.assertEqual(len(set(self.server.client_ports)), 3)
+
+    def test_threads_share_pool(self):
+        """测试多个线程共享会话，连接数不超过连接池大小"""
+        client = QianwenClient(self.base_url, "", pool_size=4)
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(10):
+                    client.send_request({"messages": []})
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.server.client_ports), 40)
+        self.assertLessEqual(len(set(self.server.client_ports)), 4)
+
+    def test_close_shared_sessions(self):
+        """测试关闭后重新创建共享会话，显式传入的会话不受影响"""
+        session = get_shared_session()
+        close_shared_sessions()
+        self.assertIsNot(get_shared_session(), session)
+        own = llm_client.requests.Session()
+        self.assertIs(QianwenClient(self.base_url, "", session=own).session, own)
+        own.close()
+
+def _sse(chunk: dict) -> bytes:
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8')
+
+
+def _delta(**delta) -> dict:
+    return {"choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+
+
+def _tool_delta(index, arguments, name=None, call_id=None) -> dict:
+    call = {"index": index, "function": {"arguments": arguments}}
+    if name:
+        call["function"]["name"] = name
+        call["id"] = call_id or f"call_{index}"
+    return _delta(tool_calls=[call])
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    """本地SSE替身服务：发送第一个事件后等待server.release，再发送其余事件"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.server.requests.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i, event in enumerate(self.server.events):
+            if i == 1:
+                self.server.release.wait(5)
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(event), event))
+            self.wfile.flush()
+        self.wfile.write(b'0\r\n\r\n')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestStreaming(unittest.TestCase):
+    """测试流式响应解析和工具调用拼装"""
+
+    def test_iter_sse_data(self):
+        """测试SSE解析：多行data、注释行、[DONE]"""
+        lines = [b'data: {"a": 1}', b'', b': keep-alive', b'', 'data: line1', 'data: line2', '',
+                 b'data: [DONE]', b'', b'data: ignored', b'']
+        self.assertEqual(list(iter_sse_data(lines)), ['{"a": 1}', 'line1\nline2'])
+        self.assertEqual(list(iter_sse_data(['data:x'])), ['x'])
+
+    def test_assembler_completes_as_soon_as_arguments_parse(self):
+        """测试参数拼成合法JSON对象时立即返回工具调用，不等待流结束"""
+        assembler = ToolCallAssembler()
+        self.assertEqual(assembler.feed([{"index": 0, "id": "c0", "function": {"name": "output_text", "arguments": ""}}]), [])
+        self.assertEqual(assembler.feed([{"index": 0, "function": {"arguments": '{"content": "a}'}}]), [])
+        events = assembler.feed([{"index": 0, "function": {"arguments": '"}'}}])
+        self.assertEqual(events, [{"type": "tool_call",
+                                   "toolCall": {"id": "c0", "name": "output_text", "parameters": {"content": "a}"}}}])
+        self.assertEqual(assembler.finish(), [])
+
+    def test_assembler_next_index_and_finish(self):
+        """测试下一个工具调用开始时前一个视为完整，finish返回其余工具调用，无效参数返回错误"""
+        assembler = ToolCallAssembler()
+        assembler.feed([{"index": 0, "id": "c0", "function": {"name": "end_execution", "arguments": ""}}])
+        events = assembler.feed([{"index": 1, "id": "c1", "function": {"name": "output_text", "arguments": '{"con'}}])
+        self.assertEqual(events[0]["toolCall"], {"id": "c0", "name": "end_execution", "parameters": {}})
+        self.assertEqual(assembler.finish()[0]["type"], "error")
+
+    def test_response_events_fallback(self):
+        """测试一次性响应（简化格式和OpenAI格式）转换为事件"""
+        simple = list(response_events({"content": "hi", "tool_calls": [{"name": "output_text", "parameters": {}}]}))
+        self.assertEqual([e["type"] for e in simple], ["text", "tool_call"])
+        openai = list(response_events({"choices": [{"message": {"content": None, "tool_calls": [
+            {"id": "c", "type": "function", "function": {"name": "output_text", "arguments": '{"content": "x"}'}}]}}]}))
+        self.assertEqual(openai, [{"type": "tool_call",
+                                   "toolCall": {"id": "c", "name": "output_text", "parameters": {"content": "x"}}}])
+
+    def test_stream_request_is_incremental(self):
+        """测试第一个文本增量在服务端发送完全部事件之前就返回给调用方"""
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _StreamHandler)
+        server.requests = []
+        server.release = threading.Event()
+        server.events = [
+            _sse(_delta(role="assistant", content="你好")),
+            _sse(_delta(content="，世界")),
+            _sse(_tool_delta(0, '{"content": ', name="output_text")),
+            _sse(_tool_delta(0, '"done"}')),
+            _sse(_tool_delta(1, '', name="end_execution")),
+            _sse({"choices": [{"index": 0, "delta": {}, "finish_reason": "tool_calls"}]}),
+            b'data: [DONE]\n\n',
+        ]
+        threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        try:
+            client = QianwenClient(f"http://127.0.0.1:{server.server_address[1]}", "", session=llm_client.requests.Session())
+            stream = client.stream_request({"messages": []})
+            self.assertEqual(next(stream), {"type": "text", "content": "你好"})
+            # 第一个事件在服务端继续发送之前已经到达
+            self.assertFalse(server.release.is_set())
+            server.release.set()
+            events = list(stream)
+        finally:
+            server.release.set()
+            server.shutdown()
+            server.server_close()
+        self.assertTrue(server.requests[0]["stream"])
+        self.assertEqual(events[0], {"type": "text", "content": "，世界"})
+        self.assertEqual(events[1]["toolCall"], {"id": "call_0", "name": "output_text", "parameters": {"content": "done"}})
+        self.assertEqual(events[2]["toolCall"]["name"], "end_execution")
+        self.assertEqual(events[3], {"type": "finish", "reason": "tool_calls"})
+
+def _response(status, body=None, headers=None):
+    response = MagicMock()
+    response.status_code = status
+    response.json.return_value = body or {}
+    response.text = json.dumps(body or {})
+    response.headers = headers or {}
+    return response
+
+
+class _FakeLimiter:
+    """记录预约和修正的限流器：acquire排队wait秒，free为False时try_acquire失败"""
+
+    def __init__(self, wait=0.0, free=True):
+        self.wait = wait
+        self.free = free
+        self.available = {}
+        self.calls = []
+
+    def estimate(self, payload):
+        return 100
+
+    def acquire(self, tokens):
+        self.calls.append(("acquire", tokens))
+        threading.Event().wait(self.wait)
+        return self.wait
+
+    def try_acquire(self, tokens):
+        self.calls.append(("try_acquire", tokens))
+        return self.free
+
+    def settle(self, estimated, actual):
+        self.calls.append(("settle", estimated, actual))
+
+
+@patch('llm_client.time.sleep')
+class TestResilience(unittest.TestCase):
+    """测试重试、熔断、对冲请求和统计"""
+
+    def setUp(self):
+        self.metrics = RequestMetrics()
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+
+    def client(self, **kwargs):
+        kwargs.setdefault('retry', RetryPolicy(max_attempts=3))
+        return QianwenClient("http://llm.test/v1", "", breaker=self.breaker, metrics=self.metrics, **kwargs)
+
+    @patch('llm_client.requests.Session.post')
+    def test_retries_retryable_errors(self, mock_post, mock_sleep):
+        """测试连接错误和可重试的状态码按退避重试，成功后返回"""
+        mock_post.side_effect = [
+            llm_client.requests.exceptions.ConnectionError("reset"),
+            _response(503, {"error": "busy"}, {"Retry-After": "1"}),
+            _response(200, {"content": "ok"}),
+        ]
+        self.assertEqual(self.client().send_request({"messages": []}), {"content": "ok"})
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(mock_post.call_args.kwargs['timeout'], 30)
+        # Retry-After不小于1秒
+        self.assertGreaterEqual(mock_sleep.call_args_list[1].args[0], 1)
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot["attempts"], 3)
+        self.assertEqual(snapshot["outcomes"],
+                         {"connection_error": 1, "retryable_status": 1, "success": 1})
+        self.assertEqual(snapshot["counters"]["retries"], 2)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    @patch('llm_client.requests.Session.post')
+    def test_gives_up_after_max_attempts(self, mock_post, mock_sleep):
+        """测试超过最大尝试次数后返回与原来相同的错误，不可重试的状态码不重试"""
+        mock_post.side_effect = llm_client.requests.exceptions.Timeout()
+        with self.assertRaises(Exception) as context:
+            self.client(retry=RetryPolicy(max_attempts=2)).send_request({"messages": []})
+        self.assertEqual(str(context.exception), "发送请求失败: Request timed out")
+        self.assertEqual(mock_post.call_count, 2)
+
+        mock_post.reset_mock(side_effect=True)
+        mock_post.return_value = _response(400, {"error": "bad request"})
+        with self.assertRaises(Exception) as context:
+            self.client().send_request({"messages": []})
+        self.assertIn("HTTP 400", str(context.exception))
+        self.assertEqual(mock_post.call_count, 1)
+
+    def test_backoff_is_bounded(self, mock_sleep):
+        """测试退避时长带随机抖动且不超过上限"""
+        policy = RetryPolicy(backoff_base=0.5, backoff_max=2)
+        for attempt in range(1, 6):
+            delay = policy.backoff(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(2, 0.5 * 2 ** (attempt - 1)))
+        self.assertEqual(policy.backoff(1, "10"), 2)
+        self.assertLessEqual(policy.backoff(1, "Wed, 21 Oct 2015 07:28:00 GMT"), 0.5)
+
+    @patch('llm_client.requests.Session.post')
+    def test_circuit_breaker_fails_fast(self, mock_post, mock_sleep):
+        """测试连续失败后熔断，熔断期间不再发送请求，半开状态下探测成功后恢复"""
+        mock_post.side_effect = llm_client.requests.exceptions.ConnectionError()
+        client = self.client(retry=RetryPolicy(max_attempts=1))
+        for _ in range(3):
+            with self.assertRaises(Exception):
+                client.send_request({"messages": []})
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(Exception) as context:
+            client.send_request({"messages": []})
+        self.assertIn("熔断", str(context.exception))
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(self.metrics.snapshot()["outcomes"]["circuit_open"], 1)
+
+        with patch('llm_client.time.monotonic', return_value=llm_client.time.monotonic() + 61):
+            self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+            self.assertTrue(self.breaker.allow())
+            # 半开状态只放行一个探测请求
+            self.assertFalse(self.breaker.allow())
+            self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_clients_share_breaker_per_endpoint(self, mock_sleep):
+        """测试同一服务地址的客户端共享熔断器"""
+        a = QianwenClient("http://shared.test/v1/", "")
+        b = QianwenClient("http://shared.test/v1", "")
+        self.assertIs(a.breaker, b.breaker)
+        self.assertIsNot(QianwenClient("http://other.test/v1", "").breaker, a.breaker)
+
+    @patch('llm_client.requests.Session.post')
+    def test_hedged_request_returns_first_answer(self, mock_post, mock_sleep):
+        """测试请求超过对冲延迟未返回时发出对冲请求，采用先返回的结果"""
+        release = threading.Event()
+        slow = _response(200, {"content": "slow"})
+        calls = []
+
+        def post(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait(5)
+                return slow
+            return _response(200, {"content": "fast"})
+
+        mock_post.side_effect = post
+        hedge = HedgePolicy(initial_delay=0.05)
+        try:
+            result = self.client(hedge=hedge).send_request({"messages": []})
+        finally:
+            release.set()
+        self.assertEqual(result, {"content": "fast"})
+        self.assertEqual(len(calls), 2)
+        counters = self.metrics.snapshot()["counters"]
+        self.assertEqual((counters["hedged"], counters["hedge_wins"]), (1, 1))
+
+    @patch('llm_client.requests.Session.post')
+    def test_hedge_delay_excludes_rate_limit_wait(self, mock_post, mock_sleep):
+        """测试对冲延迟从限流排队结束后开始计算，限流时不发送对冲请求"""
+        def post(*args, **kwargs):
+            threading.Event().wait(0.05)
+            return _response(200, {"content": "ok"})
+
+        mock_post.side_effect = post
+        limiter = _FakeLimiter(wait=0.3)
+        self.client(hedge=HedgePolicy(initial_delay=0.15), rate_limiter=limiter).send_request({"messages": []})
+        self.assertEqual([call[0] for call in limiter.calls], ["acquire"])
+
+        limiter = _FakeLimiter(free=False)
+        self.client(hedge=HedgePolicy(initial_delay=0.01), rate_limiter=limiter).send_request({"messages": []})
+        self.assertEqual([call[0] for call in limiter.calls], ["acquire", "try_acquire"])
+        self.assertEqual(mock_post.call_count, 2)
+        counters = self.metrics.snapshot()["counters"]
+        self.assertEqual(counters["hedge_skipped"], 1)
+        self.assertNotIn("hedged", counters)
+
+    @patch('llm_client.requests.Session.post')
+    def test_hedge_loser_reservation_is_refunded(self, mock_post, mock_sleep):
+        """测试被丢弃的对冲请求退回预约的token"""
+        release = threading.Event()
+        calls = []
+
+        def post(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait(5)
+                return _response(200, {"content": "slow"})
+            return _response(200, {"content": "fast", "usage": {"total_tokens": 30}})
+
+        mock_post.side_effect = post
+        limiter = _FakeLimiter()
+        try:
+            result = self.client(hedge=HedgePolicy(initial_delay=0.05), rate_limiter=limiter).send_request(
+                {"messages": []})
+        finally:
+            release.set()
+        self.assertEqual(result["content"], "fast")
+        for _ in range(100):
+            if ("settle", 100, 0) in limiter.calls:
+                break
+            threading.Event().wait(0.05)
+        self.assertEqual(sorted(call for call in limiter.calls if call[0] == "settle"),
+                         [("settle", 100, 0), ("settle", 100, 30)])
+
+    def test_hedge_delay_tracks_percentile(self, mock_sleep):
+        """测试对冲延迟取近期延迟的百分位，样本不足时使用初始值"""
+        hedge = HedgePolicy(percentile=90, initial_delay=1.5, min_delay=0.01, min_samples=10)
+        self.assertEqual(hedge.delay(), 1.5)
+        for i in range(1, 101):
+            hedge.record(i / 1000)
+        self.assertAlmostEqual(hedge.delay(), 0.091)
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
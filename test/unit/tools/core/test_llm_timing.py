@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试大模型调用耗时统计模块
+"""
+
+import unittest
+import os
+import sys
+import time
+from unittest.mock import patch
+
+# 添加tools目录到Python路径（llm_timing使用包内相对导入）
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools')))
+
+from core.llm_timing import CallTimer, LatencySummary, record_timing
+from core.llm_client import CircuitBreaker, QianwenClient, RequestMetrics, RetryPolicy
+from core.mock_llm_server import MockLLMServer
+from core.command_processor import CommandProcessor
+from core.output_formatter import OutputFormatter
+
+def request(content):
+    return {"messages": [{"role": "user", "content": content}]}
+
+class RecordingFormatter(OutputFormatter):
+    """记录输出的消息而不打印"""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def output_json(self, data):
+        self.messages.append(data)
+
+class TestHistograms(unittest.TestCase):
+    """测试RequestMetrics的直方图"""
+
+    def test_cumulative_buckets(self):
+        metrics = RequestMetrics()
+        for value in (5, 30, 30, 70000):
+            metrics.observe("llm_ttft_ms", value)
+        metrics.observe("llm_request_bytes", 300)
+        histograms = metrics.snapshot()["histograms"]
+        ttft = histograms["llm_ttft_ms"]
+        self.assertEqual(ttft["count"], 4)
+        self.assertEqual(ttft["sum"], 70065)
+        buckets = {b["le"]: b["count"] for b in ttft["buckets"]}
+        self.assertEqual(buckets[10], 1)
+        self.assertEqual(buckets[50], 3)
+        self.assertEqual(buckets[60000], 3)
+        self.assertEqual(buckets["+Inf"], 4)
+        # 按名称后缀选择桶的上界
+        self.assertEqual(histograms["llm_request_bytes"]["buckets"][0]["le"], 256)
+        metrics.reset()
+        self.assertEqual(metrics.snapshot()["histograms"], {})
+
+class TestCallTimer(unittest.TestCase):
+    """测试调用方的耗时测量"""
+
+    def test_stream_timing(self):
+        timer = CallTimer(stream=True)
+        time.sleep(0.05)
+        timer.first_token()
+        time.sleep(0.05)
+        timing = timer.finish(10)
+        self.assertGreaterEqual(timing["ttftMs"], 50)
+        self.assertGreaterEqual(timing["totalMs"], 100)
+        self.assertTrue(timing["tokensEstimated"])
+        # 生成速度按首个token之后的时间计算
+        self.assertGreater(timing["tokensPerSec"], 10 / 0.1)
+        self.assertIsNone(timing["connectMs"])
+
+    def test_network_usage_overrides_estimate(self):
+        timing = CallTimer().finish(10, {"completionTokens": 40, "connectMs": 3.5, "requestBytes": 120})
+        self.assertEqual(timing["completionTokens"], 40)
+        self.assertFalse(timing["tokensEstimated"])
+        self.assertEqual(timing["connectMs"], 3.5)
+        self.assertEqual(timing["requestBytes"], 120)
+
+    def test_rolling_summary(self):
+        metrics = RequestMetrics()
+        summary = LatencySummary(window=3)
+        for total in (10, 20, 30, 40):
+            record_timing({"totalMs": total, "connectMs": None}, metrics, summary)
+        result = summary.summary()
+        self.assertEqual(result["calls"], 3)
+        self.assertEqual(result["totalMs"], {"count": 3, "p50": 30, "p95": 40, "max": 40})
+        self.assertNotIn("connectMs", result)
+        self.assertEqual(summary.rows(), [["总耗时(ms)", 3, 30, 40, 40]])
+        # 直方图不受滚动窗口限制
+        self.assertEqual(metrics.snapshot()["histograms"]["llm_total_ms"]["count"], 4)
+
+class TestClientTiming(unittest.TestCase):
+    """测试QianwenClient报告的网络层耗时"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockLLMServer(ttft="fixed:50", inter_token="fixed:5").start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_timing_listener(self):
+        timings = []
+        client = QianwenClient(self.server.base_url, "", retry=RetryPolicy(max_attempts=1),
+                               breaker=CircuitBreaker(), metrics=RequestMetrics(), timing_listener=timings.append)
+        events = list(client.stream_request(request("1")))
+        self.assertEqual(events[-1]["type"], "finish")
+        client.send_request(request("1"))
+        list(client.stream_request(request("1")))
+        first, plain, reused = timings
+        self.assertIsNotNone(first["connectMs"])
+        self.assertGreaterEqual(first["ttftMs"], 50)
+        self.assertGreater(first["totalMs"], first["ttftMs"])
+        self.assertGreater(first["requestBytes"], 0)
+        self.assertGreater(first["responseBytes"], 0)
+        self.assertGreater(first["completionTokens"], 0)
+        self.assertEqual(first["attempts"], 1)
+        # 非流式调用整个回复一起到达
+        self.assertEqual(plain["ttftMs"], plain["totalMs"])
+        # 复用连接时没有建立连接的耗时
+        self.assertIsNone(reused["connectMs"])
+
+class TestCommandProcessorTiming(unittest.TestCase):
+    """测试CommandProcessor的timing消息和info latency"""
+
+    def processor(self):
+        processor = CommandProcessor(use_mock=True)
+        processor.formatter = RecordingFormatter()
+        processor.tool_handler.formatter = processor.formatter
+        return processor
+
+    def test_timing_message_is_optional(self):
+        with patch.dict(os.environ, {"LLM_TIMING": ""}):
+            processor = self.processor()
+        processor.process_command("1", "seq-1")
+        self.assertFalse([m for m in processor.formatter.messages if m["type"] == "timing"])
+
+        with patch.dict(os.environ, {"LLM_TIMING": "1"}):
+            processor = self.processor()
+        processor.stream = True
+        processor.process_command("1", "seq-2")
+        timings = [m for m in processor.formatter.messages if m["type"] == "timing"]
+        self.assertEqual(len(timings), 1)
+        self.assertEqual(timings[0]["sequenceId"], "seq-2")
+        self.assertTrue(timings[0]["content"]["stream"])
+        self.assertGreater(timings[0]["content"]["completionTokens"], 0)
+
+    def test_info_latency(self):
+        processor = self.processor()
+        processor.process_command("1", "seq-1")
+        processor.process_command("info latency", "seq-2")
+        table = [m for m in processor.formatter.messages if m["type"] == "table"][-1]
+        self.assertEqual(table["content"]["header"], ["指标", "样本数", "p50", "p95", "最大值"])
+        self.assertIn("总耗时(ms)", [row[0] for row in table["content"]["rows"]])
+
+if __name__ == '__main__':
+    unittest.main()
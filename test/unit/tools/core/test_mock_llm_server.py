@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试OpenAI兼容的模拟大模型服务
+"""
+
+import unittest
+import os
+import sys
+import time
+import random
+
+# 添加tools目录到Python路径（mock_llm_server使用包内相对导入）
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools')))
+
+from core.mock_llm_server import Distribution, MockLLMServer
+from core.llm_client import CircuitBreaker, QianwenClient, RetryPolicy, close_shared_sessions
+
+def request(content):
+    return {"messages": [{"role": "user", "content": content}]}
+
+class TestDistribution(unittest.TestCase):
+    """测试分布规格的解析和抽样"""
+
+    def test_parse_and_sample(self):
+        """测试各种分布的抽样值非负且在预期范围内，错误的规格报错"""
+        rng = random.Random(1)
+        self.assertEqual(Distribution("200").sample(rng), 200)
+        self.assertEqual(Distribution("fixed:5").sample(rng), 5)
+        self.assertTrue(all(50 <= Distribution("uniform:50,60").sample(rng) <= 60 for _ in range(100)))
+        self.assertTrue(all(Distribution("normal:0,10").sample(rng) >= 0 for _ in range(100)))
+        samples = sorted(Distribution("lognormal:100,0.5").sample(rng) for _ in range(1001))
+        self.assertAlmostEqual(samples[500], 100, delta=15)
+        self.assertEqual(Distribution("exp:0").sample(rng), 0)
+        for spec in ("gamma:1", "uniform:1", "fixed:abc"):
+            with self.assertRaises(ValueError):
+                Distribution(spec)
+
+class TestMockLLMServer(unittest.TestCase):
+    """测试真实客户端通过HTTP访问模拟服务"""
+
+    def setUp(self):
+        self.server = MockLLMServer(seed=7).start()
+
+    def tearDown(self):
+        self.server.stop()
+        close_shared_sessions()
+
+    def client(self, **options):
+        # 独立的熔断器，不影响其他测试
+        options.setdefault('retry', RetryPolicy(max_attempts=1))
+        return QianwenClient(self.server.base_url, "", breaker=CircuitBreaker(), **options)
+
+    def test_completion_follows_mock_scenarios(self):
+        """测试非流式响应为OpenAI格式，内容与模拟客户端的场景一致"""
+        response = self.client().send_request(request("9"))
+        message = response["choices"][0]["message"]
+        self.assertEqual(message["content"], "这是一个包含多个工具调用的响应")
+        self.assertEqual([c["function"]["name"] for c in message["tool_calls"]], ["output_text", "output_table"])
+        self.assertEqual(response["choices"][0]["finish_reason"], "tool_calls")
+        self.assertGreater(response["usage"]["total_tokens"], 0)
+        with self.assertRaises(Exception) as ctx:
+            self.client().send_request(request("8"))
+        self.assertIn("HTTP 500", str(ctx.exception))
+
+    def test_stream_is_parsed_by_client(self):
+        """测试SSE流式响应能被客户端拼装成文本增量和完整的工具调用"""
+        events = list(self.client().stream_request(request("9")))
+        text = ''.join(e["content"] for e in events if e["type"] == "text")
+        calls = [e["toolCall"] for e in events if e["type"] == "tool_call"]
+        self.assertEqual(text, "这是一个包含多个工具调用的响应")
+        self.assertEqual(calls[1]["parameters"]["rows"], [["参数1", "值1"], ["参数2", "值2"]])
+        self.assertEqual(events[-1], {"type": "finish", "reason": "tool_calls"})
+        self.assertEqual(self.server.stats["streams"], 1)
+
+    def test_latency_errors_and_payload(self):
+        """测试首字节延迟、分片间隔、错误率和填充文本的配置"""
+        self.server.ttft = Distribution("fixed:100")
+        self.server.inter_token = Distribution("fixed:10")
+        start = time.perf_counter()
+        events = iter(self.client().stream_request(request("1")))
+        next(events)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.1)
+        list(events)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.1 + 0.01 * 5)
+
+        self.server.ttft = self.server.inter_token = Distribution(0)
+        self.server.payload_chars = Distribution("fixed:1000")
+        content = self.client().send_request(request("1"))["choices"][0]["message"]["content"]
+        self.assertEqual(len(content), len("这是模拟的文本响应") + 1000)
+
+        self.server.error_rate = 1.0
+        with self.assertRaises(Exception) as ctx:
+            self.client().send_request(request("1"))
+        self.assertIn("HTTP 503", str(ctx.exception))
+        self.assertEqual(self.server.stats["errors"], 1)
+
+    def test_dropped_connection_is_retried(self):
+        """测试中途断开的连接由客户端按重试策略重试"""
+        self.server.drop_rate = 1.0
+        with self.assertRaises(Exception):
+            list(self.client().stream_request(request("9")))
+        with self.assertRaises(Exception) as ctx:
+            self.client().send_request(request("1"))
+        self.assertIn("发送请求失败", str(ctx.exception))
+        # 部分连接断开时重试后成功
+        self.server.drop_rate = 0.5
+        client = self.client(retry=RetryPolicy(max_attempts=10, backoff_base=0))
+        for _ in range(10):
+            self.assertIn("choices", client.send_request(request("1")))
+        self.assertGreater(self.server.stats["dropped"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试大模型调用限流模块
+"""
+
+import unittest
+import os
+import sys
+import time
+import tempfile
+from unittest.mock import patch
+
+# 添加tools目录到Python路径（rate_limiter使用包内相对导入）
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools')))
+
+from core.rate_limiter import RateLimiter, rate_limiter_from_env
+from core.conversation_store import ConversationStore
+from core.tool_handler import ToolSchemas
+from core.llm_client import CircuitBreaker, QianwenClient, RequestMetrics, close_shared_sessions
+from core.mock_llm_server import MockLLMServer
+
+class FakeClock:
+    """替换time.time和time.sleep：sleep直接推进时间"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def patch(self):
+        return patch.multiple('core.rate_limiter.time', time=self.time, sleep=self.sleep)
+
+class TestRateLimiter(unittest.TestCase):
+    """测试令牌桶的预约、等待和跨进程共享"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'rate_limit.sqlite3')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_estimate(self):
+        """测试请求token数的估算：消息、工具schema和回复预留"""
+        limiter = RateLimiter(rpm=60, completion_tokens=100)
+        payload = {"messages": [{"role": "user", "content": "你好世界"}]}
+        self.assertEqual(limiter.estimate(payload), 4 + 4 + 100)
+        self.assertEqual(limiter.estimate(dict(payload, max_tokens=10)), 8 + 10)
+        store = ConversationStore()
+        store.append("c", "user", "你好世界")
+        self.assertEqual(limiter.estimate({"messages": store.window("c")}), 108)
+        tools = ToolSchemas([{"type": "function", "function": {"name": "output_text"}}])
+        with_tools = limiter.estimate(dict(payload, tools=tools))
+        self.assertGreater(with_tools, 108)
+        self.assertEqual(limiter.estimate(dict(payload, tools=list(tools))), with_tools)
+
+    def test_requests_wait_instead_of_failing(self):
+        """测试配额用完后调用方按补充速度等待，先预约的先发出"""
+        # 每秒1个请求，容量10个
+        limiter = RateLimiter(rpm=60)
+        with self.clock.patch():
+            waits = [limiter.acquire() for _ in range(10)]
+            self.assertEqual(waits, [0.0] * 10)
+            self.assertAlmostEqual(limiter.acquire(), 1.0)
+            self.assertAlmostEqual(limiter.acquire(), 1.0)
+            self.assertEqual(limiter.budget()["available"]["rpm"], 0)
+            self.clock.now += 2.5
+            self.assertAlmostEqual(limiter.budget()["available"]["rpm"], 2.5)
+            self.assertEqual(limiter.acquire(), 0.0)
+            stats = limiter.stats()
+        self.assertEqual((stats["acquired"], stats["waits"]), (13, 2))
+        self.assertAlmostEqual(stats["max_wait_seconds"], 1.0)
+
+    def test_token_budget_and_settle(self):
+        """测试TPM按预约的token数扣除，按实际用量修正"""
+        # 每秒100个token，容量1000个
+        limiter = RateLimiter(tpm=6000)
+        with self.clock.patch():
+            self.assertEqual(limiter.acquire(900), 0.0)
+            limiter.settle(900, 300)
+            self.assertAlmostEqual(limiter.budget()["available"]["tpm"], 700)
+            self.assertAlmostEqual(limiter.acquire(1200), 5.0)
+            self.assertAlmostEqual(limiter.budget()["wait_seconds"], 0)
+
+    def test_try_acquire_does_not_wait(self):
+        """测试try_acquire只在配额充足时预约，不足时不扣除余额"""
+        # 每秒1个请求，容量2个
+        limiter = RateLimiter(rpm=60, burst_seconds=2)
+        with self.clock.patch():
+            self.assertTrue(limiter.try_acquire())
+            self.assertTrue(limiter.try_acquire())
+            self.assertFalse(limiter.try_acquire())
+            self.assertAlmostEqual(limiter.budget()["available"]["rpm"], 0)
+            self.assertEqual(self.clock.sleeps, [])
+            self.clock.now += 1
+            self.assertTrue(limiter.try_acquire())
+
+    def test_state_is_shared_through_file(self):
+        """测试共享状态文件的限流器（如不同进程）使用同一组令牌桶"""
+        first = RateLimiter(rpm=60, path=self.path)
+        second = RateLimiter(rpm=60, path=self.path)
+        try:
+            with self.clock.patch():
+                for _ in range(10):
+                    first.acquire()
+                self.assertAlmostEqual(second.acquire(), 1.0)
+                self.assertAlmostEqual(first.acquire(), 1.0)
+        finally:
+            first.close()
+            second.close()
+
+    def test_from_env(self):
+        """测试只有设置了配额的环境变量才启用限流"""
+        with patch.dict(os.environ, {'LLM_RATE_LIMIT_RPM': '', 'LLM_RATE_LIMIT_TPM': ''}):
+            self.assertIsNone(rate_limiter_from_env())
+        with patch.dict(os.environ, {'LLM_RATE_LIMIT_RPM': '30', 'LLM_RATE_LIMIT_TPM': '',
+                                     'LLM_RATE_LIMIT_DB': self.path}):
+            limiter = rate_limiter_from_env()
+            self.assertEqual(list(limiter.buckets), ['rpm'])
+            self.assertIs(rate_limiter_from_env(), limiter)
+            limiter.close()
+
+class TestClientRateLimit(unittest.TestCase):
+    """测试QianwenClient在每次尝试前预约配额"""
+
+    def setUp(self):
+        self.server = MockLLMServer().start()
+        self.metrics = RequestMetrics()
+
+    def tearDown(self):
+        self.server.stop()
+        close_shared_sessions()
+
+    def test_client_waits_and_reports_budget(self):
+        """测试超出配额的请求等待后发出，等待时间和剩余配额记入统计，token余额按usage修正"""
+        # 每秒10个请求，容量1个
+        limiter = RateLimiter(rpm=600, tpm=6000000, burst_seconds=0.1)
+        client = QianwenClient(self.server.base_url, "", metrics=self.metrics, breaker=CircuitBreaker(),
+                               rate_limiter=limiter)
+        data = {"messages": [{"role": "user", "content": "1"}]}
+        start = time.perf_counter()
+        with patch.object(limiter, 'settle', wraps=limiter.settle) as settle:
+            for _ in range(4):
+                response = client.send_request(data)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.25)
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot["counters"]["rate_limited"], 3)
+        self.assertGreater(snapshot["counters"]["rate_limit_wait_ms"], 250)
+        self.assertEqual(set(snapshot["gauges"]), {"rate_limit_wait_ms", "rpm_available", "tpm_available"})
+        # 按响应中的实际用量修正预约的token数
+        settle.assert_called_with(limiter.estimate(data), response["usage"]["total_tokens"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试大模型请求合并模块
+"""
+
+import unittest
+import asyncio
+import os
+import sys
+import threading
+import time
+
+# 添加tools目录到Python路径（single_flight使用包内相对导入）
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools')))
+
+from core.single_flight import (
+    AsyncSingleFlight, AsyncSingleFlightLLMClient, SingleFlight, SingleFlightLLMClient, client_identity
+)
+from core.llm_cache import CachedLLMClient, ResponseCache
+from core.llm_client import QianwenClient
+from core.mock_llm import AsyncMockQianwenClient, MockQianwenClient
+
+def run_threads(count, target):
+    results = [None] * count
+    errors = []
+
+    def worker(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+class TestSingleFlight(unittest.TestCase):
+    """测试线程版请求合并"""
+
+    def test_concurrent_calls_share_one_upstream_call(self):
+        """测试同时进行的相同调用只执行一次，所有等待者得到相同结果的副本"""
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def upstream():
+            calls.append(1)
+            release.wait(5)
+            return {"content": "ok", "tool_calls": []}
+
+        threading.Timer(0.2, release.set).start()
+        results, errors = run_threads(5, lambda: flight.do("k", upstream))
+        self.assertEqual(errors, [])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"content": "ok", "tool_calls": []}] * 5)
+        self.assertEqual(len({id(r) for r in results}), 5)
+        self.assertEqual((flight.stats["upstream"], flight.stats["shared"]), (1, 4))
+        self.assertEqual(flight.in_flight(), 0)
+        # 调用结束后不保留结果
+        flight.do("k", lambda: calls.append(1))
+        self.assertEqual(len(calls), 2)
+
+    def test_errors_reach_every_waiter(self):
+        """测试上游异常传给所有等待者"""
+        flight = SingleFlight()
+
+        def upstream():
+            time.sleep(0.2)
+            raise Exception("发送请求失败: Network Error")
+
+        _, errors = run_threads(3, lambda: flight.do("k", upstream))
+        self.assertEqual([str(e) for e in errors], ["发送请求失败: Network Error"] * 3)
+
+    def test_stream_replays_deltas_to_late_joiners(self):
+        """测试中途加入的等待者从头收到全部增量，上游只请求一次"""
+        flight = SingleFlight()
+        gate = threading.Event()
+        upstream_calls = []
+
+        def upstream():
+            upstream_calls.append(1)
+            yield {"type": "text", "content": "你"}
+            gate.wait(5)
+            yield {"type": "text", "content": "好"}
+            yield {"type": "finish", "reason": "stop"}
+
+        first = flight.stream("k", upstream)
+        self.assertEqual(next(first), {"type": "text", "content": "你"})
+        second = flight.stream("k", upstream)
+        self.assertEqual(next(second), {"type": "text", "content": "你"})
+        gate.set()
+        self.assertEqual([e["type"] for e in first], ["text", "finish"])
+        self.assertEqual([e["type"] for e in second], ["text", "finish"])
+        self.assertEqual(len(upstream_calls), 1)
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_stream_cancelled_only_when_every_waiter_leaves(self):
+        """测试一个等待者离开不影响其他等待者，全部离开后关闭上游"""
+        flight = SingleFlight()
+        closed = threading.Event()
+
+        def upstream():
+            try:
+                for i in range(100):
+                    yield {"type": "text", "content": str(i)}
+            finally:
+                closed.set()
+
+        first = flight.stream("k", upstream)
+        second = flight.stream("k", upstream)
+        next(first)
+        next(second)
+        first.close()
+        self.assertFalse(closed.is_set())
+        self.assertEqual(next(second)["content"], "1")
+        second.close()
+        self.assertTrue(closed.is_set())
+        self.assertEqual(flight.stats["cancelled"], 1)
+        # 已中止的流不再被合并
+        self.assertEqual(next(flight.stream("k", upstream))["content"], "0")
+
+    def test_client_wrapper(self):
+        """测试客户端包装按请求内容合并，忽略指定的字段"""
+        mock = MockQianwenClient()
+        original = mock.send_request
+
+        def slow_send(data, sequence_id=None):
+            time.sleep(0.2)
+            return original(data, sequence_id)
+
+        mock.send_request = slow_send
+        client = SingleFlightLLMClient(mock, ignore_fields=('sequenceId',))
+        counter = iter(range(100))
+        results, errors = run_threads(
+            4, lambda: client.send_request({"content": "9", "sequenceId": f"s{next(counter)}"}))
+        self.assertEqual(errors, [])
+        self.assertEqual(mock.call_count, 1)
+        self.assertTrue(all(len(r["tool_calls"]) == 2 for r in results))
+        self.assertEqual(client.call_count, 1)
+
+        events = list(client.stream_request({"content": "1"}))
+        self.assertEqual(events[-1]["type"], "finish")
+
+    def test_different_clients_do_not_share(self):
+        """测试共用合并器时，不同客户端的相同请求各自发出，不会拿到对方的回复"""
+        class SlowClient:
+            def __init__(self, base_url):
+                self.base_url = base_url
+
+            def send_request(self, data, sequence_id=None):
+                time.sleep(0.1)
+                return {"content": self.base_url}
+
+        flight = SingleFlight()
+        clients = [SingleFlightLLMClient(SlowClient(url), flight) for url in ("http://a", "http://b")]
+        counter = iter(range(2))
+        results, errors = run_threads(2, lambda: clients[next(counter)].send_request({"content": "9"}))
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(r["content"] for r in results), ["http://a", "http://b"])
+        self.assertEqual(flight.stats["shared"], 0)
+
+    def test_client_identity(self):
+        """测试客户端标识区分被包装的客户端类型、服务地址和API key"""
+        real = QianwenClient(base_url="http://a", api_key="k1")
+        identities = {
+            client_identity(real),
+            client_identity(QianwenClient(base_url="http://b", api_key="k1")),
+            client_identity(QianwenClient(base_url="http://a", api_key="k2")),
+            client_identity(MockQianwenClient()),
+            client_identity(CachedLLMClient(MockQianwenClient(), ResponseCache())),
+            client_identity(CachedLLMClient(real, ResponseCache())),
+        }
+        self.assertEqual(len(identities), 6)
+        self.assertEqual(client_identity(real), client_identity(QianwenClient(base_url="http://a", api_key="k1")))
+        self.assertNotIn("k1", client_identity(real))
+
+class TestAsyncSingleFlight(unittest.IsolatedAsyncioTestCase):
+    """测试asyncio版请求合并"""
+
+    async def test_concurrent_requests_share_one_task(self):
+        """测试同时进行的相同请求共享一个上游任务"""
+        mock = AsyncMockQianwenClient(latency=0.1)
+        client = AsyncSingleFlightLLMClient(mock)
+        results = await asyncio.gather(*[client.send_request({"content": "9"}) for _ in range(20)])
+        self.assertEqual(mock.call_count, 1)
+        self.assertTrue(all(r == results[0] for r in results))
+        self.assertEqual(client.flight.stats["shared"], 19)
+
+    async def test_cancellation_is_reference_counted(self):
+        """测试部分等待者被取消时上游任务继续，全部取消后才取消上游任务"""
+        flight = AsyncSingleFlight()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def upstream():
+            started.set()
+            try:
+                await asyncio.sleep(0.2)
+                return "ok"
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        a = asyncio.ensure_future(flight.do("k", upstream))
+        b = asyncio.ensure_future(flight.do("k", upstream))
+        await started.wait()
+        a.cancel()
+        self.assertEqual(await b, "ok")
+        self.assertFalse(cancelled.is_set())
+
+        c = asyncio.ensure_future(flight.do("k2", upstream))
+        d = asyncio.ensure_future(flight.do("k2", upstream))
+        await asyncio.sleep(0.05)
+        c.cancel()
+        d.cancel()
+        await asyncio.gather(c, d, return_exceptions=True)
+        await asyncio.sleep(0)
+        self.assertTrue(cancelled.is_set())
+        self.assertEqual(flight.stats["cancelled"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试工具调用并发执行模块
+"""
+
+import unittest
+import os
+import sys
+import time
+import threading
+from unittest.mock import patch
+
+# 添加tools目录到Python路径（tool_executor使用包内相对导入）
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools')))
+
+from core.tool_executor import ToolCallBatch, tool_budget_from_env
+from core.tool_handler import ToolHandler
+from core.output_formatter import OutputFormatter
+from core.tracing import Tracer
+
+class RecordingFormatter(OutputFormatter):
+    """记录输出的消息而不打印"""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def output_json(self, data):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is not None:
+            buffer.append(data)
+        else:
+            self.messages.append(data)
+
+class TestToolCallBatch(unittest.TestCase):
+    """测试一轮工具调用的执行"""
+
+    def setUp(self):
+        self.formatter = RecordingFormatter()
+        self.handler = ToolHandler(self.formatter)
+        self.tracer = Tracer()
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def register(self, name, delay, concurrent=True, timeout=None):
+        def handler(parameters, sequence_id):
+            with self.lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            time.sleep(delay)
+            with self.lock:
+                self.active -= 1
+            self.formatter.output_text(f"{name}完成", sequence_id=sequence_id)
+            return name
+        tool = {"name": name, "description": name, "parameters": {}, "handler": handler, "concurrent": concurrent}
+        if timeout is not None:
+            tool["timeout"] = timeout
+        self.handler.register_custom_tool(tool)
+
+    def texts(self):
+        return [m["content"] for m in self.formatter.messages
+                if m["type"] == "text" and not m["isError"] and not m["content"].startswith("接收到工具调用")]
+
+    def errors(self):
+        return [m["content"] for m in self.formatter.messages if m["isError"]]
+
+    def run_batch(self, names, budget=10):
+        batch = ToolCallBatch(self.handler, self.tracer, "seq", budget)
+        for name in names:
+            batch.submit({"name": name, "parameters": {}})
+        return batch.finish()
+
+    def test_concurrent_calls_overlap_and_keep_order(self):
+        """可并发的调用同时执行，输出和结果按原始顺序"""
+        self.register("slow", 0.2)
+        self.register("fast", 0.05)
+        self.formatter.messages.clear()
+        start = time.monotonic()
+        results = self.run_batch(["slow", "fast", "slow"])
+        elapsed = time.monotonic() - start
+        self.assertEqual(results, ["slow", "fast", "slow"])
+        self.assertLess(elapsed, 0.35)
+        self.assertGreaterEqual(self.peak, 2)
+        self.assertEqual(self.texts(), ["执行自定义工具: slow", "slow完成", "执行自定义工具: fast", "fast完成",
+                                        "执行自定义工具: slow", "slow完成"])
+
+    def test_sequential_call_waits_for_earlier_calls(self):
+        """未声明concurrent的调用等前面的并发调用完成后才执行"""
+        self.register("io", 0.1)
+        self.register("write", 0, concurrent=False)
+        self.formatter.messages.clear()
+        results = self.run_batch(["io", "write"])
+        self.assertEqual(results, ["io", "write"])
+        self.assertEqual(self.peak, 1)
+        self.assertEqual(self.texts(), ["执行自定义工具: io", "io完成", "执行自定义工具: write", "write完成"])
+
+    def test_per_call_timeout(self):
+        """超时的调用输出错误，结果为None，输出被丢弃"""
+        self.register("hang", 0.5, timeout=0.05)
+        self.register("fast", 0)
+        self.formatter.messages.clear()
+        results = self.run_batch(["hang", "fast"])
+        self.assertEqual(results, [None, "fast"])
+        errors = self.errors()
+        self.assertEqual(len(errors), 1)
+        self.assertIn("超时", errors[0])
+        self.assertNotIn("hang完成", self.texts())
+        self.assertIn("fast完成", self.texts())
+
+    def test_turn_budget(self):
+        """超出本轮预算后不再等待，也不再开始顺序调用"""
+        self.register("hang", 0.5)
+        self.register("write", 0, concurrent=False)
+        self.formatter.messages.clear()
+        start = time.monotonic()
+        results = self.run_batch(["hang", "write"], budget=0.1)
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual(results, [None, None])
+        errors = self.errors()
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(all("时间预算" in e for e in errors))
+
+    def test_execution_fields_not_in_schema(self):
+        """handler、concurrent、timeout不发送给大模型"""
+        self.register("io", 0, timeout=1)
+        schema = [t for t in self.handler.tool_schemas() if t["name"] == "io"][0]
+        self.assertNotIn("handler", schema)
+        self.assertNotIn("concurrent", schema)
+        self.assertNotIn("timeout", schema)
+        self.assertIn("io", self.handler.tool_schemas().json_text)
+
+    def test_budget_from_env(self):
+        with patch.dict(os.environ, {"LLM_TOOL_BUDGET": "2.5"}):
+            self.assertEqual(tool_budget_from_env(), 2.5)
+        with patch.dict(os.environ, {"LLM_TOOL_BUDGET": "abc"}):
+            with self.assertRaises(ValueError):
+                tool_budget_from_env()
+
+class TestBufferedOutput(unittest.TestCase):
+    """测试OutputFormatter的线程内缓冲"""
+
+    def test_buffered_only_affects_current_thread(self):
+        formatter = OutputFormatter()
+        with patch('builtins.print') as mock_print:
+            with formatter.buffered() as buffer:
+                formatter.output_text("缓冲")
+                thread = threading.Thread(target=formatter.output_text, args=("直接输出",))
+                thread.start()
+                thread.join()
+            formatter.output_text("恢复")
+        self.assertEqual([m["content"] for m in buffer], ["缓冲"])
+        self.assertEqual(mock_print.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
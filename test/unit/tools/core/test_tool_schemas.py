@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试预先构建的工具schema
+"""
+
+import unittest
+import json
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+# 添加tools目录到Python路径（tool_handler使用包内相对导入）
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools')))
+
+from core.tool_handler import BUILTIN_TOOLS, ToolHandler, ToolSchemas
+from core.output_formatter import OutputFormatter
+from core.llm_cache import cache_key
+from core.llm_client import QianwenClient, RetryPolicy, encode_request
+
+CUSTOM_TOOL = {
+    "name": "deploy_service",
+    "description": "部署服务",
+    "keywords": ["部署", "上线"],
+    "parameters": {"type": "object", "properties": {"name": {"type": "string"}}}
+}
+
+class TestToolSchemas(unittest.TestCase):
+    """测试工具schema的构建、缓存、失效和按请求选择"""
+
+    def setUp(self):
+        self.handler = ToolHandler(MagicMock(spec=OutputFormatter))
+
+    def test_built_once(self):
+        """测试工具列表只构建一次，带有序列化文本和内容哈希"""
+        tools = self.handler.register_extension_tools("s1")
+        self.assertIsInstance(tools, ToolSchemas)
+        self.assertIs(self.handler.register_extension_tools("s2"), tools)
+        self.assertEqual([tool["name"] for tool in tools], [tool["name"] for tool in BUILTIN_TOOLS])
+        self.assertEqual(json.loads(tools.json_text), list(tools))
+        self.assertEqual(ToolSchemas(BUILTIN_TOOLS).version, tools.version)
+
+    def test_invalidated_when_custom_tools_change(self):
+        """测试自定义工具变化（包括直接修改custom_tools）时重新构建，版本随内容变化"""
+        before = self.handler.register_extension_tools()
+        self.handler.register_custom_tool(CUSTOM_TOOL)
+        after = self.handler.register_extension_tools()
+        self.assertIsNot(after, before)
+        self.assertNotEqual(after.version, before.version)
+        self.assertEqual(after[-1]["name"], "deploy_service")
+        self.assertIs(self.handler.register_extension_tools(), after)
+
+        self.handler.unregister_custom_tool("deploy_service")
+        self.assertEqual(self.handler.register_extension_tools().version, before.version)
+
+        self.handler.custom_tools["direct"] = {"name": "direct"}
+        self.assertEqual(self.handler.register_extension_tools()[-1]["name"], "direct")
+        self.handler.custom_tools = {}
+        self.assertEqual(self.handler.register_extension_tools().version, before.version)
+
+    def test_relevant_subset(self):
+        """测试按请求内容选择相关的工具"""
+        self.handler.register_custom_tool(CUSTOM_TOOL)
+        names = [tool["name"] for tool in self.handler.register_extension_tools(content="你好")]
+        self.assertEqual(names, ["output_text", "end_execution"])
+        names = [tool["name"] for tool in self.handler.register_extension_tools(content="列出服务并部署到测试环境")]
+        self.assertEqual(names, ["output_text", "output_table", "end_execution", "deploy_service"])
+        self.assertIs(self.handler.register_extension_tools(content="用表格列出"),
+                      self.handler.register_extension_tools(content="列一个table"))
+        subset = self.handler.tool_schemas(["output_text"])
+        self.assertLess(len(subset.json_text), len(self.handler.tool_schemas().json_text))
+
+    def test_request_encoding_and_cache_key(self):
+        """测试请求体直接拼接预先序列化的工具列表，缓存键使用工具列表的版本"""
+        tools = self.handler.register_extension_tools()
+        payload = {"messages": [{"role": "user", "content": "你好"}], "tools": tools}
+        self.assertEqual(json.loads(encode_request(payload)), json.loads(json.dumps(payload)))
+        self.assertEqual(json.loads(encode_request({"tools": tools})), {"tools": list(tools)})
+        self.assertIsNone(encode_request({"messages": [], "tools": list(tools)}))
+        self.assertEqual(cache_key(payload), cache_key(dict(payload, tools=ToolSchemas(list(tools)))))
+
+        response = MagicMock(status_code=200)
+        response.json.return_value = {"content": "ok"}
+        with patch('core.llm_client.requests.Session.post', return_value=response) as post:
+            QianwenClient("http://llm.test/v1", "", retry=RetryPolicy(max_attempts=1)).send_request(payload)
+        self.assertNotIn('json', post.call_args.kwargs)
+        self.assertEqual(json.loads(post.call_args.kwargs['data']), json.loads(json.dumps(payload)))
+
+    def test_command_processor_selection(self):
+        """测试LLM_TOOL_SELECTION=relevant时命令处理器只提供相关的工具"""
+        from core.command_processor import CommandProcessor
+        with patch.dict(os.environ, {'LLM_TOOL_SELECTION': 'relevant', 'LLM_CACHE_DB': ''}):
+            processor = CommandProcessor(use_mock=True)
+        processor.formatter = MagicMock(spec=OutputFormatter)
+        processor.tool_handler.formatter = processor.formatter
+        with patch.object(processor.llm_client, 'send_request', return_value={"content": "ok"}) as send:
+            processor.process_command("qianwen 你好", "s1")
+        tools = send.call_args.args[0]["tools"]
+        self.assertEqual([tool["name"] for tool in tools], ["output_text", "end_execution"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试执行时间线追踪模块
+"""
+
+import unittest
+import json
+import os
+import sys
+import tempfile
+
+# 添加core目录到Python路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../tools/core')))
+
+from tracing import Tracer, now_us
+
+class TestTracer(unittest.TestCase):
+    """测试追踪器"""
+    
+    def test_disabled_tracer_records_nothing(self):
+        """测试未启用时不记录任何事件"""
+        tracer = Tracer(enabled=False)
+        tracer.instant("seq-1", "start")
+        tracer.complete("seq-1", "spawn", now_us())
+        with tracer.span("seq-1", "work"):
+            pass
+        
+        self.assertFalse(tracer.has_trace("seq-1"))
+        self.assertEqual(tracer.export("seq-1")["traceEvents"], [])
+        self.assertIsNone(tracer.dump("seq-1", tempfile.gettempdir()))
+    
+    def test_enabled_from_environment(self):
+        """测试从环境变量读取启用状态"""
+        os.environ['TOOL_TRACE'] = '1'
+        try:
+            self.assertTrue(Tracer().enabled)
+        finally:
+            del os.environ['TOOL_TRACE']
+        self.assertFalse(Tracer().enabled)
+    
+    def test_export_chrome_trace_format(self):
+        """测试导出的数据符合Chrome trace-event格式"""
+        tracer = Tracer(process_name="test", enabled=True)
+        with tracer.span("seq-1", "work", step=1):
+            pass
+        tracer.instant("seq-1", "done")
+        
+        trace = tracer.export("seq-1")
+        events = trace["traceEvents"]
+        self.assertEqual(trace["otherData"]["sequenceId"], "seq-1")
+        self.assertEqual(events[0]["ph"], "M")
+        self.assertEqual(events[0]["args"]["name"], "test")
+        
+        span = next(e for e in events if e["name"] == "work")
+        self.assertEqual(span["ph"], "X")
+        self.assertGreaterEqual(span["dur"], 0)
+        self.assertEqual(span["args"], {"step": 1})
+        
+        instant = next(e for e in events if e["name"] == "done")
+        self.assertEqual(instant["ph"], "i")
+        self.assertGreaterEqual(instant["ts"], span["ts"])
+    
+    def test_sequences_are_separated_and_bounded(self):
+        """测试按sequenceId分别记录并淘汰最早的记录"""
+        tracer = Tracer(enabled=True, max_sequences=2)
+        tracer.instant("seq-1", "a")
+        tracer.instant("seq-2", "b")
+        tracer.instant("seq-3", "c")
+        
+        self.assertFalse(tracer.has_trace("seq-1"))
+        self.assertEqual([e["name"] for e in tracer.get_events("seq-3")], ["c"])
+    
+    def test_add_events_from_child_process(self):
+        """测试合并子进程上报的事件"""
+        tracer = Tracer(enabled=True)
+        child_event = {"name": "spawn", "ph": "X", "ts": 10, "dur": 5, "pid": 1, "tid": 1}
+        tracer.add_events("seq-1", [child_event, "invalid"])
+        
+        self.assertEqual(tracer.get_events("seq-1"), [child_event])
+    
+    def test_dump_and_pop(self):
+        """测试写入磁盘和取出事件"""
+        tracer = Tracer(enabled=True)
+        tracer.instant("seq/1", "start")
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = tracer.dump("seq/1", temp_dir)
+            self.assertEqual(os.path.basename(path), "trace-seq_1.json")
+            with open(path, 'r', encoding='utf-8') as f:
+                self.assertEqual(json.load(f)["traceEvents"][0]["name"], "start")
+        
+        self.assertEqual(len(tracer.pop("seq/1")), 1)
+        self.assertFalse(tracer.has_trace("seq/1"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,6 +15,19 @@
 使用方式：
 python cmd-third.py "{\"amount\": \"100.00\", \"currency\": \"CNY\", \"projectDir\": \/path\/to\/project, \"sequenceId\": \"unique-id\"}"
 
+批量模式（一次调用处理多条记录，逐块输出table结果）：
+python cmd-third.py "{\"records\": [{\"amount\": \"100.00\", \"currency\": \"CNY\"}, ...], \"sequenceId\": \"unique-id\"}"
+python cmd-third.py "[{\"amount\": \"100.00\", \"currency\": \"USD\"}, ...]"
+
+流式模式（逐块读取CSV/JSONL文件或stdin，内存占用与文件大小无关）：
+python cmd-third.py --file ledger.csv [--format csv|jsonl] [--chunk-size 5000] [--sequence-id id]
+cat ledger.jsonl | python cmd-third.py --file -
+python cmd-third.py "{\"file\": \"ledger.csv\", \"sequenceId\": \"unique-id\"}"
+
+批量和流式模式都可以用本地汇率表把金额换算为基准币种（记录中的date字段指定汇率日期）：
+python cmd-third.py --file ledger.csv --fx-rates rates.fxr [--date 2024-01-31]
+python cmd-third.py "{\"records\": [...], \"fxRates\": \"rates.fxr\", \"date\": \"2024-01-31\"}"
+
 返回格式：
 JSON数组，每个元素包含：
 - type: 返回类型（text, error, command, python, table等）
@@ -25,19 +38,52 @@ JSON数组，每个元素包含：
 """
 
 import sys
-import subprocess
 import json
+import argparse
 import time
 import platform
 import os
-from typing import Dict, Any, Optional, Tuple, List
+from typing import Callable, Dict, Any, Optional, Tuple, List
+
+from core.input_parser import parse_tool_input
+from core.amount_processor import (
+    AMOUNT_TABLE_HEADER, CONVERTED_COLUMN, AmountRecordError, extract_records, iter_amount_rows,
+    process_amount_record
+)
+from core.amount_engine import AmountBatch, RunningAmountStats
+from core.amount_stream import (
+    DEFAULT_STREAM_CHUNK_SIZE, STREAM_FORMATS, ByteCountingLines, chunked, stream_records
+)
+from core.fx_rates import FxNormalizer, load_rate_table
+from core.idempotency_store import IDEMPOTENCY_DB_ENV, IdempotencyStore, content_hash, open_store
+
+# 批量模式下每条table消息包含的最大行数
+BATCH_CHUNK_SIZE = 500
 
 class CmdThird:
     """第三命令工具类，负责处理金额数据并执行命令"""
     
-    def __init__(self):
-        """初始化第三命令工具"""
+    def __init__(self, output: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 simulate_delay: bool = True, allow_files: bool = True,
+                 idempotency_store: Optional[IdempotencyStore] = None, fx_rates_dir: Optional[str] = None):
+        """初始化第三命令工具
+
+        output: 消息输出回调，默认打印为JSON行；在进程内调用（如direct_comm_server）时传入
+        simulate_delay: 是否保留单条模式中模拟执行过程的等待
+        allow_files: 是否允许通过JSON输入中的file字段读取本地文件、通过fxRates字段指定任意路径的汇率文件
+        fx_rates_dir: 不允许读取本地文件时，fxRates只能是该目录下的文件名；为None时拒绝fxRates
+        idempotency_store: 幂等存储，为None时根据环境变量AMOUNT_IDEMPOTENCY_DB打开（未设置则不启用）
+        """
         self.system = platform.system()
+        self.output = output
+        self.simulate_delay = simulate_delay
+        self.allow_files = allow_files
+        self.fx_rates_dir = fx_rates_dir
+        if idempotency_store is None and os.environ.get(IDEMPOTENCY_DB_ENV):
+            idempotency_store = open_store(os.environ[IDEMPOTENCY_DB_ENV])
+        self.idempotency_store = idempotency_store
+        # 正在记录的输出消息，处理完成后保存到幂等存储
+        self._recorded: Optional[List[Dict[str, Any]]] = None
         # 定义命令行代码时刻标记和结束标记
         self.CODE_BLOCK_MARKER = "[CODE_BLOCK_BEGIN]"
         self.CODE_BLOCK_END_MARKER = "[CODE_BLOCK_END]"
@@ -46,124 +92,143 @@ class CmdThird:
 
     def execute(self) -> None:
         """执行处理金额数据的逻辑并输出结果"""
+        # 读取命令行参数中的JSON输入
+        if len(sys.argv) > 1:
+            self.process_input(sys.argv[1])
+        else:
+            # 没有输入参数，显示帮助
+            self._show_help()
+
+    def process_input(self, input_arg: Any, sequence_id: str = '') -> None:
+        """处理一次输入：input_arg为命令行参数字符串，或已解析的对象/数组；
+        sequence_id为调用方已知的序列号（如HTTP请求中的sequenceId），在输入中没有sequenceId时用于错误消息
+
+        启用幂等存储时，带sequenceId的重复提交（sequenceId和内容都相同）直接重放保存的输出；
+        第一次提交仍在处理时（包括在其他进程中），重复提交等待其完成后重放结果。
+        """
+        key = None
+        claimed = False
+        input_data = input_arg
         try:
-            # 读取命令行参数中的JSON输入
-            if len(sys.argv) > 1:
-                input_arg = sys.argv[1]
-                
-                # 尝试直接解析参数作为JSON
-                try:
-                    input_data = json.loads(input_arg)
-                    amount = input_data.get('amount', '')
-                    currency = input_data.get('currency', 'CNY')
-                    project_dir = input_data.get('projectDir', os.getcwd())
-                    sequence_id = input_data.get('sequenceId', '')
-                except json.JSONDecodeError:
-                    # 尝试处理转义问题
-                    try:
-                        # 处理常见的转义问题，比如额外的反斜杠
-                        if '\\' in input_arg:
-                            # 尝试去除一层转义
-                            input_arg_fixed = input_arg.replace('\\', '')
-                            input_data = json.loads(input_arg_fixed)
-                            amount = input_data.get('amount', '')
-                            currency = input_data.get('currency', 'CNY')
-                            project_dir = input_data.get('projectDir', os.getcwd())
-                            sequence_id = input_data.get('sequenceId', '')
-                        else:
-                            # 如果不是JSON格式，将整个参数视为原始数据
-                            amount = input_arg
-                            currency = 'CNY'
-                            project_dir = os.getcwd()
-                            sequence_id = ''
-                    except json.JSONDecodeError:
-                        # 如果仍然不是有效的JSON，则将其视为原始数据
-                        amount = input_arg
-                        currency = 'CNY'
-                        project_dir = os.getcwd()
-                        sequence_id = ''
-                
-                # 记录执行开始
-                self._output_json({
-                    "type": "text",
-                    "content": f"处理金额数据: {amount} {currency}",
-                    "isError": False,
-                    "isEnd": False,
-                    "sequenceId": sequence_id
-                })
-                time.sleep(0.2)  # 模拟执行准备时间
-                
-                # 执行命令处理金额数据
-                self._process_amount_data(amount, currency, project_dir, sequence_id)
+            # 单遍容错解析：标准JSON、多一层转义的JSON、PowerShell去掉引号的格式
+            input_data = parse_tool_input(input_arg) if isinstance(input_arg, str) else input_arg
+            if isinstance(input_data, dict) and input_data.get('fxRates'):
+                input_data = dict(input_data, fxRates=self._resolve_fx_rates(input_data['fxRates']))
+            key = self._idempotency_key(input_data)
+            if key is not None:
+                cached = self.idempotency_store.claim(*key)
+                if cached is not None:
+                    for message in cached:
+                        self._output_json(message)
+                    return
+                claimed = True
+                self._recorded = []
+            if isinstance(input_data, dict) and input_data.get('file'):
+                if not self.allow_files:
+                    raise ValueError("当前调用方式不允许读取本地文件")
+                self._process_amount_stream(
+                    input_data['file'],
+                    fmt=input_data.get('format'),
+                    chunk_size=int(input_data.get('chunkSize') or DEFAULT_STREAM_CHUNK_SIZE),
+                    sequence_id=input_data.get('sequenceId', ''),
+                    fx_rates=input_data.get('fxRates'),
+                    fx_date=input_data.get('date')
+                )
+                return
+            records = extract_records(input_data)
+            if records is not None:
+                options = input_data if isinstance(input_data, dict) else {}
+                self._process_amount_batch(records, options.get('sequenceId', ''),
+                                           fx_rates=options.get('fxRates'), fx_date=options.get('date'))
+                return
+            if isinstance(input_data, dict):
+                amount = input_data.get('amount', '')
+                currency = input_data.get('currency', 'CNY')
+                project_dir = input_data.get('projectDir') or os.getcwd()
+                sequence_id = input_data.get('sequenceId') or sequence_id
             else:
-                # 没有输入参数，显示帮助
-                self._show_help()
+                # 如果不是JSON格式，将整个参数视为原始数据
+                amount = input_arg
+                currency = 'CNY'
+                project_dir = os.getcwd()
+            
+            # 记录执行开始
+            self._output_json({
+                "type": "text",
+                "content": f"处理金额数据: {amount} {currency}",
+                "isError": False,
+                "isEnd": False,
+                "sequenceId": sequence_id
+            })
+            self._delay(0.2)  # 模拟执行准备时间
+            
+            # 执行命令处理金额数据
+            self._process_amount_data(amount, currency, project_dir, sequence_id)
         except Exception as e:
-            # 输出执行错误
+            # 输出执行错误；字符串输入使用解析后的sequenceId
+            if isinstance(input_data, dict) and input_data.get('sequenceId'):
+                sequence_id = input_data['sequenceId']
             self._output_json({
                 "type": "error",
                 "content": f"执行错误: {str(e)}",
                 "isError": True,
                 "isEnd": False,
-                "sequenceId": ""
+                "sequenceId": sequence_id
             })
             self._output_json({
                 "type": "end",
                 "content": "",
                 "isError": False,
                 "isEnd": True,
-                "sequenceId": ""
+                "sequenceId": sequence_id
             })
+        finally:
+            recorded, self._recorded = self._recorded, None
+            try:
+                # 只保存完整结束的处理结果
+                if recorded and recorded[-1].get('isEnd'):
+                    self.idempotency_store.put(*key, recorded)
+            finally:
+                if claimed:
+                    self.idempotency_store.release(*key)
+
+    def _resolve_fx_rates(self, fx_rates: Any) -> str:
+        """返回输入中fxRates对应的汇率文件路径
+
+        不允许读取本地文件时只接受fx_rates_dir目录下的文件名，不访问文件系统就拒绝其他取值，
+        调用方无法借错误信息探测服务器上的文件是否存在。
+        """
+        if self.allow_files:
+            return fx_rates
+        if (not self.fx_rates_dir or not isinstance(fx_rates, str) or fx_rates in ('.', '..')
+                or os.path.basename(fx_rates) != fx_rates):
+            raise ValueError("当前调用方式不允许读取本地文件，fxRates只能是服务配置的汇率目录下的文件名")
+        return os.path.join(self.fx_rates_dir, fx_rates)
+
+    def _idempotency_key(self, input_data: Any) -> Optional[Tuple[str, str]]:
+        """返回(sequenceId, 内容哈希)；未启用幂等存储、没有sequenceId或为文件流式输入时返回None"""
+        if self.idempotency_store is None or not isinstance(input_data, dict):
+            return None
+        sequence_id = input_data.get('sequenceId')
+        if not sequence_id or input_data.get('file'):
+            return None
+        fx_rates = input_data.get('fxRates')
+        if fx_rates:
+            # 汇率文件被替换后结果会变化，把文件的修改时间计入内容哈希
+            try:
+                version = os.stat(fx_rates).st_mtime_ns
+            except OSError:
+                version = None
+            input_data = dict(input_data, fxRatesVersion=version)
+        return str(sequence_id), content_hash(input_data)
 
     def _process_amount_data(self, amount: str, currency: str, project_dir: str, sequence_id: str = '') -> None:
-        """处理金额数据并执行相关命令"""
+        """处理单条金额数据，在进程内完成校验和格式化"""
         try:
-            # 构造处理金额的命令
-            # 这里根据不同操作系统选择合适的命令
-            if self.system == "Windows":
-                # Windows系统下的命令示例
-                if currency == 'CNY':
-                    # 显示人民币金额格式化信息
-                    command = f"echo 处理人民币金额: {amount} 元"
-                else:
-                    # 显示其他货币格式化信息
-                    command = f"echo 处理{currency}金额: {amount}"
-            else:
-                # Unix/Linux/Mac系统下的命令示例
-                if currency == 'CNY':
-                    # 显示人民币金额格式化信息
-                    command = f"echo '处理人民币金额: {amount} 元'"
-                else:
-                    # 显示其他货币格式化信息
-                    command = f"echo '处理{currency}金额: {amount}'"
-            
-            # 保存当前目录并切换到指定目录
-            original_dir = os.getcwd()
-            if project_dir and os.path.exists(project_dir):
-                os.chdir(project_dir)
-            
-            # 执行命令并捕获输出
-            process = subprocess.Popen(
-                command,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            # 实时捕获和输出标准输出
-            self._capture_and_output_stream(process.stdout, is_error=False, sequence_id=sequence_id)
-            
-            # 捕获和输出错误输出
-            self._capture_and_output_stream(process.stderr, is_error=True, sequence_id=sequence_id)
-            
-            # 等待进程完成并获取返回码
-            return_code = process.wait()
-            
-            # 输出返回码信息
+            amount, currency, formatted = process_amount_record({"amount": amount, "currency": currency})
             self._output_json({
                 "type": "text",
-                "content": f"命令执行完成，返回码: {return_code}",
+                "content": formatted,
                 "isError": False,
                 "isEnd": False,
                 "sequenceId": sequence_id
@@ -172,18 +237,16 @@ class CmdThird:
             # 生成额外的处理信息
             self._generate_additional_info(amount, currency, sequence_id)
             
-        except Exception as e:
-            # 输出执行错误
+        except AmountRecordError as e:
+            # 输出金额校验错误
             self._output_json({
                 "type": "error",
-                "content": f"命令执行错误: {str(e)}",
+                "content": f"金额数据错误: {str(e)}",
                 "isError": True,
                 "isEnd": False,
                 "sequenceId": sequence_id
             })
         finally:
-            # 切换回原始目录
-            os.chdir(original_dir)
             # 输出结束标志
             self._output_json({
                 "type": "end",
@@ -193,9 +256,216 @@ class CmdThird:
                 "sequenceId": sequence_id
             })
 
+    def _process_amount_batch(self, records: List[Any], sequence_id: str = '',
+                              fx_rates: Optional[str] = None, fx_date: Optional[str] = None) -> None:
+        """批量处理金额记录，每BATCH_CHUNK_SIZE行输出一条table消息，单条记录的错误不中断批次，
+        最后输出按币种汇总的精确统计；指定汇率表时同时输出换算为基准币种后的汇总"""
+        try:
+            normalizer = self._create_normalizer(fx_rates, fx_date)
+        except AmountRecordError as e:
+            self._output_stream_error(f"汇率表错误: {str(e)}", sequence_id)
+            return
+        base_currency = normalizer.base if normalizer else None
+        
+        self._output_json({
+            "type": "text",
+            "content": f"批量处理金额数据: 共{len(records)}条",
+            "isError": False,
+            "isEnd": False,
+            "sequenceId": sequence_id
+        })
+        
+        total = errors = 0
+        batch = AmountBatch()
+        chunk: List[List[Any]] = []
+        for row in iter_amount_rows(records, batch=batch, convert=normalizer):
+            total += 1
+            if row[4] != "ok":
+                errors += 1
+            chunk.append(row)
+            if len(chunk) >= BATCH_CHUNK_SIZE:
+                self._output_amount_chunk(chunk, total - len(chunk), sequence_id, base_currency)
+                chunk = []
+        if chunk:
+            self._output_amount_chunk(chunk, total - len(chunk), sequence_id, base_currency)
+        
+        if len(batch):
+            self._output_stats_table(batch.stats_table(), sequence_id)
+        if normalizer and len(normalizer.batch):
+            self._output_stats_table(normalizer.batch.stats_table(), sequence_id, base_currency)
+        
+        self._output_json({
+            "type": "text",
+            "content": f"批量处理完成: 共{total}条，成功{total - errors}条，失败{errors}条",
+            "isError": False,
+            "isEnd": False,
+            "sequenceId": sequence_id
+        })
+        self._output_json({
+            "type": "end",
+            "content": "",
+            "isError": False,
+            "isEnd": True,
+            "sequenceId": sequence_id
+        })
+
+    def _process_amount_stream(self, path: str, fmt: Optional[str] = None,
+                               chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE, sequence_id: str = '',
+                               fx_rates: Optional[str] = None, fx_date: Optional[str] = None) -> None:
+        """流式处理CSV/JSONL金额文件（path为-时读取stdin）
+
+        记录经生成器逐块读取，每块输出一条table消息和一条进度消息（已读取字节数），
+        统计结果逐块合并到RunningAmountStats后丢弃缓冲区，峰值内存与文件行数无关。
+        """
+        try:
+            normalizer = self._create_normalizer(fx_rates, fx_date)
+        except AmountRecordError as e:
+            self._output_stream_error(f"汇率表错误: {str(e)}", sequence_id)
+            return
+        base_currency = normalizer.base if normalizer else None
+        base_totals = RunningAmountStats()
+        
+        try:
+            stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as e:
+            self._output_stream_error(f"无法打开文件: {str(e)}", sequence_id)
+            return
+        
+        total_bytes = 0 if path == '-' else os.fstat(stream.fileno()).st_size
+        lines = ByteCountingLines(stream)
+        totals = RunningAmountStats()
+        processed = errors = 0
+        self._output_json({
+            "type": "text",
+            "content": f"流式处理金额数据: {'stdin' if path == '-' else path}",
+            "isError": False,
+            "isEnd": False,
+            "sequenceId": sequence_id
+        })
+        
+        try:
+            for chunk in chunked(stream_records(lines, path, fmt), chunk_size):
+                batch = AmountBatch()
+                rows = list(iter_amount_rows(chunk, start=processed, batch=batch, convert=normalizer))
+                errors += sum(1 for row in rows if row[4] != "ok")
+                self._output_amount_chunk(rows, processed, sequence_id, base_currency)
+                processed += len(rows)
+                totals.merge(batch)
+                if normalizer:
+                    base_totals.merge(normalizer.batch)
+                    normalizer.batch = AmountBatch()
+                self._output_json({
+                    "type": "progress",
+                    "content": {
+                        "current": lines.bytes_read,
+                        "total": total_bytes,
+                        "status": f"已处理{processed}条"
+                    },
+                    "isError": False,
+                    "isEnd": False,
+                    "sequenceId": sequence_id
+                })
+        except (AmountRecordError, ValueError) as e:
+            # 表头缺少amount列、格式不支持等无法继续读取的错误
+            self._output_json({
+                "type": "error",
+                "content": f"金额数据错误: {str(e)}",
+                "isError": True,
+                "isEnd": False,
+                "sequenceId": sequence_id
+            })
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+        
+        if len(totals):
+            self._output_stats_table(totals.stats_table(), sequence_id)
+        if len(base_totals):
+            self._output_stats_table(base_totals.stats_table(), sequence_id, base_currency)
+        self._output_json({
+            "type": "text",
+            "content": f"流式处理完成: 共{processed}条，成功{processed - errors}条，失败{errors}条",
+            "isError": False,
+            "isEnd": False,
+            "sequenceId": sequence_id
+        })
+        self._output_json({
+            "type": "end",
+            "content": "",
+            "isError": False,
+            "isEnd": True,
+            "sequenceId": sequence_id
+        })
+
+    def _output_stream_error(self, message: str, sequence_id: str = '') -> None:
+        """输出错误信息和结束标志"""
+        self._output_json({
+            "type": "error",
+            "content": message,
+            "isError": True,
+            "isEnd": False,
+            "sequenceId": sequence_id
+        })
+        self._output_json({
+            "type": "end",
+            "content": "",
+            "isError": False,
+            "isEnd": True,
+            "sequenceId": sequence_id
+        })
+
+    def _create_normalizer(self, fx_rates: Optional[str], fx_date: Optional[str]) -> Optional[FxNormalizer]:
+        """根据汇率表路径创建基准币种换算器，未指定汇率表时返回None"""
+        if not fx_rates:
+            return None
+        return FxNormalizer(load_rate_table(fx_rates), default_date=fx_date)
+
+    def _output_amount_chunk(self, rows: List[List[Any]], offset: int, sequence_id: str = '',
+                             base_currency: Optional[str] = None) -> None:
+        """输出一块批量处理结果；换算为基准币种时表头追加基准币种金额列"""
+        metadata = {"offset": offset, "count": len(rows)}
+        header = AMOUNT_TABLE_HEADER
+        if base_currency:
+            header = AMOUNT_TABLE_HEADER + [CONVERTED_COLUMN]
+            metadata["baseCurrency"] = base_currency
+        self._output_json({
+            "type": "table",
+            "content": {
+                "header": header,
+                "rows": rows,
+                "metadata": metadata
+            },
+            "isError": False,
+            "isEnd": False,
+            "sequenceId": sequence_id
+        })
+
+    def _output_stats_table(self, content: Dict[str, Any], sequence_id: str = '',
+                            base_currency: Optional[str] = None) -> None:
+        """输出汇总统计表；base_currency不为空时表示换算为基准币种后的汇总"""
+        if base_currency:
+            content["metadata"]["baseCurrency"] = base_currency
+        self._output_json({
+            "type": "table",
+            "content": content,
+            "isError": False,
+            "isEnd": False,
+            "sequenceId": sequence_id
+        })
+
     def _output_json(self, data: Dict[str, Any]) -> None:
-        """输出JSON格式的数据"""
-        print(json.dumps(data))
+        """输出JSON格式的数据；立即刷新，使流式处理的结果和进度能被实时读取"""
+        if self._recorded is not None:
+            self._recorded.append(data)
+        if self.output is not None:
+            self.output(data)
+            return
+        print(json.dumps(data), flush=True)
+
+    def _delay(self, seconds: float) -> None:
+        """模拟执行过程的等待，进程内调用时可关闭"""
+        if self.simulate_delay:
+            time.sleep(seconds)
     
     def _show_help(self) -> None:
         """显示帮助信息"""
@@ -213,7 +483,7 @@ class CmdThird:
         })
         self._output_json({
             "type": "text",
-            "content": "  python cmd-third.py \"{\\\"amount\\\": \\"100.00\\\", \\"currency\\\": \\"CNY\\\"}\"",
+            "content": "  python cmd-third.py \"{\\\"amount\\\": \\\"100.00\\\", \\\"currency\\\": \\\"CNY\\\"}\"",
             "isError": False,
             "isEnd": False
         })
@@ -224,32 +494,6 @@ class CmdThird:
             "isEnd": True
         })
 
-    def _capture_and_output_stream(self, stream, is_error: bool = False, sequence_id: str = '') -> None:
-        """捕获并输出流内容"""
-        if not stream:
-            return
-        
-        while True:
-            line = stream.readline()
-            if not line:
-                break
-            
-            # 移除行尾换行符
-            line = line.rstrip('\r\n')
-            
-            # 使用JSON格式输出内容
-            output_type = "error" if is_error else "text"
-            self._output_json({
-                "type": output_type,
-                "content": line,
-                "isError": is_error,
-                "isEnd": False,
-                "sequenceId": sequence_id
-            })
-            
-            # 添加小延迟，模拟实时输出效果
-            time.sleep(0.1)
-
     def _generate_additional_info(self, amount: str, currency: str, sequence_id: str = '') -> None:
         """生成额外的处理信息"""
         # 输出金额处理的详细信息
@@ -262,7 +506,7 @@ class CmdThird:
         })
         
         # 输出命令行代码块供用户进一步交互
-        time.sleep(0.5)
+        self._delay(0.5)
         self._output_json({
             "type": "text",
             "content": "是否需要进行更多金额处理操作？",
@@ -286,6 +530,22 @@ class CmdThird:
         })
 
 if __name__ == "__main__":
+    # 流式模式：python cmd-third.py --file <path|-> [--format csv|jsonl] [--chunk-size N] [--sequence-id ID]
+    if len(sys.argv) > 1 and sys.argv[1] == '--file':
+        parser = argparse.ArgumentParser(description='CmdThird流式模式，逐块处理CSV/JSONL金额文件或stdin')
+        parser.add_argument('--file', required=True, help='金额文件路径，-表示stdin')
+        parser.add_argument('--format', choices=STREAM_FORMATS, help='文件格式，默认根据扩展名或第一行推断')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_STREAM_CHUNK_SIZE,
+                            help='每块处理和输出的记录数')
+        parser.add_argument('--sequence-id', default='', help='输出消息中的序列号')
+        parser.add_argument('--fx-rates', help='汇率文件路径，指定后换算为基准币种')
+        parser.add_argument('--date', help='记录中没有date字段时使用的汇率日期，默认最新汇率')
+        args = parser.parse_args()
+        CmdThird()._process_amount_stream(args.file, fmt=args.format, chunk_size=args.chunk_size,
+                                          sequence_id=args.sequence_id, fx_rates=args.fx_rates,
+                                          fx_date=args.date)
+        sys.exit(0)
+    
     # 检查命令行参数
     if len(sys.argv) < 2:
         # 创建实例以访问类变量
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+金额计算引擎
+将金额字符串按币种的小数位数解析为整数最小货币单位（如分），在连续的array('q')缓冲区上
+做合计、按币种分组和最小值/最大值/百分位统计。全程使用整数运算，结果精确，没有浮点误差。
+"""
+
+from array import array
+from operator import methodcaller, sub
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .amount_processor import AmountRecordError
+
+# ISO 4217币种的小数位数，未列出的币种使用DEFAULT_EXPONENT
+CURRENCY_EXPONENTS: Dict[str, int] = {
+    **dict.fromkeys(['BIF', 'CLP', 'DJF', 'GNF', 'ISK', 'JPY', 'KMF', 'KRW', 'PYG',
+                     'RWF', 'UGX', 'UYI', 'VND', 'VUV', 'XAF', 'XOF', 'XPF'], 0),
+    **dict.fromkeys(['BHD', 'IQD', 'JOD', 'KWD', 'LYD', 'OMR', 'TND'], 3),
+    **dict.fromkeys(['CLF', 'UYW'], 4),
+}
+DEFAULT_EXPONENT = 2
+DEFAULT_PERCENTILES = (50, 90, 99)
+STATS_TABLE_HEADER = ["currency", "count", "total", "min", "max"]
+
+# 最小货币单位使用有符号64位整数存储
+_INT64_MIN = -(1 << 63)
+_INT64_MAX = (1 << 63) - 1
+_FIND_DOT = methodcaller('find', '.')
+_STRIP_DOT = methodcaller('replace', '.', '', 1)
+
+
+def currency_exponent(currency: str) -> int:
+    """返回币种的小数位数"""
+    return CURRENCY_EXPONENTS.get(currency, DEFAULT_EXPONENT)
+
+
+def to_minor_units(amount: str, currency: str) -> int:
+    """将规范的十进制金额字符串（见amount_processor.normalize_amount）转换为最小货币单位；
+    小数位数超过币种精度且不为0时抛出AmountRecordError"""
+    exponent = CURRENCY_EXPONENTS.get(currency, DEFAULT_EXPONENT)
+    dot = amount.find('.')
+    if len(amount) - dot == exponent + 1 if dot >= 0 else not exponent:
+        # 快速路径：小数位数正好等于币种精度，去掉小数点即为最小货币单位
+        try:
+            return int(amount[:dot] + amount[dot + 1:] if dot >= 0 else amount)
+        except ValueError:
+            pass
+    whole, _, fraction = amount.partition('.')
+    if len(fraction) > exponent:
+        if fraction[exponent:].strip('0'):
+            raise AmountRecordError(f"金额{amount}超出{currency}的精度（{exponent}位小数）")
+        fraction = fraction[:exponent]
+    if whole in ('', '+', '-'):
+        whole += '0'
+    try:
+        return int(whole + fraction.ljust(exponent, '0'))
+    except ValueError:
+        raise AmountRecordError(f"无效金额: {amount!r}") from None
+
+
+def to_minor_units_array(amounts: List[str], currency: str) -> array:
+    """将同一币种的一组金额字符串转换为array('q')
+
+    小数位数全部等于币种精度时（规范数据的常见情况）整组由map在C层完成转换，
+    否则逐条调用to_minor_units。
+    """
+    exponent = CURRENCY_EXPONENTS.get(currency, DEFAULT_EXPONENT)
+    if amounts:
+        if exponent:
+            canonical = set(map(sub, map(len, amounts), map(_FIND_DOT, amounts))) == {exponent + 1}
+        else:
+            canonical = max(map(_FIND_DOT, amounts)) < 0
+        if canonical:
+            try:
+                return array('q', map(int, map(_STRIP_DOT, amounts) if exponent else amounts))
+            except ValueError:
+                pass
+            except OverflowError:
+                raise AmountRecordError(f"{currency}金额超出可处理范围") from None
+    try:
+        return array('q', [to_minor_units(amount, currency) for amount in amounts])
+    except OverflowError:
+        raise AmountRecordError(f"{currency}金额超出可处理范围") from None
+
+
+def format_minor_units(units: int, currency: str) -> str:
+    """将最小货币单位格式化为按币种精度补齐小数位的十进制字符串"""
+    exponent = CURRENCY_EXPONENTS.get(currency, DEFAULT_EXPONENT)
+    sign = '-' if units < 0 else ''
+    digits = str(abs(units))
+    if not exponent:
+        return sign + digits
+    digits = digits.rjust(exponent + 1, '0')
+    return f"{sign}{digits[:-exponent]}.{digits[-exponent:]}"
+
+
+def percentile(sorted_units: Sequence[int], pct: float) -> int:
+    """最近秩法百分位，结果一定是样本中的某个值，因此保持精确"""
+    if not sorted_units:
+        raise ValueError("空样本没有百分位")
+    rank = -(-len(sorted_units) * pct // 100)  # 向上取整
+    return sorted_units[min(max(int(rank), 1), len(sorted_units)) - 1]
+
+
+class AmountBatch:
+    """按币种分组的列式金额缓冲区
+
+    每个币种对应一个array('q')，存放该币种的最小货币单位；合计、最小值、最大值直接在
+    缓冲区上由C实现完成。缓冲区支持buffer协议，需要时可零拷贝交给NumPy等库处理。
+    """
+
+    def __init__(self):
+        self._groups: Dict[str, array] = {}
+
+    def __len__(self) -> int:
+        return sum(len(units) for units in self._groups.values())
+
+    def append(self, amount: str, currency: str) -> int:
+        """追加一条规范化后的金额，返回其最小货币单位；无效时抛出AmountRecordError且不修改缓冲区"""
+        units = to_minor_units(amount, currency)
+        if not _INT64_MIN <= units <= _INT64_MAX:
+            raise AmountRecordError(f"金额{amount}超出可处理范围")
+        group = self._groups.get(currency)
+        if group is None:
+            group = self._groups[currency] = array('q')
+        group.append(units)
+        return units
+
+    def pop(self, currency: str) -> int:
+        """移除并返回某个币种最后追加的金额，用于追加后该记录的后续处理失败时回滚"""
+        group = self._groups[currency]
+        units = group.pop()
+        if not group:
+            del self._groups[currency]
+        return units
+
+    def extend(self, records: Iterable[Tuple[str, str]]) -> int:
+        """批量追加(金额, 币种)记录，先按币种分组再逐组转换；任一记录无效时抛出AmountRecordError，
+        缓冲区保持调用前的状态。返回追加的条数"""
+        pending: Dict[str, List[str]] = {}
+        for amount, currency in records:
+            bucket = pending.get(currency)
+            if bucket is None:
+                bucket = pending[currency] = []
+            bucket.append(amount)
+
+        converted = {currency: to_minor_units_array(amounts, currency) for currency, amounts in pending.items()}
+
+        for currency, units in converted.items():
+            self.extend_units(currency, units)
+        return sum(len(units) for units in converted.values())
+
+    def extend_units(self, currency: str, units: Iterable[int]) -> None:
+        """批量追加已是最小货币单位的整数"""
+        group = self._groups.get(currency)
+        if group is None:
+            group = self._groups[currency] = array('q')
+        group.extend(units)
+
+    def currencies(self) -> List[str]:
+        """返回已出现的币种（按代码排序）"""
+        return sorted(self._groups)
+
+    def group(self, currency: str) -> array:
+        """返回某个币种的缓冲区"""
+        return self._groups.get(currency, array('q'))
+
+    def totals(self) -> Dict[str, int]:
+        """各币种合计（最小货币单位）；Python整数求和不会溢出"""
+        return {currency: sum(units) for currency, units in sorted(self._groups.items())}
+
+    def stats(self, percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, Dict[str, Any]]:
+        """各币种的条数、合计、最小值、最大值和百分位（均为最小货币单位）"""
+        result: Dict[str, Dict[str, Any]] = {}
+        for currency, units in sorted(self._groups.items()):
+            if not units:
+                continue
+            entry: Dict[str, Any] = {
+                "count": len(units),
+                "total": sum(units),
+                "min": min(units),
+                "max": max(units),
+            }
+            if percentiles:
+                ordered = sorted(units)
+                for pct in percentiles:
+                    entry[f"p{pct:g}"] = percentile(ordered, pct)
+            result[currency] = entry
+        return result
+
+    def stats_table(self, percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, Any]:
+        """将统计结果转换为table消息的内容，金额按币种精度格式化为字符串"""
+        header = STATS_TABLE_HEADER + [f"p{pct:g}" for pct in percentiles]
+        return _stats_table(self.stats(percentiles), header)
+
+
+class RunningAmountStats:
+    """按币种累计的条数、合计、最小值和最大值
+
+    流式处理时每处理完一块就把该块的AmountBatch合并进来并丢弃缓冲区，
+    内存占用只与币种数量有关。百分位需要全部样本，因此不在这里计算。
+    """
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def merge(self, batch: AmountBatch) -> None:
+        """合并一块数据的统计结果"""
+        for currency, entry in batch.stats(percentiles=()).items():
+            current = self._stats.get(currency)
+            if current is None:
+                self._stats[currency] = entry
+                continue
+            current["count"] += entry["count"]
+            current["total"] += entry["total"]
+            current["min"] = min(current["min"], entry["min"])
+            current["max"] = max(current["max"], entry["max"])
+
+    def __len__(self) -> int:
+        return sum(entry["count"] for entry in self._stats.values())
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """各币种的累计统计（最小货币单位）"""
+        return {currency: dict(entry) for currency, entry in sorted(self._stats.items())}
+
+    def stats_table(self) -> Dict[str, Any]:
+        """将累计统计转换为table消息的内容"""
+        return _stats_table(self.stats(), STATS_TABLE_HEADER)
+
+
+def _stats_table(stats: Dict[str, Dict[str, Any]], header: List[str]) -> Dict[str, Any]:
+    """按表头生成统计表格，金额列按币种精度格式化为字符串"""
+    rows: List[List[Any]] = []
+    for currency, entry in stats.items():
+        rows.append([currency, entry["count"]] +
+                    [format_minor_units(entry[column], currency) for column in header[2:]])
+    return {"header": header, "rows": rows, "metadata": {"unit": "major"}}
+
+
+def aggregate(records: Iterable[Any], batch: Optional[AmountBatch] = None) -> AmountBatch:
+    """将(金额, 币种)序列汇总到缓冲区中，无效记录直接抛出AmountRecordError"""
+    batch = batch if batch is not None else AmountBatch()
+    for amount, currency in records:
+        batch.append(amount, currency)
+    return batch
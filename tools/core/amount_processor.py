@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+金额处理模块
+在进程内校验和格式化金额记录，供cmd-third.py的单条和批量模式使用，
+每条金额不再启动shell子进程。
+"""
+
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 批量结果表格的列；换算为基准币种时追加CONVERTED_COLUMN列
+AMOUNT_TABLE_HEADER = ["index", "amount", "currency", "formatted", "status", "error"]
+CONVERTED_COLUMN = "baseAmount"
+DEFAULT_CURRENCY = 'CNY'
+# 科学计数法展开后的最大位数，避免'1e50000000'之类的输入生成超长字符串
+MAX_AMOUNT_DIGITS = 64
+
+# 金额：可选符号，整数部分允许千分位逗号或下划线，可选小数部分
+_AMOUNT_PATTERN = re.compile(r'[+-]?(?:\d{1,3}(?:[,_]\d{3})+|\d+)(?:\.\d+)?|[+-]?\.\d+')
+_CURRENCY_PATTERN = re.compile(r'[A-Z]{3}')
+
+
+class AmountRecordError(ValueError):
+    """单条金额记录无效"""
+
+
+def normalize_amount(amount: Any) -> str:
+    """校验金额并返回规范的十进制字符串（去掉千分位分隔符和首尾空白）"""
+    if isinstance(amount, bool) or amount is None:
+        raise AmountRecordError(f"无效金额: {amount!r}")
+    if isinstance(amount, (int, Decimal)):
+        text = str(amount)
+    elif isinstance(amount, float):
+        # 浮点数按最短表示转换，避免二进制误差出现在结果中
+        text = repr(amount)
+    else:
+        text = str(amount).strip()
+
+    if not _AMOUNT_PATTERN.fullmatch(text):
+        try:
+            value = Decimal(text)
+        except InvalidOperation:
+            raise AmountRecordError(f"无效金额: {amount!r}") from None
+        if not value.is_finite():
+            raise AmountRecordError(f"无效金额: {amount!r}")
+        _, digits, exponent = value.as_tuple()
+        if max(len(digits) + max(exponent, 0), -exponent) > MAX_AMOUNT_DIGITS:
+            raise AmountRecordError(f"金额位数超出上限（{MAX_AMOUNT_DIGITS}位）: {amount!r}")
+        return format(value, 'f')
+    return text.replace(',', '').replace('_', '')
+
+
+def normalize_currency(currency: Any) -> str:
+    """校验币种代码（三位字母，不区分大小写），为空时使用默认币种"""
+    if currency is None or currency == '':
+        return DEFAULT_CURRENCY
+    code = str(currency).strip().upper()
+    if not _CURRENCY_PATTERN.fullmatch(code):
+        raise AmountRecordError(f"无效币种: {currency!r}")
+    return code
+
+
+def format_amount(amount: str, currency: str) -> str:
+    """生成金额的展示文本"""
+    if currency == 'CNY':
+        return f"处理人民币金额: {amount} 元"
+    return f"处理{currency}金额: {amount}"
+
+
+def process_amount_record(record: Any) -> Tuple[str, str, str]:
+    """校验并格式化单条记录，返回(规范金额, 币种, 展示文本)；记录无效时抛出AmountRecordError
+
+    流式读取时无法解析的行以AmountRecordError实例的形式出现在记录序列中，这里直接抛出。
+    """
+    if isinstance(record, AmountRecordError):
+        raise record
+    if not isinstance(record, dict):
+        raise AmountRecordError(f"记录必须是对象: {record!r}")
+    if 'amount' not in record:
+        raise AmountRecordError("缺少amount字段")
+    amount = normalize_amount(record['amount'])
+    currency = normalize_currency(record.get('currency'))
+    return amount, currency, format_amount(amount, currency)
+
+
+def iter_amount_rows(records: Iterable[Any], start: int = 0, batch: Any = None,
+                     convert: Optional[Callable[[str, str, Dict[str, Any]], Any]] = None) -> Iterator[List[Any]]:
+    """逐条处理记录并生成表格行，单条记录的错误只记录在该行中，不中断批次
+
+    提供batch（如amount_engine.AmountBatch）时，合法记录同时追加到batch中用于汇总统计，
+    追加时发现的错误（如超出币种精度）同样记录在该行中。
+    提供convert（如fx_rates.FxNormalizer）时，每行追加一列convert(金额, 币种, 原始记录)的结果，
+    convert只在追加到batch成功后调用；换算失败（如缺少汇率）的记录标记为错误，并从batch中移除。
+    """
+    for index, record in enumerate(records, start):
+        try:
+            amount, currency, formatted = process_amount_record(record)
+            if batch is not None:
+                batch.append(amount, currency)
+            try:
+                converted = convert(amount, currency, record) if convert is not None else None
+            except AmountRecordError:
+                if batch is not None:
+                    batch.pop(currency)
+                raise
+        except AmountRecordError as e:
+            raw = record if isinstance(record, dict) else {}
+            row = [index, _cell(raw.get('amount')), _cell(raw.get('currency')), "", "error", str(e)]
+            if convert is not None:
+                row.append("")
+            yield row
+        else:
+            row = [index, amount, currency, formatted, "ok", ""]
+            if convert is not None:
+                row.append(converted)
+            yield row
+
+
+def extract_records(input_data: Any) -> Any:
+    """从解析后的输入中取出批量记录：顶层数组或对象中的records数组；不是批量输入时返回None"""
+    if isinstance(input_data, list):
+        return input_data
+    if isinstance(input_data, dict) and isinstance(input_data.get('records'), list):
+        return input_data['records']
+    return None
+
+
+def _cell(value: Any) -> Any:
+    """将原始字段转换为可放入表格的值"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value if value is not None else ""
+    return str(value)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+金额记录流式读取模块
+以生成器流水线逐行读取CSV或JSONL格式的金额文件（或stdin），按块交给调用方处理，
+内存占用只与块大小有关，与文件行数无关。
+"""
+
+import os
+import csv
+import json
+from itertools import chain, islice
+from typing import Any, BinaryIO, Iterable, Iterator, List, Optional
+
+from .amount_processor import AmountRecordError
+
+DEFAULT_STREAM_CHUNK_SIZE = 5000
+STREAM_FORMATS = ('csv', 'jsonl')
+
+# 按扩展名推断格式
+_EXTENSION_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.json': 'jsonl'}
+
+
+class ByteCountingLines:
+    """逐行读取二进制流并解码为文本，同时记录已读取的字节数（用于输出进度）"""
+
+    def __init__(self, stream: BinaryIO, encoding: str = 'utf-8'):
+        self.stream = stream
+        self.encoding = encoding
+        self.bytes_read = 0
+        self._first = True
+
+    def __iter__(self) -> Iterator[str]:
+        for raw in self.stream:
+            self.bytes_read += len(raw)
+            line = raw.decode(self.encoding, errors='replace')
+            if self._first:
+                # 去掉Excel等工具导出CSV时写入的BOM
+                line = line.lstrip('\ufeff')
+                self._first = False
+            yield line
+
+
+def detect_format(path: str, first_line: Optional[str] = None) -> str:
+    """根据扩展名推断格式；无法推断（如stdin）时根据第一行内容判断"""
+    fmt = _EXTENSION_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt:
+        return fmt
+    if first_line is not None and first_line.lstrip('\ufeff \t').startswith('{'):
+        return 'jsonl'
+    return 'csv'
+
+
+def iter_jsonl_records(lines: Iterable[str]) -> Iterator[Any]:
+    """逐行解析JSONL，空行跳过；无法解析的行生成AmountRecordError实例而不是中断读取"""
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield AmountRecordError(f"第{line_no}行JSON解析错误: {e.msg}")
+
+
+def iter_csv_records(lines: Iterable[str]) -> Iterator[Any]:
+    """逐行解析带表头的CSV，表头需要包含amount列，currency列可选；
+    字段数与表头不一致或无法解析的行生成AmountRecordError实例"""
+    reader = csv.reader(lines)
+    try:
+        header = [column.strip() for column in next(reader)]
+    except StopIteration:
+        return
+    except csv.Error as e:
+        raise AmountRecordError(f"CSV表头解析错误: {e}") from None
+    if 'amount' not in header:
+        raise AmountRecordError(f"CSV表头缺少amount列: {header}")
+
+    width = len(header)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield AmountRecordError(f"第{reader.line_num}行CSV解析错误: {e}")
+            continue
+        if not row:
+            continue
+        if len(row) != width:
+            yield AmountRecordError(f"第{reader.line_num}行字段数为{len(row)}，与表头的{width}列不一致")
+            continue
+        yield dict(zip(header, row))
+
+
+def iter_records(lines: Iterable[str], fmt: str) -> Iterator[Any]:
+    """按格式选择解析器"""
+    if fmt == 'csv':
+        return iter_csv_records(lines)
+    if fmt == 'jsonl':
+        return iter_jsonl_records(lines)
+    raise ValueError(f"不支持的格式: {fmt}，可选: {', '.join(STREAM_FORMATS)}")
+
+
+def stream_records(lines: Iterable[str], path: str = '-', fmt: Optional[str] = None) -> Iterator[Any]:
+    """从文本行流中读取记录；未指定格式时根据路径扩展名或第一行内容推断"""
+    iterator = iter(lines)
+    if fmt is None:
+        first = next(iterator, None)
+        if first is None:
+            return iter(())
+        fmt = detect_format(path, first)
+        iterator = chain([first], iterator)
+    return iter_records(iterator, fmt)
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """将可迭代对象按固定大小分块，只在内存中保留当前块"""
+    if size <= 0:
+        raise ValueError("块大小必须大于0")
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
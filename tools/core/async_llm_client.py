@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+千问大模型异步客户端模块
+基于asyncio流实现的HTTP/1.1客户端，响应约定与QianwenClient.send_request相同（成功时返回解析后的JSON，
+失败时抛出带有相同错误信息的Exception），不依赖第三方异步HTTP库。
+
+- 按(协议, 主机, 端口)保持长连接池，连接数上限为pool_size，超出的请求排队等待空闲连接
+- 每个请求有总超时时间；请求被取消或超时时关闭对应连接，不会把读到一半的连接放回连接池
+- 单个事件循环可以同时进行数百个请求，gather_requests()并发发送多个请求并按顺序返回结果
+"""
+
+import os
+import ssl
+import json
+import time
+import asyncio
+import urllib.parse
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_ASYNC_POOL_SIZE = 100
+DEFAULT_TIMEOUT = 30.0
+# 空闲连接的保留时间（秒），超过后关闭，避免使用已被服务端关闭的连接
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+
+_MAX_LINE = 64 * 1024
+
+
+class _Connection:
+    """一条HTTP/1.1连接"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.idle_since = time.monotonic()
+        self.reused = False
+
+    def close(self) -> None:
+        self.writer.close()
+
+    async def request(self, method: str, target: str, headers: Dict[str, str],
+                      body: bytes) -> Tuple[int, Dict[str, str], bytes, bool]:
+        """发送请求并读取完整响应，返回(状态码, 响应头, 响应体, 连接是否可以复用)"""
+        lines = [f"{method} {target} HTTP/1.1"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("连接已被服务端关闭")
+        parts = status_line.decode('latin-1').split(' ', 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise ConnectionError(f"无效的HTTP响应: {status_line[:100]!r}")
+        status = int(parts[1])
+
+        response_headers: Dict[str, str] = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(line) > _MAX_LINE:
+                raise ConnectionError("HTTP响应头过长")
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        reusable = response_headers.get('connection', '').lower() != 'close'
+        if 'chunked' in response_headers.get('transfer-encoding', '').lower():
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';', 1)[0].strip() or b'0', 16)
+                if size == 0:
+                    # 跳过trailer
+                    while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            content = b''.join(chunks)
+        elif 'content-length' in response_headers:
+            content = await self.reader.readexactly(int(response_headers['content-length']))
+        elif status in (204, 304) or method == 'HEAD':
+            content = b''
+        else:
+            # 没有长度信息，读到连接关闭为止
+            content = await self.reader.read()
+            reusable = False
+        return status, response_headers, content, reusable
+
+
+class AsyncConnectionPool:
+    """按(协议, 主机, 端口)复用连接的连接池，每个主机同时使用的连接数不超过pool_size"""
+
+    def __init__(self, pool_size: int = DEFAULT_ASYNC_POOL_SIZE,
+                 keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY):
+        self.pool_size = pool_size
+        self.keepalive_expiry = keepalive_expiry
+        self._idle: Dict[Tuple[str, str, int], Deque[_Connection]] = {}
+        self._limits: Dict[Tuple[str, str, int], asyncio.Semaphore] = {}
+        self._ssl_context: Optional[ssl.SSLContext] = None
+        # 已建立的连接总数，用于测试和监控连接复用
+        self.connections_opened = 0
+
+    def _limit(self, key: Tuple[str, str, int]) -> asyncio.Semaphore:
+        limit = self._limits.get(key)
+        if limit is None:
+            limit = self._limits[key] = asyncio.Semaphore(self.pool_size)
+        return limit
+
+    async def _acquire(self, key: Tuple[str, str, int]) -> _Connection:
+        """取出一条未过期的空闲连接，没有时新建"""
+        idle = self._idle.get(key)
+        now = time.monotonic()
+        while idle:
+            connection = idle.pop()
+            if now - connection.idle_since < self.keepalive_expiry and not connection.reader.at_eof():
+                connection.reused = True
+                return connection
+            connection.close()
+        scheme, host, port = key
+        if scheme == 'https':
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            reader, writer = await asyncio.open_connection(host, port, ssl=self._ssl_context,
+                                                           server_hostname=host, limit=_MAX_LINE)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=_MAX_LINE)
+        self.connections_opened += 1
+        return _Connection(reader, writer)
+
+    def _release(self, key: Tuple[str, str, int], connection: _Connection) -> None:
+        connection.idle_since = time.monotonic()
+        connection.reused = False
+        self._idle.setdefault(key, deque()).append(connection)
+
+    async def request(self, method: str, url: str, headers: Dict[str, str],
+                      body: bytes = b'') -> Tuple[int, Dict[str, str], bytes]:
+        """发送请求，返回(状态码, 响应头, 响应体)
+
+        复用的空闲连接可能已被服务端关闭，此时在新连接上重试一次；
+        请求被取消或出错时关闭连接，不放回连接池。
+        """
+        parsed = urllib.parse.urlsplit(url)
+        scheme = parsed.scheme or 'http'
+        port = parsed.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parsed.hostname or 'localhost', port)
+        target = parsed.path or '/'
+        if parsed.query:
+            target += '?' + parsed.query
+        default_port = port == (443 if scheme == 'https' else 80)
+        headers = dict({'Host': parsed.hostname if default_port else f"{parsed.hostname}:{port}"}, **headers)
+        headers['Content-Length'] = str(len(body))
+
+        async with self._limit(key):
+            while True:
+                connection = await self._acquire(key)
+                try:
+                    status, response_headers, content, reusable = await connection.request(
+                        method, target, headers, body)
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    connection.close()
+                    if connection.reused and not isinstance(e, asyncio.IncompleteReadError):
+                        continue
+                    raise ConnectionError(str(e) or type(e).__name__) from e
+                except BaseException:
+                    # 包括取消和超时：连接上可能还有未读完的响应，不能复用
+                    connection.close()
+                    raise
+                if reusable:
+                    self._release(key, connection)
+                else:
+                    connection.close()
+                return status, response_headers, content
+
+    async def aclose(self) -> None:
+        """关闭全部空闲连接"""
+        writers = []
+        for idle in self._idle.values():
+            while idle:
+                connection = idle.pop()
+                connection.close()
+                writers.append(connection.writer)
+        self._idle.clear()
+        for writer in writers:
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+
+class AsyncQianwenClient:
+    """千问大模型异步客户端，响应约定与QianwenClient.send_request相同"""
+
+    def __init__(self, base_url: str = None, api_key: str = None, pool_size: int = DEFAULT_ASYNC_POOL_SIZE,
+                 timeout: float = DEFAULT_TIMEOUT, pool: Optional[AsyncConnectionPool] = None):
+        """初始化异步客户端，base_url和api_key为None时从环境变量读取
+
+        pool_size: 每个主机同时使用的最大连接数，即同时进行的请求数上限
+        timeout: 每个请求的总超时时间（秒）
+        pool: 共享的连接池，默认每个客户端使用自己的连接池
+        """
+        if base_url is None:
+            base_url = os.environ.get('LLM_BASE_URL', 'http://localhost:3000/api/qianwen')
+        if api_key is None:
+            api_key = os.environ.get('LLM_TOKEN', '')
+        self.base_url = base_url[:-1] if base_url.endswith('/') else base_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.pool = pool or AsyncConnectionPool(pool_size)
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+        }
+        if self.api_key:
+            headers['Authorization'] = f'Bearer {self.api_key}'
+        return headers
+
+    async def send_request(self, data: Dict[str, Any], sequence_id: Optional[str] = None,
+                           timeout: Optional[float] = None) -> Dict[str, Any]:
+        """异步向千问大模型发送请求；取消时直接向上抛出CancelledError"""
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        try:
+            status, _, content = await asyncio.wait_for(
+                self.pool.request('POST', f"{self.base_url}/chat/completions", self._headers(), body),
+                timeout=self.timeout if timeout is None else timeout
+            )
+        except asyncio.TimeoutError:
+            raise Exception("发送请求失败: Request timed out")
+        except (ConnectionError, OSError):
+            raise Exception("发送请求失败: Network Error")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            raise Exception(f"发送请求失败: {str(e)}")
+
+        text = content.decode('utf-8', errors='replace')
+        if status != 200:
+            raise Exception(f"API请求失败: HTTP {status}, {text}")
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            raise Exception(f"解析响应失败: 返回了无效的JSON格式数据")
+
+    async def aclose(self) -> None:
+        await self.pool.aclose()
+
+    async def __aenter__(self) -> 'AsyncQianwenClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+
+async def gather_requests(client: Any, requests: Iterable[Dict[str, Any]], concurrency: Optional[int] = None,
+                          return_exceptions: bool = True) -> List[Any]:
+    """并发发送多个请求，按输入顺序返回结果
+
+    client为AsyncQianwenClient或AsyncMockQianwenClient；concurrency限制同时进行的请求数（默认只受连接池限制）；
+    return_exceptions为True时失败的请求在对应位置返回异常对象，否则第一个异常直接抛出并取消其余请求。
+    """
+    semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+
+    async def send(data: Dict[str, Any]) -> Any:
+        if semaphore is None:
+            return await client.send_request(data)
+        async with semaphore:
+            return await client.send_request(data)
+
+    tasks = [asyncio.ensure_future(send(data)) for data in requests]
+    try:
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
@@ -8,29 +8,73 @@
 
 import json
 import os
-from typing import Dict, Any, List, Optional
-from .llm_client import QianwenClient
+import time
+import uuid
+import queue
+import threading
+from contextlib import closing
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional, Tuple
+from .llm_client import QianwenClient, client_metrics, response_events
+from .llm_cache import LLM_CACHE_ENV, CachedLLMClient, open_cache
+from .single_flight import flight_key, shared_flight
+from .conversation_store import estimate_tokens, open_conversation_store
+from .rate_limiter import rate_limiter_from_env
 from .mock_llm import MockQianwenClient
 from .tool_handler import ToolHandler
+from .tool_executor import ToolCallBatch, tool_budget_from_env
 from .output_formatter import OutputFormatter
+from .llm_timing import CallTimer, llm_latency, record_timing, timing_enabled
+from .tracing import Tracer, now_us
+
+# 流式模式的开关（环境变量LLM_STREAM=1）
+STREAM_ENV = 'LLM_STREAM'
+# 流式文本增量的合并间隔（秒）：间隔内到达的增量合并为一条消息输出，避免逐token输出
+STREAM_FLUSH_INTERVAL = 0.05
+# 工具选择方式（环境变量LLM_TOOL_SELECTION）：all提供全部工具，relevant只提供与请求内容相关的工具
+TOOL_SELECTION_ENV = 'LLM_TOOL_SELECTION'
+# 智能体循环的最大步数（环境变量LLM_AGENT_STEPS）：大于1时把工具结果作为新消息返回给大模型，直到回复不再调用工具
+AGENT_STEPS_ENV = 'LLM_AGENT_STEPS'
+# 智能体循环的总时间预算（秒，环境变量LLM_AGENT_BUDGET）
+AGENT_BUDGET_ENV = 'LLM_AGENT_BUDGET'
+DEFAULT_AGENT_BUDGET = 120.0
 
 class CommandProcessor:
     """命令处理器，负责处理命令解析和执行"""
     
-    def __init__(self, use_mock: bool = False):
-        """初始化命令处理器"""
+    def __init__(self, use_mock: bool = False, stream: Optional[bool] = None,
+                 conversation_id: Optional[str] = None, max_steps: Optional[int] = None):
+        """初始化命令处理器，stream为None时从环境变量LLM_STREAM读取是否使用流式模式
+
+        conversation_id为多轮会话的标识，为None时每个命令处理器开始一个新的会话。
+        max_steps为智能体循环的最大步数，为None时从环境变量LLM_AGENT_STEPS读取（默认1，即不把工具结果返回给大模型）。
+        """
         self.use_mock = use_mock
+        if stream is None:
+            stream = os.environ.get(STREAM_ENV, '').lower() in ('1', 'true', 'yes')
+        self.stream = stream
+        self.select_relevant_tools = os.environ.get(TOOL_SELECTION_ENV, '').lower() == 'relevant'
         self.formatter = OutputFormatter()
         self.tool_handler = ToolHandler(self.formatter)
+        # 每轮工具调用的总时间预算（秒，环境变量LLM_TOOL_BUDGET）
+        self.tool_budget = tool_budget_from_env()
+        try:
+            self.max_steps = max_steps if max_steps is not None else int(os.environ.get(AGENT_STEPS_ENV) or 1)
+            self.agent_budget = float(os.environ.get(AGENT_BUDGET_ENV) or DEFAULT_AGENT_BUDGET)
+        except ValueError:
+            raise ValueError(f"{AGENT_STEPS_ENV}、{AGENT_BUDGET_ENV}必须是数值")
+        # 每次大模型调用的耗时：LLM_TIMING=1时输出timing消息；网络层数据由QianwenClient在调用结束时报告
+        self.emit_timing = timing_enabled()
+        self._network_timings: List[Dict[str, Any]] = []
+        # 执行时间线追踪（TOOL_TRACE=1启用）
+        self.tracer = Tracer(process_name='command_processor')
         
         # 根据配置决定使用真实客户端还是模拟客户端
-        if use_mock:
-            self.llm_client = MockQianwenClient()
-        else:
-            # 从环境变量获取千问大模型配置
-            base_url = os.environ.get('LLM_BASE_URL', 'https://api-inference.modelscope.cn/v1/')
-            api_key = os.environ.get('LLM_TOKEN', '')
-            self.llm_client = QianwenClient(base_url, api_key)
+        self.llm_client = self._create_llm_client(use_mock)
+        # 同一进程中内容相同的进行中请求只向大模型发送一次
+        self.flight = shared_flight
+        # 多轮会话：请求带上当前会话在token预算内的最近消息（LLM_CONVERSATION_DB指定文件时跨进程保留）
+        self.conversations = open_conversation_store()
+        self.conversation_id = conversation_id or uuid.uuid4().hex
         
         # 命令映射表
         self.commands = {
@@ -41,8 +85,50 @@ class CommandProcessor:
             'code': self._handle_code,
         }
     
+    def _create_llm_client(self, use_mock: bool) -> Any:
+        """创建大模型客户端；设置了环境变量LLM_CACHE_DB时在前面加一层响应缓存
+
+        设置了LLM_RATE_LIMIT_RPM/LLM_RATE_LIMIT_TPM时，真实客户端按跨进程共享的配额限流。
+        """
+        if use_mock:
+            client = MockQianwenClient()
+        else:
+            # 从环境变量获取千问大模型配置
+            base_url = os.environ.get('LLM_BASE_URL', 'https://api-inference.modelscope.cn/v1/')
+            api_key = os.environ.get('LLM_TOKEN', '')
+            client = QianwenClient(base_url, api_key, rate_limiter=rate_limiter_from_env(),
+                                   timing_listener=self._network_timings.append)
+        cache_path = os.environ.get(LLM_CACHE_ENV)
+        if cache_path:
+            client = CachedLLMClient(client, open_cache(cache_path), metrics=client_metrics)
+        return client
+    
     def process_command(self, command: str, sequence_id: str = '') -> Any:
         """处理用户输入的命令"""
+        if not self.tracer.enabled:
+            return self._dispatch_command(command, sequence_id)
+        
+        start = now_us()
+        self.tracer.instant(sequence_id, 'request_received', ts=start)
+        try:
+            return self._dispatch_command(command, sequence_id)
+        finally:
+            self.tracer.complete(sequence_id, 'command', start, command=command)
+            self._flush_trace(sequence_id)
+    
+    def _flush_trace(self, sequence_id: str) -> None:
+        """输出本次命令的追踪数据消息，配置了TOOL_TRACE_DIR时同时写入磁盘"""
+        self.tracer.dump(sequence_id)
+        self.formatter.output_json({
+            "type": "trace",
+            "content": {"traceEvents": self.tracer.pop(sequence_id)},
+            "isError": False,
+            "isEnd": False,
+            "sequenceId": sequence_id
+        })
+    
+    def _dispatch_command(self, command: str, sequence_id: str = '') -> Any:
+        """解析命令并分发给对应的处理函数"""
         try:
             # 命令解析
             parts = command.strip().split(' ', 1)
@@ -72,10 +158,26 @@ class CommandProcessor:
         self.formatter.show_help()
     
     def _handle_info(self, args: str, sequence_id: str) -> None:
-        """处理信息命令"""
+        """处理信息命令；latency主题显示最近大模型调用的耗时统计"""
         topics = args.strip().split() if args.strip() else ['features']
+        if 'latency' in topics:
+            self._show_latency(sequence_id)
+            topics = [topic for topic in topics if topic != 'latency']
+            if not topics:
+                return
         self.formatter.show_info(topics)
     
+    def _show_latency(self, sequence_id: str) -> None:
+        """输出最近大模型调用的耗时统计表格"""
+        rows = llm_latency.rows()
+        if not rows:
+            self.formatter.output_text("还没有大模型调用的耗时数据", sequence_id=sequence_id)
+            return
+        self.formatter.output_table(
+            ["指标", "样本数", "p50", "p95", "最大值"], rows,
+            {"title": f"最近{llm_latency.summary()['calls']}次大模型调用的耗时"}, sequence_id
+        )
+    
     def _handle_qianwen(self, args: str, sequence_id: str) -> Any:
         """处理千问大模型命令"""
         if not args.strip():
@@ -85,16 +187,32 @@ class CommandProcessor:
         try:
             self.formatter.output_progress(0, 100, "正在向千问大模型发送请求...", sequence_id)
             
-            # 准备发送给千问大模型的请求
+            # 准备发送给千问大模型的请求：当前会话在token预算内的最近消息，本轮的用户消息在调用成功后才保存
+            user_message = {"role": "user", "content": args.strip()}
             request_data = {
-                "messages": [
-                    {"role": "user", "content": args.strip()}
-                ],
-                "tools": self.tool_handler.register_extension_tools(sequence_id)
+                "messages": self.conversations.window(self.conversation_id, pending=[user_message]),
+                "tools": self.tool_handler.register_extension_tools(
+                    sequence_id, args.strip() if self.select_relevant_tools else None
+                )
             }
             
+            if self.max_steps > 1:
+                return self._run_agent_loop(request_data, sequence_id, user_message)
+            if self.stream and hasattr(self.llm_client, 'stream_request'):
+                return self._stream_llm_response(request_data, sequence_id, user_message)
+            
             # 发送请求到千问大模型
-            response = self.llm_client.send_request(request_data, sequence_id)
+            timer = CallTimer()
+            with self.tracer.span(sequence_id, 'llm_request'):
+                response = self.flight.do(
+                    flight_key(self.llm_client, request_data),
+                    lambda: self.llm_client.send_request(request_data, sequence_id)
+                )
+            timer.first_token()
+            events = list(response_events(response))
+            self._finish_timing(timer, ''.join(e["content"] for e in events if e["type"] == "text"),
+                                [e["toolCall"] for e in events if e["type"] == "tool_call"], sequence_id)
+            self._remember_reply(response, user_message)
             self.formatter.output_progress(50, 100, "正在处理千问大模型响应...", sequence_id)
             
             # 处理响应
@@ -103,17 +221,37 @@ class CommandProcessor:
             self.formatter.output_error(f"千问大模型请求失败: {str(e)}", sequence_id)
             return None
     
+    def _remember_reply(self, response: Any, user_message: Optional[Dict[str, Any]] = None) -> None:
+        """把大模型的回复加入当前会话；工具调用记为文本摘要（不加入工具结果，避免发送不完整的tool_calls消息）
+
+        user_message为本轮尚未保存的用户消息，与回复一起保存；调用失败或回复为空时都不保存，
+        会话中不会出现连续的用户消息。
+        """
+        if isinstance(response, str):
+            response = {"content": response}
+        if not isinstance(response, dict) or response.get("error"):
+            return
+        content = response.get("content") or ''
+        calls = [
+            f"[调用工具] {call.get('name')} {json.dumps(call.get('parameters', {}), ensure_ascii=False)}"
+            for call in response.get("tool_calls") or []
+        ]
+        content = '\n'.join(([content] if content else []) + calls)
+        if content:
+            reply = {"role": "assistant", "content": content}
+            self.conversations.extend(self.conversation_id, [user_message, reply] if user_message else [reply])
+    
     def _process_llm_response(self, response: Dict[str, Any], sequence_id: str) -> Any:
         """处理大模型的响应"""
         # 检查响应是否包含工具调用
         if isinstance(response, dict) and "tool_calls" in response and response["tool_calls"]:
             self.formatter.output_progress(75, 100, "正在处理工具调用...", sequence_id)
             
-            # 处理所有工具调用
-            results = []
+            # 处理所有工具调用：声明为可并发的调用并发执行，输出按原始顺序
+            batch = ToolCallBatch(self.tool_handler, self.tracer, sequence_id, self.tool_budget)
             for tool_call in response["tool_calls"]:
-                result = self.tool_handler.handle_tool_call(tool_call, sequence_id)
-                results.append(result)
+                batch.submit(tool_call)
+            results = batch.finish()
             
             self.formatter.output_progress(100, 100, "工具调用处理完成", sequence_id)
             return results
@@ -127,6 +265,228 @@ class CommandProcessor:
         self.formatter.output_progress(100, 100, "响应处理完成", sequence_id)
         return response
     
+    def _stream_llm_response(self, request_data: Dict[str, Any], sequence_id: str,
+                             user_message: Optional[Dict[str, Any]] = None) -> Any:
+        """流式请求并处理大模型的响应
+
+        文本增量按STREAM_FLUSH_INTERVAL合并后立即输出，每个工具调用在参数拼装完整后立即交给ToolHandler执行，
+        不等待整个回复生成完毕；可并发的工具调用在后台执行，输出在下一个顺序调用之前或回复结束时按原始顺序发出。
+        """
+        events = self.flight.stream(
+            flight_key(self.llm_client, request_data, 'stream'),
+            lambda: self.llm_client.stream_request(request_data, sequence_id)
+        )
+        timer = CallTimer(stream=True)
+        batch = ToolCallBatch(self.tool_handler, self.tracer, sequence_id, self.tool_budget)
+        text, tool_calls = self._consume_events(self._timed_events(events, timer), batch, sequence_id)
+        self._finish_timing(timer, text, tool_calls, sequence_id)
+        results = batch.finish()
+        self._remember_reply({"content": text, "tool_calls": tool_calls}, user_message)
+        
+        self.formatter.output_progress(100, 100, "工具调用处理完成" if results else "响应处理完成", sequence_id)
+        return results if results else {"content": text}
+    
+    def _consume_events(self, events: Iterable[Dict[str, Any]], batch: ToolCallBatch,
+                        sequence_id: str) -> Tuple[str, List[Dict[str, Any]]]:
+        """输出流式事件：合并文本增量，工具调用参数完整后立即提交给batch；返回完整的文本和工具调用"""
+        pending: List[str] = []
+        text: List[str] = []
+        tool_calls: List[Dict[str, Any]] = []
+        last_flush = time.monotonic()
+        
+        def flush() -> None:
+            if pending:
+                self.formatter.output_text_delta(''.join(pending), sequence_id)
+                pending.clear()
+        
+        with self.tracer.span(sequence_id, 'llm_request', stream=True):
+            for event in events:
+                kind = event.get("type")
+                if kind == "text":
+                    if not text:
+                        self.formatter.output_progress(50, 100, "正在接收千问大模型响应...", sequence_id)
+                    text.append(event["content"])
+                    pending.append(event["content"])
+                    now = time.monotonic()
+                    if now - last_flush >= STREAM_FLUSH_INTERVAL:
+                        flush()
+                        last_flush = now
+                elif kind == "tool_call":
+                    flush()
+                    tool_call = event["toolCall"]
+                    tool_calls.append(tool_call)
+                    batch.submit(tool_call)
+                elif kind == "error":
+                    flush()
+                    self.formatter.output_error(event["content"], sequence_id)
+        flush()
+        return ''.join(text), tool_calls
+    
+    def _run_agent_loop(self, request_data: Dict[str, Any], sequence_id: str,
+                        user_message: Optional[Dict[str, Any]] = None) -> Any:
+        """多步智能体循环：把工具结果作为新消息返回给大模型，直到回复不再调用工具、达到最大步数或超出时间预算
+
+        每一步都流式接收回复（客户端支持时），工具调用在参数拼装完整后立即开始执行，与模型继续生成的时间重叠；
+        结束时输出agent_summary消息，报告步数、工具执行时间和重叠节省的等待时间（估算）。
+        本次命令中的工具调用和工具结果消息只在循环内发送，会话中只保存每一步回复的文本摘要。
+        时间预算也限制每一步的大模型调用：超出预算时停止等待回复，输出错误并结束循环。
+        """
+        start = time.monotonic()
+        deadline = start + self.agent_budget
+        scratch: List[Dict[str, Any]] = []
+        summary = {"steps": 0, "toolCalls": 0, "toolMs": 0.0, "overlapSavedMs": 0.0}
+        text, results = '', []
+        for step in range(1, self.max_steps + 1):
+            data = request_data
+            if scratch:
+                data = dict(request_data, messages=list(request_data["messages"]) + scratch)
+                self.formatter.output_progress(int(100 * (step - 1) / self.max_steps), 100,
+                                               f"第{step}步：把工具结果返回给千问大模型...", sequence_id)
+            batch = ToolCallBatch(self.tool_handler, self.tracer, sequence_id,
+                                  max(0.0, min(self.tool_budget, deadline - time.monotonic())))
+            timer = CallTimer(stream=hasattr(self.llm_client, 'stream_request'))
+            expired = threading.Event()
+            with self.tracer.span(sequence_id, 'agent_step', step=step):
+                events = self._events_until(lambda: self._request_events(data, sequence_id), deadline, expired)
+                with closing(events):
+                    text, tool_calls = self._consume_events(self._timed_events(events, timer), batch, sequence_id)
+                stream_end = time.monotonic()
+                self._finish_timing(timer, text, tool_calls, sequence_id)
+                results = batch.finish()
+            if expired.is_set():
+                # 回复不完整，不保存到会话
+                summary["steps"] = step
+                summary["toolCalls"] += len(tool_calls)
+                self.formatter.output_error(
+                    f"智能体循环超出时间预算（{self.agent_budget:g}秒），停止等待千问大模型的回复", sequence_id)
+                break
+            # 本轮的用户消息随第一个成功的回复一起保存
+            self._remember_reply({"content": text, "tool_calls": tool_calls}, user_message)
+            if text or tool_calls:
+                user_message = None
+            summary["steps"] = step
+            summary["toolCalls"] += len(tool_calls)
+            summary["toolMs"] += sum(d for d in batch.durations if d is not None) * 1000
+            summary["overlapSavedMs"] += batch.overlap_saved(stream_end) * 1000
+            if not tool_calls:
+                break
+            calls = [dict(call, id=call.get("id") or f"call_{step}_{index}") for index, call in enumerate(tool_calls)]
+            scratch.append({
+                "role": "assistant",
+                "content": text or None,
+                "tool_calls": [
+                    {"id": call["id"], "type": "function",
+                     "function": {"name": call.get("name", ""),
+                                  "arguments": json.dumps(call.get("parameters", {}), ensure_ascii=False)}}
+                    for call in calls
+                ]
+            })
+            scratch.extend(
+                {"role": "tool", "tool_call_id": call["id"],
+                 "content": json.dumps(result, ensure_ascii=False, default=str)}
+                for call, result in zip(calls, results)
+            )
+            if step == self.max_steps:
+                self.formatter.output_error(f"已达到智能体循环的最大步数（{self.max_steps}），停止调用大模型", sequence_id)
+            elif time.monotonic() >= deadline:
+                self.formatter.output_error(f"智能体循环超出时间预算（{self.agent_budget:g}秒），停止调用大模型", sequence_id)
+                break
+        
+        summary["elapsedMs"] = (time.monotonic() - start) * 1000
+        summary = {key: round(value, 1) if isinstance(value, float) else value for key, value in summary.items()}
+        client_metrics.increment("agent_steps", summary["steps"])
+        client_metrics.increment("agent_overlap_saved_ms", summary["overlapSavedMs"])
+        self.formatter.output_json({
+            "type": "agent_summary",
+            "content": summary,
+            "isError": False,
+            "isEnd": False,
+            "sequenceId": sequence_id
+        })
+        self.formatter.output_progress(100, 100, "工具调用处理完成" if results else "响应处理完成", sequence_id)
+        return results if results else {"content": text}
+    
+    def _events_until(self, make_events: Callable[[], Iterable[Dict[str, Any]]], deadline: float,
+                      expired: threading.Event) -> Iterator[Dict[str, Any]]:
+        """在后台线程中获取大模型回复的事件并逐个转发，超过deadline（time.monotonic）时停止等待并设置expired
+
+        上游停滞时单次调用可能持续客户端超时乘以重试次数，不能只在步骤之间检查时间预算；
+        停止等待（超时、处理事件时出错或调用方提前关闭本生成器）后，后台线程在下一个事件到达时关闭事件流，
+        不再继续读取、消耗额度。
+        """
+        events: "queue.Queue" = queue.Queue()
+        stopped = threading.Event()
+        
+        def produce() -> None:
+            stream = None
+            try:
+                stream = make_events()
+                for event in stream:
+                    if stopped.is_set():
+                        break
+                    events.put(("event", event))
+            except Exception as e:
+                events.put(("error", e))
+            finally:
+                if hasattr(stream, 'close'):
+                    stream.close()
+                events.put(("end", None))
+        
+        threading.Thread(target=produce, name='agent-llm-events', daemon=True).start()
+        try:
+            while True:
+                try:
+                    kind, value = events.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    expired.set()
+                    return
+                if kind == "end":
+                    return
+                if kind == "error":
+                    raise value
+                yield value
+        finally:
+            stopped.set()
+    
+    def _timed_events(self, events: Iterable[Dict[str, Any]], timer: CallTimer) -> Iterable[Dict[str, Any]]:
+        """转发事件，第一个文本增量或工具调用到达时标记首个token"""
+        for event in events:
+            if event.get("type") in ("text", "tool_call"):
+                timer.first_token()
+            yield event
+    
+    def _finish_timing(self, timer: CallTimer, text: str, tool_calls: List[Dict[str, Any]], sequence_id: str) -> None:
+        """记录一次大模型调用的耗时（直方图和info latency的滚动统计）；LLM_TIMING=1时输出timing消息"""
+        network = self._network_timings[-1] if self._network_timings else None
+        self._network_timings.clear()
+        tokens = estimate_tokens(text) + sum(
+            estimate_tokens(json.dumps(call.get("parameters", {}), ensure_ascii=False)) for call in tool_calls
+        )
+        timing = timer.finish(tokens, network)
+        record_timing(timing)
+        if self.emit_timing:
+            self.formatter.output_json({
+                "type": "timing",
+                "content": timing,
+                "isError": False,
+                "isEnd": False,
+                "sequenceId": sequence_id
+            })
+    
+    def _request_events(self, request_data: Dict[str, Any], sequence_id: str) -> Iterable[Dict[str, Any]]:
+        """以事件形式获取大模型的回复：客户端支持时使用流式请求，否则把一次性返回的响应转换为相同的事件"""
+        if hasattr(self.llm_client, 'stream_request'):
+            return self.flight.stream(
+                flight_key(self.llm_client, request_data, 'stream'),
+                lambda: self.llm_client.stream_request(request_data, sequence_id)
+            )
+        response = self.flight.do(
+            flight_key(self.llm_client, request_data), lambda: self.llm_client.send_request(request_data, sequence_id)
+        )
+        if isinstance(response, dict) and response.get("error"):
+            return [{"type": "error", "content": response["error"]}]
+        return response_events(response)
+    
     def _handle_code(self, args: str, sequence_id: str) -> None:
         """处理代码生成命令"""
         parts = args.strip().split(' ', 1)
@@ -153,13 +513,7 @@ class CommandProcessor:
         """设置是否使用模拟模式"""
         if use_mock != self.use_mock:
             self.use_mock = use_mock
-            if use_mock:
-                self.llm_client = MockQianwenClient()
-            else:
-                # 从环境变量获取千问大模型配置
-                base_url = os.environ.get('LLM_BASE_URL', 'https://api-inference.modelscope.cn/v1/')
-                api_key = os.environ.get('LLM_TOKEN', '')
-                self.llm_client = QianwenClient(base_url, api_key)
+            self.llm_client = self._create_llm_client(use_mock)
             
             self.formatter.output_text(f"已切换到{'模拟' if use_mock else '真实'}千问大模型模式", "")
     
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多轮会话存储模块
+按conversationId保存会话的消息，为每次请求构建不超过token预算的上下文窗口（最近的若干条消息）。
+
+- 每条消息追加时估算一次token数并序列化一次，之后构建窗口只累加缓存的token数、拼接缓存的JSON文本，
+  长会话不会在每一轮重新扫描、重新序列化全部历史
+- 窗口随追加增量移动：新消息加入末尾，超出预算的最早的消息从内存中移出（仍保留在文件中）
+- 两级存储：进程内按最近使用时间保留max_conversations个会话的窗口，下面是WAL模式的SQLite文件；
+  被淘汰的会话再次使用时只从文件读取窗口范围内的最近消息。path为None时只使用进程内存储，被淘汰的会话丢失
+- 超过TTL没有新消息的会话在打开文件时清理
+- 多个进程（如REST服务和interactive_tool）可以共用一个会话文件：序号在写事务中按文件中的最大序号分配，
+  进程内的窗口与文件中的序号不一致时从文件重新读取
+
+启用方式：
+- 环境变量 LLM_CONVERSATION_DB 指定会话文件路径（CommandProcessor、RESTful API服务）；未设置时使用进程内存储
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+CONVERSATION_DB_ENV = 'LLM_CONVERSATION_DB'
+DEFAULT_TOKEN_BUDGET = 4096
+DEFAULT_TTL = 30 * 24 * 3600
+# 每条消息的格式开销（角色、分隔符）
+MESSAGE_OVERHEAD = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    conversation TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    created REAL NOT NULL,
+    tokens INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (conversation, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS conversations (
+    conversation TEXT PRIMARY KEY,
+    updated REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS conversations_updated ON conversations (updated);
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数：中日韩等宽字符每个字符约1个token，其余字符约4个字符1个token"""
+    wide = sum(1 for ch in text if ch >= '\u2e80')
+    return wide + (len(text) - wide + 3) // 4
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """估算一条消息的token数（内容加格式开销，工具调用按其JSON文本计算）"""
+    tokens = MESSAGE_OVERHEAD + estimate_tokens(str(message.get('content') or ''))
+    if message.get('tool_calls'):
+        tokens += estimate_tokens(json.dumps(message['tool_calls'], ensure_ascii=False))
+    return tokens
+
+
+class ContextWindow(list):
+    """构建好的上下文窗口（消息列表）
+
+    json_text为由各条消息缓存的JSON文本拼接成的序列化结果，QianwenClient发送请求时直接拼接；
+    tokens为窗口内消息的估算token数之和；version为内容哈希，可以用作缓存键。
+    """
+
+    def __init__(self, messages: Iterable[Dict[str, Any]], texts: Iterable[str], tokens: int):
+        super().__init__(messages)
+        self.json_text = '[' + ','.join(texts) + ']'
+        self.tokens = tokens
+        self._version: Optional[str] = None
+
+    @property
+    def version(self) -> str:
+        if self._version is None:
+            self._version = hashlib.sha256(self.json_text.encode('utf-8')).hexdigest()[:16]
+        return self._version
+
+
+class _Entry:
+    """窗口内的一条消息：消息、序列化文本和估算的token数"""
+
+    __slots__ = ('message', 'text', 'tokens')
+
+    def __init__(self, message: Dict[str, Any], text: str, tokens: int):
+        self.message = message
+        self.text = text
+        self.tokens = tokens
+
+
+def _entry(message: Dict[str, Any]) -> _Entry:
+    """序列化消息并估算token数"""
+    return _Entry(message, json.dumps(message, ensure_ascii=False, separators=(',', ':')), message_tokens(message))
+
+
+class _Conversation:
+    """进程内保存的会话窗口"""
+
+    def __init__(self, next_seq: int = 0):
+        self.entries: Deque[_Entry] = deque()
+        self.tokens = 0
+        self.next_seq = next_seq
+
+    def push(self, entry: _Entry, budget: int) -> None:
+        """在末尾加入消息，移出超出预算的最早的消息（至少保留最新的一条）"""
+        self.entries.append(entry)
+        self.tokens += entry.tokens
+        while self.tokens > budget and len(self.entries) > 1:
+            self.tokens -= self.entries.popleft().tokens
+
+
+class ConversationStore:
+    """多轮会话存储，线程安全；path为None时只使用进程内存储"""
+
+    def __init__(self, path: Optional[str] = None, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 max_conversations: int = 256, ttl: float = DEFAULT_TTL):
+        self.path = path
+        self.token_budget = token_budget
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self._hot: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self._stats = {"memory_hits": 0, "disk_loads": 0, "appends": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            # 连接由锁保护，允许在REST服务的各个请求线程中使用
+            self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(_SCHEMA)
+            self._expire(time.time())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def append(self, conversation_id: str, role: str, content: Any, **fields: Any) -> Dict[str, Any]:
+        """在会话末尾追加一条消息并返回该消息；fields为其他消息字段（如name、tool_call_id）"""
+        message = {"role": role, "content": content, **fields}
+        self.extend(conversation_id, [message])
+        return message
+
+    def extend(self, conversation_id: str, messages: Iterable[Dict[str, Any]]) -> None:
+        """在会话末尾依次追加多条消息，在同一个事务中写入文件
+
+        用于大模型调用成功后一起保存本轮的用户消息和回复，失败的调用不在会话中留下没有回复的用户消息。
+        消息在写入文件成功后才加入进程内的窗口；写入失败时窗口不变。
+        """
+        entries = [_entry(message) for message in messages]
+        if not entries:
+            return
+        now = time.time()
+        with self._lock:
+            if self._conn is None:
+                conversation = self._load(conversation_id)
+            else:
+                # BEGIN IMMEDIATE先取得写锁，其他进程不能在读取最大序号和插入之间追加消息
+                self._conn.execute('BEGIN IMMEDIATE')
+                try:
+                    next_seq = self._stored_next_seq(conversation_id)
+                    # 在插入之前读取，重新加载的窗口与文件中已有的消息一致
+                    conversation = self._load(conversation_id, next_seq)
+                    self._conn.executemany(
+                        'INSERT INTO messages (conversation, seq, created, tokens, message) VALUES (?, ?, ?, ?, ?)',
+                        [(conversation_id, next_seq + i, now, entry.tokens, entry.text)
+                         for i, entry in enumerate(entries)]
+                    )
+                    self._conn.execute('INSERT OR REPLACE INTO conversations (conversation, updated) VALUES (?, ?)',
+                                       (conversation_id, now))
+                except BaseException:
+                    self._conn.execute('ROLLBACK')
+                    raise
+                self._conn.execute('COMMIT')
+            for entry in entries:
+                conversation.next_seq += 1
+                conversation.push(entry, self.token_budget)
+            self._stats["appends"] += len(entries)
+
+    def window(self, conversation_id: str, token_budget: Optional[int] = None,
+               pending: Iterable[Dict[str, Any]] = ()) -> ContextWindow:
+        """返回会话最近的、估算token数之和不超过预算的消息（至少包含最新的一条）
+
+        token_budget不能超过存储的token_budget（更早的消息不在内存中），超过时按存储的预算处理。
+        pending为尚未保存的消息（如本轮的用户消息），放在窗口末尾并计入预算，调用成功后再用extend保存。
+        """
+        budget = min(token_budget or self.token_budget, self.token_budget)
+        extra = [_entry(message) for message in pending]
+        with self._lock:
+            stored_next = self._stored_next_seq(conversation_id) if self._conn is not None else None
+            conversation = self._load(conversation_id, stored_next)
+            entries = list(conversation.entries) + extra
+            tokens = conversation.tokens + sum(entry.tokens for entry in extra)
+        start = 0
+        while tokens > budget and start < len(entries) - 1:
+            tokens -= entries[start].tokens
+            start += 1
+        entries = entries[start:]
+        # 返回消息的浅拷贝，调用方修改消息不影响存储的内容
+        return ContextWindow((dict(entry.message) for entry in entries), (entry.text for entry in entries), tokens)
+
+    def history(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """返回会话的全部消息（从文件读取；只使用进程内存储时为窗口内的消息）"""
+        with self._lock:
+            if self._conn is None:
+                conversation = self._hot.get(conversation_id)
+                return [dict(entry.message) for entry in conversation.entries] if conversation else []
+            rows = self._conn.execute('SELECT message FROM messages WHERE conversation = ? ORDER BY seq',
+                                      (conversation_id,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def delete(self, conversation_id: str) -> None:
+        with self._lock:
+            self._hot.pop(conversation_id, None)
+            if self._conn is not None:
+                self._conn.execute('DELETE FROM messages WHERE conversation = ?', (conversation_id,))
+                self._conn.execute('DELETE FROM conversations WHERE conversation = ?', (conversation_id,))
+
+    def stats(self) -> Dict[str, Any]:
+        """返回进程内命中、从文件加载、追加、淘汰的次数和进程内的会话数"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["conversations"] = len(self._hot)
+        return stats
+
+    def _stored_next_seq(self, conversation_id: str) -> int:
+        """返回文件中会话的下一个序号（调用方持有锁）"""
+        return self._conn.execute('SELECT COALESCE(MAX(seq), -1) + 1 FROM messages WHERE conversation = ?',
+                                  (conversation_id,)).fetchone()[0]
+
+    def _load(self, conversation_id: str, stored_next: Optional[int] = None) -> _Conversation:
+        """返回会话窗口，不在进程内时从文件读取窗口范围内的最近消息（调用方持有锁）
+
+        stored_next为文件中会话的下一个序号，与进程内的窗口不一致（其他进程追加了消息）时重新读取。
+        """
+        conversation = self._hot.get(conversation_id)
+        if conversation is not None and stored_next is not None and conversation.next_seq != stored_next:
+            del self._hot[conversation_id]
+            conversation = None
+        if conversation is not None:
+            self._hot.move_to_end(conversation_id)
+            self._stats["memory_hits"] += 1
+            return conversation
+        conversation = _Conversation()
+        if self._conn is not None:
+            rows: List[Tuple[int, int, str]] = []
+            tokens = 0
+            # 从最新的消息向前读取，使用保存的token数，超出预算后停止，不读取更早的历史
+            for seq, count, text in self._conn.execute(
+                    'SELECT seq, tokens, message FROM messages WHERE conversation = ? ORDER BY seq DESC',
+                    (conversation_id,)):
+                if rows and tokens + count > self.token_budget:
+                    break
+                rows.append((seq, count, text))
+                tokens += count
+            if rows:
+                conversation.next_seq = rows[0][0] + 1
+                for _, count, text in reversed(rows):
+                    conversation.push(_Entry(json.loads(text), text, count), self.token_budget)
+                self._stats["disk_loads"] += 1
+        self._hot[conversation_id] = conversation
+        while len(self._hot) > self.max_conversations:
+            self._hot.popitem(last=False)
+            self._stats["evictions"] += 1
+        return conversation
+
+    def _expire(self, now: float) -> None:
+        """删除超过TTL没有新消息的会话（调用方持有锁或在初始化中）"""
+        cutoff = now - self.ttl
+        expired = self._conn.execute('SELECT conversation FROM conversations WHERE updated < ?',
+                                     (cutoff,)).fetchall()
+        self._conn.executemany('DELETE FROM messages WHERE conversation = ?', expired)
+        self._conn.execute('DELETE FROM conversations WHERE updated < ?', (cutoff,))
+
+
+_stores: Dict[str, ConversationStore] = {}
+_stores_lock = threading.Lock()
+
+
+def open_conversation_store(path: Optional[str] = None) -> ConversationStore:
+    """打开会话存储；path为None时使用环境变量LLM_CONVERSATION_DB，都没有时使用进程内存储。
+    同一文件（以及进程内存储）在进程内只打开一次。
+    """
+    path = path or os.environ.get(CONVERSATION_DB_ENV) or ''
+    real_path = os.path.realpath(path) if path else ''
+    with _stores_lock:
+        store = _stores.get(real_path)
+        if store is None:
+            store = _stores[real_path] = ConversationStore(real_path or None)
+        return store
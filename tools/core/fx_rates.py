@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地汇率表模块
+汇率历史保存在定长记录的二进制文件中，按(币种, 日期)排序，读取时内存映射并二分查找。
+同一进程内每个文件只加载一次，(币种, 日期)的汇率查询结果会被缓存，批量换算不会逐条读文件。
+
+文件由CSV生成（列：date,currency,rate，rate为1单位该币种折合多少基准币种）：
+python -m core.fx_rates build rates.csv rates.fxr --base CNY   （在tools目录下执行）
+"""
+
+import os
+import re
+import csv
+import mmap
+import struct
+import datetime
+import threading
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .amount_processor import AmountRecordError, normalize_currency
+from .amount_engine import AmountBatch, currency_exponent, format_minor_units, to_minor_units
+
+# 文件头：魔数、基准币种、记录数；记录：币种、日期(YYYYMMDD)、按RATE_SCALE放大的汇率
+_MAGIC = b'FXR1'
+_HEADER = struct.Struct('<4s3sxI')
+_RECORD = struct.Struct('<3sxiq')
+# 汇率保留10位小数，以整数存储，换算全程为整数运算
+RATE_SCALE = 10 ** 10
+# 未指定日期时使用最新汇率
+LATEST_DATE = 99991231
+
+_DATE_PATTERN = re.compile(r'(\d{4})-?(\d{2})-?(\d{2})')
+
+
+class FxRateError(AmountRecordError):
+    """汇率缺失或汇率文件无效"""
+
+
+def parse_date(value: Any) -> int:
+    """将YYYY-MM-DD或YYYYMMDD转换为整数日期；空值表示最新汇率"""
+    if value is None or value == '':
+        return LATEST_DATE
+    match = _DATE_PATTERN.fullmatch(str(value).strip())
+    if not match:
+        raise AmountRecordError(f"无效日期: {value!r}")
+    year, month, day = (int(part) for part in match.groups())
+    try:
+        # 按实际月份天数和闰年校验，拒绝2024-02-31之类不存在的日期
+        datetime.date(year, month, day)
+    except ValueError:
+        raise AmountRecordError(f"无效日期: {value!r}") from None
+    return year * 10000 + month * 100 + day
+
+
+def format_date(date: int) -> str:
+    """将整数日期格式化为YYYY-MM-DD"""
+    return f"{date // 10000:04d}-{date // 100 % 100:02d}-{date % 100:02d}"
+
+
+def parse_rate(value: Any) -> int:
+    """将汇率转换为按RATE_SCALE放大的整数，超出精度的部分按银行家舍入"""
+    try:
+        rate = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise FxRateError(f"无效汇率: {value!r}") from None
+    if not rate.is_finite() or rate <= 0:
+        raise FxRateError(f"无效汇率: {value!r}")
+    return int((rate * RATE_SCALE).to_integral_value(rounding=ROUND_HALF_EVEN))
+
+
+def write_rate_file(path: str, base: str, rates: Iterable[Tuple[str, Any, Any]]) -> int:
+    """将(币种, 日期, 汇率)写入汇率文件，同一币种同一日期以最后一条为准，返回记录数"""
+    base = normalize_currency(base)
+    entries: Dict[Tuple[bytes, int], int] = {}
+    for currency, date, rate in rates:
+        code = normalize_currency(currency)
+        entries[(code.encode('ascii'), parse_date(date))] = parse_rate(rate)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, base.encode('ascii'), len(entries)))
+        for (code, date), rate in sorted(entries.items()):
+            f.write(_RECORD.pack(code, date, rate))
+    os.replace(tmp_path, path)
+    return len(entries)
+
+
+def read_rate_csv(path: str) -> List[Tuple[str, str, str]]:
+    """读取带表头的汇率CSV（date,currency,rate）"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return [(row['currency'], row['date'], row['rate']) for row in csv.DictReader(f)]
+
+
+class FxRateTable:
+    """内存映射的汇率表，按(币种, 日期)二分查找当日或之前最近一天的汇率"""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, 'rb') as f:
+                # 空文件无法映射，mmap抛出ValueError
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise FxRateError(f"无法打开汇率文件: {e}") from None
+        if len(self._mmap) < _HEADER.size:
+            self._mmap.close()
+            raise FxRateError(f"汇率文件无效: {path}")
+        magic, base, count = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or len(self._mmap) != _HEADER.size + count * _RECORD.size:
+            self._mmap.close()
+            raise FxRateError(f"汇率文件无效: {path}")
+        self.base = base.decode('ascii')
+        self.count = count
+        self._rates: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def _record(self, index: int) -> Tuple[bytes, int, int]:
+        return _RECORD.unpack_from(self._mmap, _HEADER.size + index * _RECORD.size)
+
+    def _lookup(self, code: bytes, date: int) -> Optional[int]:
+        """二分查找(code, date)之前（含）的最后一条记录"""
+        lo, hi = 0, self.count
+        key = (code, date)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            record = self._record(mid)
+            if (record[0], record[1]) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo:
+            record = self._record(lo - 1)
+            if record[0] == code:
+                return record[2]
+        return None
+
+    def rate(self, currency: str, date: int = LATEST_DATE) -> int:
+        """返回1单位currency折合基准币种的汇率（按RATE_SCALE放大），结果按(币种, 日期)缓存"""
+        key = (currency, date)
+        rate = self._rates.get(key)
+        if rate is None:
+            if currency == self.base:
+                rate = RATE_SCALE
+            else:
+                rate = self._lookup(currency.encode('ascii'), date)
+                if rate is None:
+                    if date == LATEST_DATE:
+                        raise FxRateError(f"没有{currency}的汇率")
+                    raise FxRateError(f"没有{currency}在{format_date(date)}及之前的汇率")
+            with self._lock:
+                self._rates[key] = rate
+        return rate
+
+    def convert_minor_units(self, units: int, currency: str, date: int = LATEST_DATE) -> int:
+        """将currency的最小货币单位换算为基准币种的最小货币单位，按银行家舍入"""
+        rate = self.rate(currency, date)
+        numerator = units * rate * 10 ** currency_exponent(self.base)
+        denominator = RATE_SCALE * 10 ** currency_exponent(currency)
+        quotient, remainder = divmod(numerator, denominator)
+        # divmod向下取整，余数总是非负；超过一半或恰好一半且商为奇数时进位
+        if remainder * 2 > denominator or (remainder * 2 == denominator and quotient % 2):
+            quotient += 1
+        return quotient
+
+
+_tables: Dict[Tuple[str, int], FxRateTable] = {}
+_tables_lock = threading.Lock()
+
+
+def load_rate_table(path: str) -> FxRateTable:
+    """加载汇率表；同一文件在进程内只映射一次，文件被替换（修改时间变化）后重新加载
+
+    旧的汇率表只从缓存中移除而不关闭：其他线程中的请求可能仍在使用，映射在不再被引用时释放。
+    """
+    real_path = os.path.realpath(path)
+    try:
+        key = (real_path, os.stat(real_path).st_mtime_ns)
+    except OSError as e:
+        raise FxRateError(f"无法打开汇率文件: {e}") from None
+    with _tables_lock:
+        table = _tables.get(key)
+        if table is None:
+            for stale in [k for k in _tables if k[0] == real_path]:
+                del _tables[stale]
+            table = _tables[key] = FxRateTable(real_path)
+        return table
+
+
+class FxNormalizer:
+    """将批量记录换算为基准币种
+
+    作为amount_processor.iter_amount_rows的convert参数使用：返回换算后的基准币种金额，
+    同时把换算结果追加到self.batch中，用于输出基准币种的汇总统计。
+    """
+
+    def __init__(self, table: FxRateTable, default_date: Any = None):
+        self.table = table
+        self.base = table.base
+        self.default_date = parse_date(default_date)
+        self.batch = AmountBatch()
+        self._dates: Dict[Any, int] = {}
+
+    def __call__(self, amount: str, currency: str, record: Dict[str, Any]) -> str:
+        raw_date = record.get('date')
+        if raw_date is None or raw_date == '':
+            date = self.default_date
+        else:
+            key = raw_date if isinstance(raw_date, str) else str(raw_date)
+            date = self._dates.get(key)
+            if date is None:
+                date = self._dates[key] = parse_date(key)
+        units = self.table.convert_minor_units(to_minor_units(amount, currency), currency, date)
+        try:
+            self.batch.extend_units(self.base, (units,))
+        except OverflowError:
+            raise AmountRecordError(f"金额{amount}换算后超出可处理范围") from None
+        return format_minor_units(units, self.base)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description='汇率表工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help='由CSV（date,currency,rate）生成汇率文件')
+    build.add_argument('csv_path', help='汇率CSV路径')
+    build.add_argument('output', help='输出的汇率文件路径')
+    build.add_argument('--base', default='CNY', help='基准币种')
+    args = parser.parse_args(argv)
+
+    count = write_rate_file(args.output, args.base, read_rate_csv(args.csv_path))
+    print(f"已写入{count}条汇率到{args.output}（基准币种{args.base.upper()}）")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
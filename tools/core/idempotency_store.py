@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+金额提交幂等存储模块
+以(sequenceId, 内容哈希)为键保存一次处理输出的全部消息，重复提交（如webview超时重试）
+直接返回保存的结果，不再重新处理。
+
+- 持久层为WAL模式的SQLite，命令行和direct_comm_server可以同时读写同一个文件
+- 主键为(sequence_id, content_hash)的聚簇B树（WITHOUT ROWID），前面再加一层进程内LRU热缓存，
+  查询开销不随表的增长而明显变化
+- 超过TTL的记录在查询时视为不存在，并在打开时和每写入compact_every条后批量清理
+- 处理开始前用claim在processing表中登记键，同一键的提交（包括其他进程中的）正在处理时等待其完成后重放结果，
+  不会在第一次提交还没结束时被重复处理；登记超过claim_timeout的视为处理方已退出，可以被接管
+
+启用方式：
+- 环境变量 AMOUNT_IDEMPOTENCY_DB 指定数据库文件路径（cmd-third.py）
+- direct_comm_server.py 的 --idempotency-db 参数
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+IDEMPOTENCY_DB_ENV = 'AMOUNT_IDEMPOTENCY_DB'
+DEFAULT_TTL = 24 * 3600
+DEFAULT_CLAIM_TIMEOUT = 120.0
+# 等待同一键的处理完成时查询结果的间隔（秒）
+CLAIM_POLL_INTERVAL = 0.05
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    sequence_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    created REAL NOT NULL,
+    messages TEXT NOT NULL,
+    PRIMARY KEY (sequence_id, content_hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS submissions_created ON submissions (created);
+CREATE TABLE IF NOT EXISTS processing (
+    sequence_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    started REAL NOT NULL,
+    PRIMARY KEY (sequence_id, content_hash)
+) WITHOUT ROWID;
+"""
+
+
+def content_hash(data: Any) -> str:
+    """计算提交内容的哈希；sequenceId不参与计算，键的顺序不影响结果"""
+    if isinstance(data, dict) and 'sequenceId' in data:
+        data = {key: value for key, value in data.items() if key != 'sequenceId'}
+    text = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class IdempotencyStore:
+    """按(sequenceId, 内容哈希)保存处理结果的幂等存储，线程安全"""
+
+    def __init__(self, path: str, ttl: float = DEFAULT_TTL, hot_size: int = 1024,
+                 compact_every: int = 1000, claim_timeout: float = DEFAULT_CLAIM_TIMEOUT):
+        self.path = path
+        self.ttl = ttl
+        self.claim_timeout = claim_timeout
+        self.hot_size = hot_size
+        self.compact_every = compact_every
+        self._hot: "OrderedDict[Tuple[str, str], Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._writes = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # 连接由锁保护，允许在ThreadingMixIn的各个请求线程中使用
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        self.compact()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def get(self, sequence_id: str, digest: str) -> Optional[List[Dict[str, Any]]]:
+        """返回保存的消息列表；不存在或已过期时返回None"""
+        key = (sequence_id, digest)
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            entry = self._hot.get(key)
+            if entry is not None:
+                if entry[0] >= cutoff:
+                    self._hot.move_to_end(key)
+                    return entry[1]
+                del self._hot[key]
+            row = self._conn.execute(
+                'SELECT created, messages FROM submissions WHERE sequence_id = ? AND content_hash = ?',
+                key
+            ).fetchone()
+            if row is None or row[0] < cutoff:
+                return None
+            messages = json.loads(row[1])
+            self._remember(key, row[0], messages)
+            return messages
+
+    def put(self, sequence_id: str, digest: str, messages: List[Dict[str, Any]]) -> bool:
+        """保存一次处理的输出；同一键已存在（如并发的重复提交）时以先保存的为准，返回是否写入"""
+        key = (sequence_id, digest)
+        created = time.time()
+        text = json.dumps(messages, ensure_ascii=False)
+        with self._lock:
+            # 已过期但尚未清理的记录直接覆盖
+            inserted = self._conn.execute(
+                'INSERT INTO submissions (sequence_id, content_hash, created, messages) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (sequence_id, content_hash) DO UPDATE SET '
+                'created = excluded.created, messages = excluded.messages WHERE created < ?',
+                (sequence_id, digest, created, text, created - self.ttl)
+            ).rowcount == 1
+            if inserted:
+                self._remember(key, created, messages)
+                self._writes += 1
+            due = inserted and self.compact_every and self._writes % self.compact_every == 0
+        if due:
+            self.compact()
+        return inserted
+
+    def claim(self, sequence_id: str, digest: str) -> Optional[List[Dict[str, Any]]]:
+        """取得键的处理权并返回None，调用方处理并put结果后必须调用release；
+        已有保存的结果时直接返回；同一键正在处理时等待，处理方保存结果后返回该结果，
+        处理方没有保存结果就release，或登记超过claim_timeout时取得处理权
+        """
+        while True:
+            messages = self.get(sequence_id, digest)
+            if messages is not None:
+                return messages
+            now = time.time()
+            with self._lock:
+                claimed = self._conn.execute(
+                    'INSERT INTO processing (sequence_id, content_hash, started) VALUES (?, ?, ?) '
+                    'ON CONFLICT (sequence_id, content_hash) DO UPDATE SET '
+                    'started = excluded.started WHERE started < ?',
+                    (sequence_id, digest, now, now - self.claim_timeout)
+                ).rowcount == 1
+            if claimed:
+                # 登记之前处理方可能刚好保存结果并release
+                messages = self.get(sequence_id, digest)
+                if messages is not None:
+                    self.release(sequence_id, digest)
+                return messages
+            time.sleep(CLAIM_POLL_INTERVAL)
+
+    def release(self, sequence_id: str, digest: str) -> None:
+        """释放claim取得的处理权"""
+        with self._lock:
+            self._conn.execute('DELETE FROM processing WHERE sequence_id = ? AND content_hash = ?',
+                               (sequence_id, digest))
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """删除超过TTL的记录，返回删除的条数（按created索引范围删除，不扫描全表）"""
+        now = time.time() if now is None else now
+        cutoff = now - self.ttl
+        with self._lock:
+            deleted = self._conn.execute('DELETE FROM submissions WHERE created < ?', (cutoff,)).rowcount
+            # 处理方已退出、没有release的登记
+            self._conn.execute('DELETE FROM processing WHERE started < ?', (now - self.claim_timeout,))
+            for key in [key for key, entry in self._hot.items() if entry[0] < cutoff]:
+                del self._hot[key]
+        return deleted
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM submissions').fetchone()[0]
+
+    def _remember(self, key: Tuple[str, str], created: float, messages: List[Dict[str, Any]]) -> None:
+        """放入热缓存，超过上限时淘汰最久未使用的条目（调用方持有锁）"""
+        self._hot[key] = (created, messages)
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_size:
+            self._hot.popitem(last=False)
+
+
+_stores: Dict[str, IdempotencyStore] = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(path: str, ttl: float = DEFAULT_TTL) -> IdempotencyStore:
+    """打开幂等存储；同一文件在进程内只打开一次，再次打开时ttl必须相同"""
+    real_path = os.path.realpath(path)
+    with _stores_lock:
+        store = _stores.get(real_path)
+        if store is None:
+            store = _stores[real_path] = IdempotencyStore(real_path, ttl=ttl)
+        elif store.ttl != ttl:
+            raise ValueError(f"幂等存储{real_path}已按TTL {store.ttl:g}秒打开，不能再按{ttl:g}秒打开")
+        return store
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+工具输入解析模块
+为execinfo.py和cmd-third.py提供统一的容错输入解析，支持：
+1. 标准JSON：{"content":"dir","projectDir":""}
+2. 多一层转义的JSON：{\"content\":\"dir\",\"projectDir\":\"\"}
+3. PowerShell去掉引号后的格式：{content:dir,projectDir:}
+
+根据开头的几个字符选择一条快速路径（标准JSON直接json.loads；规范的多一层转义JSON
+去掉一层转义后json.loads），快速路径失败或不适用时由单遍扫描器在原字符串上
+容错解析。扫描器不做整体替换，因此值中的反斜杠（如Windows路径）和逗号都能保留。
+"""
+
+import re
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# 无引号格式中的键：标识符后跟冒号
+_BARE_KEY = re.compile(r'\s*([A-Za-z_$][\w$-]*)\s*:')
+# 可能是标准JSON的开头：对象的第一个键带引号，或数组的第一个元素是JSON值
+_STRICT_PREFIX = re.compile(r'\{\s*["}]|\[\s*["\[\]{\d\-tfn]')
+# 可能是多一层转义的JSON的开头
+_ESCAPED_PREFIX = re.compile(r'[{\[]\s*\\"')
+_WHITESPACE = ' \t\r\n'
+# 字符串和无引号值中需要逐个处理的字符，其余字符整段跳过
+_STRING_SPECIAL = re.compile(r'["\\]')
+_ESCAPED_STRING_SPECIAL = re.compile(r'\\')
+_BARE_SPECIAL = {closers: re.compile('[,{}\\[\\]' + re.escape(closers) + ']') for closers in ('', '}', ']')}
+_SIMPLE_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+_BARE_LITERALS = {'true': True, 'false': False, 'null': None}
+_HEX_DIGITS = frozenset('0123456789abcdefABCDEF')
+
+
+class InputParseError(ValueError):
+    """输入无法解析为JSON结构"""
+
+
+def parse_tool_input(text: str) -> Optional[Any]:
+    """解析工具输入，返回解析出的对象或数组；输入不是JSON结构（如原始命令）时返回None"""
+    stripped = text.strip()
+    if not stripped or stripped[0] not in '{[':
+        return None
+
+    # 快速路径由C实现完成，失败时再由扫描器容错解析
+    try:
+        if _STRICT_PREFIX.match(stripped):
+            return json.loads(stripped)
+        if _ESCAPED_PREFIX.match(stripped) and '\0' not in stripped:
+            return json.loads(_strip_outer_escape(stripped))
+    except json.JSONDecodeError:
+        pass
+
+    try:
+        return _Scanner(stripped).parse()
+    except InputParseError:
+        return None
+
+
+def _strip_outer_escape(text: str) -> str:
+    """去掉一层转义：\\\\ 还原为 \\，\\" 还原为 "，其余反斜杠原样保留"""
+    # 先用占位符替换成对的反斜杠，避免 \\\\" 中的第二个反斜杠被当作引号的转义
+    return text.replace('\\\\', '\0').replace('\\"', '"').replace('\0', '\\')
+
+
+class _Scanner:
+    """单遍容错扫描器
+
+    字符串可以用 " 或 \\" 作为定界符；以 \\" 开头的字符串按多一层转义解码。
+    没有引号的键和值按PowerShell格式处理：值一直延续到下一个"逗号+键:"或结尾的右括号，
+    值中的反斜杠原样保留。
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.length = len(text)
+        self.pos = 0
+
+    def parse(self) -> Any:
+        value = self._value(closers='')
+        self._skip_ws()
+        if self.pos != self.length:
+            raise InputParseError(f"unexpected trailing data at {self.pos}")
+        return value
+
+    def _skip_ws(self) -> None:
+        text, pos, length = self.text, self.pos, self.length
+        while pos < length and text[pos] in _WHITESPACE:
+            pos += 1
+        self.pos = pos
+
+    def _quote_at(self, pos: int) -> int:
+        """返回pos处字符串定界符的长度：" 为1，\\" 为2，不是定界符为0"""
+        text = self.text
+        if pos < self.length:
+            if text[pos] == '"':
+                return 1
+            if text[pos] == '\\' and pos + 1 < self.length and text[pos + 1] == '"':
+                return 2
+        return 0
+
+    def _value(self, closers: str) -> Any:
+        self._skip_ws()
+        if self.pos >= self.length:
+            raise InputParseError("unexpected end of input")
+        char = self.text[self.pos]
+        if char == '{':
+            return self._object()
+        if char == '[':
+            return self._array()
+        quote = self._quote_at(self.pos)
+        if quote:
+            return self._string(quote)
+        return self._bare(closers)
+
+    def _object(self) -> Dict[str, Any]:
+        self.pos += 1
+        result: Dict[str, Any] = {}
+        self._skip_ws()
+        if self.pos < self.length and self.text[self.pos] == '}':
+            self.pos += 1
+            return result
+
+        while True:
+            self._skip_ws()
+            key = self._key()
+            self._skip_ws()
+            if self.pos >= self.length or self.text[self.pos] != ':':
+                raise InputParseError(f"expected ':' at {self.pos}")
+            self.pos += 1
+            result[key] = self._value(closers='}')
+            self._skip_ws()
+            if self.pos >= self.length:
+                raise InputParseError("unterminated object")
+            char = self.text[self.pos]
+            self.pos += 1
+            if char == '}':
+                return result
+            if char != ',':
+                raise InputParseError(f"expected ',' or '}}' at {self.pos - 1}")
+
+    def _array(self) -> List[Any]:
+        self.pos += 1
+        result: List[Any] = []
+        self._skip_ws()
+        if self.pos < self.length and self.text[self.pos] == ']':
+            self.pos += 1
+            return result
+
+        while True:
+            result.append(self._value(closers=']'))
+            self._skip_ws()
+            if self.pos >= self.length:
+                raise InputParseError("unterminated array")
+            char = self.text[self.pos]
+            self.pos += 1
+            if char == ']':
+                return result
+            if char != ',':
+                raise InputParseError(f"expected ',' or ']' at {self.pos - 1}")
+
+    def _key(self) -> str:
+        quote = self._quote_at(self.pos)
+        if quote:
+            return self._string(quote)
+        match = _BARE_KEY.match(self.text, self.pos)
+        if not match:
+            raise InputParseError(f"expected key at {self.pos}")
+        # 只消费键名，冒号由调用方处理
+        self.pos = match.end(1)
+        return match.group(1)
+
+    def _string(self, quote: int) -> str:
+        """解码字符串；quote为2时先去掉一层转义再按JSON转义解码"""
+        text, length = self.text, self.length
+        pos = self.pos + quote
+        out: List[str] = []
+        run_start = pos
+
+        special = _STRING_SPECIAL if quote == 1 else _ESCAPED_STRING_SPECIAL
+        while True:
+            match = special.search(text, pos)
+            if not match:
+                break
+            pos = match.start()
+            if text[pos] == '"':
+                out.append(text[run_start:pos])
+                self.pos = pos + 1
+                return ''.join(out)
+
+            out.append(text[run_start:pos])
+            nxt = text[pos + 1] if pos + 1 < length else ''
+            if quote == 2:
+                if nxt == '"':
+                    # 外层的 \" 是结束定界符
+                    self.pos = pos + 2
+                    return ''.join(out)
+                if nxt == '\\':
+                    # 外层的 \\ 表示一个JSON层的反斜杠，后面紧跟JSON转义字符（也可能被外层转义）
+                    esc_pos = pos + 2
+                    if text[esc_pos:esc_pos + 1] == '\\' and text[esc_pos + 1:esc_pos + 2] in ('"', '\\'):
+                        esc_pos += 1
+                    decoded, pos = self._escape(esc_pos)
+                    out.append(decoded)
+                else:
+                    # 未转义的单个反斜杠（如Windows路径）原样保留
+                    out.append('\\')
+                    pos += 1
+            else:
+                decoded, pos = self._escape(pos + 1)
+                out.append(decoded)
+            run_start = pos
+
+        raise InputParseError("unterminated string")
+
+    def _escape(self, pos: int) -> Tuple[str, int]:
+        """解码pos处的JSON转义字符，返回(解码结果, 下一个位置)；无效转义保留反斜杠"""
+        text = self.text
+        char = text[pos] if pos < self.length else ''
+        if char in _SIMPLE_ESCAPES:
+            return _SIMPLE_ESCAPES[char], pos + 1
+        if char == 'u':
+            digits = text[pos + 1:pos + 5]
+            if len(digits) == 4 and all(c in _HEX_DIGITS for c in digits):
+                code = int(digits, 16)
+                if 0xD800 <= code < 0xDC00:
+                    # 代理对合并为一个字符，低位部分的前缀可能是 \u 或多一层转义的 \\u
+                    for prefix in ('\\u', '\\\\u'):
+                        low_pos = pos + 5 + len(prefix)
+                        low = text[low_pos:low_pos + 4]
+                        if text[pos + 5:low_pos] == prefix and len(low) == 4 \
+                                and all(c in _HEX_DIGITS for c in low) and 0xDC00 <= int(low, 16) < 0xE000:
+                            return chr(0x10000 + ((code - 0xD800) << 10) + (int(low, 16) - 0xDC00)), low_pos + 4
+                return chr(code), pos + 5
+        return '\\', pos
+
+    def _bare(self, closers: str) -> Any:
+        """读取无引号的值，直到"逗号+键:"、结尾的右括号或输入结束"""
+        text, length = self.text, self.length
+        start = pos = self.pos
+        depth = 0
+        special = _BARE_SPECIAL[closers]
+        while True:
+            match = special.search(text, pos)
+            if not match:
+                pos = length
+                break
+            pos = match.start()
+            char = text[pos]
+            if char in '{[':
+                depth += 1
+            elif depth and char in '}]':
+                depth -= 1
+            elif char == ',' and (closers != '}' or self._key_starts_at(pos + 1)):
+                break
+            elif char in closers and self._closes_at(pos + 1):
+                break
+            pos += 1
+        self.pos = pos
+        raw = text[start:pos].strip()
+        return _BARE_LITERALS[raw] if raw in _BARE_LITERALS else raw
+
+    def _key_starts_at(self, pos: int) -> bool:
+        """判断逗号之后是否紧跟下一个键（带引号的键或"标识符:"）"""
+        text, length = self.text, self.length
+        while pos < length and text[pos] in _WHITESPACE:
+            pos += 1
+        return bool(self._quote_at(pos) or _BARE_KEY.match(text, pos))
+
+    def _closes_at(self, pos: int) -> bool:
+        """判断右括号之后是否只剩空白或外层的分隔符"""
+        text, length = self.text, self.length
+        while pos < length and text[pos] in _WHITESPACE:
+            pos += 1
+        return pos >= length or text[pos] in ',}]'
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+大模型响应缓存模块
+以请求内容（messages、tools、model、temperature等）的规范化哈希为键缓存大模型的响应，
+相同的提示词（如"help me ..."模板、模拟场景）不再重复请求大模型。
+
+- 两级缓存：进程内LRU热缓存，下面是WAL模式的SQLite文件，多个进程可以共享同一个文件
+- 超过TTL的记录视为不存在；文件中的响应总大小超过max_bytes时按最近使用时间淘汰
+- 非确定性采样（temperature大于max_temperature且没有seed、n大于1）的请求不使用缓存
+- 出错的响应不缓存；流式请求按事件序列单独缓存，命中时按原顺序重放
+
+启用方式：
+- 环境变量 LLM_CACHE_DB 指定缓存文件路径（CommandProcessor）
+- interactive_tool.py 的 --llm-cache 参数或配置文件中的 llm_cache_db
+"""
+
+import os
+import copy
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional
+
+LLM_CACHE_ENV = 'LLM_CACHE_DB'
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# 只影响传输方式、不影响生成内容的请求字段，不参与键的计算
+_TRANSPORT_FIELDS = ('stream', 'stream_options', 'user')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    size INTEGER NOT NULL,
+    response TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+
+def _tool_name(tool: Any) -> str:
+    if isinstance(tool, dict):
+        function = tool.get('function')
+        return str((function or {}).get('name') if isinstance(function, dict) else tool.get('name'))
+    return str(tool)
+
+
+def cache_key(data: Any, kind: str = 'response') -> str:
+    """计算请求的缓存键：字段顺序和tools的排列顺序不影响结果，kind区分普通响应和流式事件"""
+    if isinstance(data, dict):
+        data = {key: value for key, value in data.items() if key not in _TRANSPORT_FIELDS}
+        for field in ('messages', 'tools'):
+            version = getattr(data.get(field), 'version', None)
+            if version is not None:
+                # 预先构建的列表（ToolSchemas、ContextWindow）直接用其内容哈希，不再逐个序列化
+                data[field] = f"{field}@{version}"
+        if isinstance(data.get('tools'), list):
+            data['tools'] = sorted(data['tools'], key=_tool_name)
+    text = json.dumps([kind, data], sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def bypass_reason(data: Any, max_temperature: float = 0.0) -> Optional[str]:
+    """返回请求不使用缓存的原因；可以缓存时返回None
+
+    未指定temperature的请求按确定性请求处理（本项目发出的请求都不指定采样参数）。
+    """
+    if not isinstance(data, dict):
+        return None
+    if data.get('n', 1) != 1:
+        return 'n'
+    temperature = data.get('temperature')
+    if temperature is not None and temperature > max_temperature and data.get('seed') is None:
+        return 'temperature'
+    return None
+
+
+class ResponseCache:
+    """两级响应缓存，线程安全；path为None时只使用进程内缓存"""
+
+    def __init__(self, path: Optional[str] = None, ttl: float = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES,
+                 hot_size: int = 256, max_temperature: float = 0.0):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hot_size = hot_size
+        self.max_temperature = max_temperature
+        self._hot: "OrderedDict[str, tuple]" = OrderedDict()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            # 连接由锁保护，允许在REST服务的各个请求线程中使用
+            self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute('DELETE FROM responses WHERE created < ?', (time.time() - ttl,))
+            self._bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def bypass(self, data: Any) -> Optional[str]:
+        """返回请求不使用缓存的原因并计数；可以缓存时返回None"""
+        reason = bypass_reason(data, self.max_temperature)
+        if reason is not None:
+            with self._lock:
+                self._stats["bypassed"] += 1
+        return reason
+
+    def get(self, key: str) -> Optional[Any]:
+        """返回缓存的响应（副本）；不存在或已过期时返回None"""
+        now = time.time()
+        cutoff = now - self.ttl
+        with self._lock:
+            entry = self._hot.get(key)
+            if entry is not None:
+                if entry[0] >= cutoff:
+                    self._hot.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return copy.deepcopy(entry[1])
+                del self._hot[key]
+            row = None
+            if self._conn is not None:
+                row = self._conn.execute('SELECT created, response FROM responses WHERE key = ?',
+                                         (key,)).fetchone()
+            if row is None or row[0] < cutoff:
+                self._stats["misses"] += 1
+                return None
+            self._conn.execute('UPDATE responses SET last_used = ? WHERE key = ?', (now, key))
+            response = json.loads(row[1])
+            self._remember(key, row[0], response)
+            self._stats["disk_hits"] += 1
+            return copy.deepcopy(response)
+
+    def put(self, key: str, response: Any) -> None:
+        """缓存响应；单个响应超过max_bytes时只放入进程内缓存"""
+        now = time.time()
+        text = json.dumps(response, ensure_ascii=False)
+        size = len(text.encode('utf-8'))
+        with self._lock:
+            self._remember(key, now, copy.deepcopy(response))
+            self._stats["stores"] += 1
+            if self._conn is None or size > self.max_bytes:
+                return
+            old = self._conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, created, last_used, size, response) VALUES (?, ?, ?, ?, ?)',
+                (key, now, now, size, text)
+            )
+            self._bytes += size - (old[0] if old else 0)
+            if self._bytes > self.max_bytes:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        """删除过期记录，仍超出大小预算时按最近使用时间删除到预算的90%（调用方持有锁）"""
+        self._stats["evictions"] += self._conn.execute(
+            'DELETE FROM responses WHERE created < ?', (now - self.ttl,)).rowcount
+        self._bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        target = self.max_bytes * 0.9
+        if self._bytes <= target:
+            return
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute('SELECT key, size FROM responses ORDER BY last_used'):
+            victims.append((key,))
+            freed += size
+            if self._bytes - freed <= target:
+                break
+        self._conn.executemany('DELETE FROM responses WHERE key = ?', victims)
+        for (key,) in victims:
+            self._hot.pop(key, None)
+        self._stats["evictions"] += len(victims)
+        self._bytes -= freed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._hot.clear()
+            if self._conn is not None:
+                self._conn.execute('DELETE FROM responses')
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中、未命中、绕过缓存的次数、命中率和文件中的条目数、字节数"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = (self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+                                if self._conn is not None else len(self._hot))
+            stats["bytes"] = self._bytes
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _remember(self, key: str, created: float, response: Any) -> None:
+        """放入热缓存，超过上限时淘汰最久未使用的条目（调用方持有锁）"""
+        self._hot[key] = (created, response)
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_size:
+            self._hot.popitem(last=False)
+
+
+class CachedLLMClient:
+    """在QianwenClient或MockQianwenClient前面加一层响应缓存，接口与被包装的客户端相同
+
+    metrics为llm_client.RequestMetrics时，命中、未命中和绕过缓存分别计入cache_hit、cache_miss、cache_bypass计数器。
+    """
+
+    def __init__(self, client: Any, cache: ResponseCache, metrics: Any = None):
+        self.client = client
+        self.cache = cache
+        self.metrics = metrics
+
+    def __getattr__(self, name: str) -> Any:
+        # 其余属性（如模拟客户端的call_count、reset_state）直接使用被包装的客户端
+        return getattr(self.client, name)
+
+    def _count(self, name: str) -> None:
+        if self.metrics is not None:
+            self.metrics.increment(name)
+
+    def _lookup(self, data: Dict[str, Any], kind: str) -> tuple:
+        """返回(缓存键, 缓存的值)；不使用缓存时键为None"""
+        if self.cache.bypass(data) is not None:
+            self._count('cache_bypass')
+            return None, None
+        key = cache_key(data, kind)
+        cached = self.cache.get(key)
+        self._count('cache_miss' if cached is None else 'cache_hit')
+        return key, cached
+
+    def send_request(self, data: Dict[str, Any], sequence_id: Optional[str] = None) -> Dict[str, Any]:
+        key, cached = self._lookup(data, 'response')
+        if cached is not None:
+            return cached
+        response = self.client.send_request(data, sequence_id)
+        if key is not None and not (isinstance(response, dict) and response.get('error')):
+            self.cache.put(key, response)
+        return response
+
+    def stream_request(self, data: Dict[str, Any], sequence_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        key, cached = self._lookup(data, 'stream')
+        if cached is not None:
+            yield from cached
+            return
+        events: List[Dict[str, Any]] = []
+        for event in self.client.stream_request(data, sequence_id):
+            events.append(event)
+            yield event
+        # 只缓存完整且没有出错的事件序列
+        if key is not None and not any(event.get('type') == 'error' for event in events):
+            self.cache.put(key, events)
+
+
+_caches: Dict[str, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def open_cache(path: str, ttl: float = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES) -> ResponseCache:
+    """打开响应缓存；同一文件在进程内只打开一次"""
+    real_path = os.path.realpath(path)
+    with _caches_lock:
+        cache = _caches.get(real_path)
+        if cache is None:
+            cache = _caches[real_path] = ResponseCache(real_path, ttl=ttl, max_bytes=max_bytes)
+        return cache
@@ -4,18 +4,564 @@
 """
 千问大模型客户端模块
 负责处理与千问大模型的通信，支持从环境变量读取配置
+
+请求通过共享的requests.Session发送，连接池中的连接保持长连接并被后续请求复用，
+每轮对话不必重新进行TCP/TLS握手。同一连接池配置的客户端共享一个会话，可以在多个线程中使用；
+进程退出时（或调用close_shared_sessions()时）关闭全部连接。
+
+stream_request()以流式模式（stream: true）发送请求，逐个解析SSE事件，文本增量到达即返回，
+tool_calls的分片按index拼装，每个工具调用的参数完整后立即返回，不必等待整个回复生成完毕。
+
+请求失败时的处理：
+- 连接错误、超时和可重试的状态码（429、5xx等）按RetryPolicy以带随机抖动的指数退避重试
+- 同一服务地址共享一个CircuitBreaker，连续失败达到阈值后熔断，熔断期间请求立即失败
+- 配置HedgePolicy时，请求超过近期延迟的指定百分位仍未返回，再发送一个相同的请求，采用先返回的结果
+- 每次尝试的结果记录到RequestMetrics（默认为模块级的client_metrics）
+
+每次调用结束后把网络层的耗时分解（限流排队、新建连接、首个token、总耗时、请求/响应大小、usage中的token数）
+交给timing_listener，由上层与自己测得的耗时合并后记录（见llm_timing模块）。
 """
 
 import os
 import json
+import time
+import bisect
+import random
+import atexit
+import threading
 import requests
-from typing import Dict, Any, List, Optional
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
+
+# 每个主机保持的最大连接数，对应可以同时进行的请求数
+DEFAULT_POOL_SIZE = 10
+# 单次尝试的超时时间（秒）
+DEFAULT_TIMEOUT = 30
+# 可重试的HTTP状态码
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+_sessions: Dict[Tuple[int, bool], requests.Session] = {}
+_sessions_lock = threading.Lock()
+# 当前线程最近一次请求中新建连接的耗时（秒），复用连接时为None
+_connect_local = threading.local()
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.monotonic()
+        try:
+            super().connect()
+        finally:
+            _connect_local.seconds = (getattr(_connect_local, 'seconds', None) or 0.0) + time.monotonic() - start
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.monotonic()
+        try:
+            super().connect()
+        finally:
+            _connect_local.seconds = (getattr(_connect_local, 'seconds', None) or 0.0) + time.monotonic() - start
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """记录新建连接耗时（DNS解析、TCP连接和TLS握手）的适配器；连接在发出请求的线程中建立"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPConnectionPool,
+                                                   'https': _TimedHTTPSConnectionPool}
+
+
+def get_shared_session(pool_size: int = DEFAULT_POOL_SIZE, keep_alive: bool = True) -> requests.Session:
+    """返回指定连接池配置的共享会话，不存在时创建
+
+    连接池（urllib3）是线程安全的，会话可以在REST服务的多个请求线程之间共享；
+    keep_alive为False时每个请求都带Connection: close，不复用连接。
+    """
+    key = (pool_size, keep_alive)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = TimedHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            if not keep_alive:
+                session.headers['Connection'] = 'close'
+            _sessions[key] = session
+        return session
+
+
+def close_shared_sessions() -> None:
+    """关闭全部共享会话及其连接，之后的请求会创建新的会话"""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+atexit.register(close_shared_sessions)
+
+
+# 可以预先序列化、发送时直接拼接文本的请求字段
+_PRE_ENCODED_FIELDS = ('messages', 'tools')
+
+
+def encode_request(payload: Dict[str, Any]) -> Optional[bytes]:
+    """序列化请求体；tools、messages是预先序列化的列表（带json_text属性，如ToolHandler返回的ToolSchemas、
+    ConversationStore返回的ContextWindow）时直接拼接其文本，不再重复序列化。都不是预先序列化的列表时返回None。
+    """
+    if not isinstance(payload, dict):
+        return None
+    encoded = {key: payload[key].json_text for key in _PRE_ENCODED_FIELDS
+               if getattr(payload.get(key), 'json_text', None) is not None}
+    if not encoded:
+        return None
+    text = json.dumps({key: value for key, value in payload.items() if key not in encoded}, ensure_ascii=False)
+    for key, json_text in encoded.items():
+        separator = ', ' if len(text) > 2 else ''
+        text = text[:-1] + f'{separator}"{key}": ' + json_text + '}'
+    return text.encode('utf-8')
+
+
+class RetryPolicy:
+    """重试策略：最多尝试max_attempts次，第n次重试前等待[0, min(backoff_max, backoff_base * 2^(n-1))]内的随机时长
+
+    服务端返回Retry-After（秒）时，等待时长不小于该值（仍不超过backoff_max）。
+    """
+
+    def __init__(self, max_attempts: int = 3, backoff_base: float = 0.2, backoff_max: float = 5.0,
+                 retry_statuses: Iterable[int] = RETRYABLE_STATUSES):
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+
+    def backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """第attempt次尝试失败后的等待时长（秒）"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+        try:
+            delay = max(delay, float(retry_after)) if retry_after else delay
+        except (TypeError, ValueError):
+            pass
+        return min(delay, self.backoff_max)
+
+
+class CircuitBreaker:
+    """熔断器：连续失败failure_threshold次后打开，reset_timeout秒内的请求立即失败；
+    之后进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开。线程安全。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def retry_in(self) -> float:
+        """距离可以再次尝试的秒数"""
+        with self._lock:
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        """是否放行一个请求"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(base_url: str) -> CircuitBreaker:
+    """返回服务地址对应的共享熔断器，同一地址的客户端共享健康状态"""
+    with _breakers_lock:
+        breaker = _breakers.get(base_url)
+        if breaker is None:
+            breaker = _breakers[base_url] = CircuitBreaker()
+        return breaker
+
+
+class HedgePolicy:
+    """对冲请求策略：请求超过近期成功请求延迟的percentile百分位仍未返回时，再发送一个相同的请求
+
+    样本少于min_samples时使用initial_delay；延迟不小于min_delay，避免服务抖动时把请求量翻倍。
+    """
+
+    def __init__(self, percentile: float = 95, initial_delay: float = 2.0, min_delay: float = 0.05,
+                 window: int = 200, min_samples: int = 20):
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._latencies: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+
+    def delay(self) -> float:
+        """发出对冲请求前的等待时长（秒）"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.initial_delay
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[index])
+
+
+# 直方图的桶上界，按指标名称的后缀选择：_ms为毫秒，_per_sec为每秒token数，_bytes为字节数
+HISTOGRAM_BUCKETS = {
+    '_ms': (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000),
+    '_per_sec': (1, 5, 10, 20, 50, 100, 200, 500),
+    '_bytes': (256, 1024, 4096, 16384, 65536, 262144, 1048576),
+}
+
+
+def histogram_bounds(name: str) -> Tuple[float, ...]:
+    for suffix, bounds in HISTOGRAM_BUCKETS.items():
+        if name.endswith(suffix):
+            return bounds
+    return HISTOGRAM_BUCKETS['_ms']
+
+
+class RequestMetrics:
+    """记录每次尝试的结果和延迟，线程安全
+
+    结果分为success、http_error（不重试的错误状态码）、retryable_status、timeout、connection_error、
+    circuit_open（熔断期间被拒绝）；hedged/hedge_wins为发出的对冲请求数和对冲请求先返回的次数。
+    observe()记录直方图（如每次大模型调用的首个token耗时），桶的上界见HISTOGRAM_BUCKETS。
+    """
+
+    def __init__(self, window: int = 1000):
+        self._outcomes: Counter = Counter()
+        self._latencies: deque = deque(maxlen=window)
+        self._counters: Counter = Counter()
+        self._gauges: Dict[str, float] = {}
+        # 名称 -> [各桶的计数（最后一个为+Inf）, 样本数, 总和]
+        self._histograms: Dict[str, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, outcome: str, latency: Optional[float] = None, status: Optional[int] = None) -> None:
+        with self._lock:
+            self._outcomes[outcome] += 1
+            if status is not None:
+                self._counters[f'status_{status}'] += 1
+            if latency is not None:
+                self._latencies.append(latency)
+
+    def increment(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """记录最新值（如限流器的剩余配额）"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """把一个样本计入直方图"""
+        bounds = histogram_bounds(name)
+        index = bisect.bisect_left(bounds, value)
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = [[0] * (len(bounds) + 1), 0, 0.0]
+            histogram[0][index] += 1
+            histogram[1] += 1
+            histogram[2] += value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._outcomes.clear()
+            self._latencies.clear()
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回当前统计：尝试次数、各结果次数、计数器、最新值、近期延迟的分位数（毫秒）和直方图
+
+        直方图的buckets为按上界排列的累计计数[{"le": 上界, "count": 不大于上界的样本数}]（与Prometheus相同），
+        最后一个上界为"+Inf"。
+        """
+        with self._lock:
+            outcomes = dict(self._outcomes)
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            ordered = sorted(self._latencies)
+            histograms = {name: (list(counts), count, total)
+                          for name, (counts, count, total) in self._histograms.items()}
+        latency = {}
+        for name, percentile in (('p50', 50), ('p95', 95), ('p99', 99)):
+            if ordered:
+                latency[name] = round(ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))] * 1000, 2)
+        return {
+            "attempts": sum(count for outcome, count in outcomes.items() if outcome != 'circuit_open'),
+            "outcomes": outcomes,
+            "counters": counters,
+            "gauges": gauges,
+            "latency_ms": latency,
+            "histograms": {name: _cumulative(name, counts, count, total)
+                           for name, (counts, count, total) in histograms.items()},
+        }
+
+
+def _cumulative(name: str, counts: List[int], count: int, total: float) -> Dict[str, Any]:
+    buckets = []
+    running = 0
+    for bound, bucket in zip(list(histogram_bounds(name)) + ['+Inf'], counts):
+        running += bucket
+        buckets.append({"le": bound, "count": running})
+    return {"buckets": buckets, "count": count, "sum": round(total, 2)}
+
+
+# 默认记录全部客户端请求的统计
+client_metrics = RequestMetrics()
+
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    """对冲请求使用的共享线程池"""
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='llm-hedge')
+            atexit.register(_hedge_executor.shutdown, wait=False)
+        return _hedge_executor
+
+
+def iter_sse_data(lines: Iterable[Union[bytes, str]]) -> Iterator[str]:
+    """解析SSE事件流，返回每个事件的data内容（多行data以换行连接）；收到[DONE]时结束"""
+    data: List[str] = []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.rstrip('\r\n')
+        if not line:
+            # 空行表示一个事件结束
+            if data:
+                payload = '\n'.join(data)
+                data = []
+                if payload == '[DONE]':
+                    return
+                yield payload
+            continue
+        if line.startswith(':'):
+            # 注释行（常用作心跳）
+            continue
+        field, _, value = line.partition(':')
+        if field == 'data':
+            data.append(value[1:] if value.startswith(' ') else value)
+    if data and '\n'.join(data) != '[DONE]':
+        yield '\n'.join(data)
+
+
+class ToolCallAssembler:
+    """按index拼装流式响应中的tool_calls分片
+
+    feed()返回本次分片之后已经完整的工具调用事件：参数拼成合法的JSON对象、
+    或者下一个index的工具调用开始时，前面的工具调用即视为完整；finish()返回其余未完成的工具调用。
+    完整的工具调用转换为{"id", "name", "parameters"}，与send_request返回的tool_calls格式一致。
+    """
+
+    def __init__(self):
+        self._calls: Dict[int, Dict[str, Any]] = {}
+        self._done: set = set()
+
+    def feed(self, deltas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        events = []
+        for delta in deltas:
+            index = delta.get('index', 0)
+            if index not in self._calls:
+                # 新的工具调用开始，之前的工具调用不会再有分片
+                events.extend(self._complete(i) for i in sorted(self._calls) if i not in self._done)
+                self._calls[index] = {"id": "", "name": "", "arguments": []}
+            if index in self._done:
+                continue
+            call = self._calls[index]
+            function = delta.get('function') or {}
+            if delta.get('id'):
+                call["id"] = delta['id']
+            if function.get('name'):
+                call["name"] += function['name']
+            fragment = function.get('arguments') or ''
+            if fragment:
+                call["arguments"].append(fragment)
+                # 合法JSON对象的前缀不可能是合法的JSON对象，能解析即说明参数已经完整
+                if call["name"] and fragment.rstrip().endswith('}'):
+                    try:
+                        parameters = json.loads(''.join(call["arguments"]))
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(parameters, dict):
+                        events.append(self._complete(index, parameters))
+        return events
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """返回所有尚未完成的工具调用事件"""
+        return [self._complete(index) for index in sorted(self._calls) if index not in self._done]
+
+    def _complete(self, index: int, parameters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        self._done.add(index)
+        call = self._calls[index]
+        if parameters is None:
+            arguments = ''.join(call["arguments"]).strip()
+            try:
+                parameters = json.loads(arguments) if arguments else {}
+            except json.JSONDecodeError as e:
+                return {"type": "error", "content": f"工具调用{call['name']}的参数不是合法的JSON: {e.msg}"}
+            if not isinstance(parameters, dict):
+                return {"type": "error", "content": f"工具调用{call['name']}的参数不是JSON对象"}
+        return {"type": "tool_call", "toolCall": {"id": call["id"], "name": call["name"], "parameters": parameters}}
+
+
+def response_events(response: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """将一次性返回的响应转换为与流式模式相同的事件（服务端不支持流式时使用）"""
+    if not isinstance(response, dict):
+        return
+    if response.get('choices'):
+        # OpenAI兼容格式
+        message = response['choices'][0].get('message') or {}
+        content = message.get('content')
+        assembler = ToolCallAssembler()
+        tool_events = []
+        for index, call in enumerate(message.get('tool_calls') or []):
+            tool_events.extend(assembler.feed([dict(call, index=index)]))
+        tool_events.extend(assembler.finish())
+    else:
+        content = response.get('content')
+        tool_events = [{"type": "tool_call", "toolCall": call} for call in response.get('tool_calls') or []]
+    if content:
+        yield {"type": "text", "content": content}
+    yield from tool_events
+
+
+class _CallTiming:
+    """一次调用的网络层耗时：从调用开始计时，记录首个token到达的时间、响应大小和usage中的token数"""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.first_token: Optional[float] = None
+        self.response_bytes = 0
+        self.completion_tokens: Optional[int] = None
+
+    def token(self) -> None:
+        if self.first_token is None:
+            self.first_token = time.monotonic()
+
+    def usage(self, usage: Any) -> None:
+        if isinstance(usage, dict) and usage.get('completion_tokens') is not None:
+            self.completion_tokens = usage['completion_tokens']
+
+    def count_lines(self, lines: Iterable[Any]) -> Iterator[Any]:
+        """统计流式响应的字节数"""
+        for line in lines:
+            self.response_bytes += len(line) + 1
+            yield line
+
+    def report(self, response: requests.Response) -> Dict[str, Any]:
+        """耗时分解（毫秒）：queueMs限流排队、connectMs新建连接（DNS、TCP、TLS，复用连接时为None）、
+        ttftMs首个token、totalMs总耗时（都从调用开始计算，包括重试），以及请求/响应字节数、usage中的回复token数、
+        生成速度tokensPerSec（首个token之后的每秒token数，没有usage时为None）和尝试次数；排队和连接耗时只计最后一次尝试
+        """
+        end = time.monotonic()
+        connect = getattr(response, 'connect_seconds', None)
+        first = self.first_token or end
+        generation = end - first if end > first else end - self.start
+        tokens_per_sec = None
+        if self.completion_tokens and generation > 0:
+            tokens_per_sec = round(self.completion_tokens / generation, 1)
+        return {
+            "queueMs": round(getattr(response, 'queue_seconds', 0.0) * 1000, 1),
+            "connectMs": None if connect is None else round(connect * 1000, 1),
+            "ttftMs": round((first - self.start) * 1000, 1),
+            "totalMs": round((end - self.start) * 1000, 1),
+            "requestBytes": getattr(response, 'request_bytes', 0),
+            "responseBytes": self.response_bytes,
+            "completionTokens": self.completion_tokens,
+            "tokensPerSec": tokens_per_sec,
+            "attempts": getattr(response, 'attempts', 1),
+        }
+
 
 class QianwenClient:
     """千问大模型客户端，处理与千问大模型的通信"""
     
-    def __init__(self, base_url: str = None, api_key: str = None):
-        """初始化千问大模型客户端，优先从环境变量读取配置"""
+    def __init__(self, base_url: str = None, api_key: str = None, session: Optional[requests.Session] = None,
+                 pool_size: int = DEFAULT_POOL_SIZE, keep_alive: bool = True, timeout: float = DEFAULT_TIMEOUT,
+                 retry: Optional[RetryPolicy] = None, breaker: Optional[CircuitBreaker] = None,
+                 hedge: Optional[HedgePolicy] = None, metrics: Optional[RequestMetrics] = None,
+                 rate_limiter: Any = None, timing_listener: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """初始化千问大模型客户端，优先从环境变量读取配置
+
+        session: 发送请求使用的会话，默认使用与pool_size、keep_alive对应的共享会话
+        pool_size: 连接池中每个主机保持的最大连接数
+        keep_alive: 是否复用连接
+        timeout: 单次尝试的超时时间（秒）
+        retry: 重试策略，默认最多尝试3次
+        breaker: 熔断器，默认使用服务地址对应的共享熔断器
+        hedge: 对冲请求策略，默认不发送对冲请求；只用于send_request，流式请求不对冲
+        metrics: 记录每次尝试结果的统计对象，默认为client_metrics
+        rate_limiter: 限流器（如rate_limiter.RateLimiter），每次尝试前预约配额，配额不足时等待；默认不限流
+        timing_listener: 每次调用成功结束后以网络层的耗时分解（见_CallTiming.report）调用
+        """
         # 如果明确传入了空字符串，就使用空字符串
         # 只有在参数为None时才回退到环境变量或默认值
         if base_url is None:
@@ -35,38 +581,300 @@ class QianwenClient:
         # 如果API基础URL末尾有斜杠，去除它
         if self.base_url.endswith('/'):
             self.base_url = self.base_url[:-1]
+        
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self._session = session
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or get_circuit_breaker(self.base_url)
+        self.hedge = hedge
+        self.metrics = metrics or client_metrics
+        self.rate_limiter = rate_limiter
+        self.timing_listener = timing_listener
+    
+    @property
+    def session(self) -> requests.Session:
+        """发送请求使用的会话；共享会话在close_shared_sessions()之后会被重新创建"""
+        if self._session is not None:
+            return self._session
+        return get_shared_session(self.pool_size, self.keep_alive)
+    
+    def _headers(self) -> Dict[str, str]:
+        """构建请求头"""
+        headers = {
+            'Content-Type': 'application/json',
+        }
+        # 如果有API token，添加到请求头
+        if self.api_key:
+            headers['Authorization'] = f'Bearer {self.api_key}'
+        return headers
+    
+    def _attempt(self, payload: Dict[str, Any], stream: bool = False, tokens: int = 0,
+                 queue_seconds: float = 0.0) -> requests.Response:
+        """发送一次请求，把结果记录到统计、熔断器和对冲延迟样本
+
+        tokens为调用方已向限流器预约的token数，queue_seconds为预约时排队等待的时间；请求没有得到成功的响应时退回预约的token。
+        """
+        body = encode_request(payload)
+        start = time.monotonic()
+        _connect_local.seconds = None
+        try:
+            if body is None:
+                response = self.session.post(
+                    f"{self.base_url}/chat/completions",
+                    headers=self._headers(),
+                    json=payload,
+                    timeout=self.timeout,
+                    stream=stream
+                )
+            else:
+                response = self.session.post(
+                    f"{self.base_url}/chat/completions",
+                    headers=self._headers(),
+                    data=body,
+                    timeout=self.timeout,
+                    stream=stream
+                )
+        except requests.exceptions.Timeout:
+            self.metrics.record('timeout', time.monotonic() - start)
+            self.breaker.record_failure()
+            self._refund(tokens)
+            raise
+        except requests.exceptions.ConnectionError:
+            self.metrics.record('connection_error', time.monotonic() - start)
+            self.breaker.record_failure()
+            self._refund(tokens)
+            raise
+        latency = time.monotonic() - start
+        status = response.status_code
+        # 预约的token数，收到usage后据此修正限流器的余额
+        response.reserved_tokens = tokens
+        # 耗时分解：限流排队时间、新建连接的耗时（复用连接时为None）、请求体大小
+        response.queue_seconds = queue_seconds
+        response.connect_seconds = _connect_local.seconds
+        response.request_bytes = len(body) if body is not None else len(json.dumps(payload).encode('utf-8'))
+        if status != 200:
+            # 被拒绝的请求不计入上游的token配额
+            self._refund(tokens)
+        if status == 200:
+            self.metrics.record('success', latency, status)
+            self.breaker.record_success()
+            if self.hedge is not None:
+                self.hedge.record(latency)
+        elif status in self.retry.retry_statuses:
+            self.metrics.record('retryable_status', latency, status)
+            self.breaker.record_failure()
+        else:
+            # 服务可以正常应答，只是请求本身有误（如401），不计入熔断
+            self.metrics.record('http_error', latency, status)
+            self.breaker.record_success()
+        return response
+
+    def _wait_for_quota(self, payload: Dict[str, Any]) -> int:
+        """向限流器预约配额（不足时等待），把等待时间和剩余配额记入统计；返回预约的token数"""
+        tokens = self.rate_limiter.estimate(payload)
+        waited = self.rate_limiter.acquire(tokens)
+        if waited:
+            self.metrics.increment('rate_limited')
+            self.metrics.increment('rate_limit_wait_ms', round(waited * 1000, 1))
+        self.metrics.set_gauge('rate_limit_wait_ms', round(waited * 1000, 1))
+        for name, level in self.rate_limiter.available.items():
+            self.metrics.set_gauge(f'{name}_available', level)
+        return tokens
+
+    def _settle_usage(self, response: requests.Response, usage: Any) -> None:
+        """按响应中的实际token用量修正限流器的余额"""
+        if self.rate_limiter is not None and isinstance(usage, dict) and usage.get('total_tokens') is not None:
+            self.rate_limiter.settle(getattr(response, 'reserved_tokens', 0), usage['total_tokens'])
+
+    def _refund(self, tokens: int) -> None:
+        """退回没有被上游使用的预约token"""
+        if self.rate_limiter is not None and tokens:
+            self.rate_limiter.settle(tokens, 0)
+
+    def _discard_response(self, future: Future) -> None:
+        """丢弃对冲中较慢的一方：按其响应中的实际用量修正预约的token（没有usage时全部退回），关闭响应
+
+        失败的尝试已在_attempt中退回预约。
+        """
+        if future.cancelled() or future.exception() is not None:
+            return
+        response = future.result()
+        if response.status_code == 200 and self.rate_limiter is not None:
+            try:
+                result = response.json()
+            except ValueError:
+                result = None
+            usage = result.get('usage') if isinstance(result, dict) else None
+            if isinstance(usage, dict) and usage.get('total_tokens') is not None:
+                self._settle_usage(response, usage)
+            else:
+                self._refund(getattr(response, 'reserved_tokens', 0))
+        response.close()
+
+    def _report_timing(self, timing: _CallTiming, response: requests.Response) -> None:
+        if self.timing_listener is not None:
+            self.timing_listener(timing.report(response))
+
+    def _hedged_attempt(self, payload: Dict[str, Any], tokens: int = 0,
+                        queue_seconds: float = 0.0) -> requests.Response:
+        """发送请求，超过对冲延迟仍未返回时再发送一个相同的请求，返回先成功的响应
+
+        主请求的配额由_post预约，对冲延迟从主请求发出时开始计算，不包括限流排队的时间；
+        对冲请求只在限流器有空余配额时发送，不排队等待，限流时不会因对冲加倍消耗配额。
+        """
+        executor = _get_hedge_executor()
+        primary = executor.submit(self._attempt, payload, False, tokens, queue_seconds)
+        try:
+            return primary.result(timeout=self.hedge.delay())
+        except FutureTimeoutError:
+            pass
+        hedge_tokens = 0
+        if self.rate_limiter is not None:
+            hedge_tokens = self.rate_limiter.estimate(payload)
+            if not self.rate_limiter.try_acquire(hedge_tokens):
+                self.metrics.increment('hedge_skipped')
+                return primary.result()
+        hedged = executor.submit(self._attempt, payload, False, hedge_tokens)
+        self.metrics.increment('hedged')
+        pending = {primary, hedged}
+        fallback: Optional[Future] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and future.result().status_code == 200:
+                    if future is hedged:
+                        self.metrics.increment('hedge_wins')
+                    for other in pending | ({fallback} if fallback else set()):
+                        other.add_done_callback(self._discard_response)
+                    return future.result()
+                if fallback is not None:
+                    fallback.add_done_callback(self._discard_response)
+                fallback = future
+        # 两个请求都失败，返回（或抛出）后完成的一个的结果
+        return fallback.result()
+
+    def _post(self, payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+        """按重试策略发送请求，返回最后一次尝试的响应；熔断期间直接抛出异常"""
+        attempt = 0
+        while True:
+            attempt += 1
+            if not self.breaker.allow():
+                self.metrics.record('circuit_open')
+                raise Exception(f"服务暂时不可用，熔断中（{self.breaker.retry_in():.0f}秒后重试）")
+            # 每次尝试（包括重试）在发出前预约配额，对冲的计时从预约完成后开始
+            queued = time.monotonic()
+            tokens = self._wait_for_quota(payload) if self.rate_limiter is not None else 0
+            queue_seconds = time.monotonic() - queued
+            try:
+                if self.hedge is not None and not stream:
+                    response = self._hedged_attempt(payload, tokens, queue_seconds)
+                else:
+                    response = self._attempt(payload, stream, tokens, queue_seconds)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.retry.max_attempts:
+                    raise
+                self.metrics.increment('retries')
+                time.sleep(self.retry.backoff(attempt))
+                continue
+            if response.status_code in self.retry.retry_statuses and attempt < self.retry.max_attempts:
+                delay = self.retry.backoff(attempt, response.headers.get('Retry-After'))
+                response.close()
+                self.metrics.increment('retries')
+                time.sleep(delay)
+                continue
+            response.attempts = attempt
+            return response
+
+    def stream_request(self, data: Dict[str, Any], sequence_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """以流式模式向千问大模型发送请求，按到达顺序返回事件：
+
+        - {"type": "text", "content": 文本增量}
+        - {"type": "tool_call", "toolCall": {"id", "name", "parameters"}}：参数拼装完整的工具调用
+        - {"type": "error", "content": 错误信息}：无法解析参数的工具调用
+        - {"type": "finish", "reason": 结束原因}
+        服务端不支持流式（返回普通JSON）时，一次性返回全部事件。
+        """
+        timing = _CallTiming()
+        try:
+            response = self._post(dict(data, stream=True), stream=True)
+        except requests.exceptions.ConnectionError:
+            raise Exception("发送请求失败: Network Error")
+        except requests.exceptions.Timeout:
+            raise Exception("发送请求失败: Request timed out")
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"发送请求失败: {str(e)}")
+        
+        with response:
+            if response.status_code != 200:
+                raise Exception(f"API请求失败: HTTP {response.status_code}, {response.text}")
+            if 'text/event-stream' not in response.headers.get('Content-Type', ''):
+                try:
+                    result = response.json()
+                except json.JSONDecodeError:
+                    raise Exception(f"解析响应失败: 返回了无效的JSON格式数据")
+                if isinstance(result, dict):
+                    self._settle_usage(response, result.get('usage'))
+                    timing.usage(result.get('usage'))
+                timing.response_bytes = len(response.content)
+                self._report_timing(timing, response)
+                yield from response_events(result)
+                return
+            
+            assembler = ToolCallAssembler()
+            try:
+                # chunk_size=None：每收到一个分块就立即处理，不等待缓冲区填满
+                for payload in iter_sse_data(timing.count_lines(response.iter_lines(chunk_size=None))):
+                    try:
+                        chunk = json.loads(payload)
+                    except json.JSONDecodeError:
+                        raise Exception(f"解析响应失败: 无效的流式数据 {payload[:100]}")
+                    if chunk.get('error'):
+                        raise Exception(f"API请求失败: {chunk['error']}")
+                    if chunk.get('usage'):
+                        self._settle_usage(response, chunk['usage'])
+                        timing.usage(chunk['usage'])
+                    for choice in chunk.get('choices') or []:
+                        delta = choice.get('delta') or {}
+                        if delta.get('content') or delta.get('tool_calls'):
+                            timing.token()
+                        if delta.get('content'):
+                            yield {"type": "text", "content": delta['content']}
+                        if delta.get('tool_calls'):
+                            yield from assembler.feed(delta['tool_calls'])
+                        if choice.get('finish_reason'):
+                            yield from assembler.finish()
+                            yield {"type": "finish", "reason": choice['finish_reason']}
+            except requests.exceptions.RequestException as e:
+                raise Exception(f"接收响应失败: {str(e)}")
+            yield from assembler.finish()
+            self._report_timing(timing, response)
     
     def send_request(self, data: Dict[str, Any], sequence_id: Optional[str] = None) -> Dict[str, Any]:
         """向千问大模型发送请求"""
         try:
-            # 构建请求头
-            headers = {
-                'Content-Type': 'application/json',
-            }
-            
-            # 如果有API token，添加到请求头
-            if self.api_key:
-                headers['Authorization'] = f'Bearer {self.api_key}'
-            
             # 如果提供了sequence_id，可以在请求数据中包含它
             if sequence_id:
                 # 根据实际API需求调整如何包含sequence_id
                 pass
             
-            # 发送请求
-            response = requests.post(
-                f"{self.base_url}/chat/completions",  # 假设这是千问API的端点
-                headers=headers,
-                json=data,
-                timeout=30  # 设置超时时间
-            )
+            # 发送请求（复用连接池中的长连接，按重试策略重试）
+            timing = _CallTiming()
+            response = self._post(data)
             
             # 检查响应状态
             if response.status_code == 200:
                 try:
-                    return response.json()
+                    result = response.json()
                 except json.JSONDecodeError:
                     raise Exception(f"解析响应失败: 返回了无效的JSON格式数据")
+                if isinstance(result, dict):
+                    self._settle_usage(response, result.get('usage'))
+                    timing.usage(result.get('usage'))
+                timing.response_bytes = len(response.content)
+                self._report_timing(timing, response)
+                return result
             else:
                 raise Exception(f"API请求失败: HTTP {response.status_code}, {response.text}")
         except requests.exceptions.ConnectionError:
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+大模型调用耗时统计模块
+测量每次大模型调用的耗时分解，替代只有固定进度值（0/50/75/100）的进度消息：
+
+- CallTimer在调用方测量首个token（第一个文本增量或工具调用）和总耗时，包括响应缓存、请求合并的情况；
+  与QianwenClient通过timing_listener报告的网络层数据（限流排队、新建连接、请求/响应大小、usage中的token数）合并
+- record_timing()把一次调用的耗时计入RequestMetrics的直方图（REST服务的/api/metrics）和最近调用的滚动统计（info latency）
+- 环境变量LLM_TIMING=1时，CommandProcessor为每次调用输出一条timing消息
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from .llm_client import RequestMetrics, client_metrics
+
+TIMING_ENV = 'LLM_TIMING'
+# 滚动统计保留的最近调用数
+DEFAULT_SUMMARY_WINDOW = 200
+
+# 耗时字段 -> (直方图名称, 滚动统计中显示的名称)
+TIMING_FIELDS = {
+    "queueMs": ("llm_queue_ms", "限流排队(ms)"),
+    "connectMs": ("llm_connect_ms", "建立连接(ms)"),
+    "ttftMs": ("llm_ttft_ms", "首个token(ms)"),
+    "totalMs": ("llm_total_ms", "总耗时(ms)"),
+    "tokensPerSec": ("llm_tokens_per_sec", "生成速度(token/s)"),
+    "requestBytes": ("llm_request_bytes", "请求大小(字节)"),
+    "responseBytes": ("llm_response_bytes", "响应大小(字节)"),
+}
+
+
+def timing_enabled() -> bool:
+    return os.environ.get(TIMING_ENV, '').lower() in ('1', 'true', 'yes')
+
+
+class CallTimer:
+    """调用方测量一次大模型调用：创建时开始计时，first_token()标记首个token到达，finish()返回耗时分解"""
+
+    def __init__(self, stream: bool = False):
+        self.stream = stream
+        self.start = time.monotonic()
+        self.first: Optional[float] = None
+
+    def first_token(self) -> None:
+        if self.first is None:
+            self.first = time.monotonic()
+
+    def finish(self, completion_tokens: int, network: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """合并网络层数据，返回耗时分解
+
+        completion_tokens为按回复内容估算的token数，网络层报告了usage时以usage为准；
+        tokensPerSec按首个token之后的生成时间计算（非流式调用按总耗时）。
+        没有网络层数据（模拟客户端、缓存命中）时排队、连接和大小字段为None。
+        """
+        end = time.monotonic()
+        first = self.first or end
+        network = network or {}
+        tokens = network.get("completionTokens")
+        estimated = tokens is None
+        if estimated:
+            tokens = completion_tokens
+        generation = end - first if self.stream and end - first > 0 else end - self.start
+        return {
+            "stream": self.stream,
+            "queueMs": network.get("queueMs"),
+            "connectMs": network.get("connectMs"),
+            "ttftMs": round((first - self.start) * 1000, 1),
+            "totalMs": round((end - self.start) * 1000, 1),
+            "completionTokens": tokens,
+            "tokensEstimated": estimated,
+            "tokensPerSec": round(tokens / generation, 1) if tokens and generation > 0 else None,
+            "requestBytes": network.get("requestBytes"),
+            "responseBytes": network.get("responseBytes"),
+            "attempts": network.get("attempts"),
+        }
+
+
+class LatencySummary:
+    """最近window次调用的耗时，按字段统计p50、p95和最大值；线程安全"""
+
+    def __init__(self, window: int = DEFAULT_SUMMARY_WINDOW):
+        self._timings: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, timing: Dict[str, Any]) -> None:
+        with self._lock:
+            self._timings.append(timing)
+
+    def summary(self) -> Dict[str, Any]:
+        """返回{"calls": 调用数, 字段: {"count", "p50", "p95", "max"}}；没有样本的字段不返回"""
+        with self._lock:
+            timings = list(self._timings)
+        result: Dict[str, Any] = {"calls": len(timings)}
+        for field in TIMING_FIELDS:
+            values = sorted(t[field] for t in timings if t.get(field) is not None)
+            if values:
+                result[field] = {
+                    "count": len(values),
+                    "p50": values[min(len(values) - 1, len(values) // 2)],
+                    "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                    "max": values[-1],
+                }
+        return result
+
+    def rows(self) -> List[List[Any]]:
+        """info latency显示的表格行：名称、样本数、p50、p95、最大值"""
+        summary = self.summary()
+        return [[label, summary[field]["count"], summary[field]["p50"], summary[field]["p95"], summary[field]["max"]]
+                for field, (_, label) in TIMING_FIELDS.items() if field in summary]
+
+
+# 进程内最近调用的滚动统计
+llm_latency = LatencySummary()
+
+
+def record_timing(timing: Dict[str, Any], metrics: RequestMetrics = client_metrics,
+                  summary: LatencySummary = llm_latency) -> None:
+    """把一次调用的耗时计入直方图和滚动统计"""
+    for field, (name, _) in TIMING_FIELDS.items():
+        value = timing.get(field)
+        if value is not None:
+            metrics.observe(name, value)
+    summary.record(timing)
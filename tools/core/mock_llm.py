@@ -5,8 +5,35 @@
 用于在测试环境中模拟千问大模型的行为，支持多种返回类型和场景
 """
 
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List
 import time
+import asyncio
+
+# 模拟流式响应时每个文本增量的字符数
+STREAM_CHUNK_CHARS = 4
+# 输入"7"时模拟的超时时长（秒）
+TIMEOUT_DELAY = 2
+
+def request_content(data: Any) -> str:
+    """从不同的请求格式中提取用户输入内容"""
+    if isinstance(data, dict):
+        if 'messages' in data and data['messages']:
+            # 处理标准聊天格式
+            return data['messages'][-1].get('content', '').strip()
+        # 处理简单格式
+        return data.get("content", "").strip()
+    return str(data).strip()
+
+def trailing_tool_results(data: Any) -> int:
+    """请求消息末尾连续的工具结果消息（role为tool）的数量"""
+    if not isinstance(data, dict):
+        return 0
+    count = 0
+    for message in reversed(data.get('messages') or []):
+        if not isinstance(message, dict) or message.get('role') != 'tool':
+            break
+        count += 1
+    return count
 
 class MockQianwenClient:
     """模拟千问大模型客户端"""
@@ -24,6 +51,11 @@ class MockQianwenClient:
         """模拟向千问大模型发送请求，根据不同输入返回不同类型的响应"""
         self.call_count += 1
         
+        # 工具结果作为新消息返回之后（智能体循环的后续步骤），根据工具结果给出最终回答
+        tool_results = trailing_tool_results(data)
+        if tool_results:
+            return {"content": f"已根据{tool_results}个工具调用的结果完成处理", "tool_calls": []}
+        
         # 检查是否有tools字段
         if isinstance(data, dict) and 'tools' in data and data['tools']:
             # 处理带有工具调用的请求
@@ -40,16 +72,7 @@ class MockQianwenClient:
                 ]
             }
         
-        # 从不同的请求格式中提取内容
-        if isinstance(data, dict):
-            if 'messages' in data and data['messages']:
-                # 处理标准聊天格式
-                content = data['messages'][-1].get('content', '').strip()
-            else:
-                # 处理简单格式
-                content = data.get("content", "").strip()
-        else:
-            content = str(data).strip()
+        content = request_content(data)
         
         # 根据输入内容返回不同类型的响应
         if content == "1":
@@ -72,7 +95,7 @@ class MockQianwenClient:
             return {"content": "", "tool_calls": []}
         elif content == "7":
             # 7：模拟超时
-            time.sleep(2)  # 模拟2秒超时
+            time.sleep(TIMEOUT_DELAY)  # 模拟2秒超时
             return {"content": "请求已超时", "tool_calls": []}
         elif content == "8":
             # 8：模拟请求失败
@@ -126,6 +149,20 @@ class MockQianwenClient:
                 "tool_calls": []
             }
     
+    def stream_request(self, data: Dict[str, Any], sequence_id: str = None) -> Iterator[Dict[str, Any]]:
+        """模拟流式请求：把send_request的响应拆成与QianwenClient.stream_request相同格式的事件"""
+        response = self.send_request(data, sequence_id)
+        if response.get("error"):
+            yield {"type": "error", "content": response["error"]}
+            return
+        content = response.get("content") or ""
+        for start in range(0, len(content), STREAM_CHUNK_CHARS):
+            yield {"type": "text", "content": content[start:start + STREAM_CHUNK_CHARS]}
+        tool_calls = response.get("tool_calls") or []
+        for tool_call in tool_calls:
+            yield {"type": "tool_call", "toolCall": tool_call}
+        yield {"type": "finish", "reason": "tool_calls" if tool_calls else "stop"}
+    
     def _generate_text_response(self) -> Dict[str, Any]:
         """生成文本响应"""
         return {
@@ -274,6 +311,50 @@ class MockQianwenClient:
             ]
         }
 
+class AsyncMockQianwenClient:
+    """模拟千问大模型异步客户端，与AsyncQianwenClient接口相同，响应与MockQianwenClient一致
+
+    latency为每个请求模拟的网络延迟（秒），使用asyncio.sleep，不阻塞事件循环，
+    可以用来测试大量并发请求。
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._client = MockQianwenClient()
+
+    @property
+    def call_count(self) -> int:
+        return self._client.call_count
+
+    def reset_state(self):
+        self._client.reset_state()
+
+    async def send_request(self, data: Dict[str, Any], sequence_id: str = None,
+                           timeout: float = None) -> Dict[str, Any]:
+        """异步模拟请求；输入"7"时在事件循环中等待而不是阻塞线程"""
+        delay = self.latency
+        if not (isinstance(data, dict) and data.get('tools')) and request_content(data) == "7":
+            self._client.call_count += 1
+            delay += TIMEOUT_DELAY
+            response = {"content": "请求已超时", "tool_calls": []}
+        else:
+            response = self._client.send_request(data, sequence_id)
+        if delay:
+            if timeout is not None and delay > timeout:
+                await asyncio.sleep(timeout)
+                raise Exception("发送请求失败: Request timed out")
+            await asyncio.sleep(delay)
+        return response
+
+    async def aclose(self) -> None:
+        pass
+
+    async def __aenter__(self) -> 'AsyncMockQianwenClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
 # 测试代码
 if __name__ == "__main__":
     client = MockQianwenClient()
@@ -283,4 +364,4 @@ if __name__ == "__main__":
     print(client.send_request({"content": "输入1"}))
     
     print("\n测试表格响应:")
-    print(client.send_request({"content": "输入2"}))
\ No newline at end of file
+    print(client.send_request({"content": "输入2"}))
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+OpenAI兼容的本地模拟大模型服务
+在本地HTTP端口上实现QianwenClient调用的 POST /chat/completions 接口（包括SSE流式响应），
+响应内容由MockQianwenClient的场景决定（输入"1"~"11"等），用于在没有网络的环境中对真实的网络客户端
+（连接池、重试、熔断、对冲、流式解析）做压力测试。
+
+- 首字节延迟（TTFT）、相邻文本/参数分片之间的延迟按配置的分布随机抽样
+- error_rate比例的请求返回error_status（默认503），drop_rate比例的请求在响应中途断开连接
+- payload_chars按分布在回复内容后追加填充文本，模拟不同大小的响应
+- 非流式请求在全部分片"生成"完毕后一次性返回（耗时为TTFT加全部分片间隔）
+
+分布的写法（数值单位：延迟为毫秒，大小为字符数）：
+- "0"或"fixed:200"：固定值
+- "uniform:50,200"：均匀分布
+- "normal:100,20"：正态分布（均值、标准差），小于0时取0
+- "lognormal:300,0.5"：对数正态分布（中位数、对数标准差），适合模拟长尾延迟
+- "exp:100"：指数分布（均值）
+
+使用方式（在tools目录下）：
+python -m core.mock_llm_server [--port 8000] [--ttft lognormal:300,0.5] [--inter-token normal:30,10] [--error-rate 0.01]
+然后设置 LLM_BASE_URL=http://127.0.0.1:8000 使用真实客户端（不加--mock）连接该服务。
+"""
+
+import json
+import math
+import time
+import random
+import itertools
+import socket
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from .mock_llm import STREAM_CHUNK_CHARS, MockQianwenClient, request_content
+from .conversation_store import estimate_tokens
+
+# 工具调用参数在流式响应中拆分的分片字符数
+ARGUMENT_CHUNK_CHARS = 16
+# 填充文本的内容
+_FILLER = '模拟负载payload '
+
+
+class Distribution:
+    """按规格字符串定义的随机分布，sample()返回非负的抽样值"""
+
+    KINDS = ('fixed', 'uniform', 'normal', 'lognormal', 'exp')
+
+    def __init__(self, spec: Any = 0):
+        self.spec = str(spec)
+        kind, _, values = self.spec.partition(':')
+        if not values:
+            # 只有一个数值时为固定值
+            kind, values = 'fixed', kind
+        if kind not in self.KINDS:
+            raise ValueError(f"未知的分布类型: {kind}（可选: {', '.join(self.KINDS)}）")
+        try:
+            self.params = [float(value) for value in values.split(',')]
+        except ValueError:
+            raise ValueError(f"分布参数不是数值: {self.spec}")
+        expected = 2 if kind in ('uniform', 'normal', 'lognormal') else 1
+        if len(self.params) != expected:
+            raise ValueError(f"{kind}分布需要{expected}个参数: {self.spec}")
+        self.kind = kind
+
+    def sample(self, rng: random.Random) -> float:
+        a = self.params[0]
+        if self.kind == 'fixed':
+            value = a
+        elif self.kind == 'uniform':
+            value = rng.uniform(a, self.params[1])
+        elif self.kind == 'normal':
+            value = rng.gauss(a, self.params[1])
+        elif self.kind == 'lognormal':
+            value = rng.lognormvariate(math.log(a), self.params[1]) if a > 0 else 0.0
+        else:
+            value = rng.expovariate(1 / a) if a > 0 else 0.0
+        return max(0.0, value)
+
+    def __repr__(self) -> str:
+        return f"Distribution({self.spec!r})"
+
+
+def _to_openai_tool_calls(tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": call.get("id") or f"call_{index}",
+            "type": "function",
+            "function": {"name": call.get("name", ""),
+                         "arguments": json.dumps(call.get("parameters", {}), ensure_ascii=False)}
+        }
+        for index, call in enumerate(tool_calls)
+    ]
+
+
+class MockLLMServer:
+    """OpenAI兼容的模拟大模型服务，在后台线程中运行；可以用作上下文管理器"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, ttft: Any = 0, inter_token: Any = 0,
+                 error_rate: float = 0.0, error_status: int = 503, drop_rate: float = 0.0,
+                 payload_chars: Any = 0, seed: Optional[int] = None, model: str = 'mock-qianwen'):
+        """ttft、inter_token为首字节延迟和分片间隔的分布（毫秒），payload_chars为追加填充文本长度的分布（字符数），
+        可以是Distribution对象或分布规格字符串；port为0时使用随机空闲端口
+        """
+        self.ttft = ttft if isinstance(ttft, Distribution) else Distribution(ttft)
+        self.inter_token = inter_token if isinstance(inter_token, Distribution) else Distribution(inter_token)
+        self.payload_chars = (payload_chars if isinstance(payload_chars, Distribution)
+                              else Distribution(payload_chars))
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.drop_rate = drop_rate
+        self.model = model
+        self.client = MockQianwenClient()
+        # requests、streams: 收到的普通/流式请求数；errors: 模拟的错误应答数；dropped: 中途断开的连接数
+        self.stats: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.httpd = ThreadingHTTPServer((host, port), _MockLLMHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'MockLLMServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def serve_forever(self) -> None:
+        self.httpd.serve_forever()
+
+    def __enter__(self) -> 'MockLLMServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def plan(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """为一个请求抽样：是否出错、是否断开、首字节延迟（秒）、每个分片前的延迟（秒）"""
+        response = self.client.send_request(data)
+        content = response.get("content") or ''
+        with self._lock:
+            error = self._rng.random() < self.error_rate
+            drop = not error and self._rng.random() < self.drop_rate
+            padding = int(self.payload_chars.sample(self._rng))
+            if padding and not response.get("error"):
+                content += (_FILLER * (padding // len(_FILLER) + 1))[:padding]
+            pieces = self._pieces(content, response.get("tool_calls") or [])
+            ttft = self.ttft.sample(self._rng) / 1000
+            delays = [self.inter_token.sample(self._rng) / 1000 for _ in pieces[1:]]
+        return {"response": response, "content": content, "pieces": pieces, "error": error, "drop": drop,
+                "ttft": ttft, "delays": [0.0] + delays}
+
+    @staticmethod
+    def _pieces(content: str, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """把回复拆成流式响应中的delta：文本按STREAM_CHUNK_CHARS个字符，工具调用参数按ARGUMENT_CHUNK_CHARS个字符"""
+        pieces: List[Dict[str, Any]] = [{"role": "assistant", "content": ""}]
+        for start in range(0, len(content), STREAM_CHUNK_CHARS):
+            pieces.append({"content": content[start:start + STREAM_CHUNK_CHARS]})
+        for index, call in enumerate(_to_openai_tool_calls(tool_calls)):
+            arguments = call["function"]["arguments"]
+            pieces.append({"tool_calls": [{"index": index, "id": call["id"], "type": "function",
+                                           "function": {"name": call["function"]["name"], "arguments": ""}}]})
+            for start in range(0, len(arguments), ARGUMENT_CHUNK_CHARS):
+                pieces.append({"tool_calls": [{"index": index, "function": {
+                    "arguments": arguments[start:start + ARGUMENT_CHUNK_CHARS]}}]})
+        return pieces
+
+    def completion(self, data: Dict[str, Any], content: str, tool_calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """构造OpenAI格式的非流式响应"""
+        message: Dict[str, Any] = {"role": "assistant", "content": content}
+        if tool_calls:
+            message["tool_calls"] = _to_openai_tool_calls(tool_calls)
+        return {
+            "id": self.next_id(),
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": data.get("model") or self.model,
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_calls else "stop"}],
+            "usage": self.usage(data, content),
+        }
+
+    @staticmethod
+    def usage(data: Dict[str, Any], content: str) -> Dict[str, int]:
+        """按估算的token数构造usage字段"""
+        messages = data.get("messages")
+        if isinstance(messages, list):
+            prompt = sum(estimate_tokens(str(m.get("content") or '')) for m in messages if isinstance(m, dict))
+        else:
+            prompt = estimate_tokens(request_content(data))
+        completion = estimate_tokens(content)
+        return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+    def next_id(self) -> str:
+        return f"chatcmpl-mock-{next(self._ids)}"
+
+
+class _MockLLMHandler(BaseHTTPRequestHandler):
+    """处理 /chat/completions 请求"""
+
+    # HTTP/1.1：支持长连接和分块传输的流式响应
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # 逐个分片写出，不等待Nagle合并
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        mock: MockLLMServer = self.server.mock
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {"error": {"message": f"未知的接口: {self.path}", "type": "not_found"}})
+            return
+        try:
+            data = json.loads(body or b'{}')
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "请求体不是合法的JSON", "type": "invalid_request_error"}})
+            return
+        stream = bool(data.get("stream"))
+        mock._count('streams' if stream else 'requests')
+        plan = mock.plan(data)
+        time.sleep(plan["ttft"])
+        response = plan["response"]
+        if plan["error"] or response.get("error"):
+            mock._count('errors')
+            status = mock.error_status if plan["error"] else int(response.get("code") or 500)
+            message = "模拟的服务端错误" if plan["error"] else response["error"]
+            self._send_json(status, {"error": {"message": message, "type": "server_error"}})
+            return
+        if stream:
+            self._stream(mock, data, plan)
+            return
+        time.sleep(sum(plan["delays"]))
+        if plan["drop"]:
+            self._drop(mock)
+            return
+        self._send_json(200, mock.completion(data, plan["content"], response.get("tool_calls") or []))
+
+    def _stream(self, mock: MockLLMServer, data: Dict[str, Any], plan: Dict[str, Any]) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        chunk_id = mock.next_id()
+        pieces = plan["pieces"]
+        # 模拟断开时在中途停止
+        cutoff = len(pieces) // 2 if plan["drop"] else len(pieces)
+        try:
+            for piece, delay in zip(pieces[:cutoff], plan["delays"]):
+                if delay:
+                    time.sleep(delay)
+                self._write_event(self._chunk(chunk_id, data, piece, None))
+            if plan["drop"]:
+                self._drop(mock)
+                return
+            tool_calls = plan["response"].get("tool_calls")
+            final = self._chunk(chunk_id, data, {}, "tool_calls" if tool_calls else "stop")
+            final["usage"] = mock.usage(data, plan["content"])
+            self._write_event(final)
+            self._write_chunk(b'data: [DONE]\n\n')
+            # 结束分块传输
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已断开，放弃剩余输出
+            self.close_connection = True
+
+    def _chunk(self, chunk_id: str, data: Dict[str, Any], delta: Dict[str, Any],
+               finish_reason: Optional[str]) -> Dict[str, Any]:
+        return {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": data.get("model") or self.server.mock.model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+    def _write_event(self, chunk: Dict[str, Any]) -> None:
+        self._write_chunk(b'data: ' + json.dumps(chunk, ensure_ascii=False).encode('utf-8') + b'\n\n')
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    def _drop(self, mock: MockLLMServer) -> None:
+        """不完成响应直接关闭连接"""
+        mock._count('dropped')
+        self.close_connection = True
+        try:
+            self.request.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OpenAI兼容的本地模拟大模型服务')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='服务器主机地址')
+    parser.add_argument('--port', type=int, default=8000, help='服务器端口号')
+    parser.add_argument('--ttft', type=str, default='0', help='首字节延迟的分布（毫秒），如lognormal:300,0.5')
+    parser.add_argument('--inter-token', type=str, default='0', help='分片间隔的分布（毫秒），如normal:30,10')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回错误状态码的请求比例')
+    parser.add_argument('--error-status', type=int, default=503, help='模拟错误时返回的状态码')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='响应中途断开连接的请求比例')
+    parser.add_argument('--payload-chars', type=str, default='0', help='追加的填充文本长度的分布（字符数）')
+    parser.add_argument('--seed', type=int, help='随机数种子')
+    args = parser.parse_args()
+
+    try:
+        server = MockLLMServer(args.host, args.port, ttft=args.ttft, inter_token=args.inter_token,
+                               error_rate=args.error_rate, error_status=args.error_status,
+                               drop_rate=args.drop_rate, payload_chars=args.payload_chars, seed=args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"模拟大模型服务: {server.base_url}/chat/completions")
+    print(f"  首字节延迟={server.ttft.spec}ms  分片间隔={server.inter_token.spec}ms  "
+          f"错误率={args.error_rate:g}  断开率={args.drop_rate:g}  填充={server.payload_chars.spec}字符")
+    print(f"使用方式: LLM_BASE_URL={server.base_url} python interactive_tool.py")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -7,7 +7,9 @@
 """
 
 import json
-from typing import Dict, Any, List, Optional
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional
 
 class OutputFormatter:
     """输出格式化器，处理各种类型的输出格式化"""
@@ -18,11 +20,27 @@ class OutputFormatter:
     
     def __init__(self):
         """初始化输出格式化器"""
-        pass
+        # 各线程的输出缓冲区，见buffered()
+        self._local = threading.local()
     
     def output_json(self, data: Dict[str, Any]) -> None:
-        """输出JSON格式的数据"""
-        print(json.dumps(data))
+        """输出JSON格式的数据；立即刷新，使流式输出能被实时读取。当前线程在buffered()中时放入缓冲区"""
+        buffer = getattr(getattr(self, '_local', None), 'buffer', None)
+        if buffer is not None:
+            buffer.append(data)
+            return
+        print(json.dumps(data), flush=True)
+    
+    @contextmanager
+    def buffered(self) -> Iterator[List[Dict[str, Any]]]:
+        """在当前线程中暂存输出的消息而不立即输出，由调用方决定何时按什么顺序输出（如并发执行的工具调用）"""
+        previous = getattr(self._local, 'buffer', None)
+        buffer: List[Dict[str, Any]] = []
+        self._local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self._local.buffer = previous
     
     def output_text(self, content: str, is_error: bool = False, sequence_id: str = '') -> None:
         """输出文本信息"""
@@ -34,6 +52,17 @@ class OutputFormatter:
             "sequenceId": sequence_id
         })
     
+    def output_text_delta(self, content: str, sequence_id: str = '') -> None:
+        """输出流式文本增量，isDelta为True表示应追加到上一条文本之后"""
+        self.output_json({
+            "type": "text",
+            "content": content,
+            "isError": False,
+            "isEnd": False,
+            "isDelta": True,
+            "sequenceId": sequence_id
+        })
+    
     def output_table(self, header: List[str], rows: List[List[Any]], 
                      metadata: Dict[str, Any] = None, sequence_id: str = '') -> None:
         """输出表格数据"""
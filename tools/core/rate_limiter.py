@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+大模型调用限流模块
+上游模型的配额按每分钟请求数（RPM）和每分钟token数（TPM）计算。REST服务的多个线程和它启动的多个
+interactive_tool进程各自调用QianwenClient，没有协调时容易集中发出请求而收到429。
+本模块为RPM和TPM各维护一个令牌桶，状态保存在WAL模式的SQLite小文件中，同一台机器上的进程和线程共享同一组令牌桶。
+
+- 预约式令牌桶：每次请求先扣除令牌（余额可以为负），余额为负时调用方等待到令牌补足为止，
+  不需要轮询，先预约的请求先发出；超出配额的请求等待而不是失败
+- 请求的token数按消息内容、工具schema估算，加上max_tokens（未指定时按DEFAULT_COMPLETION_TOKENS）；
+  响应返回usage后按实际用量修正TPM余额
+- 令牌桶容量为burst_seconds秒的配额，空闲之后最多连续发出这么多请求
+
+启用方式：
+- 环境变量 LLM_RATE_LIMIT_RPM、LLM_RATE_LIMIT_TPM 指定配额（CommandProcessor创建的QianwenClient）
+- 环境变量 LLM_RATE_LIMIT_DB 指定状态文件，默认为临时目录下的llm_rate_limit.sqlite3
+"""
+
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from .conversation_store import estimate_tokens, message_tokens
+
+RATE_LIMIT_RPM_ENV = 'LLM_RATE_LIMIT_RPM'
+RATE_LIMIT_TPM_ENV = 'LLM_RATE_LIMIT_TPM'
+RATE_LIMIT_DB_ENV = 'LLM_RATE_LIMIT_DB'
+DEFAULT_STATE_FILE = os.path.join(tempfile.gettempdir(), 'llm_rate_limit.sqlite3')
+DEFAULT_BURST_SECONDS = 10
+# 请求未指定max_tokens时为回复预留的token数
+DEFAULT_COMPLETION_TOKENS = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    level REAL NOT NULL,
+    updated REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class RateLimiter:
+    """RPM、TPM两个令牌桶组成的限流器，线程安全；path为None时只在进程内共享
+
+    rpm或tpm为None（或0）时不限制对应的配额。
+    """
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None, path: Optional[str] = None,
+                 burst_seconds: float = DEFAULT_BURST_SECONDS,
+                 completion_tokens: int = DEFAULT_COMPLETION_TOKENS):
+        self.path = path
+        self.completion_tokens = completion_tokens
+        # 名称 -> (每秒补充的令牌数, 容量)
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+        for name, limit in (('rpm', rpm), ('tpm', tpm)):
+            if limit:
+                self.buckets[name] = (limit / 60, max(1.0, limit * burst_seconds / 60))
+        self._state: Dict[str, Tuple[float, float]] = {}
+        # 本进程最近一次预约后各令牌桶的余额
+        self.available: Dict[str, float] = {}
+        self._tools_tokens: Dict[str, int] = {}
+        self._stats = {"acquired": 0, "waits": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+        self._lock = threading.Lock()
+        self._conn = None
+        if path and self.buckets:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            # 连接由锁保护，允许在REST服务的各个请求线程中使用
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def estimate(self, payload: Any) -> int:
+        """估算请求消耗的token数：消息、工具schema和为回复预留的token数"""
+        if not isinstance(payload, dict):
+            return estimate_tokens(str(payload)) + self.completion_tokens
+        messages = payload.get('messages')
+        # ConversationStore返回的ContextWindow带有缓存的token数
+        tokens = getattr(messages, 'tokens', None)
+        if tokens is None:
+            if isinstance(messages, list):
+                tokens = sum(message_tokens(m) for m in messages if isinstance(m, dict))
+            else:
+                tokens = estimate_tokens(str(payload.get('content') or ''))
+        tools = payload.get('tools')
+        if tools:
+            version = getattr(tools, 'version', None)
+            tools_tokens = self._tools_tokens.get(version) if version else None
+            if tools_tokens is None:
+                text = (getattr(tools, 'json_text', None)
+                        or json.dumps(tools, ensure_ascii=False, separators=(',', ':')))
+                tools_tokens = estimate_tokens(text)
+                if version:
+                    # ToolSchemas的内容不变时不再重复估算
+                    self._tools_tokens[version] = tools_tokens
+            tokens += tools_tokens
+        return tokens + int(payload.get('max_tokens') or self.completion_tokens)
+
+    def acquire(self, tokens: int = 0) -> float:
+        """预约1个请求和tokens个token，配额不足时等待；返回等待的秒数"""
+        if not self.buckets:
+            return 0.0
+        costs = {'rpm': 1.0, 'tpm': float(tokens)}
+        wait = self._update(lambda name, level: level - costs[name])
+        with self._lock:
+            self._stats["acquired"] += 1
+            if wait > 0:
+                self._stats["waits"] += 1
+                self._stats["wait_seconds"] += wait
+                self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], wait)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def try_acquire(self, tokens: int = 0) -> bool:
+        """配额充足时立即预约1个请求和tokens个token并返回True；需要等待时不预约，返回False
+
+        用于可有可无的请求（如对冲请求），限流时不排队、不占用其他请求的配额。
+        """
+        if not self.buckets:
+            return True
+        costs = {'rpm': 1.0, 'tpm': float(tokens)}
+        if self._update(lambda name, level: level - costs[name], reserve_if_waiting=False) > 0:
+            return False
+        with self._lock:
+            self._stats["acquired"] += 1
+        return True
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """按响应返回的实际token用量修正TPM余额（多预约的退回，少预约的补扣）"""
+        if 'tpm' not in self.buckets or actual is None or actual == estimated:
+            return
+        self._update(lambda name, level: level + (estimated - actual) if name == 'tpm' else level)
+
+    def budget(self) -> Dict[str, Any]:
+        """返回各令牌桶当前的余额，以及现在发出一个请求需要等待的秒数"""
+        levels = {}
+        wait = 0.0
+        now = time.time()
+        with self._lock:
+            state = self._read(now)
+        for name, (rate, capacity) in self.buckets.items():
+            level = state[name]
+            levels[name] = round(level, 2)
+            cost = 1.0 if name == 'rpm' else 0.0
+            if level < cost:
+                wait = max(wait, (cost - level) / rate)
+        return {"available": levels, "wait_seconds": round(wait, 3)}
+
+    def stats(self) -> Dict[str, Any]:
+        """返回预约次数、需要等待的次数、累计和最长的等待时间，以及当前的余额"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(self.budget())
+        return stats
+
+    def _update(self, change, reserve_if_waiting: bool = True) -> float:
+        """补充令牌后按change(名称, 余额)修改各令牌桶的余额，返回余额补足为非负需要等待的最长秒数
+
+        reserve_if_waiting为False时，需要等待则不写回修改后的余额。
+        """
+        now = time.time()
+        wait = 0.0
+        with self._lock:
+            if self._conn is not None:
+                # IMMEDIATE：读取和写回在同一个写事务中，其他进程的预约排在后面
+                self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                state = self._read(now)
+                for name, (rate, _) in self.buckets.items():
+                    level = change(name, state[name])
+                    state[name] = level
+                    if level < 0:
+                        wait = max(wait, -level / rate)
+                if wait <= 0 or reserve_if_waiting:
+                    self._write(state, now)
+                    self.available = {name: round(level, 2) for name, level in state.items()}
+            except BaseException:
+                if self._conn is not None:
+                    self._conn.execute('ROLLBACK')
+                raise
+            if self._conn is not None:
+                self._conn.execute('COMMIT')
+        return wait
+
+    def _read(self, now: float) -> Dict[str, float]:
+        """读取各令牌桶的余额并按经过的时间补充，不超过容量（调用方持有锁）"""
+        if self._conn is not None:
+            stored = {name: (level, updated) for name, level, updated in
+                      self._conn.execute('SELECT name, level, updated FROM buckets')}
+        else:
+            stored = self._state
+        state = {}
+        for name, (rate, capacity) in self.buckets.items():
+            level, updated = stored.get(name, (capacity, now))
+            state[name] = min(capacity, level + max(0.0, now - updated) * rate)
+        return state
+
+    def _write(self, state: Dict[str, float], now: float) -> None:
+        if self._conn is not None:
+            self._conn.executemany('INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)',
+                                   [(name, level, now) for name, level in state.items()])
+        else:
+            self._state = {name: (level, now) for name, level in state.items()}
+
+
+_limiters: Dict[Tuple[str, float, float], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def open_rate_limiter(rpm: Optional[float], tpm: Optional[float], path: str = DEFAULT_STATE_FILE) -> RateLimiter:
+    """打开限流器；同一状态文件和配额在进程内只打开一次"""
+    real_path = os.path.realpath(path)
+    key = (real_path, float(rpm or 0), float(tpm or 0))
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter(rpm, tpm, real_path)
+        return limiter
+
+
+def rate_limiter_from_env() -> Optional[RateLimiter]:
+    """按环境变量LLM_RATE_LIMIT_RPM、LLM_RATE_LIMIT_TPM创建限流器；都未设置时返回None"""
+    try:
+        rpm = float(os.environ.get(RATE_LIMIT_RPM_ENV) or 0)
+        tpm = float(os.environ.get(RATE_LIMIT_TPM_ENV) or 0)
+    except ValueError:
+        raise ValueError(f"{RATE_LIMIT_RPM_ENV}、{RATE_LIMIT_TPM_ENV}必须是数值")
+    if not rpm and not tpm:
+        return None
+    return open_rate_limiter(rpm, tpm, os.environ.get(RATE_LIMIT_DB_ENV) or DEFAULT_STATE_FILE)
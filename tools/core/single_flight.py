@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+大模型请求合并（single-flight）模块
+同一时刻内容相同的多个请求（如多个webview面板、超时重试同时发出同一个提示词）只向上游发送一次，
+所有等待者得到同一个结果；请求结束后不保留结果（需要缓存结果时使用llm_cache）。
+
+- 键为客户端的标识加上请求内容的规范化哈希（与llm_cache相同的cache_key），
+  同一进程中使用不同客户端（模拟与真实、不同的服务地址或API key）的相同请求不会合并
+- 流式请求的事件放入共享缓冲区，每个等待者从头按顺序读取，中途加入的等待者不会丢失之前的增量
+- 取消按引用计数：等待者全部离开（关闭事件迭代器）后才中止上游的流式请求；
+  asyncio版本在全部等待者被取消后取消上游任务
+"""
+
+import copy
+import asyncio
+import hashlib
+import threading
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .llm_cache import cache_key
+
+
+def client_identity(client: Any) -> str:
+    """返回客户端的标识：各层包装（如CachedLLMClient）和被包装客户端的类、服务地址、模型和API key的哈希"""
+    classes = []
+    inner = client
+    while inner is not None:
+        classes.append(f"{type(inner).__module__}.{type(inner).__qualname__}")
+        # 只看实例自己的client属性，不经过包装类转发到被包装客户端的__getattr__
+        inner = getattr(inner, '__dict__', {}).get('client')
+    api_key = getattr(client, 'api_key', None) or ''
+    parts = ['/'.join(classes), str(getattr(client, 'base_url', '') or ''), str(getattr(client, 'model', '') or ''),
+             hashlib.sha256(str(api_key).encode('utf-8')).hexdigest()[:16] if api_key else '']
+    return '|'.join(parts)
+
+
+def flight_key(client: Any, data: Any, kind: str = 'response') -> Tuple[str, str]:
+    """合并请求的键：(客户端标识, 请求内容的cache_key)"""
+    return client_identity(client), cache_key(data, kind)
+
+
+class _Call:
+    """一次进行中的普通请求"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _Stream:
+    """一次进行中的流式请求：事件缓冲区、上游迭代器和等待者计数"""
+
+    def __init__(self, fn: Callable[[], Iterable[Any]]):
+        self.fn = fn
+        self.cond = threading.Condition()
+        self.iterator: Optional[Iterator[Any]] = None
+        self.events: List[Any] = []
+        self.error: Optional[BaseException] = None
+        self.finished = False
+        # 是否有等待者正在从上游读取下一个事件
+        self.pulling = False
+        self.subscribers = 0
+
+
+class SingleFlight:
+    """按键合并进行中的调用，线程安全"""
+
+    def __init__(self):
+        self._calls: Dict[Any, _Call] = {}
+        self._streams: Dict[Any, _Stream] = {}
+        self._lock = threading.Lock()
+        # upstream: 实际发出的调用次数；shared: 合并到进行中调用的次数；cancelled: 因等待者全部离开而中止的流
+        self.stats: Counter = Counter()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls) + len(self._streams)
+
+    def do(self, key: Any, fn: Callable[[], Any]) -> Any:
+        """执行fn并返回结果；同一键已有进行中的调用时等待其结果（返回副本），异常同样传给所有等待者"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            self.stats['upstream' if leader else 'shared'] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stream(self, key: Any, fn: Callable[[], Iterable[Any]]) -> Iterator[Any]:
+        """返回fn()产生的事件；同一键已有进行中的流式调用时从头重放其事件并继续接收后续事件
+
+        不使用后台线程：缓冲区读完的等待者轮流从上游读取下一个事件，上游按消费的速度读取。
+        迭代器被关闭（或提前结束迭代）时离开；全部等待者离开后关闭上游的流式请求。
+        """
+        with self._lock:
+            flight = self._streams.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._streams[key] = _Stream(fn)
+            self.stats['upstream' if leader else 'shared'] += 1
+            with flight.cond:
+                flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                with flight.cond:
+                    while index >= len(flight.events) and not flight.finished and flight.pulling:
+                        flight.cond.wait()
+                    pull = False
+                    if index < len(flight.events):
+                        event = flight.events[index]
+                    elif flight.finished:
+                        if flight.error is not None:
+                            raise flight.error
+                        return
+                    else:
+                        flight.pulling = pull = True
+                if pull:
+                    self._pull(key, flight)
+                    continue
+                index += 1
+                yield event
+        finally:
+            self._leave(key, flight)
+
+    def _pull(self, key: Any, flight: _Stream) -> None:
+        """从上游读取一个事件放入缓冲区（同一时刻只有一个等待者在读取）"""
+        finished = False
+        error = None
+        try:
+            if flight.iterator is None:
+                flight.iterator = iter(flight.fn())
+            event = next(flight.iterator)
+        except StopIteration:
+            finished = True
+        except BaseException as e:
+            finished = True
+            error = e
+        if finished:
+            with self._lock:
+                if self._streams.get(key) is flight:
+                    del self._streams[key]
+        with flight.cond:
+            if finished:
+                flight.finished = True
+                flight.error = error
+            else:
+                flight.events.append(event)
+            flight.pulling = False
+            flight.cond.notify_all()
+
+    def _leave(self, key: Any, flight: _Stream) -> None:
+        with self._lock:
+            with flight.cond:
+                flight.subscribers -= 1
+                if flight.subscribers or flight.finished:
+                    return
+                flight.finished = True
+            # 已中止的流不再接受新的等待者
+            if self._streams.get(key) is flight:
+                del self._streams[key]
+            self.stats['cancelled'] += 1
+        if flight.iterator is not None and hasattr(flight.iterator, 'close'):
+            # 关闭上游生成器：QianwenClient.stream_request随之关闭连接
+            flight.iterator.close()
+
+
+class AsyncSingleFlight:
+    """asyncio版本：同一键的协程共享一个上游任务，全部等待者被取消后取消上游任务"""
+
+    def __init__(self):
+        self._tasks: Dict[Any, list] = {}
+        self.stats: Counter = Counter()
+
+    async def do(self, key: Any, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """等待factory()的结果；同一键已有进行中的任务时等待该任务（返回副本）"""
+        entry = self._tasks.get(key)
+        leader = entry is None
+        if leader:
+            entry = self._tasks[key] = [asyncio.ensure_future(factory()), 0]
+            entry[0].add_done_callback(lambda _, entry=entry: self._forget(key, entry))
+        self.stats['upstream' if leader else 'shared'] += 1
+        task = entry[0]
+        entry[1] += 1
+        try:
+            # shield：单个等待者被取消时不影响其他等待者
+            result = await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                task.cancel()
+                self._forget(key, entry)
+                self.stats['cancelled'] += 1
+        return result if leader else copy.deepcopy(result)
+
+    def _forget(self, key: Any, entry: list) -> None:
+        if self._tasks.get(key) is entry:
+            del self._tasks[key]
+
+
+class SingleFlightLLMClient:
+    """合并内容相同的进行中请求的客户端包装，接口与被包装的客户端相同
+
+    ignore_fields中的字段（如sequenceId、conversationId）不参与键的计算，
+    使不同面板、不同会话发出的相同提示词也能合并。
+    """
+
+    def __init__(self, client: Any, flight: Optional[SingleFlight] = None, ignore_fields: Iterable[str] = ()):
+        self.client = client
+        self.flight = flight or SingleFlight()
+        self.ignore_fields = tuple(ignore_fields)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+    def _key(self, data: Any, kind: str) -> Tuple[str, str]:
+        if isinstance(data, dict) and self.ignore_fields:
+            data = {key: value for key, value in data.items() if key not in self.ignore_fields}
+        return flight_key(self.client, data, kind)
+
+    def send_request(self, data: Dict[str, Any], sequence_id: Optional[str] = None) -> Dict[str, Any]:
+        return self.flight.do(self._key(data, 'response'), lambda: self.client.send_request(data, sequence_id))
+
+    def stream_request(self, data: Dict[str, Any], sequence_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        return self.flight.stream(self._key(data, 'stream'), lambda: self.client.stream_request(data, sequence_id))
+
+
+class AsyncSingleFlightLLMClient:
+    """AsyncQianwenClient / AsyncMockQianwenClient的请求合并包装"""
+
+    def __init__(self, client: Any, flight: Optional[AsyncSingleFlight] = None, ignore_fields: Iterable[str] = ()):
+        self.client = client
+        self.flight = flight or AsyncSingleFlight()
+        self.ignore_fields = tuple(ignore_fields)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+    async def send_request(self, data: Dict[str, Any], sequence_id: Optional[str] = None,
+                           timeout: Optional[float] = None) -> Dict[str, Any]:
+        if isinstance(data, dict) and self.ignore_fields:
+            key_data = {key: value for key, value in data.items() if key not in self.ignore_fields}
+        else:
+            key_data = data
+        return await self.flight.do(flight_key(self.client, key_data, 'response'),
+                                    lambda: self.client.send_request(data, sequence_id, timeout=timeout))
+
+
+# 进程内共享的合并器，同一进程中的多个CommandProcessor共享进行中的请求
+shared_flight = SingleFlight()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+工具调用并发执行模块
+大模型的一次回复可能包含多个工具调用，逐个执行时执行I/O的自定义工具的耗时会累加。
+注册时声明了concurrent（没有副作用或与其他调用相互独立）的自定义工具提交到有界线程池并发执行，其余调用仍按顺序执行。
+
+- 并发调用输出的消息先在各自的线程中缓冲，按调用的原始顺序输出，客户端看到的消息顺序与顺序执行时一致
+- 顺序执行的调用开始前先等待排在它前面的并发调用完成，保持调用之间的先后关系
+- 并发调用按工具声明的timeout（秒，从提交时开始计时）超时；每轮还有总的时间预算（环境变量LLM_TOOL_BUDGET），
+  超出预算后不再等待未完成的调用，也不再开始新的顺序调用
+- 线程无法被强制终止：超时的调用在后台继续运行到结束，但输出被丢弃，结果记为None
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# 每轮工具调用的总时间预算（秒，环境变量LLM_TOOL_BUDGET）
+TOOL_BUDGET_ENV = 'LLM_TOOL_BUDGET'
+DEFAULT_TOOL_BUDGET = 60.0
+# 执行并发工具调用的线程数
+TOOL_POOL_SIZE = 8
+
+_tool_executor: Optional[ThreadPoolExecutor] = None
+_tool_executor_lock = threading.Lock()
+
+
+def _get_tool_executor() -> ThreadPoolExecutor:
+    """进程内共享的工具调用线程池，首次使用时创建"""
+    global _tool_executor
+    with _tool_executor_lock:
+        if _tool_executor is None:
+            _tool_executor = ThreadPoolExecutor(max_workers=TOOL_POOL_SIZE, thread_name_prefix='tool-call')
+        return _tool_executor
+
+
+def tool_budget_from_env() -> float:
+    """从环境变量LLM_TOOL_BUDGET读取每轮工具调用的时间预算"""
+    try:
+        return float(os.environ.get(TOOL_BUDGET_ENV) or DEFAULT_TOOL_BUDGET)
+    except ValueError:
+        raise ValueError(f"{TOOL_BUDGET_ENV}必须是数值")
+
+
+class ToolCallBatch:
+    """一轮（大模型的一次回复）中的工具调用：submit()逐个提交，finish()等待全部完成并返回按原始顺序排列的结果"""
+
+    def __init__(self, tool_handler: Any, tracer: Any, sequence_id: str, budget: float = DEFAULT_TOOL_BUDGET):
+        self.tool_handler = tool_handler
+        self.formatter = tool_handler.formatter
+        self.tracer = tracer
+        self.sequence_id = sequence_id
+        self.budget = budget
+        self.deadline = time.monotonic() + budget
+        self.results: List[Any] = []
+        # 各调用是否并发执行、执行耗时（秒，未执行或未完成时为None），finished为finish()返回的时间
+        self.concurrent: List[bool] = []
+        self.durations: List[Optional[float]] = []
+        self.finished: Optional[float] = None
+        # (结果位置, 工具调用, 提交时间, Future)
+        self._pending: Deque[Tuple[int, Dict[str, Any], float, Future]] = deque()
+
+    def submit(self, tool_call: Dict[str, Any]) -> None:
+        """提交一个工具调用：可并发的放入线程池，其余的等待前面的并发调用完成后在当前线程执行"""
+        index = len(self.results)
+        concurrent = self.tool_handler.is_concurrent(tool_call)
+        self.results.append(None)
+        self.durations.append(None)
+        self.concurrent.append(concurrent)
+        if concurrent:
+            future = _get_tool_executor().submit(self._run_buffered, index, tool_call)
+            self._pending.append((index, tool_call, time.monotonic(), future))
+            return
+        self._drain()
+        if time.monotonic() >= self.deadline:
+            self._output_over_budget(tool_call)
+            return
+        self.results[index] = self._run(index, tool_call)
+
+    def finish(self) -> List[Any]:
+        """等待所有并发调用完成（或超时）并输出它们的消息，返回各调用的结果"""
+        self._drain()
+        self.finished = time.monotonic()
+        return self.results
+
+    def overlap_saved(self, stream_end: float) -> float:
+        """估算工具调用与流式接收重叠节省的时间（秒），需要在finish()之后调用
+
+        按各调用的实际耗时重放流结束后才开始执行的调度（并发调用同时开始，顺序调用等待前面的调用完成），
+        减去流结束后实际等待的时间；未完成的调用不计入。
+        """
+        if self.finished is None:
+            return 0.0
+        cursor = pending = 0.0
+        for concurrent, duration in zip(self.concurrent, self.durations):
+            if duration is None:
+                continue
+            if concurrent:
+                pending = max(pending, cursor + duration)
+            else:
+                cursor = pending = max(cursor, pending) + duration
+        return max(0.0, max(cursor, pending) - max(0.0, self.finished - stream_end))
+
+    def _run(self, index: int, tool_call: Dict[str, Any]) -> Any:
+        start = time.monotonic()
+        with self.tracer.span(self.sequence_id, 'tool_call', tool=tool_call.get("name")):
+            result = self.tool_handler.handle_tool_call(tool_call, self.sequence_id)
+        self.durations[index] = time.monotonic() - start
+        return result
+
+    def _run_buffered(self, index: int, tool_call: Dict[str, Any]) -> Tuple[Any, List[Dict[str, Any]]]:
+        """在线程池中执行工具调用，输出的消息缓冲后随结果一起返回"""
+        with self.formatter.buffered() as messages:
+            result = self._run(index, tool_call)
+        return result, messages
+
+    def _drain(self) -> None:
+        """按提交顺序等待并发调用，输出它们缓冲的消息"""
+        while self._pending:
+            index, tool_call, submitted, future = self._pending.popleft()
+            timeout = self.tool_handler.tool_timeout(tool_call)
+            wait_until = self.deadline if timeout is None else min(self.deadline, submitted + timeout)
+            try:
+                result, messages = future.result(timeout=max(0.0, wait_until - time.monotonic()))
+            except FutureTimeoutError:
+                future.cancel()
+                if timeout is not None and submitted + timeout <= self.deadline:
+                    self.formatter.output_error(f"工具调用超时（{timeout:g}秒）: {tool_call.get('name')}",
+                                                self.sequence_id)
+                else:
+                    self._output_over_budget(tool_call)
+                continue
+            except Exception as e:
+                self.formatter.output_error(f"工具调用失败: {str(e)}", self.sequence_id)
+                continue
+            for message in messages:
+                self.formatter.output_json(message)
+            self.results[index] = result
+
+    def _output_over_budget(self, tool_call: Dict[str, Any]) -> None:
+        self.formatter.output_error(f"工具调用超出本轮的时间预算（{self.budget:g}秒）: {tool_call.get('name')}",
+                                    self.sequence_id)
@@ -6,82 +6,210 @@
 负责处理大模型的工具调用请求和注册扩展工具
 """
 
-from typing import Dict, Any, List, Optional, Callable
+import json
+import hashlib
+from typing import Dict, Any, Iterable, List, Optional, Callable
 from .output_formatter import OutputFormatter
 
+# 内置工具的schema
+BUILTIN_TOOLS = [
+    {
+        "name": "output_text",
+        "description": "输出文本信息给用户",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "content": { "type": "string", "description": "文本内容" },
+                "isError": { "type": "boolean", "description": "是否为错误信息", "default": False }
+            },
+            "required": ["content"]
+        }
+    },
+    {
+        "name": "output_table",
+        "description": "输出表格数据给用户",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "header": { "type": "array", "items": { "type": "string" }, "description": "表头" },
+                "rows": { "type": "array", "items": { "type": "array" }, "description": "行数据" },
+                "metadata": { "type": "object", "description": "表格元数据", "required": False }
+            },
+            "required": ["header", "rows"]
+        }
+    },
+    {
+        "name": "output_progress",
+        "description": "输出进度信息给用户",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "current": { "type": "integer", "description": "当前进度值（0-100）" },
+                "total": { "type": "integer", "description": "总量", "required": False },
+                "status": { "type": "string", "description": "当前状态描述" }
+            },
+            "required": ["current", "status"]
+        }
+    },
+    {
+        "name": "request_user_input",
+        "description": "请求用户输入",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "prompt": { "type": "string", "description": "提示信息" }
+            },
+            "required": ["prompt"]
+        }
+    },
+    {
+        "name": "end_execution",
+        "description": "结束当前执行流程",
+        "parameters": { "type": "object", "properties": {} }
+    }
+]
+
+# 自定义工具中只用于执行、不发送给大模型的字段：
+# handler为执行函数handler(parameters, sequence_id)；concurrent表示工具没有副作用或与其他调用相互独立，
+# 可以与同一回复中的其他工具调用并发执行；timeout为并发执行时的超时时间（秒）
+TOOL_EXECUTION_FIELDS = ("handler", "concurrent", "timeout")
+
+# 按请求内容选择工具时，内置工具对应的关键词；不在表中的工具（output_text、end_execution）总是提供
+BUILTIN_TOOL_KEYWORDS = {
+    "output_table": ("表", "列出", "清单", "对比", "table", "list", "compare"),
+    "output_progress": ("进度", "步骤", "progress", "step"),
+    "request_user_input": ("输入", "确认", "选择", "input", "confirm", "choose"),
+}
+
+
+class ToolSchemas(list):
+    """预先构建好的工具schema列表
+
+    json_text为序列化后的文本，QianwenClient发送请求时直接拼接，不再重复序列化；
+    version为内容哈希，工具集合不变时保持不变，可以用作缓存键。
+    """
+
+    def __init__(self, tools: Iterable[Dict[str, Any]]):
+        super().__init__(tools)
+        self.json_text = json.dumps(self, ensure_ascii=False, separators=(',', ':'))
+        self.version = hashlib.sha256(self.json_text.encode('utf-8')).hexdigest()[:16]
+
+
+class _ToolRegistry(dict):
+    """自定义工具表，内容变化时递增revision，用于判断预先构建的schema是否失效"""
+
+    revision = 0
+
+    def _changed(self) -> None:
+        self.revision += 1
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._changed()
+
+    def pop(self, *args):
+        result = super().pop(*args)
+        self._changed()
+        return result
+
+    def popitem(self):
+        result = super().popitem()
+        self._changed()
+        return result
+
+    def setdefault(self, key, default=None):
+        result = super().setdefault(key, default)
+        self._changed()
+        return result
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._changed()
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
 class ToolHandler:
     """工具处理器，负责处理大模型的工具调用请求和注册扩展工具"""
     
     def __init__(self, formatter: OutputFormatter = None):
         """初始化工具处理器"""
         self.formatter = formatter or OutputFormatter()
-        self.custom_tools = {}
-    
-    def register_extension_tools(self, sequence_id: str = '') -> List[Dict[str, Any]]:
-        """注册扩展工具给千问大模型"""
-        # 基本工具列表
-        tools = [
-            {
-                "name": "output_text",
-                "description": "输出文本信息给用户",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "content": { "type": "string", "description": "文本内容" },
-                        "isError": { "type": "boolean", "description": "是否为错误信息", "default": False }
-                    },
-                    "required": ["content"]
-                }
-            },
-            {
-                "name": "output_table",
-                "description": "输出表格数据给用户",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "header": { "type": "array", "items": { "type": "string" }, "description": "表头" },
-                        "rows": { "type": "array", "items": { "type": "array" }, "description": "行数据" },
-                        "metadata": { "type": "object", "description": "表格元数据", "required": False }
-                    },
-                    "required": ["header", "rows"]
-                }
-            },
-            {
-                "name": "output_progress",
-                "description": "输出进度信息给用户",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "current": { "type": "integer", "description": "当前进度值（0-100）" },
-                        "total": { "type": "integer", "description": "总量", "required": False },
-                        "status": { "type": "string", "description": "当前状态描述" }
-                    },
-                    "required": ["current", "status"]
-                }
-            },
-            {
-                "name": "request_user_input",
-                "description": "请求用户输入",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "prompt": { "type": "string", "description": "提示信息" }
-                    },
-                    "required": ["prompt"]
-                }
-            },
-            {
-                "name": "end_execution",
-                "description": "结束当前执行流程",
-                "parameters": { "type": "object", "properties": {} }
-            }
-        ]
-        
-        # 添加自定义工具
-        for tool_name, tool_info in self.custom_tools.items():
-            tools.append(tool_info)
-        
-        return tools
+        self.custom_tools = _ToolRegistry()
+        # (自定义工具表的revision, {选择的工具名集合: ToolSchemas})
+        self._schema_cache = (-1, {})
+    
+    @property
+    def custom_tools(self) -> Dict[str, Dict[str, Any]]:
+        return self._custom_tools
+    
+    @custom_tools.setter
+    def custom_tools(self, tools: Dict[str, Dict[str, Any]]) -> None:
+        registry = _ToolRegistry(tools)
+        # 整体替换时也要让已构建的schema失效
+        registry.revision = getattr(self, '_custom_tools', registry).revision + 1
+        self._custom_tools = registry
+    
+    def tool_schemas(self, names: Optional[Iterable[str]] = None) -> ToolSchemas:
+        """返回内置工具和自定义工具的schema列表，names指定时只包含其中的工具（保持原有顺序）
+
+        结果按选择的工具集合缓存，自定义工具表变化时失效；返回的列表在请求之间共享，不要修改。
+        """
+        selection = None if names is None else frozenset(names)
+        revision, schemas = self._schema_cache
+        if revision != self._custom_tools.revision:
+            schemas = {}
+            self._schema_cache = (self._custom_tools.revision, schemas)
+        result = schemas.get(selection)
+        if result is None:
+            tools = BUILTIN_TOOLS + [
+                {key: value for key, value in tool.items() if key not in TOOL_EXECUTION_FIELDS}
+                for tool in self._custom_tools.values()
+            ]
+            if selection is not None:
+                tools = [tool for tool in tools if tool.get("name") in selection]
+            result = schemas[selection] = ToolSchemas(tools)
+        return result
+    
+    def select_tools(self, content: str) -> List[str]:
+        """按请求内容选择相关的工具名：output_text和end_execution总是提供，
+        其他内置工具在内容包含对应关键词时提供，自定义工具在内容包含工具名或其keywords之一时提供
+        """
+        text = content.lower()
+        names = []
+        for tool in BUILTIN_TOOLS:
+            keywords = BUILTIN_TOOL_KEYWORDS.get(tool["name"])
+            if keywords is None or any(keyword in text for keyword in keywords):
+                names.append(tool["name"])
+        for name, tool_info in self._custom_tools.items():
+            keywords = [name] + list(tool_info.get("keywords") or [])
+            if any(str(keyword).lower() in text for keyword in keywords):
+                names.append(name)
+        return names
+    
+    def register_extension_tools(self, sequence_id: str = '', content: Optional[str] = None) -> List[Dict[str, Any]]:
+        """注册扩展工具给千问大模型：返回预先构建的工具schema列表
+
+        content指定时只返回与请求内容相关的工具（见select_tools），减少提示词长度。
+        """
+        if content is None:
+            return self.tool_schemas()
+        return self.tool_schemas(self.select_tools(content))
+    
+    def is_concurrent(self, tool_call: Dict[str, Any]) -> bool:
+        """工具调用是否可以与其他调用并发执行（自定义工具声明了concurrent）"""
+        tool_info = self._custom_tools.get(tool_call.get("name"))
+        return bool(tool_info and tool_info.get("concurrent"))
+    
+    def tool_timeout(self, tool_call: Dict[str, Any]) -> Optional[float]:
+        """自定义工具声明的超时时间（秒），未声明时返回None"""
+        tool_info = self._custom_tools.get(tool_call.get("name"))
+        return tool_info.get("timeout") if tool_info else None
     
     def handle_tool_call(self, tool_call: Dict[str, Any], sequence_id: str) -> Any:
         """处理大模型的工具调用请求"""
@@ -147,9 +275,11 @@ class ToolHandler:
         self.formatter.output_end("执行已结束", sequence_id)
     
     def _handle_custom_tool(self, tool_name: str, parameters: Dict[str, Any], sequence_id: str) -> Any:
-        """处理自定义工具调用"""
-        # 这里只是简单示例，实际应用中可能需要更复杂的处理逻辑
+        """处理自定义工具调用：注册时提供了handler的调用handler，否则只输出工具名和参数"""
         self.formatter.output_text(f"执行自定义工具: {tool_name}", sequence_id=sequence_id)
+        handler = self.custom_tools[tool_name].get("handler")
+        if handler is not None:
+            return handler(parameters, sequence_id)
         self.formatter.output_text(f"工具参数: {parameters}", sequence_id=sequence_id)
         return {"status": "success", "message": "自定义工具执行成功"}
     
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+执行时间线追踪模块
+按sequenceId记录各阶段的单调时间戳，并导出为Chrome trace-event JSON格式
+（可直接在chrome://tracing或Perfetto中打开）
+
+启用方式：
+- 环境变量 TOOL_TRACE=1
+- 或在构造时传入 enabled=True
+环境变量 TOOL_TRACE_DIR 指定后，dump()会将追踪文件写入该目录
+未启用时所有记录方法直接返回，开销可以忽略
+"""
+
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+TRACE_ENV = 'TOOL_TRACE'
+TRACE_DIR_ENV = 'TOOL_TRACE_DIR'
+
+
+def now_us() -> int:
+    """返回单调时钟的微秒时间戳（同一主机上的进程之间可比较）"""
+    return time.monotonic_ns() // 1000
+
+
+class Tracer:
+    """按sequenceId收集追踪事件的记录器，线程安全"""
+
+    def __init__(self, process_name: str = '', enabled: Optional[bool] = None,
+                 trace_dir: Optional[str] = None, max_sequences: int = 256):
+        """初始化追踪器，enabled和trace_dir为None时从环境变量读取"""
+        if enabled is None:
+            enabled = os.environ.get(TRACE_ENV, '').lower() in ('1', 'true', 'yes')
+        if trace_dir is None:
+            trace_dir = os.environ.get(TRACE_DIR_ENV) or None
+
+        self.enabled = enabled
+        self.trace_dir = trace_dir
+        self.process_name = process_name
+        self.max_sequences = max_sequences
+        self.pid = os.getpid()
+        self._events: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _append(self, sequence_id: str, event: Dict[str, Any]) -> None:
+        """保存事件，超过上限时淘汰最早的sequenceId"""
+        with self._lock:
+            events = self._events.get(sequence_id)
+            if events is None:
+                events = self._events[sequence_id] = []
+                while len(self._events) > self.max_sequences:
+                    self._events.popitem(last=False)
+            events.append(event)
+
+    def _event(self, name: str, ph: str, ts: int, args: Dict[str, Any]) -> Dict[str, Any]:
+        """构造一个trace事件"""
+        event = {
+            "name": name,
+            "cat": self.process_name or "tool",
+            "ph": ph,
+            "ts": ts,
+            "pid": self.pid,
+            "tid": threading.get_ident()
+        }
+        if args:
+            event["args"] = args
+        return event
+
+    def instant(self, sequence_id: str, name: str, ts: Optional[int] = None, **args) -> None:
+        """记录一个瞬时事件"""
+        if not self.enabled:
+            return
+        event = self._event(name, "i", now_us() if ts is None else ts, args)
+        event["s"] = "p"
+        self._append(sequence_id, event)
+
+    def complete(self, sequence_id: str, name: str, start_us: int,
+                 end_us: Optional[int] = None, **args) -> None:
+        """记录一个已知起止时间的区间事件"""
+        if not self.enabled:
+            return
+        event = self._event(name, "X", start_us, args)
+        event["dur"] = (now_us() if end_us is None else end_us) - start_us
+        self._append(sequence_id, event)
+
+    @contextmanager
+    def span(self, sequence_id: str, name: str, **args):
+        """以上下文管理器的形式记录区间事件"""
+        if not self.enabled:
+            yield
+            return
+        start = now_us()
+        try:
+            yield
+        finally:
+            self.complete(sequence_id, name, start, **args)
+
+    def add_events(self, sequence_id: str, events: List[Dict[str, Any]]) -> None:
+        """合并其他进程上报的事件（如子进程输出的trace消息）"""
+        if not self.enabled or not events:
+            return
+        for event in events:
+            if isinstance(event, dict):
+                self._append(sequence_id, event)
+
+    def get_events(self, sequence_id: str) -> List[Dict[str, Any]]:
+        """获取指定sequenceId的事件副本，包含本进程的名称元数据"""
+        with self._lock:
+            events = list(self._events.get(sequence_id, []))
+        if events and self.process_name:
+            events.insert(0, {
+                "name": "process_name",
+                "ph": "M",
+                "pid": self.pid,
+                "args": {"name": self.process_name}
+            })
+        return events
+
+    def has_trace(self, sequence_id: str) -> bool:
+        """判断是否存在指定sequenceId的追踪数据"""
+        with self._lock:
+            return sequence_id in self._events
+
+    def export(self, sequence_id: str) -> Dict[str, Any]:
+        """导出为Chrome trace-event JSON对象"""
+        events = sorted(self.get_events(sequence_id), key=lambda e: e.get("ts", 0))
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"sequenceId": sequence_id}
+        }
+
+    def dump(self, sequence_id: str, trace_dir: Optional[str] = None) -> Optional[str]:
+        """将追踪数据写入磁盘，返回文件路径；未启用或未配置目录时返回None"""
+        trace_dir = trace_dir or self.trace_dir
+        if not self.enabled or not trace_dir or not self.has_trace(sequence_id):
+            return None
+
+        os.makedirs(trace_dir, exist_ok=True)
+        safe_id = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in sequence_id) or 'unknown'
+        path = os.path.join(trace_dir, f"trace-{safe_id}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.export(sequence_id), f)
+        return path
+
+    def pop(self, sequence_id: str) -> List[Dict[str, Any]]:
+        """取出并删除指定sequenceId的事件"""
+        events = self.get_events(sequence_id)
+        with self._lock:
+            self._events.pop(sequence_id, None)
+        return events
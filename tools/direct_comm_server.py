@@ -15,23 +15,67 @@ import urllib.parse
 import subprocess
 import threading
 import time
+import tempfile
+import importlib.util
 from datetime import datetime
 
+from core.idempotency_store import DEFAULT_TTL, open_store
+
 # 确保中文正常显示
 import io
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+# webview超时后会重试/process-amount，默认启用幂等存储，重复提交直接返回保存的结果
+DEFAULT_IDEMPOTENCY_DB = os.path.join(tempfile.gettempdir(), 'direct_comm_idempotency.sqlite3')
+
+_cmd_third_module = None
+_cmd_third_lock = threading.Lock()
+
+
+def load_cmd_third():
+    """加载cmd-third.py（文件名含连字符，无法直接import），进程内只加载一次，之后的请求直接复用"""
+    global _cmd_third_module
+    with _cmd_third_lock:
+        if _cmd_third_module is None:
+            if TOOLS_DIR not in sys.path:
+                sys.path.insert(0, TOOLS_DIR)
+            spec = importlib.util.spec_from_file_location('cmd_third', os.path.join(TOOLS_DIR, 'cmd-third.py'))
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _cmd_third_module = module
+        return _cmd_third_module
+
+
 class DirectCommHandler(BaseHTTPRequestHandler):
     """处理直接通信请求的处理器"""
     
+    # 使用HTTP/1.1以支持分块传输的流式响应；普通JSON响应都带Content-Length
+    protocol_version = 'HTTP/1.1'
+    # 金额提交的幂等存储，由run_server设置
+    idempotency_store = None
+    # 请求中fxRates可以选择的汇率文件所在目录，由run_server设置；为None时拒绝fxRates
+    fx_rates_dir = None
+    
     def do_OPTIONS(self):
         """处理跨域预检请求"""
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def _send_json(self, status, response):
+        """发送JSON响应"""
+        body = json.dumps(response).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
+        self.wfile.write(body)
     
     def do_GET(self):
         """处理GET请求"""
@@ -39,25 +83,16 @@ class DirectCommHandler(BaseHTTPRequestHandler):
         
         if parsed_path.path == '/test':
             # 测试连接
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
             response = {
                 'status': 'success',
                 'message': '直接通信服务器已启动',
                 'timestamp': datetime.now().isoformat()
             }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self._send_json(200, response)
             return
         
         # 其他GET请求返回404
-        self.send_response(404)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        response = {'status': 'error', 'message': '未找到请求的资源'}
-        self.wfile.write(json.dumps(response).encode('utf-8'))
+        self._send_json(404, {'status': 'error', 'message': '未找到请求的资源'})
     
     def do_POST(self):
         """处理POST请求"""
@@ -71,12 +106,7 @@ class DirectCommHandler(BaseHTTPRequestHandler):
             # 解析JSON数据
             request_data = json.loads(post_data.decode('utf-8'))
         except json.JSONDecodeError:
-            self.send_response(400)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            response = {'status': 'error', 'message': '无效的JSON数据'}
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self._send_json(400, {'status': 'error', 'message': '无效的JSON数据'})
             return
         
         if parsed_path.path == '/execute':
@@ -90,12 +120,7 @@ class DirectCommHandler(BaseHTTPRequestHandler):
             return
         
         # 其他POST请求返回404
-        self.send_response(404)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        response = {'status': 'error', 'message': '未找到请求的API'}
-        self.wfile.write(json.dumps(response).encode('utf-8'))
+        self._send_json(404, {'status': 'error', 'message': '未找到请求的API'})
     
     def _handle_execute(self, request_data):
         """处理执行命令的请求"""
@@ -114,11 +139,6 @@ class DirectCommHandler(BaseHTTPRequestHandler):
             result = self._execute_command(command)
             
             # 返回结果
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
             response = {
                 'success': True,
                 'result': {
@@ -126,66 +146,64 @@ class DirectCommHandler(BaseHTTPRequestHandler):
                     'content': result
                 }
             }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self._send_json(200, response)
             
         except Exception as e:
-            self.send_response(500)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            response = {
-                'success': False,
-                'error': str(e)
-            }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self._send_json(500, {'success': False, 'error': str(e)})
     
     def _handle_process_amount(self, request_data):
-        """处理金额数据的请求"""
+        """处理金额数据的请求
+
+        在进程内调用CmdThird，结果以分块传输的NDJSON（每行一条消息）流式返回，
+        不再为每个请求启动shell和Python解释器。
+        """
+        amount_data = request_data.get('amountData')
+        if not amount_data:
+            self._send_json(400, {'success': False, 'error': '金额数据不能为空'})
+            return
+        
+        sequence_id = request_data.get('sequenceId', '')
+        if isinstance(amount_data, list):
+            amount_data = {'records': amount_data}
+        if isinstance(amount_data, dict) and sequence_id and not amount_data.get('sequenceId'):
+            amount_data = dict(amount_data, sequenceId=sequence_id)
+        
+        records = amount_data.get('records') if isinstance(amount_data, dict) else None
+        print(f"[处理金额数据] seq: {sequence_id}, "
+              f"{f'{len(records)}条记录' if isinstance(records, list) else '单条记录'}")
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        
+        # HTTP请求可能来自浏览器，不允许通过file字段读取服务器上的文件，fxRates只能选择汇率目录下的文件
+        tool = load_cmd_third().CmdThird(output=self._write_ndjson_chunk, simulate_delay=False, allow_files=False,
+                                         idempotency_store=self.idempotency_store, fx_rates_dir=self.fx_rates_dir)
         try:
-            # 获取金额数据
-            amount_data = request_data.get('amountData')
-            
-            if not amount_data:
-                raise ValueError('金额数据不能为空')
-            
-            print(f"[处理金额数据] {json.dumps(amount_data, ensure_ascii=False)}")
-            
-            # 调用cmd-third.py处理金额数据
-            cmd_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cmd-third.py')
-            # 使用格式化字符串并避免嵌套引号问题
-            escaped_json = json.dumps(amount_data, ensure_ascii=False).replace('"', '\\"')
-            command = f'python "{cmd_path}" "{escaped_json}"'
-            
-            result = self._execute_command(command)
-            
-            # 解析结果
             try:
-                result_json = json.loads(result)
-            except json.JSONDecodeError:
-                result_json = {'type': 'text', 'content': result}
-            
-            # 返回结果
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
-            response = {
-                'success': True,
-                'result': result_json
-            }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
-            
-        except Exception as e:
-            self.send_response(500)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            response = {
-                'success': False,
-                'error': str(e)
-            }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+                tool.process_input(amount_data, sequence_id)
+            except (BrokenPipeError, ConnectionResetError):
+                raise
+            except Exception as e:
+                # 响应头已经发出，错误以NDJSON消息返回，分块传输仍然正常结束
+                print(f"[处理金额数据失败] seq: {sequence_id}, {str(e)}")
+                self._write_ndjson_chunk({'type': 'error', 'content': f'处理金额数据失败: {str(e)}',
+                                          'isError': True, 'isEnd': False, 'sequenceId': sequence_id})
+                self._write_ndjson_chunk({'type': 'end', 'content': '',
+                                          'isError': False, 'isEnd': True, 'sequenceId': sequence_id})
+            # 结束分块传输
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已断开，放弃剩余输出
+            self.close_connection = True
+    
+    def _write_ndjson_chunk(self, message):
+        """将一条消息作为一个NDJSON行写入分块响应"""
+        data = json.dumps(message).encode('utf-8') + b'\n'
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
     
     def _execute_command(self, command):
         """执行系统命令并返回结果"""
@@ -223,17 +241,28 @@ class ThreadedHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
     """支持多线程的HTTP服务器"""
     daemon_threads = True
 
-def run_server(host='localhost', port=5001, debug=False):
-    """启动直接通信服务器"""
+def run_server(host='localhost', port=5001, debug=False, idempotency_db=DEFAULT_IDEMPOTENCY_DB,
+               idempotency_ttl=None, fx_rates_dir=None):
+    """启动直接通信服务器，idempotency_db为空时不启用幂等存储，fx_rates_dir为空时不允许使用汇率表"""
     server_address = (host, port)
     httpd = ThreadedHTTPServer(server_address, DirectCommHandler)
+    # 预先加载金额处理模块，第一个请求不必承担导入开销
+    load_cmd_third()
+    if idempotency_db:
+        DirectCommHandler.idempotency_store = open_store(idempotency_db, ttl=idempotency_ttl or DEFAULT_TTL)
+    if fx_rates_dir:
+        DirectCommHandler.fx_rates_dir = os.path.abspath(fx_rates_dir)
     
     print(f"\n直接通信服务器启动成功!")
     print(f"服务器地址: http://{host}:{port}")
     print(f"API端点:")
     print(f"  - GET  /test              - 测试服务器连接")
     print(f"  - POST /execute           - 执行命令")
-    print(f"  - POST /process-amount    - 处理金额数据")
+    print(f"  - POST /process-amount    - 处理金额数据（NDJSON流式返回）")
+    if idempotency_db:
+        print(f"幂等存储: {idempotency_db}")
+    if fx_rates_dir:
+        print(f"汇率目录: {DirectCommHandler.fx_rates_dir}")
     print(f"\n按Ctrl+C停止服务器...\n")
     
     try:
@@ -249,8 +278,13 @@ if __name__ == '__main__':
     parser.add_argument('--host', type=str, default='localhost', help='服务器主机地址')
     parser.add_argument('--port', type=int, default=5001, help='服务器端口')
     parser.add_argument('--debug', action='store_true', help='启用调试模式')
+    parser.add_argument('--idempotency-db', default=DEFAULT_IDEMPOTENCY_DB,
+                        help='金额提交幂等存储的SQLite文件，传空字符串不启用')
+    parser.add_argument('--idempotency-ttl', type=float, help='幂等记录的保留秒数，默认24小时')
+    parser.add_argument('--fx-rates-dir', help='汇率文件目录，请求中的fxRates只能是该目录下的文件名；不指定时不允许使用汇率表')
     
     args = parser.parse_args()
     
     # 启动服务器
-    run_server(host=args.host, port=args.port, debug=args.debug)
\ No newline at end of file
+    run_server(host=args.host, port=args.port, debug=args.debug, idempotency_db=args.idempotency_db,
+               idempotency_ttl=args.idempotency_ttl, fx_rates_dir=args.fx_rates_dir)
\ No newline at end of file
@@ -30,97 +30,116 @@ import json
 import time
 import platform
 import os
+import shlex
+import shutil
+import queue
+import codecs
+import select
+import signal
+import tempfile
+import argparse
+import threading
+import concurrent.futures
 from typing import Dict, Any, Optional, Tuple, List
 
+from core.tracing import Tracer, now_us
+from core.input_parser import parse_tool_input
+
+# 需要shell解释的字符：管道、重定向、命令串联、通配符、变量/命令替换、转义等
+SHELL_META_CHARS = frozenset('|&;<>()$`\\*?[]{}~!#\n')
+
+# shell内建命令或依赖shell状态的命令，不能直接exec
+SHELL_BUILTINS = frozenset([
+    '.', ':', 'alias', 'bg', 'bind', 'break', 'builtin', 'cd', 'command', 'continue',
+    'declare', 'dirs', 'eval', 'exec', 'exit', 'export', 'fg', 'hash', 'history',
+    'jobs', 'let', 'local', 'popd', 'pushd', 'read', 'readonly', 'return', 'set',
+    'shift', 'source', 'trap', 'type', 'typeset', 'ulimit', 'umask', 'unalias',
+    'unset', 'wait'
+])
+
+# 跟随模式默认参数：每次刷新的间隔（秒）和每次刷新最多输出的行数
+FOLLOW_FLUSH_INTERVAL = 0.1
+FOLLOW_MAX_LINES_PER_FLUSH = 200
+# 跟随模式读取输出时检查是否已分离的间隔（秒）
+FOLLOW_POLL_INTERVAL = 0.05
+
+# 分离后接管子进程输出管道的脚本：在独立会话中把各个管道的内容追加写入日志文件，直到子进程关闭输出
+DETACH_DRAIN_SCRIPT = """
+import os, sys, threading
+log = open(sys.argv[1], 'ab', buffering=0)
+def drain(fd):
+    for data in iter(lambda: os.read(fd, 65536), b''):
+        log.write(data)
+threads = [threading.Thread(target=drain, args=(int(fd),)) for fd in sys.argv[2:]]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+"""
+
+# 守护模式默认的最大并发执行数
+DEFAULT_MAX_CONCURRENCY = 4
+# 守护模式关闭时等待非跟随模式请求完成的时间（秒），以及发送SIGTERM、SIGKILL后各自等待的时间（秒）
+DEFAULT_SHUTDOWN_TIMEOUT = 10.0
+SHUTDOWN_KILL_TIMEOUT = 2.0
+
+# 可执行文件路径缓存，键为(PATH环境变量, 命令名)，同一环境下只查找一次；找不到的命令不缓存，之后安装的命令可以被找到
+_executable_cache: Dict[Tuple[str, str], str] = {}
+
 class ExecInfo:
     """执行信息工具类，负责在后台执行命令并返回结果"""
     
-    def __init__(self):
-        """初始化执行信息工具"""
+    def __init__(self, output_lock: Optional[threading.Lock] = None):
+        """初始化执行信息工具，output_lock用于多个实例共享同一个stdout"""
         self.system = platform.system()
         # 定义命令行代码时刻标记和结束标记
         self.CODE_BLOCK_MARKER = "[CODE_BLOCK_BEGIN]"
         self.CODE_BLOCK_END_MARKER = "[CODE_BLOCK_END]"
         self.ERROR_MARKER = "[ERROR_MARKER]"
         self.END_MARKER = "[COMMAND_EXECUTION_END]"
+        # 执行时间线追踪（默认由TOOL_TRACE环境变量控制，也可由输入的trace字段开启）
+        self.tracer = Tracer(process_name='execinfo')
+        # 只有上层在输入中请求追踪（trace字段）时才输出追踪消息；仅由环境变量开启时只写入TOOL_TRACE_DIR
+        self._trace_requested = False
+        self._first_byte_us = None
+        self._last_byte_us = None
+        # 跟随模式下最近一次resize控制消息设置的终端尺寸(cols, rows)
+        self.terminal_size = None
+        # 跟随模式是否从自身stdin读取控制消息（守护模式下由send_control投递）
+        self.control_from_stdin = True
+        # 跟随模式的事件队列，提前创建以便缓存执行开始前到达的控制消息
+        self._follow_events = queue.Queue()
+        # 分离后写入子进程剩余输出的日志文件
+        self._detach_log = None
+        # 正在执行的子进程，及其是否在独立进程组中（跟随模式），供守护模式关闭时终止
+        self.process: Optional[subprocess.Popen] = None
+        self._process_group = False
+        # 输出锁及是否每条消息立即刷新（守护模式下需要）
+        self._output_lock = output_lock or threading.Lock()
+        self.flush_output = False
         
     def execute(self) -> None:
         """执行指定的命令并输出结果"""
         try:
             # 读取命令行参数中的JSON输入
             if len(sys.argv) > 1:
+                start_us = now_us()
                 input_arg = sys.argv[1]
                 
-                # 尝试直接解析参数作为JSON
-                try:
-                    input_data = json.loads(input_arg)
+                # 单遍容错解析：标准JSON、多一层转义的JSON、PowerShell去掉引号的格式
+                input_data = parse_tool_input(input_arg)
+                if isinstance(input_data, dict):
                     content = input_data.get('content', '')
-                    project_dir = input_data.get('projectDir', os.getcwd())
+                    project_dir = input_data.get('projectDir') or os.getcwd()
                     sequence_id = input_data.get('sequenceId', '')
-                except json.JSONDecodeError:
-                    # 尝试处理转义问题
-                    try:
-                        # 处理常见的转义问题，比如额外的反斜杠
-                        if '\\' in input_arg:
-                            # 尝试去除一层转义
-                            input_arg_fixed = input_arg.replace('\\', '')
-                            input_data = json.loads(input_arg_fixed)
-                            content = input_data.get('content', '')
-                            project_dir = input_data.get('projectDir', os.getcwd())
-                            sequence_id = input_data.get('sequenceId', '')
-                        else:
-                            # 检查是否是PowerShell处理后的格式 (如 {content:dir,projectDir:})
-                            if input_arg.startswith('{') and input_arg.endswith('}') and ':' in input_arg and not '"' in input_arg:
-                                # 这种格式可能是PowerShell处理后的格式，我们尝试手动解析
-                                content = input_arg
-                                project_dir = os.getcwd()
-                                sequence_id = ''
-                                # 尝试从中提取content和projectDir
-                                try:
-                                    # 简单解析：查找content:后的内容直到下一个逗号或结束
-                                    if 'content:' in content:
-                                        content_start = content.find('content:') + len('content:')
-                                        if ',' in content[content_start:]:
-                                            content_end = content.find(',', content_start)
-                                            content = content[content_start:content_end].strip()
-                                        else:
-                                            content_end = content.find('}', content_start)
-                                            content = content[content_start:content_end].strip()
-                                    # 简单解析：查找projectDir:后的内容直到下一个逗号或结束
-                                    if 'projectDir:' in input_arg:
-                                        proj_start = input_arg.find('projectDir:') + len('projectDir:')
-                                        if ',' in input_arg[proj_start:]:
-                                            proj_end = input_arg.find(',', proj_start)
-                                            project_dir = input_arg[proj_start:proj_end].strip() or os.getcwd()
-                                        else:
-                                            proj_end = input_arg.find('}', proj_start)
-                                            project_dir = input_arg[proj_start:proj_end].strip() or os.getcwd()
-                                except:
-                                    # 如果解析失败，保持原样
-                                    pass
-                            else:
-                                # 如果不是JSON格式，将整个参数视为命令
-                                content = input_arg
-                                project_dir = os.getcwd()
-                                sequence_id = ''
-                    except json.JSONDecodeError:
-                        # 如果仍然不是有效的JSON，则将其视为原始命令
-                        content = input_arg
-                        project_dir = os.getcwd()
-                        sequence_id = ''
-                
-                # 记录执行开始
-                self._output_json({
-                    "type": "text",
-                    "content": f"Executing code in background: {content}",
-                    "isError": False,
-                    "isEnd": False,
-                    "sequenceId": sequence_id
-                })
-                time.sleep(0.2)  # 模拟执行准备时间
+                else:
+                    # 如果不是JSON格式，将整个参数视为命令
+                    content = input_arg
+                    project_dir = os.getcwd()
+                    sequence_id = ''
                 
-                # 执行命令
-                self._execute_command(content, project_dir, sequence_id)
+                self._run(content, project_dir, sequence_id,
+                          input_data if isinstance(input_data, dict) else {}, start_us)
             else:
                 # 没有输入参数，显示帮助
                 self._show_help()
@@ -141,6 +160,33 @@ class ExecInfo:
                 "sequenceId": ""
             })
     
+    def _run(self, content: str, project_dir: str, sequence_id: str = '',
+             options: Optional[Dict[str, Any]] = None, start_us: Optional[int] = None) -> None:
+        """执行一个已解析的请求，options为原始输入中的附加字段（trace、follow等）"""
+        options = options or {}
+        if options.get('trace'):
+            self._trace_requested = True
+            self.tracer.enabled = True
+        # 进程启动到此处之前的时间即为Python启动耗时
+        self.tracer.instant(sequence_id, 'execinfo_start', ts=start_us)
+        
+        # 记录执行开始
+        self._output_json({
+            "type": "text",
+            "content": f"Executing code in background: {content}",
+            "isError": False,
+            "isEnd": False,
+            "sequenceId": sequence_id
+        })
+        time.sleep(0.2)  # 模拟执行准备时间
+        
+        # 执行命令
+        if options.get('follow'):
+            # 跟随模式：持续输出并接收控制消息
+            self._execute_follow(content, project_dir, sequence_id, options)
+        else:
+            self._execute_command(content, project_dir, sequence_id)
+    
     def _execute_command(self, command: str, project_dir: str, sequence_id: str = '') -> None:
         """执行命令并处理输出"""
         # 根据操作系统选择合适的shell
@@ -152,19 +198,25 @@ class ExecInfo:
             shell = True
         
         try:
-            # 保存当前目录并切换到指定目录
-            original_dir = os.getcwd()
-            if project_dir and os.path.exists(project_dir):
-                os.chdir(project_dir)
+            # 在指定目录中执行（不切换本进程的工作目录，便于并发执行）
+            cwd = project_dir if project_dir and os.path.exists(project_dir) else None
+            
+            # 简单命令直接exec，复杂命令交给shell处理
+            popen_args, use_shell, executable = self._build_popen_args(command, shell, cwd)
             
             # 执行命令并捕获输出
+            spawn_start = now_us() if self.tracer.enabled else 0
             process = subprocess.Popen(
-                command,
-                shell=shell,
+                popen_args,
+                executable=executable,
+                shell=use_shell,
+                cwd=cwd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True
             )
+            self.tracer.complete(sequence_id, 'spawn', spawn_start, shell=use_shell)
+            self.process = process
             
             # 实时捕获和输出标准输出
             self._capture_and_output_stream(process.stdout, is_error=False, sequence_id=sequence_id)
@@ -174,6 +226,12 @@ class ExecInfo:
             
             # 等待进程完成并获取返回码
             return_code = process.wait()
+            if self.tracer.enabled:
+                if self._first_byte_us is not None:
+                    self.tracer.instant(sequence_id, 'first_byte', ts=self._first_byte_us)
+                    self.tracer.instant(sequence_id, 'last_byte', ts=self._last_byte_us)
+                self.tracer.instant(sequence_id, 'exit', returnCode=return_code)
+                self.tracer.complete(sequence_id, 'child', spawn_start, command=command)
             
             # 输出返回码信息
             self._output_json({
@@ -197,20 +255,381 @@ class ExecInfo:
                 "sequenceId": sequence_id
             })
         finally:
-            # 切换回原始目录
-            os.chdir(original_dir)
-            # 输出结束标志
+            # 输出追踪数据和结束标志
+            self._output_end(sequence_id)
+    
+    def _execute_follow(self, command: str, project_dir: str, sequence_id: str = '',
+                        options: Optional[Dict[str, Any]] = None) -> None:
+        """跟随模式执行命令（适用于tail -f、开发服务器、watch模式测试等长时间运行的命令）
+        
+        输出按固定间隔合并为一条消息发送，每个间隔超出行数上限的输出会被省略并提示；
+        同时从自身stdin逐行读取JSON控制消息：
+        - {"type": "stdin", "data": "...", "eof": false}  写入子进程stdin
+        - {"type": "signal", "signal": "SIGINT"}          向子进程（进程组）发送信号
+        - {"type": "resize", "cols": 120, "rows": 40}     更新终端尺寸并通知子进程
+        - {"type": "detach"}                              停止转发并立即结束，子进程继续运行，输出写入日志文件
+        """
+        options = options or {}
+        interval = float(options.get('flushInterval', FOLLOW_FLUSH_INTERVAL))
+        max_lines = int(options.get('maxLinesPerFlush', FOLLOW_MAX_LINES_PER_FLUSH))
+        cwd = project_dir if project_dir and os.path.exists(project_dir) else None
+        
+        env = dict(os.environ)
+        if options.get('cols') and options.get('rows'):
+            env['COLUMNS'] = str(options['cols'])
+            env['LINES'] = str(options['rows'])
+        
+        process = None
+        detached = False
+        try:
+            popen_args, use_shell, executable = self._build_popen_args(command, cwd=cwd)
+            spawn_start = now_us() if self.tracer.enabled else 0
+            process = subprocess.Popen(
+                popen_args,
+                executable=executable,
+                shell=use_shell,
+                cwd=cwd,
+                env=env,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                bufsize=1,
+                # 独立进程组，信号可以送达shell启动的所有子进程
+                start_new_session=self.system != "Windows"
+            )
+            self.tracer.complete(sequence_id, 'spawn', spawn_start, shell=use_shell)
+            self.process = process
+            self._process_group = self.system != "Windows"
+            
+            events = self._follow_events
+            stop = threading.Event()
+            pumps = []
+            for kind, stream in (("stdout", process.stdout), ("stderr", process.stderr)):
+                pump = threading.Thread(target=self._pump_stream, args=(stream, kind, events, stop), daemon=True)
+                pump.start()
+                pumps.append(pump)
+            if self.control_from_stdin:
+                threading.Thread(target=self._pump_control, args=(events,), daemon=True).start()
+            
+            pending = {"stdout": [], "stderr": []}
+            dropped = 0
+            open_streams = 2
+            next_flush = time.monotonic() + interval
+            
+            while open_streams:
+                try:
+                    kind, payload = events.get(timeout=max(0.0, next_flush - time.monotonic()))
+                except queue.Empty:
+                    kind, payload = None, None
+                
+                if kind in pending:
+                    if payload is None:
+                        open_streams -= 1
+                    else:
+                        if self.tracer.enabled:
+                            self._last_byte_us = now_us()
+                            if self._first_byte_us is None:
+                                self._first_byte_us = self._last_byte_us
+                        if len(pending["stdout"]) + len(pending["stderr"]) < max_lines:
+                            pending[kind].append(payload)
+                        else:
+                            dropped += 1
+                elif kind == "control":
+                    if self._handle_control(process, payload, sequence_id):
+                        # 分离：发送剩余输出，把管道交给接管进程后立即结束，不再等待子进程
+                        self._flush_follow_output(pending, dropped, sequence_id)
+                        log_path = self._detach(process, pumps, stop)
+                        detached = True
+                        self._output_json({
+                            "type": "text",
+                            "content": f"Detached from process {process.pid}, it keeps running in background"
+                                       + (f", output is written to {log_path}" if log_path else ""),
+                            "isError": False,
+                            "isEnd": False,
+                            "sequenceId": sequence_id
+                        })
+                        self._output_end(sequence_id)
+                        return
+                
+                if time.monotonic() >= next_flush:
+                    self._flush_follow_output(pending, dropped, sequence_id)
+                    dropped = 0
+                    next_flush = time.monotonic() + interval
+            
+            return_code = process.wait()
+            self._flush_follow_output(pending, dropped, sequence_id)
+            if self.tracer.enabled:
+                if self._first_byte_us is not None:
+                    self.tracer.instant(sequence_id, 'first_byte', ts=self._first_byte_us)
+                    self.tracer.instant(sequence_id, 'last_byte', ts=self._last_byte_us)
+                self.tracer.instant(sequence_id, 'exit', returnCode=return_code)
+                self.tracer.complete(sequence_id, 'child', spawn_start, command=command)
             self._output_json({
-                "type": "end",
-                "content": "",
+                "type": "text",
+                "content": f"Command executed with return code: {return_code}",
                 "isError": False,
-                "isEnd": True,
+                "isEnd": False,
+                "sequenceId": sequence_id
+            })
+        except Exception as e:
+            self._output_json({
+                "type": "error",
+                "content": f"Command execution error: {str(e)}",
+                "isError": True,
+                "isEnd": False,
+                "sequenceId": sequence_id
+            })
+            if process is not None and not detached and process.poll() is None:
+                process.kill()
+        finally:
+            if not detached:
+                self._output_end(sequence_id)
+    
+    def terminate(self, force: bool = False) -> None:
+        """终止正在执行的子进程：跟随模式下发送给整个进程组，force为True时强制结束（SIGKILL）"""
+        process = self.process
+        if process is None or process.poll() is not None:
+            return
+        try:
+            if self._process_group:
+                os.killpg(process.pid, signal.SIGKILL if force else signal.SIGTERM)
+            elif force:
+                process.kill()
+            else:
+                process.terminate()
+        except OSError:
+            pass
+    
+    def send_control(self, message: Dict[str, Any]) -> None:
+        """向跟随模式的执行投递控制消息，执行开始前到达的消息会在开始后处理"""
+        self._follow_events.put(("control", message))
+    
+    def _output_end(self, sequence_id: str = '') -> None:
+        """输出追踪数据和结束标志
+        
+        追踪消息必须在isEnd消息之前输出，读到isEnd即停止读取的上层（webview）才能收到；
+        end_sent在结束标志写出并刷新之后记录，只出现在写入TOOL_TRACE_DIR的追踪文件中。
+        """
+        self._output_trace(sequence_id)
+        self._output_json({
+            "type": "end",
+            "content": "",
+            "isError": False,
+            "isEnd": True,
+            "sequenceId": sequence_id
+        })
+        sys.stdout.flush()
+        self.tracer.instant(sequence_id, 'end_sent')
+        self.tracer.dump(sequence_id)
+    
+    def _pump_stream(self, stream, kind: str, events: "queue.Queue", stop: threading.Event) -> None:
+        """后台线程：逐行读取子进程输出放入事件队列，结束时放入None
+        
+        POSIX下用select轮询管道，stop置位（分离）后不再读取，未读取的输出留在管道中交给接管进程，
+        已读取但不成行的部分作为最后一行放入队列；Windows下管道不支持select，分离后继续读取并写入分离日志。
+        """
+        if self.system == "Windows":
+            try:
+                for line in iter(stream.readline, ''):
+                    if stop.is_set():
+                        self._write_detach_log(line)
+                    else:
+                        events.put((kind, line.rstrip('\r\n')))
+            except (OSError, ValueError):
+                pass
+            finally:
+                events.put((kind, None))
+            return
+        
+        fd = stream.fileno()
+        decoder = codecs.getincrementaldecoder(stream.encoding)(errors=stream.errors or 'strict')
+        buffer = ''
+        try:
+            while not stop.is_set():
+                ready, _, _ = select.select([fd], [], [], FOLLOW_POLL_INTERVAL)
+                if not ready:
+                    continue
+                data = os.read(fd, 65536)
+                if not data:
+                    buffer += decoder.decode(b'', final=True)
+                    break
+                buffer += decoder.decode(data)
+                *lines, buffer = buffer.split('\n')
+                for line in lines:
+                    events.put((kind, line.rstrip('\r')))
+        except (OSError, ValueError):
+            pass
+        finally:
+            if buffer:
+                events.put((kind, buffer.rstrip('\r')))
+            events.put((kind, None))
+    
+    def _detach(self, process: subprocess.Popen, pumps: List[threading.Thread], stop: threading.Event) -> Optional[str]:
+        """分离跟随模式的子进程，返回输出日志路径
+        
+        停止读取输出，把已读取未发送的输出写入日志文件，再把输出管道交给独立会话中的接管进程继续写入日志，
+        本进程可以立即退出而子进程不会因管道关闭收到SIGPIPE；子进程的stdin随即关闭。
+        """
+        fd, log_path = tempfile.mkstemp(prefix=f'execinfo-{process.pid}-', suffix='.log')
+        self._detach_log = os.fdopen(fd, 'a', encoding='utf-8', errors='replace')
+        stop.set()
+        try:
+            if process.stdin and not process.stdin.closed:
+                process.stdin.close()
+        except OSError:
+            pass
+        if self.system == "Windows":
+            # 管道由本进程的读取线程继续写入日志，本进程退出后子进程的输出管道随之关闭
+            return log_path
+        
+        for pump in pumps:
+            pump.join()
+        while True:
+            try:
+                kind, payload = self._follow_events.get_nowait()
+            except queue.Empty:
+                break
+            if kind in ("stdout", "stderr") and payload is not None:
+                self._write_detach_log(payload + '\n')
+        self._detach_log.close()
+        
+        fds = [process.stdout.fileno(), process.stderr.fileno()]
+        subprocess.Popen(
+            [sys.executable, '-c', DETACH_DRAIN_SCRIPT, log_path] + [str(fd) for fd in fds],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            pass_fds=fds,
+            start_new_session=True
+        )
+        process.stdout.close()
+        process.stderr.close()
+        return log_path
+    
+    def _write_detach_log(self, text: str) -> None:
+        """把分离后的输出追加写入日志文件"""
+        try:
+            self._detach_log.write(text)
+            self._detach_log.flush()
+        except (OSError, ValueError):
+            pass
+    
+    def _pump_control(self, events: "queue.Queue") -> None:
+        """后台线程：从自身stdin逐行读取JSON控制消息放入事件队列"""
+        try:
+            for line in iter(sys.stdin.readline, ''):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    message = {"type": "invalid", "raw": line}
+                events.put(("control", message))
+        except (OSError, ValueError):
+            pass
+    
+    def _flush_follow_output(self, pending: Dict[str, List[str]], dropped: int, sequence_id: str = '') -> None:
+        """将缓冲的输出合并为每个流一条消息发送"""
+        for kind, is_error in (("stdout", False), ("stderr", True)):
+            lines = pending[kind]
+            if lines:
+                self._output_json({
+                    "type": "error" if is_error else "text",
+                    "content": "\n".join(lines),
+                    "isError": is_error,
+                    "isEnd": False,
+                    "sequenceId": sequence_id
+                })
+                pending[kind] = []
+        if dropped:
+            self._output_json({
+                "type": "text",
+                "content": f"[Output rate limited: {dropped} lines skipped]",
+                "isError": False,
+                "isEnd": False,
                 "sequenceId": sequence_id
             })
+        sys.stdout.flush()
+    
+    def _handle_control(self, process: subprocess.Popen, message: Any, sequence_id: str = '') -> bool:
+        """处理一条控制消息，返回是否请求分离"""
+        control_type = message.get("type") if isinstance(message, dict) else None
+        try:
+            if control_type == "stdin":
+                if process.stdin and not process.stdin.closed:
+                    process.stdin.write(message.get("data", ""))
+                    process.stdin.flush()
+                    if message.get("eof"):
+                        process.stdin.close()
+            elif control_type == "signal":
+                self._send_signal(process, message.get("signal", "SIGINT"))
+            elif control_type == "resize":
+                self._resize(process, message.get("cols"), message.get("rows"))
+            elif control_type == "detach":
+                return True
+            elif control_type == "invalid":
+                raise ValueError(f"invalid control message: {message.get('raw')}")
+            else:
+                raise ValueError(f"unknown control message: {message}")
+        except Exception as e:
+            self._output_json({
+                "type": "error",
+                "content": f"Control message error: {str(e)}",
+                "isError": True,
+                "isEnd": False,
+                "sequenceId": sequence_id
+            })
+        return False
+    
+    def _send_signal(self, process: subprocess.Popen, name: Any) -> None:
+        """向子进程发送信号，POSIX下发送给整个进程组"""
+        if isinstance(name, int):
+            sig = signal.Signals(name)
+        else:
+            name = str(name).upper()
+            sig = getattr(signal, name if name.startswith("SIG") else f"SIG{name}", None)
+            if sig is None:
+                raise ValueError(f"unknown signal: {name}")
+        
+        if process.poll() is not None:
+            return
+        if self.system != "Windows":
+            os.killpg(process.pid, sig)
+        else:
+            process.send_signal(sig)
+    
+    def _resize(self, process: subprocess.Popen, cols: Any, rows: Any) -> None:
+        """记录新的终端尺寸并通知子进程
+        
+        子进程通过管道而非伪终端连接，尺寸无法直接生效；POSIX下发送SIGWINCH，
+        由自行处理该信号的程序重新读取尺寸。
+        """
+        cols, rows = int(cols), int(rows)
+        if cols <= 0 or rows <= 0:
+            raise ValueError(f"invalid size: {cols}x{rows}")
+        self.terminal_size = (cols, rows)
+        if self.system != "Windows" and process.poll() is None:
+            os.killpg(process.pid, signal.SIGWINCH)
+    
+    def _output_trace(self, sequence_id: str = '') -> None:
+        """输出追踪数据消息，供上层进程合并；上层没有在输入中请求追踪时不输出"""
+        if not self.tracer.enabled or not self._trace_requested:
+            return
+        self._output_json({
+            "type": "trace",
+            "content": {"traceEvents": self.tracer.get_events(sequence_id)},
+            "isError": False,
+            "isEnd": False,
+            "sequenceId": sequence_id
+        })
     
     def _output_json(self, data: Dict[str, Any]) -> None:
         """输出JSON格式的数据"""
-        print(json.dumps(data))
+        line = json.dumps(data)
+        with self._output_lock:
+            print(line, flush=self.flush_output)
     
     def _show_help(self) -> None:
         """显示帮助信息"""
@@ -240,21 +659,54 @@ class ExecInfo:
         })
     
     def _is_complex_command(self, command: str) -> bool:
-        """判断是否为复杂命令（包含管道、重定向等）"""
-        complex_chars = ["|", "<", ">", "&&", "||"]
-        return any(char in command for char in complex_chars)
+        """判断是否为复杂命令（包含管道、重定向、通配符、变量展开等）"""
+        return any(char in SHELL_META_CHARS for char in command)
     
     def _split_command(self, command: str) -> List[str]:
         """简单拆分命令字符串为参数列表"""
-        # 这是一个简单的实现，实际应用中可能需要更复杂的解析
-        # 考虑引号、转义字符等情况
-        import shlex
         try:
             return shlex.split(command)
         except ValueError:
             # 如果解析失败，返回整个命令作为单个参数
             return [command]
     
+    def _resolve_executable(self, name: str, cwd: Optional[str] = None) -> Optional[str]:
+        """在PATH中查找可执行文件，找到的结果按PATH环境变量缓存"""
+        if os.sep in name or (os.altsep and os.altsep in name):
+            # 带路径的命令不依赖PATH，相对路径按执行目录解析，不做缓存
+            path = os.path.join(cwd, name) if cwd else name
+            return name if os.access(path, os.X_OK) and not os.path.isdir(path) else None
+        
+        key = (os.environ.get('PATH', os.defpath), name)
+        executable = _executable_cache.get(key)
+        if executable is None:
+            executable = shutil.which(name, path=key[0])
+            if executable is not None:
+                _executable_cache[key] = executable
+        return executable
+    
+    def _build_popen_args(self, command: str, shell: bool = True,
+                          cwd: Optional[str] = None) -> Tuple[Any, bool, Optional[str]]:
+        """为命令选择执行方式，返回(Popen参数, 是否使用shell, 可执行文件路径)
+        
+        不含shell语法的简单命令在PATH中查找后直接exec，省去一次/bin/sh的fork和exec；
+        查找到的路径作为Popen的executable参数，argv[0]保持命令中的写法，与经过shell执行时相同。
+        其余情况（Windows、复杂命令、内建命令、变量赋值、找不到可执行文件）回退到shell，可执行文件路径为None。
+        """
+        if self.system == "Windows" or self._is_complex_command(command):
+            return command, shell, None
+        
+        args = self._split_command(command)
+        if not args or not args[0] or args[0] in SHELL_BUILTINS or '=' in args[0]:
+            return command, shell, None
+        
+        executable = self._resolve_executable(args[0], cwd)
+        if executable is None:
+            # 交给shell处理，保持"command not found"等原有错误输出
+            return command, shell, None
+        
+        return args, False, executable
+    
     def _capture_and_output_stream(self, stream, is_error: bool = False, sequence_id: str = '') -> None:
         """捕获并输出流内容"""
         if not stream:
@@ -265,6 +717,11 @@ class ExecInfo:
             if not line:
                 break
             
+            if self.tracer.enabled:
+                self._last_byte_us = now_us()
+                if self._first_byte_us is None:
+                    self._first_byte_us = self._last_byte_us
+            
             # 移除行尾换行符
             line = line.rstrip('\r\n')
             
@@ -330,7 +787,207 @@ class ExecInfo:
             "sequenceId": sequence_id
         })
 
+
+class _ShutdownRequested(Exception):
+    """收到终止信号时用于跳出请求读取循环"""
+
+
+class ExecInfoDaemon:
+    """execinfo守护模式：从stdin读取换行分隔的JSON请求并发执行，输出带sequenceId的协议消息
+    
+    请求格式：
+    - {"content": "...", "projectDir": "...", "sequenceId": "...", ...}  执行命令（字段同单次模式）
+    - {"type": "control", "sequenceId": "...", "control": {...}}      向跟随模式的执行投递控制消息
+    - {"type": "shutdown"}                                            停止接收请求，等待执行中的请求完成后退出
+    stdin关闭或收到SIGTERM/SIGINT时同样优雅退出，第二次收到信号时立即终止。
+    
+    max_concurrency只限制普通请求；跟随模式的请求（tail -f、开发服务器等）可能一直运行，各自使用独立线程，不占用并发数。
+    """
+    
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 shutdown_timeout: float = DEFAULT_SHUTDOWN_TIMEOUT):
+        """初始化守护进程"""
+        self.max_concurrency = max(1, max_concurrency)
+        self.shutdown_timeout = shutdown_timeout
+        self._output_lock = threading.Lock()
+        # 执行中的请求：sequenceId -> (ExecInfo实例, 是否为跟随模式)
+        self._active: Dict[str, Tuple[ExecInfo, bool]] = {}
+        self._active_lock = threading.Lock()
+        self._active_changed = threading.Condition(self._active_lock)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix='execinfo')
+        self._request_count = 0
+        # 关闭过程中不再开始排队的请求
+        self._stopping = False
+    
+    def serve(self, input_stream=None) -> bool:
+        """读取并处理请求，直到stdin关闭或收到关闭请求；返回执行中的请求是否都已结束"""
+        input_stream = input_stream or sys.stdin
+        self._install_signal_handlers()
+        self._emit({
+            "type": "ready",
+            "content": {"pid": os.getpid(), "maxConcurrency": self.max_concurrency},
+            "isError": False,
+            "isEnd": False,
+            "sequenceId": ""
+        })
+        try:
+            for line in iter(input_stream.readline, ''):
+                line = line.strip()
+                if line and not self._dispatch(line):
+                    break
+        except _ShutdownRequested:
+            pass
+        return self.shutdown()
+    
+    def shutdown(self) -> bool:
+        """关闭守护进程，等待时间有上限；返回执行中的请求是否都已结束
+        
+        普通请求最多等待shutdown_timeout秒自行完成；跟随模式的请求不会自行结束，不等待。
+        之后向仍在执行的子进程发送SIGTERM（跟随模式发送给整个进程组），SHUTDOWN_KILL_TIMEOUT秒后仍未结束则SIGKILL，
+        排队中的请求直接结束。已分离的子进程不在执行中，继续运行。
+        """
+        self._wait_active(lambda: all(follow for _, follow in self._active.values()), self.shutdown_timeout)
+        self._stopping = True
+        finished = self._wait_active(lambda: not self._active, 0)
+        for force in (False, True):
+            if finished:
+                break
+            with self._active_lock:
+                tools = [tool for tool, _ in self._active.values()]
+            for tool in tools:
+                tool.terminate(force)
+            finished = self._wait_active(lambda: not self._active, SHUTDOWN_KILL_TIMEOUT)
+        # 子进程结束后仍可能有孙进程占用输出管道，此时不等待工作线程
+        self._executor.shutdown(wait=finished)
+        self._emit({
+            "type": "shutdown",
+            "content": "",
+            "isError": False,
+            "isEnd": True,
+            "sequenceId": ""
+        })
+        return finished
+    
+    def _wait_active(self, predicate, timeout: float) -> bool:
+        """等待执行中的请求满足predicate，最多等待timeout秒"""
+        with self._active_changed:
+            return self._active_changed.wait_for(predicate, timeout)
+    
+    def _install_signal_handlers(self) -> None:
+        """注册终止信号处理，只能在主线程中注册"""
+        if threading.current_thread() is not threading.main_thread():
+            return
+        
+        def handle(signum, frame):
+            # 恢复默认处理，再次收到信号时立即终止
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            if hasattr(signal, 'SIGTERM'):
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            raise _ShutdownRequested()
+        
+        signal.signal(signal.SIGINT, handle)
+        if hasattr(signal, 'SIGTERM'):
+            signal.signal(signal.SIGTERM, handle)
+    
+    def _dispatch(self, line: str) -> bool:
+        """处理一行请求，返回是否继续读取"""
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            self._emit_error(f"Invalid request: {str(e)}", "")
+            return True
+        
+        request_type = request.get('type')
+        if request_type == 'shutdown':
+            return False
+        
+        sequence_id = request.get('sequenceId') or ''
+        if request_type == 'control':
+            with self._active_lock:
+                tool, follow = self._active.get(sequence_id, (None, False))
+            if follow:
+                tool.send_control(request.get('control') or {})
+            else:
+                self._emit_error(f"No follow-mode execution for sequenceId: {sequence_id}", sequence_id)
+            return True
+        
+        self._request_count += 1
+        if not sequence_id:
+            sequence_id = f"serve-{self._request_count}"
+        
+        tool = ExecInfo(output_lock=self._output_lock)
+        tool.flush_output = True
+        tool.control_from_stdin = False
+        with self._active_lock:
+            if sequence_id in self._active:
+                self._emit_error(f"Duplicate sequenceId: {sequence_id}", sequence_id)
+                return True
+            self._active[sequence_id] = (tool, bool(request.get('follow')))
+        
+        if request.get('follow'):
+            threading.Thread(target=self._run_request, args=(tool, request, sequence_id, now_us()),
+                             name=f'execinfo-follow-{sequence_id}', daemon=True).start()
+        else:
+            self._executor.submit(self._run_request, tool, request, sequence_id, now_us())
+        return True
+    
+    def _run_request(self, tool: ExecInfo, request: Dict[str, Any], sequence_id: str, start_us: int) -> None:
+        """在工作线程中执行一个请求"""
+        try:
+            if self._stopping:
+                raise RuntimeError("daemon is shutting down")
+            tool._run(request.get('content', ''), request.get('projectDir') or os.getcwd(),
+                      sequence_id, request, start_us)
+        except Exception as e:
+            self._emit_error(f"执行错误: {str(e)}", sequence_id)
+            self._emit({
+                "type": "end",
+                "content": "",
+                "isError": False,
+                "isEnd": True,
+                "sequenceId": sequence_id
+            })
+        finally:
+            with self._active_changed:
+                self._active.pop(sequence_id, None)
+                self._active_changed.notify_all()
+    
+    def _emit(self, data: Dict[str, Any]) -> None:
+        """输出一条协议消息"""
+        line = json.dumps(data)
+        with self._output_lock:
+            print(line, flush=True)
+    
+    def _emit_error(self, content: str, sequence_id: str) -> None:
+        """输出错误消息"""
+        self._emit({
+            "type": "error",
+            "content": content,
+            "isError": True,
+            "isEnd": False,
+            "sequenceId": sequence_id
+        })
+
+
 if __name__ == "__main__":
+    # 守护模式：python execinfo.py --serve [--max-concurrency N]
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        parser = argparse.ArgumentParser(description='ExecInfo守护模式，从stdin读取换行分隔的JSON请求')
+        parser.add_argument('--serve', action='store_true', help='以守护模式运行')
+        parser.add_argument('--max-concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                            help='最大并发执行数（不含跟随模式的请求）')
+        parser.add_argument('--shutdown-timeout', type=float, default=DEFAULT_SHUTDOWN_TIMEOUT,
+                            help='关闭时等待执行中的请求完成的秒数，超时后终止子进程')
+        args = parser.parse_args()
+        if not ExecInfoDaemon(max_concurrency=args.max_concurrency, shutdown_timeout=args.shutdown_timeout).serve():
+            # 仍有工作线程阻塞在读取孙进程占用的输出管道上，不等待线程池退出
+            sys.stdout.flush()
+            os._exit(1)
+        sys.exit(0)
+    
     # 检查命令行参数
     if len(sys.argv) < 2:
         # 创建实例以访问类变量
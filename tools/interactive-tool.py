@@ -33,6 +33,64 @@ import requests
 import re
 from typing import Dict, Any, Optional, List, Union, Callable
 
+# 提供给千问大模型的扩展工具，模块加载时构建一次，所有请求共享
+EXTENSION_TOOLS = [
+    {
+        "name": "output_text",
+        "description": "输出文本信息给用户",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "content": { "type": "string", "description": "文本内容" },
+                "isError": { "type": "boolean", "description": "是否为错误信息", "default": False }
+            },
+            "required": ["content"]
+        }
+    },
+    {
+        "name": "output_table",
+        "description": "输出表格数据给用户",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "header": { "type": "array", "items": { "type": "string" }, "description": "表头" },
+                "rows": { "type": "array", "items": { "type": "array" }, "description": "行数据" },
+                "metadata": { "type": "object", "description": "表格元数据", "required": False }
+            },
+            "required": ["header", "rows"]
+        }
+    },
+    {
+        "name": "output_progress",
+        "description": "输出进度信息给用户",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "current": { "type": "integer", "description": "当前进度值（0-100）" },
+                "total": { "type": "integer", "description": "总量", "required": False },
+                "status": { "type": "string", "description": "当前状态描述" }
+            },
+            "required": ["current", "status"]
+        }
+    },
+    {
+        "name": "request_user_input",
+        "description": "请求用户输入",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "prompt": { "type": "string", "description": "提示信息" }
+            },
+            "required": ["prompt"]
+        }
+    },
+    {
+        "name": "end_execution",
+        "description": "结束当前执行流程",
+        "parameters": { "type": "object", "properties": {} }
+    }
+]
+
 class QianwenClient:
     """千问大模型客户端，处理与千问大模型的通信"""
     
@@ -250,64 +308,9 @@ class InteractiveTool:
             })
             return {"code": -1, "message": str(e)}
 
-    def _register_extension_tools(self, sequence_id: str) -> List[Dict[str, Any]]:
-        """注册扩展工具给千问大模型"""
-        return [
-            {
-                "name": "output_text",
-                "description": "输出文本信息给用户",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "content": { "type": "string", "description": "文本内容" },
-                        "isError": { "type": "boolean", "description": "是否为错误信息", "default": False }
-                    },
-                    "required": ["content"]
-                }
-            },
-            {
-                "name": "output_table",
-                "description": "输出表格数据给用户",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "header": { "type": "array", "items": { "type": "string" }, "description": "表头" },
-                        "rows": { "type": "array", "items": { "type": "array" }, "description": "行数据" },
-                        "metadata": { "type": "object", "description": "表格元数据", "required": False }
-                    },
-                    "required": ["header", "rows"]
-                }
-            },
-            {
-                "name": "output_progress",
-                "description": "输出进度信息给用户",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "current": { "type": "integer", "description": "当前进度值（0-100）" },
-                        "total": { "type": "integer", "description": "总量", "required": False },
-                        "status": { "type": "string", "description": "当前状态描述" }
-                    },
-                    "required": ["current", "status"]
-                }
-            },
-            {
-                "name": "request_user_input",
-                "description": "请求用户输入",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "prompt": { "type": "string", "description": "提示信息" }
-                    },
-                    "required": ["prompt"]
-                }
-            },
-            {
-                "name": "end_execution",
-                "description": "结束当前执行流程",
-                "parameters": { "type": "object", "properties": {} }
-            }
-        ]
+    def _register_extension_tools(self, sequence_id: str = '') -> List[Dict[str, Any]]:
+        """注册扩展工具给千问大模型（返回模块加载时构建的工具列表，不要修改）"""
+        return EXTENSION_TOOLS
 
     def _handle_tool_call(self, tool_call: Dict[str, Any], sequence_id: str) -> Any:
         """处理大模型的工具调用请求"""
@@ -147,7 +147,9 @@ def load_config(config_file: str = None) -> Dict[str, Any]:
     config = {
         "use_mock": False,
         "llm_base_url": os.environ.get('LLM_BASE_URL', 'https://api-inference.modelscope.cn/v1/'),
-        "llm_token": os.environ.get('LLM_TOKEN', '')
+        "llm_token": os.environ.get('LLM_TOKEN', ''),
+        "llm_stream": os.environ.get('LLM_STREAM', '').lower() in ('1', 'true', 'yes'),
+        "llm_cache_db": os.environ.get('LLM_CACHE_DB', '')
     }
     
     # 如果提供了配置文件，加载配置
@@ -169,6 +171,8 @@ def main():
     parser = argparse.ArgumentParser(description='交互式工具')
     parser.add_argument('--mock', action='store_true', help='使用模拟模式')
     parser.add_argument('--config', type=str, help='配置文件路径')
+    parser.add_argument('--stream', action='store_true', help='以流式模式请求千问大模型')
+    parser.add_argument('--llm-cache', type=str, help='大模型响应缓存文件路径')
     args = parser.parse_args()
     
     # 加载配置
@@ -180,6 +184,8 @@ def main():
     # 设置环境变量
     os.environ['LLM_BASE_URL'] = config.get('llm_base_url', 'https://api-inference.modelscope.cn/v1/')
     os.environ['LLM_TOKEN'] = config.get('llm_token', '')
+    os.environ['LLM_STREAM'] = '1' if args.stream or config.get('llm_stream', False) else ''
+    os.environ['LLM_CACHE_DB'] = args.llm_cache or config.get('llm_cache_db', '')
     
     # 创建并启动交互式工具
     tool = InteractiveTool(use_mock=use_mock)
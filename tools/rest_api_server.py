@@ -16,6 +16,11 @@ from flask_cors import CORS
 
 # 导入Mock LLM客户端
 from core.mock_llm import MockQianwenClient
+from core.single_flight import SingleFlightLLMClient
+from core.conversation_store import estimate_tokens, open_conversation_store
+from core.llm_client import client_metrics
+from core.llm_timing import TIMING_ENV, CallTimer, llm_latency, record_timing, timing_enabled
+from core.tracing import Tracer, now_us
 
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -26,6 +31,10 @@ CORS(app)  # 允许跨域请求
 
 # 初始化Mock LLM客户端
 mock_llm_client = MockQianwenClient()
+# 聊天接口使用的客户端：多个面板同时发出的相同请求只请求一次（不同序列号、上下文相同的不同会话也合并）
+chat_llm_client = SingleFlightLLMClient(mock_llm_client, ignore_fields=('sequenceId', 'conversationId'))
+# 聊天会话存储：带conversationId的聊天请求按会话发送token预算内的最近消息
+conversation_store = open_conversation_store()
 
 # 当前目录（tools目录）
 TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -34,6 +43,12 @@ TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
 active_processes = {}
 process_lock = threading.Lock()
 
+# 执行时间线追踪器（--trace或TOOL_TRACE=1启用）
+tracer = Tracer(process_name='rest_api_server')
+
+# 工具子进程是否上报大模型调用耗时（--tool-timing启用），计入/api/metrics的直方图
+collect_tool_timing = False
+
 # 执行工具的函数
 def execute_tool(tool_name, command, sequence_id, callback=None):
     """执行指定的Python工具并返回结果"""
@@ -54,19 +69,28 @@ def execute_tool(tool_name, command, sequence_id, callback=None):
             'projectDir': os.getcwd(),
             'sequenceId': sequence_id
         }
+        if tracer.enabled:
+            input_data['trace'] = True
         
         json_input = json.dumps(input_data)
         
         logger.info(f"执行工具: {tool_path}，命令: {command}")
         
-        # 启动Python进程
+        # 启动Python进程；启用--tool-timing时子进程上报大模型调用的耗时，调用方自己设置的LLM_TIMING保持不变
+        env = None
+        if collect_tool_timing and TIMING_ENV not in os.environ:
+            env = dict(os.environ, **{TIMING_ENV: '1'})
+        spawn_start = now_us() if tracer.enabled else 0
         process = subprocess.Popen(
             [sys.executable, tool_path, json_input],
             cwd=TOOLS_DIR,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True
+            text=True,
+            env=env
         )
+        tracer.complete(sequence_id, 'tool_spawn', spawn_start, tool=tool_file_name)
+        first_output = True
         
         # 存储活跃进程
         with process_lock:
@@ -83,14 +107,35 @@ def execute_tool(tool_name, command, sequence_id, callback=None):
                 break
             if output:
                 line = output.strip()
+                # 每行只解析一次，按消息类型分支；非JSON输出作为普通文本
+                try:
+                    response_data = json.loads(line)
+                except json.JSONDecodeError:
+                    response_data = None
+                if not isinstance(response_data, dict):
+                    response_data = None
+                message_type = response_data.get('type') if response_data else None
+                # 子进程上报的大模型调用耗时计入本进程的统计；本进程设置了LLM_TIMING时才转发给前台
+                if message_type == 'timing':
+                    content = response_data.get('content')
+                    record_timing(content if isinstance(content, dict) else {})
+                    if not timing_enabled():
+                        continue
+                if tracer.enabled and first_output:
+                    tracer.instant(sequence_id, 'tool_first_output')
+                    first_output = False
+                # 子进程上报的追踪数据在启用追踪时合并到本进程，任何情况下都不作为输出转发
+                if message_type == 'trace':
+                    content = response_data.get('content')
+                    if tracer.enabled and isinstance(content, dict):
+                        tracer.add_events(sequence_id, content.get('traceEvents', []))
+                    continue
                 stdout_output.append(line)
                 logger.debug(f"工具输出: {line}")
                 
                 # 如果有回调函数，实时返回结果
                 if callback:
-                    try:
-                        # 尝试解析JSON响应
-                        response_data = json.loads(line)
+                    if response_data is not None:
                         callback({
                             'type': response_data.get('type', 'output'),
                             'content': response_data.get('content', line),
@@ -98,7 +143,7 @@ def execute_tool(tool_name, command, sequence_id, callback=None):
                             'isEnd': False,
                             'sequenceId': sequence_id
                         })
-                    except json.JSONDecodeError:
+                    else:
                         # 如果不是JSON格式，作为普通文本输出
                         callback({
                             'type': 'output',
@@ -130,6 +175,7 @@ def execute_tool(tool_name, command, sequence_id, callback=None):
         
         # 获取退出码
         return_code = process.poll()
+        tracer.complete(sequence_id, 'tool_process', spawn_start, returnCode=return_code)
         
         # 从活跃进程中删除
         with process_lock:
@@ -188,11 +234,13 @@ def test_connection():
 def execute_tool_api():
     """执行工具的API接口"""
     try:
+        received_us = now_us() if tracer.enabled else 0
         # 获取请求数据
         data = request.json
         tool_name = data.get('toolName')
         command = data.get('command', '')
         sequence_id = data.get('sequenceId', f'seq-{int(time.time())}')
+        tracer.instant(sequence_id, 'request_received', ts=received_us, path=request.path)
         
         # 验证参数
         if not tool_name:
@@ -202,7 +250,10 @@ def execute_tool_api():
         result = execute_tool(tool_name, command, sequence_id)
         
         # 返回结果
-        return jsonify(result)
+        response = jsonify(result)
+        tracer.instant(sequence_id, 'end_sent')
+        tracer.dump(sequence_id)
+        return response
         
     except Exception as e:
         logger.error(f"API执行异常: {str(e)}")
@@ -251,6 +302,26 @@ def cancel_execution():
         logger.error(f"取消执行异常: {str(e)}")
         return jsonify({'success': False, 'error': str(e)})
 
+# 获取执行时间线的接口
+@app.route('/api/trace/<sequence_id>', methods=['GET'])
+def get_trace(sequence_id):
+    """以Chrome trace-event JSON格式返回指定序列ID的执行时间线"""
+    if not tracer.enabled:
+        return jsonify({'success': False, 'error': '未启用追踪，请使用--trace启动服务'})
+    if not tracer.has_trace(sequence_id):
+        return jsonify({'success': False, 'error': '未找到指定序列ID的追踪数据'})
+    return jsonify(tracer.export(sequence_id))
+
+# 大模型调用统计的接口
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """返回大模型调用的统计：结果计数、耗时直方图（首个token、总耗时、生成速度、请求/响应大小等），以及最近调用的滚动统计"""
+    return jsonify({
+        'success': True,
+        'metrics': client_metrics.snapshot(),
+        'latency': llm_latency.summary()
+    })
+
 # 列出可用工具的接口
 @app.route('/api/tools', methods=['GET'])
 def list_available_tools():
@@ -297,9 +368,19 @@ def chat_api():
         processed_data = data.copy()
         if message and 'content' not in processed_data:
             processed_data['content'] = message
+        user_message = {'role': 'user', 'content': message}
+        if conversation_id and message:
+            # 多轮会话：发送会话在token预算内的最近消息，本轮的用户消息在调用成功后与回复一起保存
+            processed_data['messages'] = conversation_store.window(conversation_id, pending=[user_message])
         
         # 调用Mock LLM客户端生成响应
-        response_data = mock_llm_client.send_request(processed_data)
+        timer = CallTimer()
+        response_data = chat_llm_client.send_request(processed_data)
+        content = response_data.get('content') if isinstance(response_data, dict) else None
+        timing = timer.finish(estimate_tokens(content or ''))
+        record_timing(timing)
+        if conversation_id and message and content and not response_data.get('error'):
+            conversation_store.extend(conversation_id, [user_message, {'role': 'assistant', 'content': content}])
         
         # 构建返回结果
         result = {
@@ -307,6 +388,8 @@ def chat_api():
             'data': response_data,
             'message': '聊天请求处理成功'
         }
+        if timing_enabled():
+            result['timing'] = timing
         
         # 打印返回的JSON
         logger.info(f"返回聊天响应: {json.dumps(result, ensure_ascii=False)}")
@@ -329,11 +412,13 @@ def chat_api():
 def execute_tool_stream():
     """流式传输工具执行结果的接口"""
     try:
+        received_us = now_us() if tracer.enabled else 0
         # 获取请求数据
         data = request.json
         tool_name = data.get('toolName')
         command = data.get('command', '')
         sequence_id = data.get('sequenceId', f'seq-{int(time.time())}')
+        tracer.instant(sequence_id, 'request_received', ts=received_us, path=request.path)
         
         # 验证参数
         if not tool_name:
@@ -367,6 +452,7 @@ def execute_tool_stream():
                         'error': result.get('error')
                     }
                     yield f"data: {json.dumps(end_response)}\n\n"
+                    tracer.instant(sequence_id, 'end_sent')
                     
             except Exception as e:
                 logger.error(f"流式执行异常: {str(e)}")
@@ -381,6 +467,7 @@ def execute_tool_stream():
                     yield f"data: {json.dumps(error_response)}\n\n"
             finally:
                 stop_event.set()
+                tracer.dump(sequence_id)
         
         # 返回SSE响应
         return Response(generate(), mimetype='text/event-stream')
@@ -395,8 +482,20 @@ if __name__ == '__main__':
     parser.add_argument('--host', type=str, default='localhost', help='服务器主机地址')
     parser.add_argument('--port', type=int, default=5000, help='服务器端口号')
     parser.add_argument('--debug', action='store_true', help='启用调试模式')
+    parser.add_argument('--trace', action='store_true', help='记录执行时间线（Chrome trace格式）')
+    parser.add_argument('--trace-dir', type=str, help='追踪文件输出目录')
+    parser.add_argument('--tool-timing', action='store_true',
+                        help='工具子进程上报大模型调用耗时，计入/api/metrics的直方图')
     
     args = parser.parse_args()
+    collect_tool_timing = args.tool_timing
+    
+    # 配置执行时间线追踪
+    if args.trace:
+        tracer.enabled = True
+    if args.trace_dir:
+        tracer.enabled = True
+        tracer.trace_dir = args.trace_dir
     
     # 检查是否安装了必要的依赖
     try:
@@ -416,6 +515,8 @@ if __name__ == '__main__':
     logger.info("  GET    /api/active-processes  - 获取活跃进程数")
     logger.info("  POST   /api/cancel            - 取消执行")
     logger.info("  GET    /api/tools             - 列出可用工具")
+    logger.info("  GET    /api/trace/<seqId>     - 获取执行时间线")
+    logger.info("  GET    /api/metrics           - 获取大模型调用统计")
     
     # 启动服务器
     app.run(host=args.host, port=args.port, debug=args.debug, threaded=True)
\ No newline at end of file